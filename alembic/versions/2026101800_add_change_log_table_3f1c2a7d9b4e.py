@@ -0,0 +1,34 @@
+"""Add change_log table.
+
+Revision ID: 3f1c2a7d9b4e
+Revises: 6c013a88862f
+Create Date: 2026-10-18 00:12:41.093215
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b4e'
+down_revision = '6c013a88862f'
+
+
+def upgrade():
+    op.create_table(
+        'change_log',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+            autoincrement=True,
+        ),
+        sa.Column('kind', sa.String(length=63), nullable=False),
+        sa.Column('object_id', sa.String(length=127), nullable=False),
+        sa.Column('date_created', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('change_log')
@@ -0,0 +1,65 @@
+"""Add metadata_json column to bundle and backfill it from bundle_metadata.
+
+Revision ID: 8e5b2d4c7a91
+Revises: 3f1c2a7d9b4e
+Create Date: 2026-10-18 01:04:22.518310
+
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8e5b2d4c7a91'
+down_revision = '3f1c2a7d9b4e'
+
+# Number of bundles backfilled per query.
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.add_column('bundle', sa.Column('metadata_json', sa.Text(2 ** 24 - 1), nullable=True))
+
+    conn = op.get_bind()
+    bundle = sa.table('bundle', sa.column('id'), sa.column('uuid'), sa.column('metadata_json'),)
+    bundle_metadata = sa.table(
+        'bundle_metadata',
+        sa.column('id'),
+        sa.column('bundle_uuid'),
+        sa.column('metadata_key'),
+        sa.column('metadata_value'),
+    )
+    last_id = -1
+    while True:
+        bundle_rows = conn.execute(
+            sa.select([bundle.c.id, bundle.c.uuid])
+            .where(bundle.c.id > last_id)
+            .order_by(bundle.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not bundle_rows:
+            break
+        last_id = bundle_rows[-1].id
+        metadata = {row.uuid: [] for row in bundle_rows}
+        for row in conn.execute(
+            sa.select(
+                [
+                    bundle_metadata.c.bundle_uuid,
+                    bundle_metadata.c.metadata_key,
+                    bundle_metadata.c.metadata_value,
+                ]
+            )
+            .where(bundle_metadata.c.bundle_uuid.in_(list(metadata)))
+            .order_by(bundle_metadata.c.id)
+        ):
+            metadata[row.bundle_uuid].append([row.metadata_key, row.metadata_value])
+        for uuid, pairs in metadata.items():
+            conn.execute(
+                bundle.update().where(bundle.c.uuid == uuid).values(metadata_json=json.dumps(pairs))
+            )
+
+
+def downgrade():
+    op.drop_column('bundle', 'metadata_json')
@@ -0,0 +1,40 @@
+"""Add worker_message table.
+
+Revision ID: 5d7e9a1b3c26
+Revises: 8e5b2d4c7a91
+Create Date: 2026-10-18 02:17:45.306129
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d7e9a1b3c26'
+down_revision = '8e5b2d4c7a91'
+
+
+def upgrade():
+    op.create_table(
+        'worker_message',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+            autoincrement=True,
+        ),
+        sa.Column('socket_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.String(length=63), nullable=False),
+        sa.Column('data', sa.LargeBinary(2 ** 24 - 1), nullable=False),
+        sa.Column('is_last', sa.Boolean(), nullable=False),
+        sa.Column('date_created', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('worker_message_socket_id_index', 'worker_message', ['socket_id'])
+    op.create_index('worker_message_message_id_index', 'worker_message', ['message_id'])
+
+
+def downgrade():
+    op.drop_index('worker_message_message_id_index', 'worker_message')
+    op.drop_index('worker_message_socket_id_index', 'worker_message')
+    op.drop_table('worker_message')
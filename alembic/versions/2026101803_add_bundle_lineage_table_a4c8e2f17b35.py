@@ -0,0 +1,83 @@
+"""Add bundle_lineage table and backfill it from bundle_dependency.
+
+Revision ID: a4c8e2f17b35
+Revises: 5d7e9a1b3c26
+Create Date: 2026-10-18 03:41:09.720415
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2f17b35'
+down_revision = '5d7e9a1b3c26'
+
+# Number of rows inserted per query.
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.create_table(
+        'bundle_lineage',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+            autoincrement=True,
+        ),
+        sa.Column('ancestor_uuid', sa.String(length=63), nullable=False),
+        sa.Column('descendant_uuid', sa.String(length=63), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('bundle_lineage_ancestor_index', 'bundle_lineage', ['ancestor_uuid', 'depth'])
+    op.create_index(
+        'bundle_lineage_descendant_index', 'bundle_lineage', ['descendant_uuid', 'depth']
+    )
+
+    conn = op.get_bind()
+    bundle_dependency = sa.table(
+        'bundle_dependency', sa.column('child_uuid'), sa.column('parent_uuid')
+    )
+    bundle_lineage = sa.table(
+        'bundle_lineage',
+        sa.column('ancestor_uuid'),
+        sa.column('descendant_uuid'),
+        sa.column('depth'),
+    )
+    parents = {}
+    for row in conn.execute(
+        sa.select([bundle_dependency.c.child_uuid, bundle_dependency.c.parent_uuid])
+    ):
+        parents.setdefault(row.child_uuid, set()).add(row.parent_uuid)
+
+    # Walk up the dependencies of each bundle breadth-first, so that each ancestor is first
+    # reached through the fewest dependencies.
+    rows = []
+    for uuid in parents:
+        depths = {}
+        frontier = [uuid]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for child_uuid in frontier:
+                for parent_uuid in parents.get(child_uuid, ()):
+                    if parent_uuid not in depths and parent_uuid != uuid:
+                        depths[parent_uuid] = depth
+                        next_frontier.append(parent_uuid)
+            frontier = next_frontier
+        for ancestor_uuid, depth in depths.items():
+            rows.append({'ancestor_uuid': ancestor_uuid, 'descendant_uuid': uuid, 'depth': depth})
+        if len(rows) >= BATCH_SIZE:
+            conn.execute(bundle_lineage.insert(), rows)
+            rows = []
+    if rows:
+        conn.execute(bundle_lineage.insert(), rows)
+
+
+def downgrade():
+    op.drop_index('bundle_lineage_descendant_index', 'bundle_lineage')
+    op.drop_index('bundle_lineage_ancestor_index', 'bundle_lineage')
+    op.drop_table('bundle_lineage')
@@ -0,0 +1,88 @@
+"""Add bundle_search_ngram table and backfill it from bundle and bundle_metadata.
+
+Revision ID: c61f0d84e9a2
+Revises: a4c8e2f17b35
+Create Date: 2026-10-18 04:52:37.118264
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c61f0d84e9a2'
+down_revision = 'a4c8e2f17b35'
+
+# Number of bundles indexed per batch.
+BATCH_SIZE = 1000
+
+# Metadata keys whose values are indexed (see SearchIndex.METADATA_KEYS).
+METADATA_KEYS = ('name', 'description', 'tags')
+
+
+def get_ngrams(text):
+    text = text.lower()
+    return set(text[i : i + 3] for i in range(len(text) - 2))
+
+
+def upgrade():
+    op.create_table(
+        'bundle_search_ngram',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+            autoincrement=True,
+        ),
+        sa.Column('bundle_uuid', sa.String(length=63), nullable=False),
+        sa.Column('ngram', sa.String(length=3), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('bundle_search_ngram_index', 'bundle_search_ngram', ['ngram', 'bundle_uuid'])
+    op.create_index('bundle_search_ngram_bundle_index', 'bundle_search_ngram', ['bundle_uuid'])
+
+    conn = op.get_bind()
+    bundle = sa.table('bundle', sa.column('id'), sa.column('uuid'), sa.column('command'))
+    bundle_metadata = sa.table(
+        'bundle_metadata',
+        sa.column('bundle_uuid'),
+        sa.column('metadata_key'),
+        sa.column('metadata_value'),
+    )
+    bundle_search_ngram = sa.table(
+        'bundle_search_ngram', sa.column('bundle_uuid'), sa.column('ngram')
+    )
+    last_id = -1
+    while True:
+        bundles = conn.execute(
+            sa.select([bundle.c.id, bundle.c.uuid, bundle.c.command])
+            .where(bundle.c.id > last_id)
+            .order_by(bundle.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not bundles:
+            break
+        last_id = bundles[-1].id
+        ngrams = {row.uuid: get_ngrams(row.uuid) | get_ngrams(row.command or '') for row in bundles}
+        for row in conn.execute(
+            sa.select([bundle_metadata.c.bundle_uuid, bundle_metadata.c.metadata_value]).where(
+                sa.and_(
+                    bundle_metadata.c.bundle_uuid.in_(list(ngrams)),
+                    bundle_metadata.c.metadata_key.in_(METADATA_KEYS),
+                )
+            )
+        ):
+            ngrams[row.bundle_uuid] |= get_ngrams(row.metadata_value)
+        rows = [
+            {'bundle_uuid': uuid, 'ngram': ngram}
+            for uuid, bundle_ngrams in ngrams.items()
+            for ngram in sorted(bundle_ngrams)
+        ]
+        if rows:
+            conn.execute(bundle_search_ngram.insert(), rows)
+
+
+def downgrade():
+    op.drop_index('bundle_search_ngram_bundle_index', 'bundle_search_ngram')
+    op.drop_index('bundle_search_ngram_index', 'bundle_search_ngram')
+    op.drop_table('bundle_search_ngram')
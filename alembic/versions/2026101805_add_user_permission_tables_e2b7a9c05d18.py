@@ -0,0 +1,73 @@
+"""Add user_bundle_permission and user_object_permission tables and backfill them from the
+group permissions of each user.
+
+Revision ID: e2b7a9c05d18
+Revises: c61f0d84e9a2
+Create Date: 2026-10-18 06:14:52.306127
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7a9c05d18'
+down_revision = 'c61f0d84e9a2'
+
+# Tables of materialized user permissions, and the group permission tables they're computed from.
+TABLES = [
+    ('user_bundle_permission', 'group_bundle_permission'),
+    ('user_object_permission', 'group_object_permission'),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    user_group = sa.table('user_group', sa.column('user_id'), sa.column('group_uuid'))
+    for name, group_table_name in TABLES:
+        op.create_table(
+            name,
+            sa.Column(
+                'id',
+                sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+                nullable=False,
+                autoincrement=True,
+            ),
+            sa.Column('user_id', sa.String(length=63), nullable=False),
+            sa.Column('object_uuid', sa.String(length=63), nullable=False),
+            sa.Column('permission', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('%s_user_index' % name, name, ['user_id', 'object_uuid'])
+        op.create_index('%s_object_index' % name, name, ['object_uuid'])
+
+        user_table = sa.table(
+            name, sa.column('user_id'), sa.column('object_uuid'), sa.column('permission')
+        )
+        group_table = sa.table(
+            group_table_name,
+            sa.column('group_uuid'),
+            sa.column('object_uuid'),
+            sa.column('permission'),
+        )
+        conn.execute(
+            user_table.insert().from_select(
+                ['user_id', 'object_uuid', 'permission'],
+                sa.select(
+                    [
+                        user_group.c.user_id,
+                        group_table.c.object_uuid,
+                        sa.func.max(group_table.c.permission),
+                    ]
+                )
+                .where(user_group.c.group_uuid == group_table.c.group_uuid)
+                .group_by(user_group.c.user_id, group_table.c.object_uuid),
+            )
+        )
+
+
+def downgrade():
+    for name, _ in reversed(TABLES):
+        op.drop_index('%s_object_index' % name, name)
+        op.drop_index('%s_user_index' % name, name)
+        op.drop_table(name)
@@ -0,0 +1,22 @@
+"""Add capabilities to worker
+
+Revision ID: 7b3e1f9d2a64
+Revises: e2b7a9c05d18
+Create Date: 2026-10-18 09:41:12.518204
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7b3e1f9d2a64'
+down_revision = 'e2b7a9c05d18'
+
+
+def upgrade():
+    op.add_column('worker', sa.Column('capabilities', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('worker', 'capabilities')
@@ -19,6 +19,17 @@ def main():
         type=int,
         default=60,
     )
+    parser.add_argument(
+        '--event-driven',
+        help='React to bundle and worker changes as they are recorded instead of rescanning all bundles every --sleep-time seconds.',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--full-iteration-seconds',
+        help='When --event-driven is set, number of seconds between full scans of all bundles.',
+        type=int,
+        default=60,
+    )
     args = parser.parse_args()
 
     manager = BundleManager(CodaLabManager(), args.worker_timeout_seconds)
@@ -26,7 +37,7 @@ def main():
     for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGHUP]:
         signal.signal(sig, lambda signup, frame: manager.signal())
 
-    manager.run(args.sleep_time)
+    manager.run(args.sleep_time, args.event_driven, args.full_iteration_seconds)
 
 
 if __name__ == '__main__':
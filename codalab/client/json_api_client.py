@@ -1,6 +1,13 @@
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+import hashlib
 import http.client
+import json
+import logging
 import socket
 import sys
+import time
 import six
 import urllib.request
 import urllib.parse
@@ -11,6 +18,14 @@ from codalab.worker.rest_client import RestClient, RestClientException
 from codalab.worker.download_util import BundleTarget
 
 
+# Size of the parts of resumable uploads, and the number of parts that are sent at once.
+UPLOAD_PART_SIZE = 32 * 1024 * 1024
+UPLOAD_PARALLELISM = 4
+# Number of times that a part is sent again after a server or network error.
+UPLOAD_PART_MAX_RETRIES = 5
+UPLOAD_COMMIT_TIMEOUT_SECONDS = 6 * 60 * 60
+
+
 def wrap_exception(message):
     def decorator(f):
         def wrapper(*args, **kwargs):
@@ -434,6 +449,36 @@ class JsonApiClient(RestClient):
         else:
             return results[0]
 
+    @wrap_exception('Unable to search bundles')
+    def stream_bundles(self, keywords, params=None):
+        """
+        Request to fetch the bundles matching the search keywords, which the server streams as
+        they are iterated over, so that memory use doesn't grow with the number of bundles. Unlike
+        with fetch, `.limit` is the total number of bundles (all of them by default), and
+        aggregate keywords such as `.count` aren't supported.
+
+        :param keywords: list of search keywords
+        :param params: dict of other query parameters, as for fetch('bundles')
+        :return: iterator over the bundles
+        """
+        params = dict(params or {}, keywords=keywords, stream=True)
+        response = self._make_request(
+            method='GET',
+            path=self._get_resource_path('bundles'),
+            query_params=self._pack_params(params),
+            return_response=True,
+        )
+        if not response.headers.get('Content-Type', '').startswith('application/x-ndjson'):
+            response.close()
+            raise UsageError('Aggregate searches cannot be streamed')
+        return self._unpack_documents(response)
+
+    def _unpack_documents(self, response):
+        with closing(response):
+            for line in response:
+                if line.strip():
+                    yield self._unpack_document(json.loads(line))
+
     @wrap_exception('Unable to netcat {1}')
     def netcat(self, bundle_id, port, data):
         """
@@ -632,6 +677,33 @@ class JsonApiClient(RestClient):
             'GET', request_path, headers=headers, query_params=params, return_response=True
         )
 
+    @wrap_exception('Unable to follow contents of bundle {1}')
+    def follow_contents(self, bundle_id, offsets):
+        """
+        Request to follow files of a bundle, which the server streams as they are appended to,
+        together with the changes of the state of the bundle, until it is in a final state.
+
+        :param bundle_id: uuid of the bundle
+        :param offsets: list of (subpath, offset) of the files to follow, where negative offsets
+                        are relative to the end of the file
+        :return: iterator over the events (see GET /bundles/<uuid>/contents/follow/)
+        """
+        request_path = '/bundles/%s/contents/follow/' % bundle_id
+        params = {
+            'subpath': [subpath for subpath, _ in offsets],
+            'offset': [offset for _, offset in offsets],
+        }
+        response = self._make_request(
+            'GET', request_path, query_params=self._pack_params(params), return_response=True
+        )
+        return self._unpack_events(response)
+
+    def _unpack_events(self, response):
+        with closing(response):
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
     @wrap_exception('Unable to upload contents of bundle {1}')
     def upload_contents_blob(self, bundle_id, fileobj=None, params=None, progress_callback=None):
         """
@@ -660,6 +732,160 @@ class JsonApiClient(RestClient):
                 progress_callback=progress_callback,
             )
 
+    @wrap_exception('Unable to start upload of contents of bundle {1}')
+    def create_contents_upload(self, bundle_id, params=None):
+        """
+        Starts a resumable upload of the contents of the specified bundle.
+
+        :param bundle_id: the id of the target bundle
+        :param params: dict of query parameters, as for upload_contents_blob
+        :return: the upload session, with the keys 'upload_id' and 'parts'
+        """
+        return self._make_request(
+            method='POST',
+            path='/bundles/%s/contents/uploads/' % bundle_id,
+            query_params=self._pack_params(params or {}),
+        )['data']
+
+    @wrap_exception('Unable to fetch uploads of contents of bundle {1}')
+    def fetch_contents_uploads(self, bundle_id):
+        """
+        :return: the resumable uploads of the contents of the bundle that haven't been
+                 committed, oldest first
+        """
+        return self._make_request(method='GET', path='/bundles/%s/contents/uploads/' % bundle_id)[
+            'data'
+        ]
+
+    @wrap_exception('Unable to upload part {3} of contents of bundle {1}')
+    def upload_contents_part(self, bundle_id, upload_id, number, data):
+        """
+        Uploads the bytes data as the part number (starting at 0) of a resumable upload.
+        """
+        self._make_request(
+            method='PUT',
+            path='/bundles/%s/contents/uploads/%s/parts/%d' % (bundle_id, upload_id, number),
+            query_params={'sha1': hashlib.sha1(data).hexdigest()},
+            headers={'Content-Type': 'application/octet-stream'},
+            data=data,
+        )
+
+    @wrap_exception('Unable to commit upload of contents of bundle {1}')
+    def commit_contents_upload(self, bundle_id, upload_id, num_parts):
+        """
+        Stores the first num_parts parts of a resumable upload as the contents of the bundle.
+        """
+        self._make_request(
+            method='POST',
+            path='/bundles/%s/contents/uploads/%s/commit' % (bundle_id, upload_id),
+            query_params={'num_parts': num_parts},
+            # The server unpacks and stores the contents before it responds.
+            timeout_seconds=UPLOAD_COMMIT_TIMEOUT_SECONDS,
+        )
+
+    def upload_contents_in_parts(
+        self,
+        bundle_id,
+        fileobj,
+        params=None,
+        progress_callback=None,
+        part_size=UPLOAD_PART_SIZE,
+        parallelism=UPLOAD_PARALLELISM,
+        upload=None,
+    ):
+        """
+        Uploads the contents of the given fileobj as the contents of the specified bundle with
+        a resumable upload. The fileobj is read in parts of part_size bytes, which are sent
+        parallelism at a time, and each part is sent again if it fails with a server or
+        network error. Contents are stored once all the parts are sent.
+
+        :param upload: the session of an earlier upload of the same contents to resume (see
+                       fetch_contents_uploads), or None to start a new one. The parts that the
+                       server already has are read from fileobj but not sent again.
+        Other parameters are the same as for upload_contents_blob.
+        :return: None
+        """
+        if upload is None:
+            upload = self.create_contents_upload(bundle_id, params)
+        upload_id = upload['upload_id']
+        sent_parts = {part['number']: part['sha1'] for part in upload['parts']}
+        bytes_uploaded = 0
+        num_parts = 0
+        pending = collections.deque()
+        with ThreadPoolExecutor(parallelism) as executor:
+
+            def wait_for_part():
+                nonlocal bytes_uploaded
+                bytes_uploaded += pending.popleft().result()
+                if progress_callback is not None and not progress_callback(bytes_uploaded):
+                    raise Exception('Upload aborted by client')
+
+            try:
+                while True:
+                    data = fileobj.read(part_size)
+                    if not data:
+                        break
+                    if sent_parts.get(num_parts) == hashlib.sha1(data).hexdigest():
+                        future = Future()  # type: Future
+                        future.set_result(len(data))
+                    else:
+                        future = executor.submit(
+                            self._upload_contents_part_with_retries,
+                            bundle_id,
+                            upload_id,
+                            num_parts,
+                            data,
+                        )
+                    pending.append(future)
+                    num_parts += 1
+                    while len(pending) >= parallelism:
+                        wait_for_part()
+                while pending:
+                    wait_for_part()
+            finally:
+                for future in pending:
+                    future.cancel()
+        self.commit_contents_upload(bundle_id, upload_id, num_parts)
+
+    def _upload_contents_part_with_retries(self, bundle_id, upload_id, number, data):
+        """
+        Uploads a part, retrying with exponential backoff on server and network errors.
+        Returns the size of the part.
+        """
+        for attempt in range(UPLOAD_PART_MAX_RETRIES + 1):
+            try:
+                self.upload_contents_part(bundle_id, upload_id, number, data)
+                return len(data)
+            except JsonApiException as e:
+                if e.client_error or attempt == UPLOAD_PART_MAX_RETRIES:
+                    raise
+                logging.debug('Retrying part %d of upload %s: %s', number, upload_id, e)
+                time.sleep(2 ** attempt)
+
+    @wrap_exception('Unable to fetch the lineage of bundles')
+    def fetch_bundles_lineage(self, bundle_uuids, descendant_depth=0, ancestor_depth=0):
+        """
+        :param bundle_uuids: uuids of the bundles
+        :param descendant_depth: number of dependencies to follow down from the bundles
+        :param ancestor_depth: number of dependencies to follow up from the bundles and their
+                               descendants
+        :return: infos of the bundles, their descendants and the ancestors of all of them,
+                 ancestors first
+        """
+        return self._unpack_document(
+            self._make_request(
+                method='GET',
+                path='/bundles/lineage',
+                query_params=self._pack_params(
+                    {
+                        'uuids': bundle_uuids,
+                        'descendant_depth': descendant_depth,
+                        'ancestor_depth': ancestor_depth,
+                    }
+                ),
+            )
+        )
+
     @wrap_exception('Unable to get the locations of bundles')
     def get_bundles_locations(self, bundle_uuids):
         response = self._make_request(
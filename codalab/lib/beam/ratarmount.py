@@ -642,7 +642,10 @@ class SQLiteIndexedTar:
 
     @staticmethod
     def _openSqlDb(path: AnyStr) -> sqlite3.Connection:
-        sqlConnection = sqlite3.connect(path)
+        # The connection may be used from a different thread than the one that opened it,
+        # since codalab.worker.archive_index_cache reuses SQLiteIndexedTar objects across
+        # requests. It's only ever used by one thread at a time.
+        sqlConnection = sqlite3.connect(path, check_same_thread=False)
         sqlConnection.row_factory = sqlite3.Row
         sqlConnection.executescript(
             """
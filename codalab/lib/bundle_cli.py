@@ -15,8 +15,10 @@ results in the following:
 """
 # TODO(sckoo): Move this into a separate CLI directory/package
 import argparse
+import base64
 import codecs
 import datetime
+import http.client
 import inspect
 import itertools
 import os
@@ -80,7 +82,11 @@ from codalab.lib.cli_util import (
     UUID_POST_FUNC,
 )
 from codalab.objects.permission import group_permissions_str, parse_permission, permission_str
-from codalab.client.json_api_client import JsonApiRelationship
+from codalab.client.json_api_client import (
+    JsonApiRelationship,
+    UPLOAD_PARALLELISM,
+    UPLOAD_PART_SIZE,
+)
 from codalab.lib.formatting import contents_str
 from codalab.lib.completers import (
     AddressesCompleter,
@@ -1277,6 +1283,25 @@ class BundleCLI(object):
                 action='store_true',
                 default=False,
             ),
+            Commands.Argument(
+                '--resume',
+                help='Resume an interrupted upload of the same path(s) to this bundle (%s) '
+                'instead of creating a new bundle. Parts that the server already has are not '
+                'sent again, unless storing them failed.' % BUNDLE_SPEC_FORMAT,
+                completer=BundlesCompleter,
+            ),
+            Commands.Argument(
+                '--part-size',
+                help='Size of the parts that local files are uploaded in (e.g., 32m).',
+                type=formatting.parse_size,
+                default=UPLOAD_PART_SIZE,
+            ),
+            Commands.Argument(
+                '--parallelism',
+                help='Number of parts of local files to upload at once.',
+                type=int,
+                default=UPLOAD_PARALLELISM,
+            ),
         )
         + Commands.metadata_arguments([UploadedBundle])
         + EDIT_ARGUMENTS,
@@ -1392,35 +1417,83 @@ class BundleCLI(object):
                 ignore_file=args.ignore,
             )
 
-            # Create bundle.
-            # We must create the bundle right before we upload it because we
-            # perform some input validation in functions such as
-            # zip_util.pack_files_for_upload that we want to fail fast before
-            # we try to create or upload the bundle, otherwise you will be left
-            # with empty shells of failed uploading bundles on your worksheet.
-            new_bundle = client.create(
-                'bundles',
-                bundle_info,
-                params={'worksheet': worksheet_uuid, 'wait_for_upload': True},
-            )
+            params = {
+                'filename': packed['filename'],
+                'unpack': packed['should_unpack'],
+                'state_on_success': State.READY,
+                'finalize_on_success': True,
+                'use_azure_blob_beta': args.use_azure_blob_beta,
+            }
+            upload = None
+            if args.resume:
+                new_bundle = client.fetch(
+                    'bundles', self.resolve_bundle_uuid(client, worksheet_uuid, args.resume)
+                )
+                if new_bundle['state'] != State.UPLOADING:
+                    raise UsageError(
+                        'Bundle %s is %s, not uploading.' % (new_bundle['id'], new_bundle['state'])
+                    )
+                uploads = client.fetch_contents_uploads(new_bundle['id'])
+                if uploads:
+                    upload = uploads[-1]
+                else:
+                    # The server deletes the parts of an upload that it failed to store.
+                    upload = client.create_contents_upload(
+                        new_bundle['id'], dict(params, finalize_on_failure=False)
+                    )
+            else:
+                # Create bundle.
+                # We must create the bundle right before we upload it because we
+                # perform some input validation in functions such as
+                # zip_util.pack_files_for_upload that we want to fail fast before
+                # we try to create or upload the bundle, otherwise you will be left
+                # with empty shells of failed uploading bundles on your worksheet.
+                new_bundle = client.create(
+                    'bundles',
+                    bundle_info,
+                    params={'worksheet': worksheet_uuid, 'wait_for_upload': True},
+                )
+                try:
+                    # Keep the bundle uploading if the upload fails, so that it can be resumed.
+                    upload = client.create_contents_upload(
+                        new_bundle['id'], dict(params, finalize_on_failure=False)
+                    )
+                except NotFoundError:
+                    # The server doesn't support resumable uploads.
+                    pass
             print(
                 'Uploading %s (%s) to %s' % (packed['filename'], new_bundle['id'], client.address),
                 file=self.stderr,
             )
+            # The size of packed directories and of several sources isn't known up front, in
+            # which case only the bytes sent so far are shown. Both kinds of upload below are
+            # sent in chunks, so they don't need the size.
             progress = FileTransferProgress('Sent ', packed['filesize'], f=self.stderr)
             with closing(packed['fileobj']), progress:
-                client.upload_contents_blob(
-                    new_bundle['id'],
-                    fileobj=packed['fileobj'],
-                    params={
-                        'filename': packed['filename'],
-                        'unpack': packed['should_unpack'],
-                        'state_on_success': State.READY,
-                        'finalize_on_success': True,
-                        'use_azure_blob_beta': args.use_azure_blob_beta,
-                    },
-                    progress_callback=progress.update,
-                )
+                if upload is None:
+                    client.upload_contents_blob(
+                        new_bundle['id'],
+                        fileobj=packed['fileobj'],
+                        params=params,
+                        progress_callback=progress.update,
+                    )
+                else:
+                    try:
+                        client.upload_contents_in_parts(
+                            new_bundle['id'],
+                            fileobj=packed['fileobj'],
+                            progress_callback=progress.update,
+                            part_size=args.part_size,
+                            parallelism=args.parallelism,
+                            upload=upload,
+                        )
+                    except Exception:
+                        print(
+                            'Upload failed. To resume it, run the same command with --resume %s'
+                            % new_bundle['id'],
+                            file=self.stderr,
+                        )
+                        raise
 
         print(new_bundle['id'], file=self.stdout)
 
@@ -2528,6 +2601,12 @@ class BundleCLI(object):
             Commands.Argument(
                 '-t', '--tail', type=int, metavar='NUM', help='Display last NUM lines of contents'
             ),
+            Commands.Argument(
+                '-f',
+                '--follow',
+                action='store_true',
+                help='Display the contents of the file (stdout and stderr for a bundle) as it is appended to, until the run bundle has finished running.',
+            ),
             Commands.Argument(
                 '-w',
                 '--worksheet-spec',
@@ -2544,6 +2623,14 @@ class BundleCLI(object):
         client, worksheet_uuid, target = self.resolve_target(
             default_client, default_worksheet_uuid, args.target_spec
         )
+        if args.follow:
+            self._fail_if_headless(args)
+            if args.head is not None or args.tail is not None:
+                raise UsageError('--follow cannot be used with --head or --tail.')
+            # Like wait --tail, follow the output of the run when given the whole bundle.
+            subpaths = [target.subpath] if target.subpath else ['stdout', 'stderr']
+            self.follow_targets(client, target.bundle_uuid, subpaths, from_start=True)
+            return
         info = self.print_target_info(client, target, head=args.head, tail=args.tail)
         if info is None:
             raise UsageError(
@@ -2666,6 +2753,42 @@ class BundleCLI(object):
             start from near the end of the file (like tail)
         :return: 'ready' or 'failed' based on whether it was computed successfully.
         """
+        # Seconds to wait before following again when the stream ends before the run finishes.
+        RESUME_PERIOD = 1.0
+
+        # Go to near the end of the files (TODO: make this match up with lines)
+        offsets = {subpath: 0 if from_start else -64 for subpath in subpaths}
+        run_state = None
+        # Pick up where we left off if the server ends the stream before the run finishes, or
+        # the connection is lost.
+        while True:
+            try:
+                events = client.follow_contents(bundle_uuid, list(offsets.items()))
+            except NotFoundError:
+                # Servers that can't stream the contents have to be polled instead.
+                return self._poll_targets(client, bundle_uuid, subpaths, from_start)
+            try:
+                for event in events:
+                    if event['type'] == 'state':
+                        run_state = event['state']
+                    elif event['type'] == 'data':
+                        data = base64.b64decode(event['data'])
+                        offsets[event['subpath']] = event['offset'] + len(data)
+                        self.stdout.write(ensure_str(data))
+                        self.stdout.flush()
+            except (http.client.HTTPException, OSError):
+                # The rest of the files may not have been sent yet, even in a final state.
+                pass
+            else:
+                if run_state in State.FINAL_STATES:
+                    return run_state
+            time.sleep(RESUME_PERIOD)
+
+    def _poll_targets(self, client, bundle_uuid, subpaths, from_start=False):
+        """
+        Same as follow_targets, but polls the server for the state of the bundle and the
+        contents of the files every second.
+        """
         subpath_is_file = [None] * len(subpaths)
         subpath_offset = [None] * len(subpaths)
         subpath_targets = [None] * len(subpaths)
@@ -45,8 +45,10 @@ from codalab.lib.download_manager import DownloadManager
 from codalab.lib.emailer import SMTPEmailer, ConsoleEmailer
 from codalab.lib.print_util import pretty_print_json
 from codalab.lib.upload_manager import UploadManager
+from codalab.lib.upload_part_store import UploadPartStore
 from codalab.lib import formatting
 from codalab.model.worker_model import WorkerModel
+from codalab.worker import compression
 from codalab.lib.beam.filesystems import AZURE_BLOB_ACCOUNT_NAME
 
 MAIN_BUNDLE_SERVICE = 'https://worksheets.codalab.org'
@@ -149,6 +151,11 @@ class CodaLabManager(object):
 
         self.config = replace(self.config)
 
+        # How bundle contents are gzipped for uploads and downloads, e.g.,
+        # {"level": 6, "threads": 4}, or a level of 0 to send them uncompressed.
+        compression_config = self.config.get('compression', {})
+        compression.configure(compression_config.get('level'), compression_config.get('threads'))
+
         # Read state file, creating if it doesn't exist.
         if not os.path.exists(self.state_path):
             write_pretty_json(
@@ -351,19 +358,98 @@ class CodaLabManager(object):
             )
         else:
             raise UsageError('Unexpected model class: %s, expected MySQLModel' % (model_class,))
+
+        # Optionally cache bundles in memory, e.g. "bundle_cache": {"size": 10000, "ttl": "5s"}.
+        cache_config = self.config['server'].get('bundle_cache')
+        if cache_config:
+            from codalab.model.bundle_cache import BundleCache, LRUCacheBackend
+
+            model.bundle_cache = BundleCache(
+                LRUCacheBackend(
+                    cache_config.get('size', 10000),
+                    formatting.parse_duration(cache_config.get('ttl', '5s')),
+                )
+            )
+        # Optionally cache the groups of each user, e.g. "permission_cache": {"size": 10000,
+        # "ttl": "10s"}.
+        cache_config = self.config['server'].get('permission_cache')
+        if cache_config:
+            from codalab.model.bundle_cache import LRUCacheBackend
+            from codalab.model.permission_cache import PermissionCache
+
+            model.permission_cache = PermissionCache(
+                LRUCacheBackend(
+                    cache_config.get('size', 10000),
+                    formatting.parse_duration(cache_config.get('ttl', '10s')),
+                )
+            )
+        # Optionally resolve permissions through the user_bundle_permission and
+        # user_object_permission tables instead of the groups of each user.
+        model.use_permission_view = self.config['server'].get('permission_view', False)
         return model
 
+    @cached
+    def interpret_cache(self):
+        """
+        Returns the cache of interpreted worksheet blocks, or None if it's disabled. Enabled with
+        e.g. "interpret_cache": {"size": 10000, "ttl": "1h"} in the server config.
+        """
+        cache_config = self.config['server'].get('interpret_cache')
+        if not cache_config:
+            return None
+        from codalab.lib.interpret_cache import InterpretCache
+        from codalab.model.bundle_cache import LRUCacheBackend
+
+        return InterpretCache(
+            LRUCacheBackend(
+                cache_config.get('size', 10000),
+                formatting.parse_duration(cache_config.get('ttl', '1h')),
+            )
+        )
+
     @cached
     def worker_model(self):
-        return WorkerModel(self.model().engine, self.worker_socket_dir)
+        from codalab.model.message_bus import DatabaseMessageBus, MessageBusType
+
+        model = self.model()
+        message_bus_type = self.config['server'].get(
+            'worker_message_bus', MessageBusType.UNIX_SOCKET
+        )
+        if message_bus_type not in MessageBusType.OPTIONS:
+            raise UsageError(
+                'Unexpected worker_message_bus: %s, expected one of %s'
+                % (message_bus_type, ', '.join(sorted(MessageBusType.OPTIONS)))
+            )
+        message_bus = None
+        if message_bus_type == MessageBusType.DATABASE:
+            message_bus = DatabaseMessageBus(model.engine)
+        return WorkerModel(model.engine, self.worker_socket_dir, model.change_log, message_bus)
 
     @cached
     def upload_manager(self):
         return UploadManager(self.model(), self.bundle_store())
 
+    @cached
+    def upload_part_store(self):
+        """
+        Returns the store of the parts of resumable uploads. Uploads that don't receive a part
+        for upload_session_ttl (default 7 days) are removed.
+        """
+        return UploadPartStore(
+            os.path.join(self.codalab_home, 'partial_uploads'),
+            formatting.parse_duration(self.config['server'].get('upload_session_ttl', '7d')),
+        )
+
     @cached
     def download_manager(self):
-        return DownloadManager(self.model(), self.worker_model(), self.bundle_store())
+        return DownloadManager(
+            self.model(),
+            self.worker_model(),
+            self.bundle_store(),
+            read_coalesce_window=formatting.parse_duration(
+                self.config['server'].get('read_coalesce_window', '0.02')
+            ),
+        )
 
     @cached
     def rest_oauth_handler(self):
@@ -1,6 +1,9 @@
+from concurrent.futures import Future
 import logging
 import os
 from contextlib import closing
+import threading
+import time
 
 from codalab.common import (
     http_error_to_exception,
@@ -9,7 +12,7 @@ from codalab.common import (
     NotFoundError,
     parse_linked_bundle_url,
 )
-from codalab.worker import download_util
+from codalab.worker import download_util, read_batch
 from codalab.worker.bundle_state import State
 from codalab.worker.un_gzip_stream import un_gzip_stream
 
@@ -37,6 +40,64 @@ def retry_if_no_longer_running(f):
     return wrapper
 
 
+class ReadCoalescer(object):
+    """
+    Coalesces the reads from the same worker that are requested at about the same time into a
+    single batch_read message. The first read for a worker waits |window_seconds| for others
+    to join it (or until there are |max_batch_size| of them) and then sends them all with
+    batch_read_fn(worker, reads).
+    """
+
+    class Batch(object):
+        def __init__(self):
+            self.reads = []  # (target, read_args, future)
+            self.full = threading.Event()
+
+    def __init__(self, batch_read_fn, window_seconds, max_batch_size=100):
+        self._batch_read_fn = batch_read_fn
+        self._window_seconds = window_seconds
+        self._max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        # (user_id, worker_id) -> Batch that reads can still join
+        self._pending = {}
+
+    def read(self, worker, target, read_args):
+        """
+        Reads |target| from |worker|. Returns the (message, data) the worker replied with.
+        """
+        key = (worker['user_id'], worker['worker_id'])
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = self._pending[key] = self.Batch()
+            batch.reads.append((target, read_args, future))
+            if len(batch.reads) >= self._max_batch_size:
+                del self._pending[key]
+                batch.full.set()
+
+        if is_leader:
+            batch.full.wait(self._window_seconds)
+            with self._lock:
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+            try:
+                results = self._batch_read_fn(
+                    worker, [(target, read_args) for target, read_args, _ in batch.reads]
+                )
+                for (_, _, read_future), result in zip(batch.reads, results):
+                    if isinstance(result, Exception):
+                        read_future.set_exception(result)
+                    else:
+                        read_future.set_result(result)
+            except Exception as e:
+                for _, _, read_future in batch.reads:
+                    if not read_future.done():
+                        read_future.set_exception(e)
+        return future.result()
+
+
 class DownloadManager(object):
     """
     Used for downloading the contents of bundles. The main purpose of this class
@@ -47,13 +108,23 @@ class DownloadManager(object):
     responsible for doing all required permissions checks.
     """
 
-    def __init__(self, bundle_model, worker_model, bundle_store):
+    # Seconds between reads of the files followed on workers that don't handle follow_files.
+    FOLLOW_POLL_INTERVAL_SECS = 2
+    # Maximum number of bytes of a file read at a time when following it on such workers.
+    FOLLOW_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, bundle_model, worker_model, bundle_store, read_coalesce_window=0.02):
+        """
+        Reads from running bundles on the same worker that are requested within
+        |read_coalesce_window| seconds of each other are sent to the worker together.
+        """
         from codalab.worker import file_util
 
         self._bundle_model = bundle_model
         self._worker_model = worker_model
         self._bundle_store = bundle_store
         self.file_util = file_util
+        self._read_coalescer = ReadCoalescer(self.batch_read, read_coalesce_window)
 
     @retry_if_no_longer_running
     def get_target_info(self, target, depth):
@@ -129,32 +200,14 @@ class DownloadManager(object):
             # system since 1) due to NFS caching the worker has more up to date
             # information on directory contents, and 2) the logic of hiding
             # the dependency paths doesn't need to be re-implemented here.
-            worker = self._bundle_model.get_bundle_worker(target.bundle_uuid)
-            response_socket_id = self._worker_model.allocate_socket(
-                worker['user_id'], worker['worker_id']
+            read_args = {'type': 'get_target_info', 'depth': depth}
+            result, _ = self._read_from_worker(target, read_args)
+            target_info = result['target_info']
+            # Deserialize dict response sent over JSON
+            target_info['resolved_target'] = download_util.BundleTarget.from_dict(
+                target_info['resolved_target']
             )
-            try:
-                read_args = {'type': 'get_target_info', 'depth': depth}
-                self._send_read_message(worker, response_socket_id, target, read_args)
-                with closing(self._worker_model.start_listening(response_socket_id)) as sock:
-                    result = self._worker_model.get_json_message(sock, 60)
-                if result is None:  # dead workers are a fact of life now
-                    logging.info('Unable to reach worker, bundle state {}'.format(bundle_state))
-                    raise NotFoundError(
-                        'Unable to reach worker of running bundle with bundle state {}'.format(
-                            bundle_state
-                        )
-                    )
-                elif 'error_code' in result:
-                    raise http_error_to_exception(result['error_code'], result['error_message'])
-                target_info = result['target_info']
-                # Deserialize dict response sent over JSON
-                target_info['resolved_target'] = download_util.BundleTarget.from_dict(
-                    target_info['resolved_target']
-                )
-                return target_info
-            finally:
-                self._worker_model.deallocate_socket(response_socket_id)
+            return target_info
 
     @retry_if_no_longer_running
     def stream_tarred_gzipped_directory(self, target):
@@ -237,16 +290,8 @@ class DownloadManager(object):
                 bytestring = self.file_util.gzip_bytestring(bytestring)
             return bytestring
         else:
-            worker = self._bundle_model.get_bundle_worker(target.bundle_uuid)
-            response_socket_id = self._worker_model.allocate_socket(
-                worker['user_id'], worker['worker_id']
-            )
-            try:
-                read_args = {'type': 'read_file_section', 'offset': offset, 'length': length}
-                self._send_read_message(worker, response_socket_id, target, read_args)
-                bytestring = self._get_read_response(response_socket_id)
-            finally:
-                self._worker_model.deallocate_socket(response_socket_id)
+            read_args = {'type': 'read_file_section', 'offset': offset, 'length': length}
+            _, bytestring = self._read_from_worker(target, read_args)
 
             # Note: all data from the worker is gzipped (see `local_reader.py`).
             if not gzipped:
@@ -274,27 +319,92 @@ class DownloadManager(object):
                 bytestring = self.file_util.gzip_bytestring(bytestring)
             return bytestring
         else:
-            worker = self._bundle_model.get_bundle_worker(target.bundle_uuid)
+            read_args = {
+                'type': 'summarize_file',
+                'num_head_lines': num_head_lines,
+                'num_tail_lines': num_tail_lines,
+                'max_line_length': max_line_length,
+                'truncation_text': truncation_text,
+            }
+            _, bytestring = self._read_from_worker(target, read_args)
+
+            # Note: all data from the worker is gzipped (see `local_reader.py`).
+            if not gzipped:
+                bytestring = self.file_util.un_gzip_bytestring(bytestring)
+            return bytestring
+
+    @retry_if_no_longer_running
+    def follow_files(self, bundle_uuid, offsets, timeout_secs):
+        """
+        Returns an iterator over (subpath, offset, bytes) for the sections appended to the files
+        of the bundle at the subpaths in |offsets|, starting at the offset of each, as they are
+        appended over the next |timeout_secs| seconds.
+
+        Unlike the other reads of running bundles, this isn't a single reply: the worker follows
+        the files itself and streams the sections as they are appended (see Reader.follow_files).
+        """
+        if self._is_available_locally(download_util.BundleTarget(bundle_uuid, '')):
+            file_paths = {
+                subpath: self._get_target_path(download_util.BundleTarget(bundle_uuid, subpath))
+                for subpath in offsets
+            }
+            return self.file_util.follow_files(file_paths, offsets, timeout_secs)
+        else:
+            worker = self._bundle_model.get_bundle_worker(bundle_uuid)
+            if 'follow_files' not in worker['capabilities']:
+                return self._poll_followed_files(bundle_uuid, offsets, timeout_secs)
             response_socket_id = self._worker_model.allocate_socket(
                 worker['user_id'], worker['worker_id']
             )
             try:
-                read_args = {
-                    'type': 'summarize_file',
-                    'num_head_lines': num_head_lines,
-                    'num_tail_lines': num_tail_lines,
-                    'max_line_length': max_line_length,
-                    'truncation_text': truncation_text,
-                }
-                self._send_read_message(worker, response_socket_id, target, read_args)
-                bytestring = self._get_read_response(response_socket_id)
-            finally:
+                read_args = {'type': 'follow_files', 'offsets': offsets, 'timeout': timeout_secs}
+                self._send_read_message(
+                    worker,
+                    response_socket_id,
+                    download_util.BundleTarget(bundle_uuid, ''),
+                    read_args,
+                )
+                fileobj = self._get_read_response_stream(response_socket_id)
+                return self._read_followed_files(
+                    Deallocating(fileobj, self._worker_model, response_socket_id)
+                )
+            except Exception:
                 self._worker_model.deallocate_socket(response_socket_id)
+                raise
 
-            # Note: all data from the worker is gzipped (see `local_reader.py`).
-            if not gzipped:
-                bytestring = self.file_util.un_gzip_bytestring(bytestring)
-            return bytestring
+    def _poll_followed_files(self, bundle_uuid, offsets, timeout_secs):
+        """
+        Same as follow_files, for workers that don't handle follow_files reads: the sections
+        appended to the files are read every FOLLOW_POLL_INTERVAL_SECS seconds instead.
+        """
+        offsets = dict(offsets)
+        deadline = time.time() + timeout_secs
+        while True:
+            for subpath in offsets:
+                target = download_util.BundleTarget(bundle_uuid, subpath)
+                while True:
+                    try:
+                        data = self.read_file_section(
+                            target, offsets[subpath], self.FOLLOW_CHUNK_SIZE, gzipped=False
+                        )
+                    except NotFoundError:
+                        # The file doesn't exist yet.
+                        break
+                    if not data:
+                        break
+                    yield subpath, offsets[subpath], data
+                    offsets[subpath] += len(data)
+            remaining_secs = deadline - time.time()
+            if remaining_secs <= 0:
+                return
+            time.sleep(min(self.FOLLOW_POLL_INTERVAL_SECS, remaining_secs))
+
+    def _read_followed_files(self, fileobj):
+        with closing(fileobj):
+            for message, data in read_batch.read_frames(fileobj):
+                if 'error_code' in message:
+                    raise http_error_to_exception(message['error_code'], message['error_message'])
+                yield message['subpath'], message['offset'], data
 
     def netcat(self, uuid, port, message):
         """
@@ -312,6 +422,68 @@ class DownloadManager(object):
 
         return bytestring
 
+    def batch_read(self, worker, reads):
+        """
+        Sends |reads|, a list of (target, read_args) for bundles running on |worker|, to the
+        worker in a single batch_read message. Returns a list with, for each read, the
+        (message, data) the worker replied with, or the exception that the read failed with.
+        """
+        response_socket_id = self._worker_model.allocate_socket(
+            worker['user_id'], worker['worker_id']
+        )
+        try:
+            message = {
+                'type': 'batch_read',
+                'socket_id': response_socket_id,
+                'reads': [
+                    {'uuid': target.bundle_uuid, 'path': target.subpath, 'read_args': read_args}
+                    for target, read_args in reads
+                ],
+            }
+            self._send_message(worker, message)
+            results = []
+            with closing(self._get_read_response_stream(response_socket_id)) as fileobj:
+                for result, data in read_batch.read_frames(fileobj):
+                    if 'error_code' in result:
+                        results.append(
+                            http_error_to_exception(result['error_code'], result['error_message'])
+                        )
+                    else:
+                        results.append((result, data))
+            precondition(len(results) == len(reads), 'Incomplete reply from worker')
+            return results
+        finally:
+            self._worker_model.deallocate_socket(response_socket_id)
+
+    def _read_from_worker(self, target, read_args):
+        """
+        Reads |target| from the worker its bundle is running on, together with other reads
+        from the same worker requested at about the same time if the worker handles
+        batch_read messages. Returns the (message, data) the worker replied with.
+        """
+        worker = self._bundle_model.get_bundle_worker(target.bundle_uuid)
+        if 'batch_read' in worker['capabilities']:
+            return self._read_coalescer.read(worker, target, read_args)
+        response_socket_id = self._worker_model.allocate_socket(
+            worker['user_id'], worker['worker_id']
+        )
+        try:
+            self._send_read_message(worker, response_socket_id, target, read_args)
+            with closing(self._worker_model.start_listening(response_socket_id)) as sock:
+                message = self._worker_model.get_json_message(sock, 60)
+                precondition(message is not None, 'Unable to reach worker')
+                if 'error_code' in message:
+                    raise http_error_to_exception(message['error_code'], message['error_message'])
+                # Only get_target_info replies with a message alone, without any data.
+                if read_args['type'] == 'get_target_info':
+                    return message, None
+                fileobj = self._worker_model.get_stream(sock, 60)
+                precondition(fileobj is not None, 'Unable to reach worker')
+            with closing(fileobj):
+                return message, fileobj.read()
+        finally:
+            self._worker_model.deallocate_socket(response_socket_id)
+
     def _is_available_locally(self, target):
         """Returns whether the target is accessible from the current machine. Returns True
         if the target is on an accessible disk or if the target is on Azure Blob Storage.
@@ -352,6 +524,12 @@ class DownloadManager(object):
     def get_target_sas_url(self, target, **kwargs):
         return parse_linked_bundle_url(self._get_target_path(target)).bundle_path_sas_url(**kwargs)
 
+    def _send_message(self, worker, message):
+        if not self._worker_model.send_json_message(worker['socket_id'], message, 60):
+            # Dead workers are a fact of life now, so don't wait for a reply that won't come.
+            logging.info('Unable to reach worker %s', worker['worker_id'])
+            raise NotFoundError('Unable to reach worker of running bundle')
+
     def _send_read_message(self, worker, response_socket_id, target, read_args):
         message = {
             'type': 'read',
@@ -360,10 +538,7 @@ class DownloadManager(object):
             'path': target.subpath,
             'read_args': read_args,
         }
-        if not self._worker_model.send_json_message(
-            worker['socket_id'], message, 60
-        ):  # dead workers are a fact of life now
-            logging.info('Unable to reach worker')
+        self._send_message(worker, message)
 
     def _send_netcat_message(self, worker, response_socket_id, uuid, port, message):
         message = {
@@ -0,0 +1,84 @@
+"""
+InterpretCache is an optional cache of the file contents that resolving the blocks of an
+interpreted worksheet reads (genpath table cells, contents, images and graphs).
+
+Popular worksheets are interpreted on every page load, although the bundles they show rarely
+change once they are done. A block's resolved contents are cached under a key built from the
+worksheet's uuid and last modification time, the block itself and the (uuid, state, data_hash)
+of every bundle it refers to, so editing the worksheet or re-running a bundle gives a new key.
+Blocks that refer to bundles that aren't in a final state (e.g., RUNNING) are never cached, so
+only those blocks are resolved again while the rest of the worksheet is served from the cache.
+"""
+import copy
+import hashlib
+import json
+import threading
+
+from codalab.worker.bundle_state import State
+
+
+class InterpretCache(object):
+    """
+    Caches the resolved contents of worksheet blocks in a CacheBackend (see bundle_cache.py),
+    and counts hits, misses, blocks that couldn't be cached and the bytes of contents served
+    from the cache instead of being read from bundles again.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, worksheet_uuid, date_last_modified, block, bundles):
+        """
+        Returns the key to cache the resolved contents of |block|, a block of the worksheet
+        |worksheet_uuid| as interpreted before resolution, under. |bundles| are the bundles
+        the block refers to. Returns None if the block can't be cached because some of them
+        aren't in a final state yet.
+        """
+        if any(bundle.state not in State.FINAL_STATES for bundle in bundles):
+            with self._lock:
+                self.uncacheable += 1
+            return None
+        # Bundle infos hold the permissions of the current user, which are checked separately,
+        # so only the versions of the bundles go into the key.
+        block = {k: v for k, v in block.items() if k != 'bundles_spec'}
+        versions = sorted((bundle.uuid, bundle.state, bundle.data_hash) for bundle in bundles)
+        key = json.dumps(
+            [worksheet_uuid, str(date_last_modified), block, versions], sort_keys=True, default=str
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the resolved contents cached under |key|, or None.
+        """
+        item = self.backend.get_many([key]).get(key)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += item[0]
+        return copy.deepcopy(item[1])
+
+    def set(self, key, contents):
+        """
+        Caches the resolved contents |contents|, a JSON-serializable dict, under |key|.
+        """
+        num_bytes = len(json.dumps(contents, default=str))
+        self.backend.set_many({key: (num_bytes, copy.deepcopy(contents))})
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total else None,
+            'uncacheable': self.uncacheable,
+            'bytes_saved': self.bytes_saved,
+            'size': len(self.backend),
+        }
@@ -9,11 +9,13 @@ There are a few classes of methods provided here:
     safe_join, get_relative_path, ls, recursive_ls
 
   Functions to read files to compute hashes, write results to stdout, etc:
-    getmtime, get_size, hash_directory, hash_file_contents
+    getmtime, get_size, hash_directory, hash_files, hash_file_contents, write_and_hash_file
 
   Functions that modify that filesystem in controlled ways:
     copy, make_directory, set_write_permissions, rename, remove
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import errno
 import hashlib
 import itertools
@@ -21,7 +23,9 @@ import os
 import shutil
 import subprocess
 import sys
-from typing import Optional
+import threading
+import time
+from typing import IO, List, Optional
 
 from codalab.common import precondition, UsageError, parse_linked_bundle_url
 from codalab.lib import file_util
@@ -33,6 +37,12 @@ BLOCK_SIZE = 0x40000
 FILE_PREFIX = 'file'
 LINK_PREFIX = 'link'
 
+# Number of threads used to hash the files of a directory, and number of files that each
+# thread hashes at a time. hashlib releases the GIL while hashing large blocks, so the
+# files are hashed in parallel.
+HASH_THREADS = min(8, os.cpu_count() or 1)
+HASH_BATCH_SIZE = 64
+
 
 def path_error(message, path):
     """
@@ -207,36 +217,145 @@ def hash_directory(path, dirs_and_files=None):
     # Use a similar two-level hashing scheme for all files, but incorporate a
     # hash of both the file name and contents.
     file_hash = hashlib.sha1()
-    for file_name in sorted(files):
+    files = sorted(files)
+    for file_name, contents_hash in zip(files, hash_files(files)):
         relative_path = get_relative_path(path, file_name)
         file_hash.update(hashlib.sha1(relative_path.encode()).hexdigest().encode())
-        file_hash.update(hash_file_contents(file_name).encode())
+        file_hash.update(contents_hash.encode())
     # Return a hash of the two hashes.
     overall_hash = hashlib.sha1(directory_hash.hexdigest().encode())
     overall_hash.update(file_hash.hexdigest().encode())
     return overall_hash.hexdigest()
 
 
+class FileHashCache(object):
+    """
+    Thread-safe map from (path, inode, size, mtime, ctime) to the hash_file_contents of the
+    file at that path, which keeps the |max_entries| most recently used entries. Lets the data hash of a
+    bundle be recomputed without reading the files that haven't changed since they were
+    last hashed (or written with write_and_hash_file).
+    """
+
+    def __init__(self, max_entries=200000):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hashes = OrderedDict()  # type: OrderedDict
+
+    @staticmethod
+    def _key(path, stat):
+        # The inode and ctime change when the file is replaced (e.g. by a rename), or when its
+        # mtime is set back with utime, which the size and mtime alone don't show.
+        return (path, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+    def get(self, path, stat):
+        """
+        Return the cached hash of the file at the given path, which has the given lstat
+        result, or None if it isn't cached.
+        """
+        key = self._key(path, stat)
+        with self._lock:
+            contents_hash = self._hashes.get(key)
+            if contents_hash is not None:
+                self._hashes.move_to_end(key)
+            return contents_hash
+
+    def put(self, path, stat, contents_hash):
+        """
+        Cache the hash of the file at the given path, which had the given lstat result
+        when it was hashed.
+        """
+        key = self._key(path, stat)
+        with self._lock:
+            self._hashes[key] = contents_hash
+            self._hashes.move_to_end(key)
+            while len(self._hashes) > self._max_entries:
+                self._hashes.popitem(last=False)
+
+
+file_hash_cache = FileHashCache()
+
+
+def hash_files(paths: List[str]) -> List[str]:
+    """
+    Return the hash_file_contents of each of the given paths, in order, hashing them in
+    parallel in batches of HASH_BATCH_SIZE files.
+    """
+    if len(paths) <= 1 or HASH_THREADS <= 1:
+        return [hash_file_contents(file_name) for file_name in paths]
+    batches = [paths[i : i + HASH_BATCH_SIZE] for i in range(0, len(paths), HASH_BATCH_SIZE)]
+    with ThreadPoolExecutor(min(HASH_THREADS, len(batches))) as executor:
+        hashed_batches = executor.map(
+            lambda batch: [hash_file_contents(file_name) for file_name in batch], batches
+        )
+        return list(itertools.chain.from_iterable(hashed_batches))
+
+
 def hash_file_contents(path):
     """
     Return the hash of the file's contents, read in blocks of size BLOCK_SIZE.
+    The hashes of files are cached in file_hash_cache, so files that haven't changed since
+    they were last hashed aren't read again.
     """
     message = 'hash_file called with relative path: %s' % (path,)
     precondition(os.path.isabs(path), message)
     if os.path.islink(path):
         contents_hash = hashlib.sha1(LINK_PREFIX.encode())
         contents_hash.update(os.readlink(path).encode())
-    else:
-        contents_hash = hashlib.sha1(FILE_PREFIX.encode())
-        with open(path, 'rb') as file_handle:
-            while True:
-                data = file_handle.read(BLOCK_SIZE)
-                if not data:
-                    break
-                contents_hash.update(data)
+        return contents_hash.hexdigest()
+
+    stat = os.lstat(path)
+    cached_hash = file_hash_cache.get(path, stat)
+    if cached_hash is not None:
+        return cached_hash
+    contents_hash = hashlib.sha1(FILE_PREFIX.encode())
+    with open(path, 'rb') as file_handle:
+        while True:
+            data = file_handle.read(BLOCK_SIZE)
+            if not data:
+                break
+            contents_hash.update(data)
+    # Files modified within the last couple of seconds might be modified again without
+    # changing their mtime, so their hashes aren't cached.
+    if time.time() - stat.st_mtime > 2:
+        file_hash_cache.put(path, stat, contents_hash.hexdigest())
     return contents_hash.hexdigest()
 
 
+def copy_and_hash(fileobj: IO[bytes], out: IO[bytes], length: Optional[int] = None) -> str:
+    """
+    Copy the contents of the given file object (or only its first |length| bytes) to |out|,
+    and return the hash of the contents, as computed by hash_file_contents.
+    """
+    contents_hash = hashlib.sha1(FILE_PREFIX.encode())
+    while length is None or length > 0:
+        data = fileobj.read(BLOCK_SIZE if length is None else min(BLOCK_SIZE, length))
+        if not data:
+            if length is not None:
+                raise IOError('Unexpected end of file')
+            break
+        contents_hash.update(data)
+        out.write(data)
+        if length is not None:
+            length -= len(data)
+    return contents_hash.hexdigest()
+
+
+def write_and_hash_file(fileobj: IO[bytes], path: str):
+    """
+    Write the contents of the given file object to a new file at the given path, hashing
+    them as they're written. The hash is added to file_hash_cache, so that computing the
+    hash of the file (or of a directory containing it) doesn't read it again.
+
+    Unlike in hash_file_contents, the hash is cached right away, although the file was just
+    modified. The file is new and is written in full here, and nothing else writes to the
+    contents of a bundle while they're being uploaded or unpacked, so it isn't modified again
+    within the same mtime.
+    """
+    with open(path, 'wb') as out:
+        contents_hash = copy_and_hash(fileobj, out)
+    file_hash_cache.put(path, os.lstat(path), contents_hash)
+
+
 ################################################################################
 # Functions that modify that filesystem in controlled ways.
 ################################################################################
@@ -86,6 +86,32 @@ def rate_limited(max_calls_per_hour):
     return decorate
 
 
+class RequestSlots(object):
+    """
+    Counts the long-lived requests of some kind (e.g. ones waiting for messages) that this
+    process is serving, so that they can be limited and can't take up all the threads of the
+    REST server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._num_used = 0
+
+    def acquire(self, limit):
+        """
+        Takes one of |limit| slots and returns True, or returns False if they're all taken.
+        """
+        with self._lock:
+            if self._num_used >= limit:
+                return False
+            self._num_used += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._num_used -= 1
+
+
 def decoded_body():
     """
     Return the request body decoded into Unicode string according to UTF-8.
@@ -1,4 +1,6 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 import os
+import queue
 import shutil
 import tempfile
 
@@ -138,13 +140,17 @@ class DiskStorageUploader(Uploader):
         if unpack_archive:
             zip_util.unpack(source_ext, source_fileobj, bundle_path)
         else:
-            with open(bundle_path, 'wb') as out:
-                shutil.copyfileobj(cast(IO, source_fileobj), out)
+            path_util.write_and_hash_file(source_fileobj, bundle_path)
 
 
 class BlobStorageUploader(Uploader):
     """Uploader that uploads to archive files + index files on Blob Storage."""
 
+    # Size of the chunks that archives are uploaded in, and the number of chunks that can be
+    # waiting to be uploaded.
+    CHUNK_SIZE = 16 * 1024 * 1024
+    MAX_PENDING_CHUNKS = 4
+
     @property
     def storage_type(self):
         return StorageType.AZURE_BLOB_STORAGE.value
@@ -164,26 +170,64 @@ class BlobStorageUploader(Uploader):
             output_fileobj = zip_util.unpack_to_archive(source_ext, source_fileobj)
         else:
             output_fileobj = GzipStream(source_fileobj)
-        # Write archive file.
-        with FileSystems.create(bundle_path, compression_type=CompressionTypes.UNCOMPRESSED) as out:
-            shutil.copyfileobj(output_fileobj, out)
-        # Write index file to a temporary file, then write that file to Blob Storage.
-        with FileSystems.open(
-            bundle_path, compression_type=CompressionTypes.UNCOMPRESSED
-        ) as ttf, tempfile.NamedTemporaryFile(suffix=".sqlite") as tmp_index_file:
-            SQLiteIndexedTar(
-                fileObject=ttf,
-                tarFileName="contents",  # If saving a single file as a .gz archive, this file can be accessed by the "/contents" entry in the index.
-                writeIndex=True,
-                clearIndexCache=True,
-                indexFileName=tmp_index_file.name,
-            )
+        with tempfile.NamedTemporaryFile(
+            suffix=".tar.gz"
+        ) as local_archive, tempfile.NamedTemporaryFile(suffix=".sqlite") as tmp_index_file:
+            # Stream the archive to Blob Storage on another thread while keeping a local copy
+            # of it, so that it can be indexed without reading it back from Blob Storage.
+            with ThreadPoolExecutor(1) as executor:
+                chunks = queue.Queue(self.MAX_PENDING_CHUNKS)  # type: queue.Queue
+                upload = executor.submit(self._write_chunks, chunks, bundle_path)
+                end_sent = False
+                try:
+                    while not end_sent:
+                        chunk = output_fileobj.read(self.CHUNK_SIZE)
+                        local_archive.write(chunk)
+                        self._put_chunk(chunks, chunk, upload)
+                        end_sent = not chunk
+                    local_archive.flush()
+                    # Index the archive while the end of it is being uploaded.
+                    with open(local_archive.name, "rb") as ttf:
+                        SQLiteIndexedTar(
+                            fileObject=ttf,
+                            tarFileName="contents",  # If saving a single file as a .gz archive, this file can be accessed by the "/contents" entry in the index.
+                            writeIndex=True,
+                            clearIndexCache=True,
+                            indexFileName=tmp_index_file.name,
+                        )
+                finally:
+                    # Make sure the upload thread finishes, even if reading the source failed.
+                    if not end_sent and not upload.done():
+                        chunks.put(b'')
+                upload.result()
             with FileSystems.create(
                 parse_linked_bundle_url(bundle_path).index_path,
                 compression_type=CompressionTypes.UNCOMPRESSED,
             ) as out_index_file, open(tmp_index_file.name, "rb") as tif:
                 shutil.copyfileobj(tif, out_index_file)
 
+    @staticmethod
+    def _write_chunks(chunks: queue.Queue, bundle_path: str):
+        """Writes the chunks put in |chunks| to the file at |bundle_path|, until an empty chunk."""
+        with FileSystems.create(bundle_path, compression_type=CompressionTypes.UNCOMPRESSED) as out:
+            while True:
+                chunk = chunks.get()
+                if not chunk:
+                    break
+                out.write(chunk)
+
+    @staticmethod
+    def _put_chunk(chunks: queue.Queue, chunk: bytes, upload: Future):
+        """Puts |chunk| in |chunks| for the |upload| thread, raising its error if it failed."""
+        while True:
+            try:
+                chunks.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                if upload.done():
+                    upload.result()
+                    raise IOError('Upload stopped before the end of the archive')
+
 
 class UploadManager(object):
     """
@@ -225,4 +269,3 @@ class UploadManager(object):
         self._bundle_store.cleanup(bundle.uuid, dry_run=False)
         bundle_update = {'data_hash': None, 'metadata': {'data_size': 0}}
         self._bundle_model.update_bundle(bundle, bundle_update)
-        self._bundle_model.update_user_disk_used(bundle.owner_id)
@@ -0,0 +1,198 @@
+"""
+UploadPartStore keeps the parts of resumable uploads of bundle contents (see the
+/bundles/<uuid>/contents/uploads/ endpoints) until they are committed.
+
+A client starts an upload session, sends the contents in numbered parts (possibly in parallel,
+and possibly again after a failure), and then commits the session, which stores the
+concatenation of its parts in the bundle store like a single upload would. Parts are kept on
+disk under <root>/<upload_id>/, next to the parameters of the session, so that a client that
+lost its connection (or crashed) can ask which parts the server already has and only send the
+others. Sessions that haven't received a part for ttl_seconds are removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from codalab.common import NotFoundError, UsageError
+from codalab.lib.spec_util import generate_uuid
+
+# Size of the blocks that parts are read and written in.
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadPartStore(object):
+    SESSION_FILE_NAME = 'session.json'
+    PART_SUFFIX = '.part'
+    PART_INFO_SUFFIX = '.json'
+
+    def __init__(self, root, ttl_seconds):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.root, exist_ok=True)
+
+    def _get_session_path(self, upload_id):
+        # Upload ids are generated by create_session(), but they come back from clients.
+        if not upload_id.isalnum():
+            raise NotFoundError('Upload %s not found' % upload_id)
+        return os.path.join(self.root, upload_id)
+
+    def _get_part_path(self, upload_id, number):
+        return os.path.join(self._get_session_path(upload_id), '%08d' % number)
+
+    def create_session(self, bundle_uuid, user_id, params):
+        """
+        Starts an upload session of the contents of the bundle |bundle_uuid|, which will be
+        stored with the upload parameters |params| once committed. Returns the session.
+        """
+        self.cleanup()
+        session = {
+            'upload_id': generate_uuid(),
+            'bundle_uuid': bundle_uuid,
+            'user_id': user_id,
+            'params': params,
+            'created': int(time.time()),
+        }
+        session_path = self._get_session_path(session['upload_id'])
+        os.makedirs(session_path)
+        with open(os.path.join(session_path, self.SESSION_FILE_NAME), 'w') as f:
+            json.dump(session, f)
+        return session
+
+    def get_session(self, upload_id):
+        """
+        Returns the session |upload_id|, with the parts received so far under 'parts'.
+        """
+        session_path = self._get_session_path(upload_id)
+        try:
+            with open(os.path.join(session_path, self.SESSION_FILE_NAME)) as f:
+                session = json.load(f)
+        except FileNotFoundError:
+            raise NotFoundError('Upload %s not found' % upload_id)
+        session['parts'] = self._list_parts(upload_id)
+        return session
+
+    def get_sessions(self, bundle_uuid):
+        """
+        Returns the sessions uploading the contents of the bundle |bundle_uuid|, oldest first.
+        """
+        sessions = []
+        for upload_id in os.listdir(self.root):
+            try:
+                session = self.get_session(upload_id)
+            except NotFoundError:
+                continue
+            if session['bundle_uuid'] == bundle_uuid:
+                sessions.append(session)
+        return sorted(sessions, key=lambda session: session['created'])
+
+    def _list_parts(self, upload_id):
+        parts = []
+        session_path = self._get_session_path(upload_id)
+        for file_name in sorted(os.listdir(session_path)):
+            if file_name.endswith(self.PART_INFO_SUFFIX) and file_name != self.SESSION_FILE_NAME:
+                with open(os.path.join(session_path, file_name)) as f:
+                    parts.append(json.load(f))
+        return parts
+
+    def write_part(self, upload_id, number, fileobj, sha1=None):
+        """
+        Stores the data read from |fileobj| as the part |number| (starting at 0) of the session
+        |upload_id|, replacing the part if it was already sent. If |sha1| is given, it's checked
+        against the SHA-1 of the data. Returns the info of the part.
+        """
+        if number < 0:
+            raise UsageError('Part numbers start at 0')
+        self.get_session(upload_id)
+        part_path = self._get_part_path(upload_id, number)
+        # Parts only show up once they are complete.
+        temp_path = '%s.%s%s' % (part_path, generate_uuid(), self.PART_SUFFIX)
+        size = 0
+        part_hash = hashlib.sha1()
+        try:
+            with open(temp_path, 'wb') as f:
+                for block in iter(lambda: fileobj.read(BLOCK_SIZE), b''):
+                    f.write(block)
+                    part_hash.update(block)
+                    size += len(block)
+            if sha1 is not None and part_hash.hexdigest() != sha1:
+                raise UsageError(
+                    'Part %d is corrupted: got SHA-1 %s, expected %s'
+                    % (number, part_hash.hexdigest(), sha1)
+                )
+            os.replace(temp_path, part_path + self.PART_SUFFIX)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        part = {'number': number, 'size': size, 'sha1': part_hash.hexdigest()}
+        with open(part_path + self.PART_INFO_SUFFIX, 'w') as f:
+            json.dump(part, f)
+        return part
+
+    def open_parts(self, upload_id, num_parts):
+        """
+        Returns a file-like object that reads the parts 0 to |num_parts| - 1 of the session
+        |upload_id| one after the other.
+        """
+        numbers = set(part['number'] for part in self.get_session(upload_id)['parts'])
+        missing = sorted(set(range(num_parts)) - numbers)
+        if missing:
+            raise UsageError(
+                'Upload %s is missing parts %s' % (upload_id, ', '.join(map(str, missing[:10])))
+            )
+        return PartsReader(
+            [
+                self._get_part_path(upload_id, number) + self.PART_SUFFIX
+                for number in range(num_parts)
+            ]
+        )
+
+    def delete_session(self, upload_id):
+        shutil.rmtree(self._get_session_path(upload_id), ignore_errors=True)
+
+    def cleanup(self):
+        """
+        Removes the sessions that haven't been written to for ttl_seconds.
+        """
+        now = time.time()
+        for upload_id in os.listdir(self.root):
+            session_path = os.path.join(self.root, upload_id)
+            try:
+                if now - os.stat(session_path).st_mtime > self.ttl_seconds:
+                    shutil.rmtree(session_path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+
+class PartsReader(object):
+    """
+    File-like object that reads the files at the given paths one after the other.
+    """
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._file = None
+
+    def read(self, num_bytes=-1):
+        chunks = []
+        while num_bytes is None or num_bytes < 0 or num_bytes > 0:
+            if self._file is None:
+                if not self._paths:
+                    break
+                self._file = open(self._paths.pop(0), 'rb')
+            chunk = self._file.read(num_bytes if num_bytes is not None else -1)
+            if not chunk:
+                self._file.close()
+                self._file = None
+                continue
+            chunks.append(chunk)
+            if num_bytes is not None and num_bytes > 0:
+                num_bytes -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._paths = []
@@ -4,17 +4,16 @@ the user uploads an archive of a known type.
 """
 from fnmatch import fnmatch
 import os
-import shutil
 import tarfile
-import tempfile
+import threading
 import logging
 from typing import IO
 
 from codalab.common import UsageError
+from codalab.lib import path_util
 from codalab.worker.file_util import (
     gzip_file,
     tar_gzip_directory,
-    un_bz2_file,
     unzip_directory,
     GzipStream,
 )
@@ -50,6 +49,35 @@ def strip_archive_ext(path):
     raise UsageError('Not an archive: %s' % path)
 
 
+class HashingTarFile(tarfile.TarFile):
+    """
+    TarFile that hashes the regular files it extracts while writing them, and adds the hashes
+    to path_util.file_hash_cache. The data hash of an unpacked bundle can then be computed
+    without reading its files again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Target path -> hash of the files extracted by the current call to extract().
+        self._file_hashes = {}
+        super().__init__(*args, **kwargs)
+
+    def makefile(self, tarinfo, targetpath):
+        if tarinfo.sparse is not None:
+            return super().makefile(tarinfo, targetpath)
+        self.fileobj.seek(tarinfo.offset_data)
+        with open(targetpath, 'wb') as out:
+            contents_hash = path_util.copy_and_hash(self.fileobj, out, tarinfo.size)
+        # Member names usually start with ./, but files are hashed by their normalized paths.
+        self._file_hashes[os.path.normpath(targetpath)] = contents_hash
+
+    def extract(self, member, path='', set_attrs=True, *, numeric_owner=False):
+        super().extract(member, path, set_attrs=set_attrs, numeric_owner=numeric_owner)
+        # Only cache the hashes once the file's attributes (e.g., mtime) are set.
+        for targetpath, contents_hash in self._file_hashes.items():
+            path_util.file_hash_cache.put(targetpath, os.lstat(targetpath), contents_hash)
+        self._file_hashes.clear()
+
+
 def unpack(ext: str, source: IO[bytes], dest_path: str):
     """Unpack the archive |source| to |dest_path|.
 
@@ -61,15 +89,15 @@ def unpack(ext: str, source: IO[bytes], dest_path: str):
     """
     try:
 
+        # Files are hashed while they're unpacked (see HashingTarFile).
         if ext == '.tar.gz' or ext == '.tgz':
-            un_tar_directory(source, dest_path, 'gz')
+            un_tar_directory(source, dest_path, 'gz', tarfile_cls=HashingTarFile)
         elif ext == '.tar.bz2':
-            un_tar_directory(source, dest_path, 'bz2')
+            un_tar_directory(source, dest_path, 'bz2', tarfile_cls=HashingTarFile)
         elif ext == '.bz2':
-            un_bz2_file(source, dest_path)
+            path_util.write_and_hash_file(UnBz2Stream(source), dest_path)
         elif ext == '.gz':
-            with open(dest_path, 'wb') as f:
-                shutil.copyfileobj(un_gzip_stream(source), f)
+            path_util.write_and_hash_file(un_gzip_stream(source), dest_path)
         elif ext == '.zip':
             unzip_directory(source, dest_path)
         else:
@@ -195,16 +223,7 @@ def pack_files_for_upload(
                 'should_unpack': False,
             }
 
-    # Build archive file incrementally from all sources
-    # TODO: For further optimization, could either uses a temporary named pipe
-    # or a wrapper around a TemporaryFile to concurrently write to the tarfile
-    # while the REST client reads and sends it to the server. At the moment,
-    # we wait for the tarfile to be created until we rewind and pass the file
-    # to the client to be sent to the server.
-    scratch_dir = tempfile.mkdtemp()
-    archive_fileobj = tempfile.SpooledTemporaryFile()
-    archive = tarfile.open(name='we', mode='w:gz', fileobj=archive_fileobj)
-
+    # Build the archive while it's being read, so that it can be sent as it's packed.
     def should_exclude(fn):
         basefn = os.path.basename(fn)
         return any(fnmatch(basefn, p) for p in exclude_patterns)
@@ -212,18 +231,51 @@ def pack_files_for_upload(
     def filter(tarinfo):
         return None if should_exclude(tarinfo.name) else tarinfo
 
-    for source in sources:
-        # Add file to archive, or add files recursively if directory
-        archive.add(source, arcname=os.path.basename(source), recursive=True, filter=filter)
-
-    # Clean up, rewind archive file, and return it
-    archive.close()
-    shutil.rmtree(scratch_dir)
-    filesize = archive_fileobj.tell()
-    archive_fileobj.seek(0)
     return {
-        'fileobj': archive_fileobj,
+        'fileobj': GzipStream(TarStream(sources, filter)),
         'filename': 'contents.tar.gz',
-        'filesize': filesize,
+        'filesize': None,
         'should_unpack': True,
     }
+
+
+class TarStream(object):
+    """
+    File-like object that reads a tar archive of the given sources (each added under its base
+    name, with the given tarfile filter), which a thread writes to a pipe as it's read.
+    """
+
+    def __init__(self, sources, filter):
+        read_fd, write_fd = os.pipe()
+        self._reader = os.fdopen(read_fd, 'rb')
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._write, args=(os.fdopen(write_fd, 'wb'), sources, filter), daemon=True
+        )
+        self._thread.start()
+
+    def _write(self, writer, sources, filter):
+        try:
+            with writer:
+                with tarfile.open(fileobj=writer, mode='w|') as archive:
+                    for source in sources:
+                        # Add file to archive, or add files recursively if directory
+                        archive.add(
+                            source, arcname=os.path.basename(source), recursive=True, filter=filter
+                        )
+        except Exception as e:
+            self._error = e
+
+    def read(self, num_bytes=-1):
+        data = self._reader.read(num_bytes)
+        if not data or num_bytes is None or num_bytes < 0:
+            # The archive is over, make sure it's complete.
+            self._thread.join()
+            if self._error is not None:
+                raise IOError('Failed to pack files for upload: %s' % self._error)
+        return data
+
+    def close(self):
+        # Stops the thread if it's still writing.
+        self._reader.close()
+        self._thread.join()
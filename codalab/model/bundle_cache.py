@@ -0,0 +1,128 @@
+"""
+BundleCache is an optional read-through cache of bundles for BundleModel, keyed by uuid.
+
+REST handlers and the worker checkin loop load the same bundles many times per request;
+with the cache enabled, BundleModel serves lookups by uuid (batch_get_bundles(uuid=...),
+get_bundle, get_bundle_state(s)) from the cache, and invalidates entries whenever it
+writes to a bundle. Writes made by other processes are only picked up once the entries
+expire, so the TTL bounds how stale a cached bundle can be.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class CacheBackend(object):
+    """
+    Storage behind a BundleCache. Values are plain Python objects (dicts, lists, strings,
+    numbers and datetimes), so a backend shared between processes (e.g., Redis) can pickle
+    them.
+    """
+
+    def get_many(self, keys):
+        """
+        Returns {key: value} for the keys that are present and haven't expired.
+        """
+        raise NotImplementedError
+
+    def set_many(self, items):
+        """
+        Stores the {key: value} pairs in |items|.
+        """
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    In-process cache that holds at most |max_size| values, evicting the least recently used
+    ones first, for at most |ttl_seconds| each.
+    """
+
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # {key: (expiry time, value)}, from the least to the most recently used.
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        result = {}
+        with self._lock:
+            for key in keys:
+                item = self._items.get(key)
+                if item is None:
+                    continue
+                expiry, value = item
+                if expiry <= now:
+                    del self._items[key]
+                    continue
+                self._items.move_to_end(key)
+                result[key] = value
+        return result
+
+    def set_many(self, items):
+        expiry = time.time() + self.ttl_seconds
+        with self._lock:
+            for key, value in items.items():
+                self._items[key] = (expiry, value)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class BundleCache(object):
+    """
+    Caches the values BundleModel builds bundles from (the bundle row as a dict, with
+    'dependencies' and 'metadata' lists of row dicts), and counts hits and misses.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, uuids):
+        """
+        Returns {uuid: bundle value} for the given uuids that are cached.
+        """
+        result = self.backend.get_many(uuids)
+        self.hits += len(result)
+        self.misses += len(uuids) - len(result)
+        return result
+
+    def set_many(self, bundle_values):
+        self.backend.set_many(bundle_values)
+
+    def invalidate(self, uuids):
+        self.backend.delete_many(uuids)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total else None,
+            'size': len(self.backend),
+        }
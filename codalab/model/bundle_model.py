@@ -13,8 +13,8 @@ import json
 from dateutil import parser
 from uuid import uuid4
 
-from sqlalchemy import and_, or_, not_, select, union, desc, func
-from sqlalchemy.sql.expression import literal, true
+from sqlalchemy import and_, or_, not_, select, union, desc, func, bindparam
+from sqlalchemy.sql.expression import false, literal, true
 
 from codalab.bundles import get_bundle_subclass
 from codalab.bundles.run_bundle import RunBundle
@@ -25,10 +25,13 @@ from codalab.common import (
     UsageError,
 )
 from codalab.lib import crypt_util, spec_util, worksheet_util, path_util
-from codalab.model.util import LikeQuery
+from codalab.model.change_log import ChangeKind, ChangeLog
+from codalab.model.search_index import SearchIndex
+from codalab.model.util import LikeQuery, decode_search_cursor, encode_search_cursor
 from codalab.model.tables import (
     bundle as cl_bundle,
     bundle_dependency as cl_bundle_dependency,
+    bundle_lineage as cl_bundle_lineage,
     bundle_metadata as cl_bundle_metadata,
     group as cl_group,
     group_bundle_permission as cl_group_bundle_permission,
@@ -38,6 +41,8 @@ from codalab.model.tables import (
     GROUP_OBJECT_PERMISSION_READ,
     GROUP_OBJECT_PERMISSION_NONE,
     user_group as cl_user_group,
+    user_bundle_permission as cl_user_bundle_permission,
+    user_object_permission as cl_user_worksheet_permission,
     worksheet as cl_worksheet,
     worksheet_tag as cl_worksheet_tag,
     worksheet_item as cl_worksheet_item,
@@ -66,6 +71,12 @@ logger = logging.getLogger(__name__)
 SEARCH_KEYWORD_REGEX = re.compile('^([\.\w/]*)=(.*)$')
 SEARCH_RESULTS_LIMIT = 10
 
+# The materialized permissions of users (see tables.py) of each table of group permissions.
+USER_PERMISSION_TABLES = {
+    cl_group_bundle_permission: cl_user_bundle_permission,
+    cl_group_worksheet_permission: cl_user_worksheet_permission,
+}
+
 
 def str_key_dict(row):
     """
@@ -77,6 +88,22 @@ def str_key_dict(row):
     return dict((str(k), v) for k, v in row.items())
 
 
+def metadata_rows_to_json(metadata_rows):
+    """
+    Serializes bundle_metadata rows to the bundle's metadata_json column.
+    """
+    return json.dumps([[row['metadata_key'], row['metadata_value']] for row in metadata_rows])
+
+
+def metadata_json_to_rows(metadata_json):
+    """
+    Inverse of metadata_rows_to_json, returning the rows as dicts.
+    """
+    return [
+        {'metadata_key': key, 'metadata_value': value} for key, value in json.loads(metadata_json)
+    ]
+
+
 class BundleModel(object):
     def __init__(self, engine, default_user_info, root_user_id, system_user_id):
         """
@@ -87,6 +114,14 @@ class BundleModel(object):
         self.root_user_id = root_user_id
         self.system_user_id = system_user_id
         self.public_group_uuid = ''
+        self.change_log = ChangeLog(engine)
+        self.search_index = SearchIndex(engine)
+        # Optional BundleCache, see bundle_cache.py.
+        self.bundle_cache = None
+        # Optional PermissionCache, see permission_cache.py.
+        self.permission_cache = None
+        # Whether to resolve permissions through the materialized permissions of users.
+        self.use_permission_view = False
         self.create_tables()
 
     # ==========================================================================
@@ -205,18 +240,35 @@ class BundleModel(object):
         """
         if len(uuids) == 0:
             return []
+        result = {}
         with self.engine.begin() as connection:
-            rows = connection.execute(
-                select(
-                    [cl_bundle_metadata.c.bundle_uuid, cl_bundle_metadata.c.metadata_value]
-                ).where(
-                    and_(
-                        cl_bundle_metadata.c.metadata_key == metadata_key,
-                        cl_bundle_metadata.c.bundle_uuid.in_(uuids),
-                    )
+            bundle_rows = connection.execute(
+                select([cl_bundle.c.uuid, cl_bundle.c.metadata_json]).where(
+                    cl_bundle.c.uuid.in_(uuids)
                 )
             ).fetchall()
-            return dict((row.bundle_uuid, row.metadata_value) for row in rows)
+            # Bundles that haven't been backfilled yet are looked up in bundle_metadata.
+            unfilled_uuids = []
+            for row in bundle_rows:
+                if row.metadata_json is None:
+                    unfilled_uuids.append(row.uuid)
+                    continue
+                for metadata_row in metadata_json_to_rows(row.metadata_json):
+                    if metadata_row['metadata_key'] == metadata_key:
+                        result[row.uuid] = metadata_row['metadata_value']
+            if unfilled_uuids:
+                rows = connection.execute(
+                    select(
+                        [cl_bundle_metadata.c.bundle_uuid, cl_bundle_metadata.c.metadata_value]
+                    ).where(
+                        and_(
+                            cl_bundle_metadata.c.metadata_key == metadata_key,
+                            cl_bundle_metadata.c.bundle_uuid.in_(unfilled_uuids),
+                        )
+                    )
+                ).fetchall()
+                result.update((row.bundle_uuid, row.metadata_value) for row in rows)
+        return result
 
     def get_owner_ids(self, table, uuids):
         """
@@ -261,6 +313,7 @@ class BundleModel(object):
                 'worker_id': worker_row.worker_id,
                 'shared_file_system': worker_row.shared_file_system,
                 'socket_id': worker_row.socket_id,
+                'capabilities': json.loads(worker_row.capabilities or '[]'),
             }
 
     def get_children_uuids(self, uuids):
@@ -333,21 +386,200 @@ class BundleModel(object):
         Get all bundles that depend on bundles with the given uuids.
         depth = 1 gets only children
         """
-        frontier = uuids
-        visited = list(frontier)
-        while len(frontier) > 0 and depth > 0:
-            # Get children of all nodes in frontier
-            result = self.get_children_uuids(frontier)
-            new_frontier = []
-            for v in result.values():
-                for uuid in v:
-                    if uuid in visited:
-                        continue
-                    new_frontier.append(uuid)
-                    visited.append(uuid)
-            frontier = new_frontier
-            depth -= 1
-        return visited
+        descendants = self.get_descendant_depths(uuids, depth)
+        result = list(uuids)
+        visited = set(uuids)
+        for uuid in sorted(descendants, key=lambda uuid: (descendants[uuid], uuid)):
+            if uuid not in visited:
+                result.append(uuid)
+                visited.add(uuid)
+        return result
+
+    def get_descendant_depths(self, uuids, depth):
+        """
+        Get the bundles that depend on bundles with the given uuids, directly or not, up to
+        |depth| dependencies away.
+        Return {descendant_uuid: smallest number of dependencies from any of the uuids, ...}
+        """
+        if not uuids or depth <= 0:
+            return {}
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                select(
+                    [
+                        cl_bundle_lineage.c.descendant_uuid,
+                        func.min(cl_bundle_lineage.c.depth).label('depth'),
+                    ]
+                )
+                .where(
+                    and_(
+                        cl_bundle_lineage.c.ancestor_uuid.in_(uuids),
+                        cl_bundle_lineage.c.depth <= depth,
+                    )
+                )
+                .group_by(cl_bundle_lineage.c.descendant_uuid)
+            ).fetchall()
+        return {row.descendant_uuid: row.depth for row in rows}
+
+    def get_ancestor_depths(self, uuids, depth):
+        """
+        Get the bundles that bundles with the given uuids depend on, directly or not, up to
+        |depth| dependencies away. Ancestors that are not in the system are left out.
+        Return {ancestor_uuid: smallest number of dependencies to any of the uuids, ...}
+        """
+        if not uuids or depth <= 0:
+            return {}
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                select(
+                    [
+                        cl_bundle_lineage.c.ancestor_uuid,
+                        func.min(cl_bundle_lineage.c.depth).label('depth'),
+                    ]
+                )
+                .select_from(
+                    cl_bundle_lineage.join(
+                        cl_bundle, cl_bundle.c.uuid == cl_bundle_lineage.c.ancestor_uuid
+                    )
+                )
+                .where(
+                    and_(
+                        cl_bundle_lineage.c.descendant_uuid.in_(uuids),
+                        cl_bundle_lineage.c.depth <= depth,
+                    )
+                )
+                .group_by(cl_bundle_lineage.c.ancestor_uuid)
+            ).fetchall()
+        return {row.ancestor_uuid: row.depth for row in rows}
+
+    def _add_bundle_lineage(self, connection, uuid, parent_uuids):
+        """
+        Add the rows of bundle_lineage between the new bundle |uuid|, whose dependencies are on
+        |parent_uuids|, and its ancestors, as well as between its ancestors and the bundles that
+        already depended on it (when children are saved before their parents, or the bundle is
+        saved again after being deleted).
+        """
+        if not parent_uuids:
+            return
+        ancestors = {parent_uuid: 1 for parent_uuid in parent_uuids}
+        for row in connection.execute(
+            select([cl_bundle_lineage.c.ancestor_uuid, cl_bundle_lineage.c.depth]).where(
+                cl_bundle_lineage.c.descendant_uuid.in_(list(ancestors))
+            )
+        ):
+            ancestors[row.ancestor_uuid] = min(
+                ancestors.get(row.ancestor_uuid, row.depth + 1), row.depth + 1
+            )
+        ancestors.pop(uuid, None)
+        descendants = {uuid: 0}
+        for row in connection.execute(
+            select([cl_bundle_lineage.c.descendant_uuid, cl_bundle_lineage.c.depth]).where(
+                cl_bundle_lineage.c.ancestor_uuid == uuid
+            )
+        ):
+            descendants[row.descendant_uuid] = row.depth
+
+        depths = {
+            (ancestor_uuid, descendant_uuid): ancestor_depth + descendant_depth
+            for ancestor_uuid, ancestor_depth in ancestors.items()
+            for descendant_uuid, descendant_depth in descendants.items()
+        }
+        if len(descendants) > 1:
+            # Keep the existing rows, and make them shorter if there's now a shorter path.
+            for row in connection.execute(
+                cl_bundle_lineage.select().where(
+                    and_(
+                        cl_bundle_lineage.c.ancestor_uuid.in_(list(ancestors)),
+                        cl_bundle_lineage.c.descendant_uuid.in_(list(descendants)),
+                    )
+                )
+            ):
+                depth = depths.pop((row.ancestor_uuid, row.descendant_uuid), None)
+                if depth is not None and depth < row.depth:
+                    connection.execute(
+                        cl_bundle_lineage.update()
+                        .where(cl_bundle_lineage.c.id == row.id)
+                        .values(depth=depth)
+                    )
+        self.do_multirow_insert(
+            connection,
+            cl_bundle_lineage,
+            [
+                {'ancestor_uuid': ancestor_uuid, 'descendant_uuid': descendant_uuid, 'depth': depth}
+                for (ancestor_uuid, descendant_uuid), depth in depths.items()
+            ],
+        )
+
+    def _rebuild_bundle_lineage(self, connection, uuids):
+        """
+        Recompute the rows of bundle_lineage for the bundles |uuids| from their dependencies,
+        after bundles that they depended on, directly or not, were deleted. The rows to the
+        deleted bundles themselves are kept, so that saving them again restores the lineage.
+        """
+        if not uuids:
+            return
+        parents = {uuid: set() for uuid in uuids}
+        for row in connection.execute(
+            select([cl_bundle_dependency.c.child_uuid, cl_bundle_dependency.c.parent_uuid]).where(
+                cl_bundle_dependency.c.child_uuid.in_(list(uuids))
+            )
+        ):
+            parents[row.child_uuid].add(row.parent_uuid)
+
+        # The lineage of the other parents is unaffected.
+        parent_ancestors = {}
+        other_parent_uuids = set().union(*parents.values()) - set(uuids)
+        if other_parent_uuids:
+            for row in connection.execute(
+                select(
+                    [
+                        cl_bundle_lineage.c.ancestor_uuid,
+                        cl_bundle_lineage.c.descendant_uuid,
+                        cl_bundle_lineage.c.depth,
+                    ]
+                ).where(cl_bundle_lineage.c.descendant_uuid.in_(list(other_parent_uuids)))
+            ):
+                parent_ancestors.setdefault(row.descendant_uuid, {})[row.ancestor_uuid] = row.depth
+
+        # Compute the ancestors of each bundle after those of its parents.
+        stack = list(parents)
+        entered = set()
+        while stack:
+            uuid = stack[-1]
+            if uuid in parent_ancestors:
+                stack.pop()
+                continue
+            if uuid not in entered:
+                entered.add(uuid)
+                stack.extend(
+                    parent_uuid
+                    for parent_uuid in parents[uuid]
+                    if parent_uuid in parents and parent_uuid not in entered
+                )
+                continue
+            stack.pop()
+            ancestors = {}
+            for parent_uuid in parents[uuid]:
+                for ancestor_uuid, depth in parent_ancestors.get(parent_uuid, {}).items():
+                    ancestors[ancestor_uuid] = min(
+                        ancestors.get(ancestor_uuid, depth + 1), depth + 1
+                    )
+                ancestors[parent_uuid] = 1
+            ancestors.pop(uuid, None)
+            parent_ancestors[uuid] = ancestors
+
+        connection.execute(
+            cl_bundle_lineage.delete().where(cl_bundle_lineage.c.descendant_uuid.in_(list(uuids)))
+        )
+        self.do_multirow_insert(
+            connection,
+            cl_bundle_lineage,
+            [
+                {'ancestor_uuid': ancestor_uuid, 'descendant_uuid': uuid, 'depth': depth}
+                for uuid in parents
+                for ancestor_uuid, depth in parent_ancestors[uuid].items()
+            ],
+        )
 
     def search_bundles(self, user_id, keywords):
         """
@@ -356,11 +588,17 @@ class BundleModel(object):
                           specified for bundle searches
                     single number value for aggregate searches(.count, .sum)
             is_aggregate: True for aggregate searches, False otherwise
+            next_cursor: (only with .cursor) cursor of the next page of results, or None if
+                         there are no more results
         Each keyword is either:
         - <key>=<value>
         - .floating: return bundles not in any worksheet
         - .offset=<int>: return bundles starting at this offset
         - .limit=<int>: maximum number of bundles to return
+        - .cursor: return bundles from the start, in pages of .limit bundles ordered by the sort
+          key and then by id, and the cursor of the next page
+        - .cursor=<cursor>: return the page of bundles after the cursor (unlike .offset, this
+          doesn't scan the bundles of the previous pages)
         - .count: just return the number of bundles
         - .shared: shared with me through a group
         - .mine: sugar for owner_id=user_id
@@ -374,14 +612,18 @@ class BundleModel(object):
         - .sort-: sort by decreasing order
         - .sum: add up the numbers
         Bare keywords: sugar for uuid_name=.*<word>.*
+        Searches with .* on the uuid, command, name, description or tags only look at the bundles
+        that the search index (see search_index.py) finds could match.
         Search only bundles which are readable by user_id.
         """
         clauses = []
         offset = 0
         limit = SEARCH_RESULTS_LIMIT
+        cursor = None
         format_func = None
         count = False
         sort_key = [None]
+        sort_descending = [False]
         sum_key = [None]
         aux_fields = []  # Fields (e.g., sorting) that we need to include in the query
 
@@ -397,16 +639,12 @@ class BundleModel(object):
 
         def make_condition(key, field, value):
             # Special
-            if value == '.sort':
+            if value in ('.sort', '.sort-'):
                 aux_fields.append(field)
                 if is_numeric(key):
                     field = field * 1
                 sort_key[0] = field
-            elif value == '.sort-':
-                aux_fields.append(field)
-                if is_numeric(key):
-                    field = field * 1
-                sort_key[0] = desc(field)
+                sort_descending[0] = value == '.sort-'
             elif value == '.sum':
                 sum_key[0] = field * 1
             else:
@@ -418,6 +656,19 @@ class BundleModel(object):
                 return field == value
             return None
 
+        def use_search_index(key, value, clause):
+            # Narrow down LIKE searches on indexed fields to the candidates from the search index.
+            if clause is None or not isinstance(value, str) or '%' not in value:
+                return clause
+            if key not in ('uuid', 'uuid_name', 'command') + SearchIndex.METADATA_KEYS:
+                return clause
+            candidates = self.search_index.get_candidates(value)
+            if candidates is None:
+                return clause
+            if not candidates:
+                return false()
+            return and_(cl_bundle.c.uuid.in_(sorted(candidates)), clause)
+
         shortcuts = {'type': 'bundle_type', 'size': 'data_size', 'worksheet': 'host_worksheet'}
 
         for keyword in keywords:
@@ -429,6 +680,8 @@ class BundleModel(object):
                 keyword = '.shared=True'
             elif keyword == '.last':
                 keyword = 'id=.sort-'
+            elif keyword == '.cursor':
+                keyword = '.cursor='
             elif keyword == '.count':
                 count = True
                 limit = None
@@ -459,21 +712,20 @@ class BundleModel(object):
                 offset = int(value)
             elif key == '.limit':
                 limit = int(value)
+            elif key == '.cursor':
+                cursor = value
             elif key == '.format':
                 format_func = value
             # Bundle fields
             elif key in ('bundle_type', 'id', 'uuid', 'data_hash', 'state', 'command', 'owner_id'):
                 clause = make_condition(key, getattr(cl_bundle.c, key), value)
+                clause = use_search_index(key, value, clause)
             elif key == '.shared':  # shared with any group I am in with read permission
                 clause = cl_bundle.c.uuid.in_(
                     select([cl_group_bundle_permission.c.object_uuid]).where(
                         and_(
                             cl_group_bundle_permission.c.group_uuid.in_(
-                                alias(
-                                    select([cl_user_group.c.group_uuid]).where(
-                                        cl_user_group.c.user_id == user_id
-                                    )
-                                )
+                                self._get_member_group_uuids(user_id)
                             ),
                             cl_group_bundle_permission.c.permission >= GROUP_OBJECT_PERMISSION_READ,
                         )
@@ -568,7 +820,7 @@ class BundleModel(object):
                         )
                     )
                 )
-                clause = or_(*clause)
+                clause = use_search_index(key, '%' + value + '%', or_(*clause))
             elif key == '':  # Match any field
                 clause = []
                 clause.append(cl_bundle.c.uuid.like('%' + value + '%'))
@@ -597,6 +849,7 @@ class BundleModel(object):
                             and_(cl_bundle_metadata.c.metadata_key == key, condition)
                         )
                     )
+                    clause = use_search_index(key, value, clause)
 
             if clause is not None:
                 clauses.append(clause)
@@ -606,27 +859,29 @@ class BundleModel(object):
         if user_id != self.root_user_id:
             # Restrict to the bundles that we have access to.
             access_via_owner = cl_bundle.c.owner_id == user_id
-            access_via_group = cl_bundle.c.uuid.in_(
-                select([cl_group_bundle_permission.c.object_uuid]).where(
-                    and_(
-                        or_(  # Join constraint (group)
-                            cl_group_bundle_permission.c.group_uuid
-                            == self.public_group_uuid,  # Public group
-                            cl_group_bundle_permission.c.group_uuid.in_(
-                                alias(
-                                    select([cl_user_group.c.group_uuid]).where(
-                                        cl_user_group.c.user_id == user_id
-                                    )
-                                )
-                            ),  # Private group
-                        ),
-                        cl_group_bundle_permission.c.permission
-                        >= GROUP_OBJECT_PERMISSION_READ,  # Match the uuid of the parent
-                    )
-                )
+            access_via_group = self._make_group_access_clause(
+                cl_group_bundle_permission, cl_bundle.c.uuid, user_id
             )
             clause = and_(clause, or_(access_via_owner, access_via_group))
 
+        # Keyset pagination
+        paginate = cursor is not None and not count and sum_key[0] is None
+        if paginate:
+            if offset:
+                raise UsageError('.offset cannot be used with .cursor')
+            if limit is None:
+                raise UsageError('.limit is required with .cursor')
+            if sort_key[0] is None:
+                sort_key[0] = cl_bundle.c.id
+            if cursor:
+                values = decode_search_cursor(cursor)
+                if len(values) != 2:
+                    raise UsageError('Invalid cursor: %s' % cursor)
+                clause = and_(
+                    clause, self._make_cursor_clause(sort_key[0], sort_descending[0], *values)
+                )
+            aux_fields.extend([sort_key[0].label('sort_value'), cl_bundle.c.id])
+
         # Aggregate (sum)
         if sum_key[0] is not None:
             # Construct a table with only the uuid and the num (and make sure it's distinct!)
@@ -646,18 +901,54 @@ class BundleModel(object):
 
         # Sort
         if sort_key[0] is not None:
-            query = query.order_by(sort_key[0])
+            query = query.order_by(desc(sort_key[0]) if sort_descending[0] else sort_key[0])
+            if paginate:
+                # Bundles with the same sort key are ordered by id, so that pages don't overlap.
+                query = query.order_by(
+                    desc(cl_bundle.c.id) if sort_descending[0] else cl_bundle.c.id
+                )
 
         # Count
         if count:
             query = alias(query).count()
 
+        if paginate:
+            with self.engine.begin() as connection:
+                rows = connection.execute(query).fetchall()
+            next_cursor = None
+            if rows and len(rows) == limit:
+                next_cursor = encode_search_cursor([rows[-1].sort_value, rows[-1].id])
+            return {
+                'result': [row.uuid for row in rows],
+                'is_aggregate': False,
+                'next_cursor': next_cursor,
+            }
+
         result = self._execute_query(query)
         if count or sum_key[0] is not None:  # Just returning a single number
             result = worksheet_util.apply_func(format_func, result[0])
             return {'result': result, 'is_aggregate': True}
         return {'result': result, 'is_aggregate': False}
 
+    @staticmethod
+    def _make_cursor_clause(sort_key, descending, sort_value, bundle_id):
+        """
+        Returns the clause that matches the bundles after the bundle with id |bundle_id| and sort
+        key |sort_value| in the order of search_bundles. NULL sort keys come first in increasing
+        order, as in MySQL and SQLite.
+        """
+        if descending:
+            after_id = cl_bundle.c.id < bundle_id
+            if sort_value is None:
+                return and_(sort_key.is_(None), after_id)
+            return or_(
+                sort_key < sort_value, and_(sort_key == sort_value, after_id), sort_key.is_(None)
+            )
+        after_id = cl_bundle.c.id > bundle_id
+        if sort_value is None:
+            return or_(sort_key.isnot(None), and_(sort_key.is_(None), after_id))
+        return or_(sort_key > sort_value, and_(sort_key == sort_value, after_id))
+
     def get_bundle_uuids(self, conditions, max_results):
         """
         Returns a list of bundle_uuids that have match the conditions.
@@ -788,43 +1079,72 @@ class BundleModel(object):
         """
         Return a list of bundles given a SQLAlchemy clause on the cl_bundle table.
         """
-        clause = self.make_kwargs_clause(cl_bundle, kwargs)
+        if self.bundle_cache is not None and list(kwargs) == ['uuid']:
+            # Lookups by uuid go through the cache.
+            uuid = kwargs['uuid']
+            uuids = set([uuid] if isinstance(uuid, str) else uuid)
+            bundle_values = self.bundle_cache.get_many(uuids)
+            missing_uuids = uuids - set(bundle_values)
+            if missing_uuids:
+                missing_values = self._get_bundle_values(cl_bundle.c.uuid.in_(missing_uuids))
+                self.bundle_cache.set_many(missing_values)
+                bundle_values.update(missing_values)
+        else:
+            bundle_values = self._get_bundle_values(self.make_kwargs_clause(cl_bundle, kwargs))
+
+        # Construct and validate all of the retrieved bundles.
+        sorted_values = sorted(bundle_values.values(), key=lambda r: r['id'])
+        bundles = [
+            #
+            get_bundle_subclass(bundle_value['bundle_type'])(bundle_value)
+            for bundle_value in sorted_values
+        ]
+        return bundles
+
+    def _get_bundle_values(self, clause):
+        """
+        Return {uuid: bundle value} for the bundles matching the given clause on the cl_bundle
+        table, where a bundle value is the bundle row as a dict, with its 'dependencies' and
+        'metadata' as lists of row dicts.
+        """
         with self.engine.begin() as connection:
             bundle_rows = connection.execute(cl_bundle.select().where(clause)).fetchall()
             if not bundle_rows:
-                return []
+                return {}
             uuids = set(bundle_row.uuid for bundle_row in bundle_rows)
             dependency_rows = connection.execute(
                 cl_bundle_dependency.select()
                 .where(cl_bundle_dependency.c.child_uuid.in_(uuids))
                 .order_by(cl_bundle_dependency.c.id)
             ).fetchall()
-            metadata_rows = connection.execute(
-                cl_bundle_metadata.select().where(cl_bundle_metadata.c.bundle_uuid.in_(uuids))
-            ).fetchall()
+            # Metadata is read from bundle_metadata only for bundles that haven't been
+            # backfilled yet.
+            unfilled_uuids = [row.uuid for row in bundle_rows if row.metadata_json is None]
+            metadata_rows = []
+            if unfilled_uuids:
+                metadata_rows = connection.execute(
+                    cl_bundle_metadata.select()
+                    .where(cl_bundle_metadata.c.bundle_uuid.in_(unfilled_uuids))
+                    .order_by(cl_bundle_metadata.c.id)
+                ).fetchall()
 
         # Make a dictionary for each bundle with both data and metadata.
         bundle_values = {row.uuid: str_key_dict(row) for row in bundle_rows}
         for bundle_value in bundle_values.values():
             bundle_value['dependencies'] = []
-            bundle_value['metadata'] = []
+            metadata_json = bundle_value.pop('metadata_json')
+            bundle_value['metadata'] = (
+                [] if metadata_json is None else metadata_json_to_rows(metadata_json)
+            )
         for dep_row in dependency_rows:
             if dep_row.child_uuid not in bundle_values:
                 raise IntegrityError('Got dependency %s without bundle' % (dep_row,))
-            bundle_values[dep_row.child_uuid]['dependencies'].append(dep_row)
+            bundle_values[dep_row.child_uuid]['dependencies'].append(str_key_dict(dep_row))
         for metadata_row in metadata_rows:
             if metadata_row.bundle_uuid not in bundle_values:
                 raise IntegrityError('Got metadata %s without bundle' % (metadata_row,))
-            bundle_values[metadata_row.bundle_uuid]['metadata'].append(metadata_row)
-
-        # Construct and validate all of the retrieved bundles.
-        sorted_values = sorted(bundle_values.values(), key=lambda r: r['id'])
-        bundles = [
-            #
-            get_bundle_subclass(bundle_value['bundle_type'])(bundle_value)
-            for bundle_value in sorted_values
-        ]
-        return bundles
+            bundle_values[metadata_row.bundle_uuid]['metadata'].append(str_key_dict(metadata_row))
+        return bundle_values
 
     # ==========================================================================
     # Server-side bundle state machine methods
@@ -940,6 +1260,19 @@ class BundleModel(object):
             worker_run_row = {'user_id': user_id, 'worker_id': worker_id, 'run_uuid': bundle.uuid}
             connection.execute(cl_worker_run.insert().values(worker_run_row))
 
+        self.update_bundle(
+            bundle,
+            {'state': worker_run.state, 'metadata': self.get_running_metadata(worker_run)},
+            connection,
+        )
+
+        return True
+
+    @staticmethod
+    def get_running_metadata(worker_run):
+        """
+        Returns the metadata update for a bundle that a worker reports as running.
+        """
         cpu_usage: float = 0.0
         if 'cpu_usage' in worker_run.as_dict:
             cpu_usage = worker_run.cpu_usage
@@ -976,11 +1309,7 @@ class BundleModel(object):
                 RunStage.UPLOADING_RESULTS
             ]['elapsed']
 
-        self.update_bundle(
-            bundle, {'state': worker_run.state, 'metadata': metadata_update}, connection
-        )
-
-        return True
+        return metadata_update
 
     def transition_bundle_worker_offline(self, bundle):
         """
@@ -1019,6 +1348,20 @@ class BundleModel(object):
             If the user running the bundle was the CodaLab root user,
             increments the time used by the bundle owner.
         """
+        bundle_update = {
+            'state': State.FINALIZING,
+            'metadata': self.get_finalizing_metadata(worker_run),
+        }
+
+        self.update_bundle(bundle, bundle_update, connection)
+        return True
+
+    @staticmethod
+    def get_finalizing_metadata(worker_run):
+        """
+        Returns the metadata update for a bundle that a worker reports as finalizing:
+        the failure message and the exit code.
+        """
         failure_message, exitcode = worker_run.failure_message, worker_run.exitcode
         if failure_message is None and exitcode is not None and exitcode != 0:
             failure_message = 'Exit code %d' % exitcode
@@ -1028,11 +1371,7 @@ class BundleModel(object):
             metadata['failure_message'] = failure_message
         if exitcode is not None:
             metadata['exitcode'] = exitcode
-
-        bundle_update = {'state': State.FINALIZING, 'metadata': metadata}
-
-        self.update_bundle(bundle, bundle_update, connection)
-        return True
+        return metadata
 
     def transition_bundle_finished(self, bundle, bundle_location):
         """
@@ -1073,6 +1412,7 @@ class BundleModel(object):
         """
         Computes the disk use and data hash of the given bundle.
         Updates the database rows for the bundle and user with the new disk use
+        (update_bundle applies the change in disk use to the user).
         """
         dirs_and_files = None
         if os.path.isdir(bundle_location):
@@ -1093,7 +1433,6 @@ class BundleModel(object):
 
         bundle_update = {'data_hash': data_hash, 'metadata': {'data_size': data_size}}
         self.update_bundle(bundle, bundle_update)
-        self.update_user_disk_used(bundle.owner_id)
 
     def bundle_checkin(self, bundle, worker_run, user_id, worker_id):
         """
@@ -1126,22 +1465,165 @@ class BundleModel(object):
             # State isn't one we can check in for
             return False
 
+    def batch_bundle_checkin(self, worker_runs, user_id, worker_id):
+        """
+        Same as calling bundle_checkin for each of the given runs, but loads all the bundles
+        with one query and applies the updates to the PREPARING, RUNNING and FINALIZING runs
+        in a single transaction, with a fixed number of statements regardless of the number
+        of runs. Returns {uuid: whether the bundle was updated}.
+        """
+        worker_runs = {worker_run.uuid: worker_run for worker_run in worker_runs}
+        result = {uuid: False for uuid in worker_runs}
+        if not worker_runs:
+            return result
+        bundles = {bundle.uuid: bundle for bundle in self.batch_get_bundles(uuid=list(result))}
+
+        # Runs rarely go back to STAGED, so restage them one by one.
+        for uuid, worker_run in worker_runs.items():
+            if uuid in bundles and worker_run.state == State.STAGED:
+                result[uuid] = self.transition_bundle_staged(bundles[uuid])
+
+        uuids = [
+            uuid
+            for uuid, worker_run in worker_runs.items()
+            if uuid in bundles
+            and worker_run.state in (State.PREPARING, State.RUNNING, State.FINALIZING)
+        ]
+        if not uuids:
+            return result
+
+        with self.engine.begin() as connection:
+            # If a bundle isn't in the db anymore the user deleted it, so skip it.
+            states = dict(
+                connection.execute(
+                    select([cl_bundle.c.uuid, cl_bundle.c.state]).where(cl_bundle.c.uuid.in_(uuids))
+                ).fetchall()
+            )
+
+            # Apply the updates in memory and validate them, as update_bundle does.
+            new_states = {}
+            metadata_values = []
+            uuids_by_metadata_keys = collections.defaultdict(list)
+            for uuid in states:
+                bundle, worker_run = bundles[uuid], worker_runs[uuid]
+                metadata_update = self.get_running_metadata(worker_run)
+                if worker_run.state == State.FINALIZING:
+                    metadata_update.update(self.get_finalizing_metadata(worker_run))
+                try:
+                    bundle.update_in_memory({'state': worker_run.state})
+                    for key, value in metadata_update.items():
+                        bundle.metadata.set_metadata_key(key, value)
+                    bundle.validate()
+                except UsageError as e:
+                    logger.warning('Invalid check-in for bundle %s: %s', uuid, e)
+                    continue
+                new_states[uuid] = worker_run.state
+                metadata_values.extend(
+                    row
+                    for row in bundle.to_dict().pop('metadata')
+                    if row['metadata_key'] in metadata_update
+                )
+                uuids_by_metadata_keys[tuple(sorted(metadata_update))].append(uuid)
+            if not new_states:
+                return result
+
+            # Runs that a worker resumes after they went offline are assigned to it again.
+            offline_uuids = [uuid for uuid in new_states if states[uuid] == State.WORKER_OFFLINE]
+            if offline_uuids:
+                run_row = connection.execute(
+                    cl_worker_run.select().where(cl_worker_run.c.run_uuid.in_(offline_uuids))
+                ).fetchone()
+                if run_row:
+                    # we should never get to this point: panic
+                    raise IntegrityError(
+                        'worker_run row exists for a bundle in WORKER_OFFLINE state, uuid %s'
+                        % (run_row.run_uuid,)
+                    )
+                self.do_multirow_insert(
+                    connection,
+                    cl_worker_run,
+                    [
+                        {'user_id': user_id, 'worker_id': worker_id, 'run_uuid': uuid}
+                        for uuid in offline_uuids
+                    ],
+                )
+
+            try:
+                # Replace the updated metadata keys, grouping the bundles that update the
+                # same keys into one delete.
+                for keys, group_uuids in uuids_by_metadata_keys.items():
+                    connection.execute(
+                        cl_bundle_metadata.delete().where(
+                            and_(
+                                cl_bundle_metadata.c.bundle_uuid.in_(group_uuids),
+                                cl_bundle_metadata.c.metadata_key.in_(keys),
+                            )
+                        )
+                    )
+                self.do_multirow_insert(connection, cl_bundle_metadata, metadata_values)
+
+                # Update the state and metadata_json columns of all the bundles at once.
+                metadata_rows = collections.defaultdict(list)
+                for row in connection.execute(
+                    cl_bundle_metadata.select()
+                    .where(cl_bundle_metadata.c.bundle_uuid.in_(new_states))
+                    .order_by(cl_bundle_metadata.c.id)
+                    .with_for_update()
+                ):
+                    metadata_rows[row.bundle_uuid].append(row)
+                connection.execute(
+                    cl_bundle.update()
+                    .where(cl_bundle.c.uuid == bindparam('_uuid'))
+                    .values(state=bindparam('_state'), metadata_json=bindparam('_metadata_json')),
+                    [
+                        {
+                            '_uuid': uuid,
+                            '_state': state,
+                            '_metadata_json': metadata_rows_to_json(metadata_rows[uuid]),
+                        }
+                        for uuid, state in new_states.items()
+                    ],
+                )
+            except UnicodeError:
+                raise UsageError("Invalid character detected; use ascii characters only.")
+
+            self.change_log.record_many(
+                ChangeKind.BUNDLE,
+                [uuid for uuid, state in new_states.items() if states[uuid] != state],
+                connection,
+            )
+
+        self.invalidate_bundle_cache(list(new_states))
+        result.update((uuid, True) for uuid in new_states)
+        return result
+
     def save_bundle(self, bundle):
         """
         Save a bundle. On success, sets the Bundle object's id from the result.
         """
         bundle.validate()
         bundle_value = bundle.to_dict(strict=False)
+        search_texts = self.search_index.get_texts(bundle_value)
         dependency_values = bundle_value.pop('dependencies')
         metadata_values = bundle_value.pop('metadata')
 
         # Raises exception when the UUID uniqueness constraint is violated
         # (Clients should check for this case ahead of time if they want to
         # silently skip over creating bundles that already exist.)
+        bundle_value['metadata_json'] = metadata_rows_to_json(metadata_values)
         with self.engine.begin() as connection:
             result = connection.execute(cl_bundle.insert().values(bundle_value))
             self.do_multirow_insert(connection, cl_bundle_dependency, dependency_values)
+            self._add_bundle_lineage(
+                connection, bundle.uuid, [value['parent_uuid'] for value in dependency_values]
+            )
             self.do_multirow_insert(connection, cl_bundle_metadata, metadata_values)
+            self.search_index.add(connection, bundle.uuid, search_texts)
+            if bundle_value.get('data_hash') is not None:
+                self._update_disk_used(
+                    connection, {}, self._get_disk_used_by_bundles(connection, [bundle.uuid])
+                )
+            self.change_log.record(ChangeKind.BUNDLE, bundle.uuid, connection)
             bundle.id = result.lastrowid
 
     def update_bundle(self, bundle, update, connection=None, delete=False):
@@ -1156,6 +1638,11 @@ class BundleModel(object):
         precondition('id' not in update and 'uuid' not in update, message)
         # Apply the column and metadata updates in memory and validate the result.
         metadata_update = update.pop('metadata', {})
+        # Record state changes, and any change to a staged bundle (e.g. its priority), in the
+        # change log so that the bundle manager picks them up.
+        record_change = bundle.state == State.STAGED or (
+            'state' in update and update['state'] != bundle.state
+        )
         bundle.update_in_memory(update)
 
         # Generate a list of metadata keys that will be deleted and update metadata key-value pair
@@ -1174,6 +1661,19 @@ class BundleModel(object):
         for key in metadata_delete_keys:
             del metadata_update[key]
 
+        # Changes to these count towards the disk used by the bundle's owners.
+        updates_disk_used = (
+            'data_hash' in update
+            or 'owner_id' in update
+            or 'data_size' in metadata_update
+            or 'data_size' in metadata_delete_keys
+        )
+        # Changes to these are reflected in the search index.
+        updates_search_index = 'command' in update or any(
+            key in metadata_update or key in metadata_delete_keys
+            for key in SearchIndex.METADATA_KEYS
+        )
+
         bundle.validate()
         # Construct clauses and update lists for updating certain bundle columns.
         if update:
@@ -1197,6 +1697,8 @@ class BundleModel(object):
         # Perform the actual updates and deletes.
         def do_update(connection):
             try:
+                if updates_disk_used:
+                    disk_used_before = self._get_disk_used_by_bundles(connection, [bundle.uuid])
                 if update:
                     connection.execute(cl_bundle.update().where(clause).values(update))
                 if metadata_update:
@@ -1204,6 +1706,22 @@ class BundleModel(object):
                     self.do_multirow_insert(connection, cl_bundle_metadata, metadata_update_values)
                 if metadata_delete_keys:
                     connection.execute(cl_bundle_metadata.delete().where(metadata_delete_clause))
+                if metadata_update or metadata_delete_keys:
+                    self.update_metadata_json(connection, bundle.uuid)
+                if updates_search_index:
+                    self.search_index.replace(
+                        connection,
+                        bundle.uuid,
+                        self.search_index.get_texts(bundle.to_dict(strict=False)),
+                    )
+                if updates_disk_used:
+                    self._update_disk_used(
+                        connection,
+                        disk_used_before,
+                        self._get_disk_used_by_bundles(connection, [bundle.uuid]),
+                    )
+                if record_change:
+                    self.change_log.record(ChangeKind.BUNDLE, bundle.uuid, connection)
             except UnicodeError:
                 raise UsageError("Invalid character detected; use ascii characters only.")
 
@@ -1212,6 +1730,33 @@ class BundleModel(object):
         else:
             with self.engine.begin() as connection:
                 do_update(connection)
+        self.invalidate_bundle_cache([bundle.uuid])
+
+    def invalidate_bundle_cache(self, uuids):
+        """
+        Drops the given bundles from the bundle cache, if there is one. Must be called after
+        writing to a bundle's rows.
+        """
+        if self.bundle_cache is not None:
+            self.bundle_cache.invalidate(uuids)
+
+    def update_metadata_json(self, connection, uuid):
+        """
+        Rewrites the metadata_json column of the given bundle from its rows in bundle_metadata.
+        The rows are read (and locked) again instead of serializing the bundle in memory, so
+        that concurrent updates to different metadata keys of a bundle aren't lost.
+        """
+        metadata_rows = connection.execute(
+            cl_bundle_metadata.select()
+            .where(cl_bundle_metadata.c.bundle_uuid == uuid)
+            .order_by(cl_bundle_metadata.c.id)
+            .with_for_update()
+        ).fetchall()
+        connection.execute(
+            cl_bundle.update()
+            .where(cl_bundle.c.uuid == uuid)
+            .values(metadata_json=metadata_rows_to_json(metadata_rows))
+        )
 
     def get_bundle_dependencies(self, uuid):
         with self.engine.begin() as connection:
@@ -1232,11 +1777,37 @@ class BundleModel(object):
         """
         Return {uuid: state, ...}
         """
+        result = {}
+        if self.bundle_cache is not None:
+            uuids = set(uuids)
+            cached_values = self.bundle_cache.get_many(uuids)
+            result.update((uuid, value['state']) for uuid, value in cached_values.items())
+            uuids -= set(cached_values)
+            if not uuids:
+                return result
         with self.engine.begin() as connection:
             rows = connection.execute(
                 select([cl_bundle.c.uuid, cl_bundle.c.state]).where(cl_bundle.c.uuid.in_(uuids))
             ).fetchall()
-            return dict((r.uuid, r.state) for r in rows)
+        result.update((r.uuid, r.state) for r in rows)
+        return result
+
+    def get_bundle_data_hashes(self, uuids):
+        """
+        Return {uuid: data_hash, ...} for the bundles that are in a final state and have a data
+        hash, i.e., whose contents won't change anymore.
+        """
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                select([cl_bundle.c.uuid, cl_bundle.c.data_hash]).where(
+                    and_(
+                        cl_bundle.c.uuid.in_(uuids),
+                        cl_bundle.c.state.in_(State.FINAL_STATES),
+                        cl_bundle.c.data_hash.isnot(None),
+                    )
+                )
+            ).fetchall()
+            return dict((r.uuid, r.data_hash) for r in rows)
 
     def get_bundle_storage_info(self, uuid):
         """
@@ -1265,6 +1836,18 @@ class BundleModel(object):
         Delete bundles with the given uuids.
         """
         with self.engine.begin() as connection:
+            self._update_disk_used(
+                connection, self._get_disk_used_by_bundles(connection, uuids), {}
+            )
+            # The lineage of the remaining descendants might have gone through these bundles.
+            descendant_uuids = set(
+                row.descendant_uuid
+                for row in connection.execute(
+                    select([cl_bundle_lineage.c.descendant_uuid]).where(
+                        cl_bundle_lineage.c.ancestor_uuid.in_(uuids)
+                    )
+                )
+            ) - set(uuids)
             # We must delete bundles rows in the opposite order that we create them
             # to avoid foreign-key constraint failures.
             connection.execute(
@@ -1272,6 +1855,11 @@ class BundleModel(object):
                     cl_group_bundle_permission.c.object_uuid.in_(uuids)
                 )
             )
+            connection.execute(
+                cl_user_bundle_permission.delete().where(
+                    cl_user_bundle_permission.c.object_uuid.in_(uuids)
+                )
+            )
             connection.execute(
                 cl_worksheet_item.delete().where(cl_worksheet_item.c.bundle_uuid.in_(uuids))
             )
@@ -1281,15 +1869,28 @@ class BundleModel(object):
             connection.execute(
                 cl_bundle_dependency.delete().where(cl_bundle_dependency.c.child_uuid.in_(uuids))
             )
+            connection.execute(
+                cl_bundle_lineage.delete().where(cl_bundle_lineage.c.descendant_uuid.in_(uuids))
+            )
+            self._rebuild_bundle_lineage(connection, descendant_uuids)
+            self.search_index.remove(connection, uuids)
             # In case something goes wrong, delete bundles that are currently running on workers.
             connection.execute(cl_worker_run.delete().where(cl_worker_run.c.run_uuid.in_(uuids)))
             connection.execute(cl_bundle.delete().where(cl_bundle.c.uuid.in_(uuids)))
+            # So that the bundle manager stops scheduling deleted bundles right away.
+            self.change_log.record_many(ChangeKind.BUNDLE, uuids, connection)
+        self.invalidate_bundle_cache(uuids)
 
     def remove_data_hash_references(self, uuids):
         with self.engine.begin() as connection:
+            self._update_disk_used(
+                connection, self._get_disk_used_by_bundles(connection, uuids), {}
+            )
             connection.execute(
                 cl_bundle.update().where(cl_bundle.c.uuid.in_(uuids)).values({'data_hash': None})
             )
+            self.change_log.record_many(ChangeKind.BUNDLE, uuids, connection)
+        self.invalidate_bundle_cache(uuids)
 
     # ==========================================================================
     # Worksheet-related model methods follow!
@@ -1428,11 +2029,7 @@ class BundleModel(object):
                     select([cl_group_worksheet_permission.c.object_uuid]).where(
                         and_(
                             cl_group_worksheet_permission.c.group_uuid.in_(
-                                alias(
-                                    select([cl_user_group.c.group_uuid]).where(
-                                        cl_user_group.c.user_id == user_id
-                                    )
-                                )
+                                self._get_member_group_uuids(user_id)
                             ),
                             cl_group_worksheet_permission.c.permission
                             >= GROUP_OBJECT_PERMISSION_READ,
@@ -1517,20 +2114,8 @@ class BundleModel(object):
         # Enforce permissions
         if user_id != self.root_user_id:
             access_via_owner = cl_worksheet.c.owner_id == user_id
-            access_via_group = cl_worksheet.c.uuid.in_(
-                select([cl_group_worksheet_permission.c.object_uuid]).where(
-                    or_(
-                        cl_group_worksheet_permission.c.group_uuid
-                        == self.public_group_uuid,  # Public group
-                        cl_group_worksheet_permission.c.group_uuid.in_(  # Private group
-                            alias(
-                                select([cl_user_group.c.group_uuid]).where(
-                                    cl_user_group.c.user_id == user_id
-                                )
-                            )
-                        ),
-                    )
-                )
+            access_via_group = self._make_group_access_clause(
+                cl_group_worksheet_permission, cl_worksheet.c.uuid, user_id
             )
             clause = and_(clause, or_(access_via_owner, access_via_group))
 
@@ -1799,6 +2384,11 @@ class BundleModel(object):
                     cl_group_worksheet_permission.c.object_uuid == worksheet_uuid
                 )
             )
+            connection.execute(
+                cl_user_worksheet_permission.delete().where(
+                    cl_user_worksheet_permission.c.object_uuid == worksheet_uuid
+                )
+            )
             connection.execute(
                 cl_worksheet_item.delete().where(
                     cl_worksheet_item.c.worksheet_uuid == worksheet_uuid
@@ -1928,6 +2518,21 @@ class BundleModel(object):
         Delete the group with the given uuid.
         """
         with self.engine.begin() as connection:
+            member_ids = [
+                row.user_id
+                for row in connection.execute(
+                    select([cl_user_group.c.user_id]).where(cl_user_group.c.group_uuid == uuid)
+                )
+            ]
+            object_uuids = {
+                table: [
+                    row.object_uuid
+                    for row in connection.execute(
+                        select([table.c.object_uuid]).where(table.c.group_uuid == uuid)
+                    )
+                ]
+                for table in USER_PERMISSION_TABLES
+            }
             connection.execute(
                 cl_group_bundle_permission.delete().where(
                     cl_group_bundle_permission.c.group_uuid == uuid
@@ -1940,6 +2545,12 @@ class BundleModel(object):
             )
             connection.execute(cl_user_group.delete().where(cl_user_group.c.group_uuid == uuid))
             connection.execute(cl_group.delete().where(cl_group.c.uuid == uuid))
+            for table in USER_PERMISSION_TABLES:
+                if member_ids and object_uuids[table]:
+                    self._refresh_user_permissions(
+                        connection, table, user_ids=member_ids, object_uuids=object_uuids[table]
+                    )
+        self._invalidate_permission_cache(member_ids)
 
     def add_user_in_group(self, user_id, group_uuid, is_admin):
         """
@@ -1949,6 +2560,8 @@ class BundleModel(object):
         with self.engine.begin() as connection:
             result = connection.execute(cl_user_group.insert().values(row))
             row['id'] = result.lastrowid
+            self._refresh_user_permissions_in_group(connection, user_id, group_uuid)
+        self._invalidate_permission_cache([user_id])
         return row
 
     def delete_user_in_group(self, user_id, group_uuid):
@@ -1961,6 +2574,8 @@ class BundleModel(object):
                 .where(cl_user_group.c.user_id == user_id)
                 .where(cl_user_group.c.group_uuid == group_uuid)
             )
+            self._refresh_user_permissions_in_group(connection, user_id, group_uuid)
+        self._invalidate_permission_cache([user_id])
 
     def update_user_in_group(self, user_id, group_uuid, is_admin):
         """
@@ -1995,9 +2610,142 @@ class BundleModel(object):
         """
         groups = [self.public_group_uuid]  # Everyone is in the public group implicitly.
         if user_id is not None:
-            groups += [row['group_uuid'] for row in self.batch_get_user_in_group(user_id=user_id)]
+            groups += self._get_member_group_uuids(user_id)
         return groups
 
+    def _get_member_group_uuids(self, user_id):
+        """
+        Returns the list of uuids of the groups that the user is a member of (not counting the
+        public group), from the permission cache if it's enabled.
+        """
+        if user_id is None:
+            return []
+        if self.permission_cache is not None:
+            group_uuids = self.permission_cache.get_user_groups(user_id)
+            if group_uuids is not None:
+                return group_uuids
+        group_uuids = [row['group_uuid'] for row in self.batch_get_user_in_group(user_id=user_id)]
+        if self.permission_cache is not None:
+            self.permission_cache.set_user_groups(user_id, group_uuids)
+        return group_uuids
+
+    def _invalidate_permission_cache(self, user_ids):
+        if self.permission_cache is not None:
+            self.permission_cache.invalidate(user_ids)
+
+    def _make_group_access_clause(
+        self, table, uuid_column, user_id, permission=GROUP_OBJECT_PERMISSION_READ
+    ):
+        """
+        Returns a clause that |uuid_column| is the uuid of an object that the user has at least
+        |permission| on through a group (including the public group).
+        :param table: cl_group_bundle_permission or cl_group_worksheet_permission
+        """
+        if self.use_permission_view and user_id is not None:
+            user_table = USER_PERMISSION_TABLES[table]
+            return or_(
+                uuid_column.in_(
+                    select([table.c.object_uuid]).where(
+                        and_(
+                            table.c.group_uuid == self.public_group_uuid,
+                            table.c.permission >= permission,
+                        )
+                    )
+                ),
+                uuid_column.in_(
+                    select([user_table.c.object_uuid]).where(
+                        and_(user_table.c.user_id == user_id, user_table.c.permission >= permission)
+                    )
+                ),
+            )
+        return uuid_column.in_(
+            select([table.c.object_uuid]).where(
+                and_(
+                    table.c.group_uuid.in_(self.get_user_groups(user_id)),
+                    table.c.permission >= permission,
+                )
+            )
+        )
+
+    def _get_group_permissions_of_user(self, table, user_id, object_uuids):
+        """
+        Returns a map from object_uuid to the highest permission that the user has on the
+        object through a group (including the public group), for the objects |object_uuids| that
+        the user has any permission on.
+        """
+        if self.use_permission_view and user_id is not None:
+            user_table = USER_PERMISSION_TABLES[table]
+            queries = [
+                select([table.c.object_uuid, table.c.permission]).where(
+                    and_(
+                        table.c.group_uuid == self.public_group_uuid,
+                        table.c.object_uuid.in_(object_uuids),
+                    )
+                ),
+                select([user_table.c.object_uuid, user_table.c.permission]).where(
+                    and_(
+                        user_table.c.user_id == user_id, user_table.c.object_uuid.in_(object_uuids)
+                    )
+                ),
+            ]
+        else:
+            queries = [
+                select([table.c.object_uuid, table.c.permission]).where(
+                    and_(
+                        table.c.group_uuid.in_(self.get_user_groups(user_id)),
+                        table.c.object_uuid.in_(object_uuids),
+                    )
+                )
+            ]
+        permissions = {}
+        with self.engine.begin() as connection:
+            for query in queries:
+                for row in connection.execute(query):
+                    permissions[row.object_uuid] = max(
+                        permissions.get(row.object_uuid, GROUP_OBJECT_PERMISSION_NONE),
+                        row.permission,
+                    )
+        return permissions
+
+    def _refresh_user_permissions(self, connection, table, user_ids=None, object_uuids=None):
+        """
+        Recompute the materialized permissions of the users |user_ids| on the objects
+        |object_uuids| (each a list or a select of them; None for all) from |table|, as part of
+        the ongoing transaction on |connection|.
+        :param table: cl_group_bundle_permission or cl_group_worksheet_permission
+        """
+        user_table = USER_PERMISSION_TABLES[table]
+        delete_clauses = []
+        select_clauses = [cl_user_group.c.group_uuid == table.c.group_uuid]
+        if user_ids is not None:
+            delete_clauses.append(user_table.c.user_id.in_(user_ids))
+            select_clauses.append(cl_user_group.c.user_id.in_(user_ids))
+        if object_uuids is not None:
+            delete_clauses.append(user_table.c.object_uuid.in_(object_uuids))
+            select_clauses.append(table.c.object_uuid.in_(object_uuids))
+        connection.execute(user_table.delete().where(and_(true(), *delete_clauses)))
+        connection.execute(
+            user_table.insert().from_select(
+                ['user_id', 'object_uuid', 'permission'],
+                select([cl_user_group.c.user_id, table.c.object_uuid, func.max(table.c.permission)])
+                .where(and_(*select_clauses))
+                .group_by(cl_user_group.c.user_id, table.c.object_uuid),
+            )
+        )
+
+    def _refresh_user_permissions_in_group(self, connection, user_id, group_uuid):
+        """
+        Recompute the materialized permissions of the user on the objects that the group has
+        permissions on, after the user joined or left the group.
+        """
+        for table in USER_PERMISSION_TABLES:
+            self._refresh_user_permissions(
+                connection,
+                table,
+                user_ids=[user_id],
+                object_uuids=select([table.c.object_uuid]).where(table.c.group_uuid == group_uuid),
+            )
+
     def set_group_permission(self, table, group_uuid, object_uuid, new_permission):
         """
         Atomically set group permission on object. Does NOT check for user
@@ -2045,6 +2793,16 @@ class BundleModel(object):
                         .where(table.c.object_uuid == object_uuid)
                     )
 
+            if new_permission != old_permission:
+                self._refresh_user_permissions(
+                    connection,
+                    table,
+                    user_ids=select([cl_user_group.c.user_id]).where(
+                        cl_user_group.c.group_uuid == group_uuid
+                    ),
+                    object_uuids=[object_uuid],
+                )
+
     def set_group_bundle_permission(self, group_uuid, bundle_uuid, new_permission):
         return self.set_group_permission(
             cl_group_bundle_permission, group_uuid, bundle_uuid, new_permission
@@ -2132,14 +2890,9 @@ class BundleModel(object):
                 remaining_object_uuids.append(object_uuid)
 
         if len(remaining_object_uuids) > 0:
-            result = self.batch_get_group_permissions(table, user_id, remaining_object_uuids)
-            user_groups = self.get_user_groups(user_id)
-            for object_uuid, permissions in result.items():
-                for row in permissions:
-                    if row['group_uuid'] in user_groups:
-                        object_permissions[object_uuid] = max(
-                            object_permissions[object_uuid], row['permission']
-                        )
+            object_permissions.update(
+                self._get_group_permissions_of_user(table, user_id, remaining_object_uuids)
+            )
         return object_permissions
 
     def get_user_bundle_permissions(self, user_id, bundle_uuids, owner_ids):
@@ -2543,6 +3296,8 @@ class BundleModel(object):
 
             # User Groups
             connection.execute(cl_user_group.delete().where(cl_user_group.c.user_id == user_id))
+            for user_table in USER_PERMISSION_TABLES.values():
+                connection.execute(user_table.delete().where(user_table.c.user_id == user_id))
 
             # Chat
             connection.execute(
@@ -2553,6 +3308,7 @@ class BundleModel(object):
 
             # Delete User
             connection.execute(cl_user.delete().where(cl_user.c.user_id == user_id))
+        self._invalidate_permission_cache([user_id])
 
     def get_verification_key(self, user_id):
         """
@@ -2719,9 +3475,12 @@ class BundleModel(object):
         """
         User used some time.
         """
-        user_info = self.get_user_info(user_id)
-        user_info['time_used'] += amount
-        self.update_user_info(user_info)
+        with self.engine.begin() as connection:
+            connection.execute(
+                cl_user.update()
+                .where(cl_user.c.user_id == user_id)
+                .values(time_used=cl_user.c.time_used + amount)
+            )
 
     def get_user_time_quota_left(self, user_id, user_info=None):
         if not user_info:
@@ -2770,10 +3529,104 @@ class BundleModel(object):
         return user_info['disk_quota'] - user_info['disk_used']
 
     def update_user_disk_used(self, user_id):
-        user_info = self.get_user_info(user_id)
-        # Compute from scratch for simplicity
-        user_info['disk_used'] = self._get_disk_used(user_id)
-        self.update_user_info(user_info)
+        """
+        Recomputes the disk used by the given user from scratch. Not needed after changes
+        made through this class, which keep disk_used up to date incrementally.
+        """
+        self.update_user_info({'user_id': user_id, 'disk_used': self._get_disk_used(user_id)})
+
+    def _get_disk_used_by_bundles(self, connection, uuids):
+        """
+        Returns {owner_id: number of bytes} with the disk used by the given bundles, that is,
+        the data_size of those that have a data_hash (see _get_disk_used). Locks the rows of
+        the bundles until the end of the transaction.
+        """
+        if not uuids:
+            return {}
+        rows = connection.execute(
+            select([cl_bundle.c.uuid, cl_bundle.c.owner_id, cl_bundle_metadata.c.metadata_value])
+            .where(
+                and_(
+                    cl_bundle.c.uuid.in_(uuids),
+                    cl_bundle.c.data_hash.isnot(None),
+                    cl_bundle_metadata.c.bundle_uuid == cl_bundle.c.uuid,
+                    cl_bundle_metadata.c.metadata_key == 'data_size',
+                )
+            )
+            .with_for_update()
+        ).fetchall()
+        disk_used = collections.defaultdict(float)
+        for uuid, owner_id, data_size in set(tuple(row) for row in rows):
+            try:
+                disk_used[owner_id] += float(data_size)
+            except (TypeError, ValueError):
+                pass
+        return disk_used
+
+    def _update_disk_used(self, connection, disk_used_before, disk_used_after):
+        """
+        Applies a change in the disk used by some bundles, from |disk_used_before| to
+        |disk_used_after| (as returned by _get_disk_used_by_bundles), to the disk_used of
+        their owners.
+        """
+        for owner_id in set(disk_used_before) | set(disk_used_after):
+            delta = disk_used_after.get(owner_id, 0) - disk_used_before.get(owner_id, 0)
+            if delta:
+                connection.execute(
+                    cl_user.update()
+                    .where(cl_user.c.user_id == owner_id)
+                    .values(disk_used=cl_user.c.disk_used + delta)
+                )
+
+    def reconcile_user_disk_used(self):
+        """
+        Recomputes the disk used by every user from their bundles and corrects the users
+        whose disk_used has drifted, e.g. because bundle rows were changed outside of this
+        class. Returns {user_id: (disk_used, corrected disk_used)} for the corrected users.
+        """
+        sizes = (
+            select(
+                [
+                    cl_bundle.c.owner_id,
+                    cl_bundle.c.uuid,
+                    (cl_bundle_metadata.c.metadata_value * 1).label('num'),
+                ]
+            )
+            .distinct()
+            .where(
+                and_(
+                    cl_bundle.c.data_hash.isnot(None),
+                    cl_bundle_metadata.c.bundle_uuid == cl_bundle.c.uuid,
+                    cl_bundle_metadata.c.metadata_key == 'data_size',
+                )
+            )
+            .alias('sizes')
+        )
+        corrected = {}
+        with self.engine.begin() as connection:
+            actual = {
+                row.owner_id: row.disk_used or 0
+                for row in connection.execute(
+                    select([sizes.c.owner_id, func.sum(sizes.c.num).label('disk_used')]).group_by(
+                        sizes.c.owner_id
+                    )
+                )
+            }
+            for user_id, disk_used in connection.execute(
+                select([cl_user.c.user_id, cl_user.c.disk_used])
+            ).fetchall():
+                delta = actual.get(user_id, 0) - disk_used
+                if abs(delta) < 1:
+                    continue
+                # Apply the difference rather than the recomputed value, so that changes
+                # committed by other transactions since this one started aren't lost.
+                connection.execute(
+                    cl_user.update()
+                    .where(cl_user.c.user_id == user_id)
+                    .values(disk_used=cl_user.c.disk_used + delta)
+                )
+                corrected[user_id] = (disk_used, actual.get(user_id, 0))
+        return corrected
 
     # ===========================================================================
     # OAuth-related methods follow!
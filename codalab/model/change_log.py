@@ -0,0 +1,107 @@
+"""
+ChangeLog is a wrapper around the change_log table. Writers record that a bundle or
+worker changed (in the same transaction as the change), and the bundle manager
+reads the records to decide what to look at instead of rescanning every bundle on
+a fixed timer.
+"""
+import datetime
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from codalab.model.tables import change_log as cl_change_log
+
+
+class ChangeKind(object):
+    BUNDLE = 'bundle'  # A bundle was created or changed state.
+    WORKER = 'worker'  # A worker joined or its capacity changed.
+
+
+class ChangeLog(object):
+    # Maximum number of change records returned by a single call to fetch().
+    FETCH_LIMIT = 10000
+
+    def __init__(self, engine):
+        self._engine = engine
+        # Lets readers in this process wake up as soon as a change is recorded here.
+        # Changes recorded by other processes are picked up by polling in wait().
+        self._condition = threading.Condition()
+
+    def record(self, kind, object_id, connection=None):
+        """
+        Record that the object |object_id| of kind |kind| changed. Pass |connection|
+        to make the record part of an ongoing transaction.
+        """
+        row = {'kind': kind, 'object_id': object_id, 'date_created': datetime.datetime.utcnow()}
+        if connection is not None:
+            connection.execute(cl_change_log.insert().values(row))
+        else:
+            with self._engine.begin() as connection:
+                connection.execute(cl_change_log.insert().values(row))
+        with self._condition:
+            self._condition.notify_all()
+
+    def record_many(self, kind, object_ids, connection):
+        """
+        Record that each of the objects |object_ids| of kind |kind| changed, as part of the
+        ongoing transaction on |connection|.
+        """
+        if not object_ids:
+            return
+        now = datetime.datetime.utcnow()
+        connection.execute(
+            cl_change_log.insert(),
+            [
+                {'kind': kind, 'object_id': object_id, 'date_created': now}
+                for object_id in object_ids
+            ],
+        )
+        with self._condition:
+            self._condition.notify_all()
+
+    def last_id(self):
+        """
+        Return the id of the latest change record, or 0 if there are none.
+        """
+        with self._engine.begin() as connection:
+            return connection.execute(select([func.max(cl_change_log.c.id)])).scalar() or 0
+
+    def fetch(self, after_id):
+        """
+        Return (last_id, changes) where |changes| maps each kind to the set of object
+        ids recorded after |after_id|, and |last_id| is the id of the last record read.
+        """
+        with self._engine.begin() as connection:
+            rows = connection.execute(
+                select([cl_change_log.c.id, cl_change_log.c.kind, cl_change_log.c.object_id])
+                .where(cl_change_log.c.id > after_id)
+                .order_by(cl_change_log.c.id)
+                .limit(self.FETCH_LIMIT)
+            ).fetchall()
+        changes = {ChangeKind.BUNDLE: set(), ChangeKind.WORKER: set()}
+        for row in rows:
+            changes.setdefault(row.kind, set()).add(row.object_id)
+        return (rows[-1].id if rows else after_id), changes
+
+    def prune(self, up_to_id):
+        """
+        Delete all change records with id at most |up_to_id|.
+        """
+        with self._engine.begin() as connection:
+            connection.execute(cl_change_log.delete().where(cl_change_log.c.id <= up_to_id))
+
+    def wait(self, after_id, timeout, poll_interval=0.1):
+        """
+        Block until there is a change record after |after_id| or |timeout| seconds
+        pass. Returns whether there are new changes.
+        """
+        deadline = time.time() + timeout
+        while True:
+            if self.last_id() > after_id:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            with self._condition:
+                self._condition.wait(min(poll_interval, remaining))
@@ -0,0 +1,498 @@
+"""
+Message buses carry messages between the REST servers, the bundle manager and the
+workers. Messages are addressed to socket IDs allocated by WorkerModel: each worker
+listens on its socket while it checks in, and the server listens on a temporary socket
+while it waits for a worker's reply. A message is either a JSON message or a stream of
+bytes.
+
+Two implementations are provided:
+- UnixSocketMessageBus sends messages through Unix domain sockets in a directory shared by
+  all the processes, which must therefore run on the same host.
+- DatabaseMessageBus stores messages in the worker_message table until they are read, so
+  it works across hosts. A message waits for a listener (e.g. the worker's next checkin)
+  until it is read or the sender times out.
+"""
+from contextlib import closing
+import datetime
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from uuid import uuid4
+
+from sqlalchemy import and_, func, select
+
+from codalab.common import precondition
+from codalab.model.tables import worker_message as cl_worker_message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBusType(object):
+    UNIX_SOCKET = 'unix_socket'
+    DATABASE = 'database'
+
+    OPTIONS = {UNIX_SOCKET, DATABASE}
+
+
+class MessageBus(object):
+    """
+    Interface of a message bus. Listeners are used as in:
+
+        with closing(message_bus.start_listening(socket_id)) as listener:
+            message = message_bus.get_json_message(listener, timeout_secs)
+    """
+
+    def start_listening(self, socket_id):
+        """
+        Returns a listener for messages sent to the socket with the given ID, which must be
+        closed when done.
+        """
+        raise NotImplementedError
+
+    def get_stream(self, listener, timeout_secs):
+        """
+        Receives a single message and returns a file-like object that can be used for
+        streaming the message data. If no messages are received within timeout_secs
+        seconds, returns None.
+        """
+        raise NotImplementedError
+
+    def get_json_message(self, listener, timeout_secs):
+        """
+        Receives a single message and returns the message data parsed as JSON. If no
+        messages are received within timeout_secs seconds, returns None.
+        """
+        fileobj = self.get_stream(listener, timeout_secs)
+
+        if fileobj is None:
+            return None
+
+        with closing(fileobj):
+            return json.loads(fileobj.read().decode())
+
+    def send_stream(self, socket_id, fileobj, timeout_secs):
+        """
+        Streams the given file-like object to the given socket. Returns False if the
+        message isn't received within timeout_secs seconds, True otherwise.
+        """
+        raise NotImplementedError
+
+    def send_json_message(self, socket_id, message, timeout_secs, autoretry=True):
+        """
+        Sends a JSON message to the given socket. Returns False if the message isn't
+        received within timeout_secs seconds, True otherwise.
+        """
+        raise NotImplementedError
+
+    def cleanup(self, socket_id):
+        """
+        Discards any resources and pending messages of the given socket.
+        """
+        raise NotImplementedError
+
+
+class UnixSocketMessageBus(MessageBus):
+    """
+    Sends messages through Unix domain sockets stored in |socket_dir|. A message can only
+    be received while the recipient is listening, so senders retry connecting until then.
+    """
+
+    ACK = b'a'
+
+    def __init__(self, socket_dir):
+        self._socket_dir = socket_dir
+
+    def _socket_path(self, socket_id):
+        return os.path.join(self._socket_dir, str(socket_id))
+
+    def cleanup(self, socket_id):
+        try:
+            os.remove(self._socket_path(socket_id))
+        except OSError:
+            pass
+
+    def start_listening(self, socket_id):
+        self.cleanup(socket_id)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self._socket_path(socket_id))
+        sock.listen(0)
+        return sock
+
+    def get_stream(self, sock, timeout_secs):
+        sock.settimeout(timeout_secs)
+        try:
+            conn, _ = sock.accept()
+            # Send Ack. This helps protect from messages to the worker being
+            # lost due to spuriously accepted connections when the socket
+            # file is deleted.
+            conn.sendall(self.ACK)
+            conn.settimeout(None)  # Need to remove timeout before makefile.
+            fileobj = conn.makefile('rb')
+            conn.close()
+            return fileobj
+        except socket.timeout:
+            return None
+
+    def send_stream(self, socket_id, fileobj, timeout_secs):
+        start_time = time.time()
+        while time.time() - start_time < timeout_secs:
+            with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+                sock.settimeout(timeout_secs)
+
+                success = False
+                try:
+                    sock.connect(self._socket_path(socket_id))
+                    success = sock.recv(len(self.ACK)) == self.ACK
+                except socket.error:
+                    pass
+
+                if not success:
+                    # Shouldn't be too expensive just to keep retrying.
+                    time.sleep(0.003)
+                    continue
+
+                while True:
+                    data = fileobj.read(4096)
+                    if not data:
+                        return True
+                    sock.sendall(data)
+
+        return False
+
+    def send_json_message(self, socket_id, message, timeout_secs, autoretry=True):
+        """
+        Note, only the worker should call this method with autoretry set to
+        False. See comments below.
+        """
+        start_time = time.time()
+        while time.time() - start_time < timeout_secs:
+            with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
+                sock.settimeout(timeout_secs)
+
+                success = False
+                try:
+                    sock.connect(self._socket_path(socket_id))
+                    if autoretry:
+                        # This auto retry mechanisms helps ensure that messages
+                        # sent to a worker are received more reliably. The
+                        # socket API isn't particularly robust to our usage
+                        # where we continuously start and stop listening on a
+                        # socket, like the worker checkin mechanism does. In
+                        # fact, it seems to spuriously accept connections
+                        # just when a socket object is in the process of being
+                        # destroyed. On the sending end, such a scenario results
+                        # in a "Broken pipe" exception, which we catch here.
+                        success = sock.recv(len(self.ACK)) == self.ACK
+                    else:
+                        success = True
+                except socket.error:
+                    pass
+
+                if not success:
+                    # Shouldn't be too expensive just to keep retrying.
+                    # TODO: maybe exponential backoff
+                    time.sleep(
+                        0.3
+                    )  # changed from 0.003 to keep from rate-limiting due to dead workers
+                    continue
+
+                if not autoretry:
+                    # When messages are being sent from the worker, we don't
+                    # have the problem with "Broken pipe" as above, since
+                    # code waiting for a reply shouldn't just abruptly stop
+                    # listening.
+                    precondition(
+                        sock.recv(len(self.ACK)) == self.ACK, 'Received invalid ack on socket.',
+                    )
+
+                sock.sendall(json.dumps(message).encode())
+                return True
+
+        return False
+
+
+class DatabaseListener(object):
+    def __init__(self, socket_id):
+        self.socket_id = socket_id
+
+    def close(self):
+        pass
+
+
+class DatabaseStreamReader(io.RawIOBase):
+    """
+    Reads the chunks of a stream sent through a DatabaseMessageBus as they arrive.
+    """
+
+    def __init__(self, message_bus, socket_id, message_id, first_chunk, timeout_secs):
+        self._message_bus = message_bus
+        self._socket_id = socket_id
+        self._message_id = message_id
+        self._timeout_secs = timeout_secs
+        self._chunk = first_chunk.data
+        self._offset = 0
+        self._done = first_chunk.is_last
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._chunk):
+            if self._done:
+                return 0
+            row = self._message_bus._wait_until(
+                (DatabaseMessageBus.SOCKET, self._socket_id),
+                lambda: self._message_bus._claim_next(self._socket_id, self._message_id),
+                self._timeout_secs,
+            )
+            if row is None:
+                raise IOError('Timed out waiting for message data on socket %s' % self._socket_id)
+            self._chunk, self._offset, self._done = row.data, 0, row.is_last
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset : self._offset + size]
+        self._offset += size
+        return size
+
+
+class DatabaseMessageBus(MessageBus):
+    """
+    Stores messages in the worker_message table. A sender inserts the message and waits
+    until a reader has deleted it, withdrawing it if that doesn't happen in time, so a
+    message is received exactly once or the sender knows it wasn't.
+
+    Threads waiting for a message on a socket, or for a message to be read, are woken up
+    as soon as this process inserts or reads it. For changes made by other processes, a
+    single background thread polls the table every |poll_interval| seconds for all the
+    waiting threads and wakes up those whose socket or message changed. When a poll fails, it
+    wakes up all the waiting threads to check for themselves, and polls again after
+    POLL_ERROR_BACKOFF_SECS seconds.
+    """
+
+    # Maximum size of a row of a stream.
+    CHUNK_SIZE = 256 * 1024
+    # Maximum number of rows of a stream that the sender gets ahead of the reader.
+    MAX_UNREAD_CHUNKS = 8
+
+    # Seconds the poller waits before polling again after a failed poll.
+    POLL_ERROR_BACKOFF_SECS = 1
+
+    # Kinds of keys threads wait on: (SOCKET, socket_id) to receive a message on a socket,
+    # and (MESSAGE, message_id) for a sent message to be read.
+    SOCKET = 'socket'
+    MESSAGE = 'message'
+
+    def __init__(self, engine, poll_interval=0.1):
+        self._engine = engine
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._has_waiters = threading.Condition(self._lock)
+        # {key: set of threading.Event}
+        self._waiters = {}
+        self._poller = None
+
+    def _notify(self, key):
+        with self._lock:
+            for event in self._waiters.get(key, ()):
+                event.set()
+
+    def _wait_until(self, key, get_result, timeout_secs):
+        """
+        Calls get_result until it returns something other than None and returns that, or
+        returns None once timeout_secs seconds have passed. get_result is called again
+        whenever |key| is notified.
+        """
+        deadline = time.time() + timeout_secs
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(event)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, daemon=True)
+                self._poller.start()
+            self._has_waiters.notify()
+        try:
+            while True:
+                event.clear()
+                result = get_result()
+                if result is not None:
+                    return result
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                event.wait(remaining)
+        finally:
+            with self._lock:
+                self._waiters[key].discard(event)
+                if not self._waiters[key]:
+                    del self._waiters[key]
+
+    def _poll(self):
+        """
+        Wakes up threads waiting on sockets that have messages and on messages whose number
+        of unread rows changed, as they may have been changed by another process.
+        """
+        num_unread = {}
+        while True:
+            with self._lock:
+                while not self._waiters:
+                    self._has_waiters.wait()
+                keys = list(self._waiters)
+            try:
+                woken_keys, num_unread = self._poll_once(keys, num_unread)
+            except Exception:
+                # The poller must survive errors like lost connections, or every thread
+                # waiting on another process would wait until it times out. Waiters are woken
+                # up to check the database themselves in the meantime.
+                logger.exception('Failed to poll for worker messages')
+                for key in keys:
+                    self._notify(key)
+                time.sleep(self.POLL_ERROR_BACKOFF_SECS)
+                continue
+            for key in woken_keys:
+                self._notify(key)
+            time.sleep(self._poll_interval)
+
+    def _poll_once(self, keys, num_unread):
+        """
+        Returns the keys among |keys| that should be woken up, and the new number of unread
+        rows of each message, given the numbers as of the last poll.
+        """
+        socket_ids = [key[1] for key in keys if key[0] == self.SOCKET]
+        message_ids = [key[1] for key in keys if key[0] == self.MESSAGE]
+        woken_keys = []
+        with self._engine.begin() as conn:
+            if socket_ids:
+                woken_keys.extend(
+                    (self.SOCKET, row.socket_id)
+                    for row in conn.execute(
+                        select([cl_worker_message.c.socket_id])
+                        .where(cl_worker_message.c.socket_id.in_(socket_ids))
+                        .distinct()
+                    )
+                )
+            if message_ids:
+                counts = dict(
+                    conn.execute(
+                        select([cl_worker_message.c.message_id, func.count()])
+                        .where(cl_worker_message.c.message_id.in_(message_ids))
+                        .group_by(cl_worker_message.c.message_id)
+                    ).fetchall()
+                )
+                new_num_unread = {
+                    message_id: counts.get(message_id, 0) for message_id in message_ids
+                }
+                woken_keys.extend(
+                    (self.MESSAGE, message_id)
+                    for message_id, count in new_num_unread.items()
+                    if num_unread.get(message_id) != count
+                )
+                num_unread = new_num_unread
+        return woken_keys, num_unread
+
+    def _insert(self, socket_id, message_id, data, is_last):
+        with self._engine.begin() as conn:
+            conn.execute(
+                cl_worker_message.insert().values(
+                    socket_id=socket_id,
+                    message_id=message_id,
+                    data=data,
+                    is_last=is_last,
+                    date_created=datetime.datetime.utcnow(),
+                )
+            )
+        self._notify((self.SOCKET, socket_id))
+
+    def _num_unread(self, message_id):
+        with self._engine.begin() as conn:
+            return conn.execute(
+                select([func.count()])
+                .select_from(cl_worker_message)
+                .where(cl_worker_message.c.message_id == message_id)
+            ).scalar()
+
+    def _wait_until_read(self, message_id, max_unread, timeout_secs):
+        """
+        Waits until at most max_unread rows of the message are left and returns True. If
+        that doesn't happen within timeout_secs seconds, withdraws the rest of the message
+        and returns False.
+        """
+        if self._wait_until(
+            (self.MESSAGE, message_id),
+            lambda: True if self._num_unread(message_id) <= max_unread else None,
+            timeout_secs,
+        ):
+            return True
+        with self._engine.begin() as conn:
+            num_withdrawn = conn.execute(
+                cl_worker_message.delete().where(cl_worker_message.c.message_id == message_id)
+            ).rowcount
+        # The reader may have read the whole message just before it was withdrawn.
+        return max_unread == 0 and num_withdrawn == 0
+
+    def _claim_next(self, socket_id, message_id=None):
+        """
+        Deletes and returns the oldest row sent to the socket (that is part of the given
+        message, if any), or returns None if there isn't one.
+        """
+        clause = cl_worker_message.c.socket_id == socket_id
+        if message_id is not None:
+            clause = and_(clause, cl_worker_message.c.message_id == message_id)
+        while True:
+            with self._engine.begin() as conn:
+                row = conn.execute(
+                    cl_worker_message.select()
+                    .where(clause)
+                    .order_by(cl_worker_message.c.id)
+                    .limit(1)
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = conn.execute(
+                    cl_worker_message.delete().where(cl_worker_message.c.id == row.id)
+                ).rowcount
+            if claimed:
+                self._notify((self.MESSAGE, row.message_id))
+                return row
+            # Another reader claimed the row first, try the next one.
+
+    def start_listening(self, socket_id):
+        return DatabaseListener(socket_id)
+
+    def get_stream(self, listener, timeout_secs):
+        row = self._wait_until(
+            (self.SOCKET, listener.socket_id),
+            lambda: self._claim_next(listener.socket_id),
+            timeout_secs,
+        )
+        if row is None:
+            return None
+        return io.BufferedReader(
+            DatabaseStreamReader(self, listener.socket_id, row.message_id, row, timeout_secs)
+        )
+
+    def send_stream(self, socket_id, fileobj, timeout_secs):
+        message_id = uuid4().hex
+        while True:
+            data = fileobj.read(self.CHUNK_SIZE)
+            self._insert(socket_id, message_id, data, not data)
+            if not data:
+                return self._wait_until_read(message_id, 0, timeout_secs)
+            if not self._wait_until_read(message_id, self.MAX_UNREAD_CHUNKS - 1, timeout_secs):
+                return False
+
+    def send_json_message(self, socket_id, message, timeout_secs, autoretry=True):
+        """
+        Messages are delivered exactly once, so autoretry is ignored.
+        """
+        message_id = uuid4().hex
+        self._insert(socket_id, message_id, json.dumps(message).encode(), True)
+        return self._wait_until_read(message_id, 0, timeout_secs)
+
+    def cleanup(self, socket_id):
+        with self._engine.begin() as conn:
+            conn.execute(
+                cl_worker_message.delete().where(cl_worker_message.c.socket_id == socket_id)
+            )
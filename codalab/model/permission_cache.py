@@ -0,0 +1,46 @@
+"""
+PermissionCache is an optional cache of the groups that each user is a member of, which
+BundleModel looks up whenever it resolves a user's permissions (searching bundles and
+worksheets, and checking permissions on them).
+
+BundleModel invalidates the entries of users whenever their memberships change. Like with
+BundleCache, changes made by other processes are only picked up once the entries expire, so the
+TTL bounds how long a user removed from a group keeps access through it.
+"""
+
+
+class PermissionCache(object):
+    def __init__(self, backend):
+        """
+        |backend| is a CacheBackend (see bundle_cache.py).
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_user_groups(self, user_id):
+        """
+        Returns the list of uuids of the groups |user_id| is a member of, or None if it isn't
+        cached.
+        """
+        group_uuids = self.backend.get_many([user_id]).get(user_id)
+        if group_uuids is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return group_uuids
+
+    def set_user_groups(self, user_id, group_uuids):
+        self.backend.set_many({user_id: list(group_uuids)})
+
+    def invalidate(self, user_ids):
+        self.backend.delete_many(user_ids)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total else None,
+            'size': len(self.backend),
+        }
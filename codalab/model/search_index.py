@@ -0,0 +1,142 @@
+"""
+SearchIndex is a wrapper around the bundle_search_ngram table, which maps each trigram (three
+consecutive characters, lowercased) of the uuid, command, name, description and tags of a bundle
+to the bundle. Writers update it in the same transaction as the bundle, and
+BundleModel.search_bundles uses it to narrow down LIKE '%...%' searches on these fields to a few
+candidate bundles, instead of scanning every bundle and all of their metadata.
+
+The index only ever rules bundles out: search_bundles still applies the original LIKE clause to
+the candidates, so results don't depend on whether the index is used.
+"""
+from sqlalchemy import and_, func, select
+
+from codalab.model.tables import bundle_search_ngram as cl_bundle_search_ngram
+
+# Number of characters in an n-gram.
+NGRAM_LENGTH = 3
+
+
+def get_ngrams(text):
+    """
+    Returns the set of n-grams of |text|.
+    """
+    text = text.lower()
+    return set(text[i : i + NGRAM_LENGTH] for i in range(len(text) - NGRAM_LENGTH + 1))
+
+
+def get_pattern_ngrams(pattern):
+    """
+    Returns the set of n-grams that any string matching the LIKE pattern |pattern| contains, or
+    None if the pattern can't be narrowed down by n-grams.
+    """
+    if '\\' in pattern:
+        # MySQL treats backslashes as escapes, so the characters of the pattern aren't
+        # necessarily in the matching strings.
+        return None
+    ngrams = set()
+    for literal in pattern.replace('_', '%').split('%'):
+        ngrams |= get_ngrams(literal)
+    return ngrams or None
+
+
+class SearchIndex(object):
+    # Metadata keys whose values are indexed, along with the uuid and command.
+    METADATA_KEYS = ('name', 'description', 'tags')
+    # Searches matching more candidates than this aren't narrowed down enough to use the index.
+    MAX_CANDIDATES = 1000
+    # Maximum number of bundles with the rarest n-gram of a search that are looked through.
+    MAX_SCANNED = 50000
+    # Maximum number of n-grams of a search that candidates are checked against.
+    MAX_NGRAMS = 8
+
+    def __init__(self, engine):
+        self._engine = engine
+        # Whether search_bundles uses the index. The index is kept up to date regardless.
+        self.enabled = True
+
+    @classmethod
+    def get_texts(cls, bundle_value):
+        """
+        Returns the indexed strings of the bundle whose serialized form (see Bundle.to_dict) is
+        |bundle_value|.
+        """
+        texts = [bundle_value['uuid']]
+        if bundle_value.get('command'):
+            texts.append(bundle_value['command'])
+        for row in bundle_value['metadata']:
+            if row['metadata_key'] in cls.METADATA_KEYS:
+                texts.append(row['metadata_value'])
+        return texts
+
+    def add(self, connection, uuid, texts):
+        """
+        Index the strings |texts| of the bundle |uuid|, as part of the ongoing transaction on
+        |connection|.
+        """
+        ngrams = set()
+        for text in texts:
+            ngrams |= get_ngrams(text)
+        if ngrams:
+            connection.execute(
+                cl_bundle_search_ngram.insert(),
+                [{'bundle_uuid': uuid, 'ngram': ngram} for ngram in sorted(ngrams)],
+            )
+
+    def replace(self, connection, uuid, texts):
+        """
+        Replace the indexed strings of the bundle |uuid| with |texts|.
+        """
+        self.remove(connection, [uuid])
+        self.add(connection, uuid, texts)
+
+    def remove(self, connection, uuids):
+        """
+        Remove the bundles |uuids| from the index.
+        """
+        connection.execute(
+            cl_bundle_search_ngram.delete().where(cl_bundle_search_ngram.c.bundle_uuid.in_(uuids))
+        )
+
+    def get_candidates(self, pattern):
+        """
+        Returns the set of uuids of the bundles whose indexed strings could match the LIKE
+        pattern |pattern|, or None if the index can't narrow down the search (e.g. because the
+        pattern is too short or too common), in which case every bundle is a candidate.
+        """
+        if not self.enabled:
+            return None
+        ngrams = get_pattern_ngrams(pattern)
+        if ngrams is None:
+            return None
+        with self._engine.begin() as connection:
+            # Find the n-gram with the fewest bundles, counting each n-gram only up to the
+            # fewest bundles of the n-grams before it.
+            rarest_ngram, rarest_count = None, self.MAX_SCANNED + 1
+            for ngram in sorted(ngrams):
+                rows = (
+                    select([cl_bundle_search_ngram.c.id])
+                    .where(cl_bundle_search_ngram.c.ngram == ngram)
+                    .limit(rarest_count)
+                    .alias()
+                )
+                count = connection.execute(select([func.count()]).select_from(rows)).scalar()
+                if count < rarest_count:
+                    rarest_ngram, rarest_count = ngram, count
+                if count == 0:
+                    return set()
+            if rarest_ngram is None:
+                return None
+            ngrams = [rarest_ngram] + sorted(ngrams - {rarest_ngram})[: self.MAX_NGRAMS - 1]
+            # Look up each bundle with the rarest n-gram in the index of each other n-gram.
+            tables = [cl_bundle_search_ngram.alias('ngram%d' % i) for i in range(len(ngrams))]
+            query = select([tables[0].c.bundle_uuid]).where(tables[0].c.ngram == ngrams[0])
+            for table, ngram in zip(tables[1:], ngrams[1:]):
+                query = query.where(
+                    and_(table.c.ngram == ngram, table.c.bundle_uuid == tables[0].c.bundle_uuid)
+                )
+            candidates = set(
+                row.bundle_uuid for row in connection.execute(query.limit(self.MAX_CANDIDATES + 1))
+            )
+        if len(candidates) > self.MAX_CANDIDATES:
+            return None
+        return candidates
@@ -52,6 +52,10 @@ bundle = Table(
     Column(
         'is_dir', Boolean, nullable=True,
     ),  # Whether the bundle is a directory or just a single file. If set to null, nothing has been uploaded for the bundle yet.
+    # Copy of the bundle's rows in bundle_metadata as a JSON list of [metadata_key, metadata_value]
+    # pairs, so that bundles can be loaded without querying bundle_metadata. Kept in sync with
+    # bundle_metadata, which is still used for searching. NULL if the bundle hasn't been backfilled.
+    Column('metadata_json', Text(2 ** 24 - 1), nullable=True),
     UniqueConstraint('uuid', name='uix_1'),
     Index('bundle_data_hash_index', 'data_hash'),
     Index('state_index', 'state'),  # Needed for the bundle manager.
@@ -93,6 +97,47 @@ bundle_dependency = Table(
     Column('parent_path', Text, nullable=False),
 )
 
+# Transitive closure of bundle_dependency: a row for each bundle and each of its ancestors, with
+# the smallest number of dependencies between them, so that the lineage of a bundle is one query.
+# Maintained by BundleModel when bundles are saved and deleted. Like bundle_dependency, ancestors
+# need not be in the system, and rows of deleted ancestors are kept.
+bundle_lineage = Table(
+    'bundle_lineage',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('ancestor_uuid', String(63), nullable=False),
+    Column('descendant_uuid', String(63), nullable=False),
+    Column('depth', Integer, nullable=False),
+    Index('bundle_lineage_ancestor_index', 'ancestor_uuid', 'depth'),
+    Index('bundle_lineage_descendant_index', 'descendant_uuid', 'depth'),
+)
+
+# Search index of bundles: a row for each distinct lowercased trigram of the uuid, command, name,
+# description and tags of each bundle, so that substring searches on these fields only look at
+# the bundles that have every trigram of the searched string. Maintained by BundleModel (see
+# search_index.py).
+bundle_search_ngram = Table(
+    'bundle_search_ngram',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('bundle_uuid', String(63), nullable=False),
+    Column('ngram', String(3), nullable=False),
+    Index('bundle_search_ngram_index', 'ngram', 'bundle_uuid'),
+    Index('bundle_search_ngram_bundle_index', 'bundle_uuid'),
+)
+
 # The worksheet table does not have many columns now, but it will eventually
 # include columns for owner, group, permissions, etc.
 worksheet = Table(
@@ -242,6 +287,46 @@ group_object_permission = Table(
     Column('permission', Integer, nullable=False),
 )
 
+# Effective permissions of users on bundles through the groups they are members of (not
+# counting the public group, which everyone is implicitly in): a row for each user and bundle
+# with the highest permission of the user's groups on it. Maintained by BundleModel whenever
+# group permissions or memberships change, and used to resolve permissions when the
+# permission_view server option is on.
+user_bundle_permission = Table(
+    'user_bundle_permission',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('user_id', String(63), nullable=False),
+    Column('object_uuid', String(63), nullable=False),
+    Column('permission', Integer, nullable=False),
+    Index('user_bundle_permission_user_index', 'user_id', 'object_uuid'),
+    Index('user_bundle_permission_object_index', 'object_uuid'),
+)
+
+# Like user_bundle_permission, for worksheets.
+user_object_permission = Table(
+    'user_object_permission',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('user_id', String(63), nullable=False),
+    Column('object_uuid', String(63), nullable=False),
+    Column('permission', Integer, nullable=False),
+    Index('user_object_permission_user_index', 'user_id', 'object_uuid'),
+    Index('user_object_permission_object_index', 'object_uuid'),
+)
+
 # A permission value is one of the following: none (0), read (1), or all (2).
 GROUP_OBJECT_PERMISSION_NONE = 0x00
 GROUP_OBJECT_PERMISSION_READ = 0x01
@@ -445,6 +530,9 @@ worker = Table(
         'exit_after_num_runs', Integer, nullable=False
     ),  # Number of jobs allowed to run on worker.
     Column('is_terminating', Boolean, nullable=False),
+    # JSON list of the optional messages the worker handles (e.g. batch_read). NULL for workers
+    # that predate them.
+    Column('capabilities', Text, nullable=True),
 )
 
 # Store information about all sockets currently allocated to each worker.
@@ -480,3 +568,44 @@ worker_dependency = Table(
     # See WorkerModel for the serialization method.
     Column('dependencies', LargeBinary, nullable=False),
 )
+
+# Append-only log of changes the bundle manager should react to (bundles changing
+# state, workers joining or changing capacity). Rows are written in the same
+# transaction as the change itself and consumed and pruned by the bundle manager.
+change_log = Table(
+    'change_log',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('kind', String(63), nullable=False),  # Kind of object that changed (see ChangeKind).
+    Column('object_id', String(127), nullable=False),  # Bundle uuid or worker_id.
+    Column('date_created', DateTime, nullable=False),
+)
+
+# Messages to worker sockets, used by DatabaseMessageBus (see message_bus.py) instead of Unix
+# domain sockets so that REST servers and workers don't need to share a host. A JSON message
+# is a single row; a stream is a sequence of rows with the same message_id, ending with an
+# empty row with is_last set. Readers delete rows as they consume them.
+worker_message = Table(
+    'worker_message',
+    db_metadata,
+    Column(
+        'id',
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        nullable=False,
+        autoincrement=True,
+    ),
+    Column('socket_id', Integer, nullable=False),
+    Column('message_id', String(63), nullable=False),
+    Column('data', LargeBinary(2 ** 24 - 1), nullable=False),
+    Column('is_last', Boolean, nullable=False),
+    Column('date_created', DateTime, nullable=False),
+    Index('worker_message_socket_id_index', 'socket_id'),
+    Index('worker_message_message_id_index', 'message_id'),
+)
@@ -1,6 +1,10 @@
 """
 Some utility classes and methods used with the CodaLab bundle model.
 """
+import base64
+import json
+
+from codalab.common import UsageError
 
 
 class LikeQuery(str):
@@ -8,3 +12,25 @@ class LikeQuery(str):
     Used for a string that should be used to construct a LIKE clause instead of
     an equality clause in make_bundle_clause.
     """
+
+
+def encode_search_cursor(values):
+    """
+    Returns the cursor of a keyset-paginated search that resumes after the row whose sort
+    values (see BundleModel.search_bundles) are |values|. Cursors are search keyword values,
+    so they don't contain commas, dots or equal signs.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(cursor):
+    """
+    Returns the sort values of the cursor |cursor| returned by encode_search_cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise UsageError('Invalid cursor: %s' % cursor)
+    if not isinstance(values, list):
+        raise UsageError('Invalid cursor: %s' % cursor)
+    return values
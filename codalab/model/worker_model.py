@@ -1,14 +1,11 @@
-from contextlib import closing
 import datetime
 import json
 import logging
-import os
-import socket
-import time
 
 from sqlalchemy import and_, select
 
-from codalab.common import precondition
+from codalab.model.change_log import ChangeKind
+from codalab.model.message_bus import UnixSocketMessageBus
 from codalab.model.tables import (
     worker as cl_worker,
     group as cl_group,
@@ -27,15 +24,32 @@ class WorkerModel(object):
 
     1) It is used to add, remove and query information about workers.
     2) It is used for communication with the workers. This communication happens
-       through Unix domain sockets stored in a special directory. This class
-       provides methods to allocate sockets (i.e. figure out unique paths in the
-       socket directory), clean up sockets (i.e. delete the socket files),
-       listen on these sockets for messages and send messages to these sockets.
+       through a message bus (see message_bus.py), by default Unix domain sockets
+       stored in a special directory. This class provides methods to allocate
+       sockets (i.e. unique socket IDs), clean up sockets, listen on these sockets
+       for messages and send messages to these sockets.
     """
 
-    def __init__(self, engine, socket_dir):
+    # Worker columns that affect where runs can be scheduled. A change in any of these (or in
+    # the worker's cached dependencies) is recorded in the change log so that the bundle
+    # manager reschedules.
+    SCHEDULING_COLUMNS = (
+        'tag',
+        'cpus',
+        'gpus',
+        'memory_bytes',
+        'free_disk_bytes',
+        'shared_file_system',
+        'tag_exclusive',
+        'exit_after_num_runs',
+        'is_terminating',
+        'group_uuid',
+    )
+
+    def __init__(self, engine, socket_dir, change_log=None, message_bus=None):
         self._engine = engine
-        self._socket_dir = socket_dir
+        self._change_log = change_log
+        self._message_bus = message_bus or UnixSocketMessageBus(socket_dir)
 
     def worker_checkin(
         self,
@@ -52,10 +66,14 @@ class WorkerModel(object):
         tag_exclusive,
         exit_after_num_runs,
         is_terminating,
+        capabilities=None,
     ):
         """
         Adds the worker to the database, if not yet there. Returns the socket ID
         that the worker should listen for messages on.
+
+        |capabilities| is the list of optional messages the worker handles (e.g. batch_read),
+        or None for workers that don't report them.
         """
         with self._engine.begin() as conn:
             worker_row = {
@@ -69,6 +87,7 @@ class WorkerModel(object):
                 'tag_exclusive': tag_exclusive,
                 'exit_after_num_runs': exit_after_num_runs,
                 'is_terminating': is_terminating,
+                'capabilities': self._serialize_capabilities(capabilities),
             }
 
             # Populate the group for this worker, if group_name is valid
@@ -97,9 +116,22 @@ class WorkerModel(object):
                 )
                 conn.execute(cl_worker.insert().values(worker_row))
 
+            changed = not existing_row or any(
+                existing_row[column] != worker_row.get(column) for column in self.SCHEDULING_COLUMNS
+            )
+
             # Update dependencies
             blob = self._serialize_dependencies(dependencies).encode()
             if existing_row:
+                existing_blob = conn.execute(
+                    select([cl_worker_dependency.c.dependencies]).where(
+                        and_(
+                            cl_worker_dependency.c.user_id == user_id,
+                            cl_worker_dependency.c.worker_id == worker_id,
+                        )
+                    )
+                ).scalar()
+                changed = changed or existing_blob != blob
                 conn.execute(
                     cl_worker_dependency.update()
                     .where(
@@ -117,8 +149,100 @@ class WorkerModel(object):
                     )
                 )
 
+            if self._change_log is not None and changed:
+                self._change_log.record(ChangeKind.WORKER, worker_id, conn)
+
         return socket_id
 
+    def worker_heartbeat(self, user_id, worker_id, changes):
+        """
+        Records a check-in from a worker that is already in the database, updating only
+        checkin_time and the columns in |changes|, a dict that maps the worker_checkin
+        arguments that changed since the last check-in (e.g. 'cpus', 'group_name' or
+        'dependencies') to their new values.
+
+        Returns the socket ID that the worker should listen for messages on, or None if the
+        worker isn't in the database (e.g. because it was cleaned up as dead), in which case
+        it should check in with all its information again.
+        """
+        with self._engine.begin() as conn:
+            existing_row = conn.execute(
+                cl_worker.select().where(
+                    and_(cl_worker.c.user_id == user_id, cl_worker.c.worker_id == worker_id)
+                )
+            ).fetchone()
+            if not existing_row:
+                return None
+
+            worker_row = {
+                column: changes[column]
+                for column in (
+                    'tag',
+                    'cpus',
+                    'gpus',
+                    'memory_bytes',
+                    'free_disk_bytes',
+                    'shared_file_system',
+                    'tag_exclusive',
+                    'exit_after_num_runs',
+                    'is_terminating',
+                )
+                if column in changes
+            }
+            if 'capabilities' in changes:
+                worker_row['capabilities'] = self._serialize_capabilities(changes['capabilities'])
+            worker_row['checkin_time'] = datetime.datetime.utcnow()
+            if 'group_name' in changes:
+                group_row = conn.execute(
+                    cl_group.select().where(cl_group.c.name == changes['group_name'])
+                ).fetchone()
+                if group_row:
+                    worker_row['group_uuid'] = group_row.uuid
+            conn.execute(
+                cl_worker.update()
+                .where(and_(cl_worker.c.user_id == user_id, cl_worker.c.worker_id == worker_id))
+                .values(worker_row)
+            )
+
+            # Workers only send their dependencies when they changed.
+            if self._change_log is not None and (
+                'dependencies' in changes
+                or any(
+                    column in worker_row and existing_row[column] != worker_row[column]
+                    for column in self.SCHEDULING_COLUMNS
+                )
+            ):
+                self._change_log.record(ChangeKind.WORKER, worker_id, conn)
+
+            if 'dependencies' in changes:
+                conn.execute(
+                    cl_worker_dependency.update()
+                    .where(
+                        and_(
+                            cl_worker_dependency.c.user_id == user_id,
+                            cl_worker_dependency.c.worker_id == worker_id,
+                        )
+                    )
+                    .values(
+                        dependencies=self._serialize_dependencies(changes['dependencies']).encode()
+                    )
+                )
+
+        return existing_row.socket_id
+
+    def get_socket_id(self, user_id, worker_id):
+        """
+        Returns the socket ID that the worker listens for messages on, or None if the worker
+        isn't in the database.
+        """
+        with self._engine.begin() as conn:
+            row = conn.execute(
+                select([cl_worker.c.socket_id]).where(
+                    and_(cl_worker.c.user_id == user_id, cl_worker.c.worker_id == worker_id)
+                )
+            ).fetchone()
+        return row and row.socket_id
+
     @staticmethod
     def _serialize_dependencies(dependencies):
         return json.dumps(dependencies, separators=(',', ':'))
@@ -127,6 +251,14 @@ class WorkerModel(object):
     def _deserialize_dependencies(blob):
         return list(map(tuple, json.loads(blob)))
 
+    @staticmethod
+    def _serialize_capabilities(capabilities):
+        return None if capabilities is None else json.dumps(sorted(capabilities))
+
+    @staticmethod
+    def _deserialize_capabilities(blob):
+        return json.loads(blob) if blob else []
+
     def worker_cleanup(self, user_id, worker_id):
         """
         Deletes the worker and all associated data from the database as well
@@ -206,6 +338,7 @@ class WorkerModel(object):
                 'tag_exclusive': row.tag_exclusive,
                 'exit_after_num_runs': row.exit_after_num_runs,
                 'is_terminating': row.is_terminating,
+                'capabilities': self._deserialize_capabilities(row.capabilities),
             }
             for row in worker_rows
         }
@@ -256,38 +389,25 @@ class WorkerModel(object):
 
     def deallocate_socket(self, socket_id):
         """
-        Cleans up the socket, removing the associated file in the socket
+        Cleans up the socket, e.g. removing the associated file in the socket
         directory.
         """
         self._cleanup_socket(socket_id)
         with self._engine.begin() as conn:
             conn.execute(cl_worker_socket.delete().where(cl_worker_socket.c.socket_id == socket_id))
 
-    def _socket_path(self, socket_id):
-        return os.path.join(self._socket_dir, str(socket_id))
-
     def _cleanup_socket(self, socket_id):
-        try:
-            os.remove(self._socket_path(socket_id))
-        except OSError:
-            pass
+        self._message_bus.cleanup(socket_id)
 
     def start_listening(self, socket_id):
         """
-        Returns a Python socket object that can be used to accept connections on
-        the socket with the given ID. This object should be passed to the
-        get_ methods below. as in:
+        Returns a listener that can be used to receive messages sent to the socket with the
+        given ID. This object should be passed to the get_ methods below, as in:
 
             with closing(worker_model.start_listening(socket_id)) as sock:
                 message = worker_model.get_json_message(sock, timeout_secs)
         """
-        self._cleanup_socket(socket_id)
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.bind(self._socket_path(socket_id))
-        sock.listen(0)
-        return sock
-
-    ACK = b'a'
+        return self._message_bus.start_listening(socket_id)
 
     def get_stream(self, sock, timeout_secs):
         """
@@ -296,19 +416,7 @@ class WorkerModel(object):
 
         If no messages are received within timeout_secs seconds, returns None.
         """
-        sock.settimeout(timeout_secs)
-        try:
-            conn, _ = sock.accept()
-            # Send Ack. This helps protect from messages to the worker being
-            # lost due to spuriously accepted connections when the socket
-            # file is deleted.
-            conn.sendall(WorkerModel.ACK)
-            conn.settimeout(None)  # Need to remove timeout before makefile.
-            fileobj = conn.makefile('rb')
-            conn.close()
-            return fileobj
-        except socket.timeout:
-            return None
+        return self._message_bus.get_stream(sock, timeout_secs)
 
     def get_json_message(self, sock, timeout_secs):
         """
@@ -317,45 +425,16 @@ class WorkerModel(object):
 
         If no messages are received within timeout_secs seconds, returns None.
         """
-        fileobj = self.get_stream(sock, timeout_secs)
-
-        if fileobj is None:
-            return None
-
-        with closing(fileobj):
-            return json.loads(fileobj.read().decode())
+        return self._message_bus.get_json_message(sock, timeout_secs)
 
     def send_stream(self, socket_id, fileobj, timeout_secs):
         """
         Streams the given file-like object to the given socket.
 
-        If nothing accepts a connection on the socket for more than timeout_secs,
-        return False. Otherwise, returns True.
+        If the message isn't received within timeout_secs, return False.
+        Otherwise, returns True.
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout_secs:
-            with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
-                sock.settimeout(timeout_secs)
-
-                success = False
-                try:
-                    sock.connect(self._socket_path(socket_id))
-                    success = sock.recv(len(WorkerModel.ACK)) == WorkerModel.ACK
-                except socket.error:
-                    pass
-
-                if not success:
-                    # Shouldn't be too expensive just to keep retrying.
-                    time.sleep(0.003)
-                    continue
-
-                while True:
-                    data = fileobj.read(4096)
-                    if not data:
-                        return True
-                    sock.sendall(data)
-
-        return False
+        return self._message_bus.send_stream(socket_id, fileobj, timeout_secs)
 
     def send_json_message(self, socket_id, message, timeout_secs, autoretry=True):
         """
@@ -366,54 +445,9 @@ class WorkerModel(object):
         False. Otherwise, returns True.
 
         Note, only the worker should call this method with autoretry set to
-        False. See comments below.
+        False (see UnixSocketMessageBus).
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout_secs:
-            with closing(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)) as sock:
-                sock.settimeout(timeout_secs)
-
-                success = False
-                try:
-                    sock.connect(self._socket_path(socket_id))
-                    if autoretry:
-                        # This auto retry mechanisms helps ensure that messages
-                        # sent to a worker are received more reliably. The
-                        # socket API isn't particularly robust to our usage
-                        # where we continuously start and stop listening on a
-                        # socket, like the worker checkin mechanism does. In
-                        # fact, it seems to spuriously accept connections
-                        # just when a socket object is in the process of being
-                        # destroyed. On the sending end, such a scenario results
-                        # in a "Broken pipe" exception, which we catch here.
-                        success = sock.recv(len(WorkerModel.ACK)) == WorkerModel.ACK
-                    else:
-                        success = True
-                except socket.error:
-                    pass
-
-                if not success:
-                    # Shouldn't be too expensive just to keep retrying.
-                    # TODO: maybe exponential backoff
-                    time.sleep(
-                        0.3
-                    )  # changed from 0.003 to keep from rate-limiting due to dead workers
-                    continue
-
-                if not autoretry:
-                    # When messages are being sent from the worker, we don't
-                    # have the problem with "Broken pipe" as above, since
-                    # code waiting for a reply shouldn't just abruptly stop
-                    # listening.
-                    precondition(
-                        sock.recv(len(WorkerModel.ACK)) == WorkerModel.ACK,
-                        'Received invalid ack on socket.',
-                    )
-
-                sock.sendall(json.dumps(message).encode())
-                return True
-
-        return False
+        return self._message_bus.send_json_message(socket_id, message, timeout_secs, autoretry)
 
     def has_reply_permission(self, user_id, worker_id, socket_id):
         """
@@ -276,9 +276,12 @@ def reset_password():
         return redirect_with_query('/account/reset/verified', {'code_valid': False})
 
     # Update user password
-    user_info = local.model.get_user_info(user_id)
-    user_info['password'] = (User.encode_password(password, crypt_util.get_random_string()),)
-    local.model.update_user_info(user_info)
+    local.model.update_user_info(
+        {
+            'user_id': user_id,
+            'password': (User.encode_password(password, crypt_util.get_random_string()),),
+        }
+    )
 
     return redirect('/account/reset/complete')
 
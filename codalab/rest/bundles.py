@@ -1,4 +1,6 @@
+import base64
 import http.client
+import json
 import logging
 import mimetypes
 import os
@@ -16,6 +18,7 @@ from codalab.common import StorageType, precondition, UsageError, NotFoundError
 from codalab.lib import canonicalize, spec_util, worksheet_util, bundle_util
 from codalab.lib.beam.filesystems import LOCAL_USING_AZURITE
 from codalab.lib.server_util import (
+    RequestSlots,
     RequestSource,
     bottle_patch as patch,
     get_request_source,
@@ -46,6 +49,29 @@ from codalab.worker.download_util import BundleTarget
 
 logger = logging.getLogger(__name__)
 
+# Number of bundles that are read from the database at a time when streaming search results.
+STREAM_PAGE_SIZE = 1000
+
+# Number of seconds that running bundles are followed for at a time when following their contents,
+# after which their state is checked again.
+FOLLOW_TIMEOUT_SECS = 5
+
+# Number of seconds to wait between checks of the state of bundles that haven't started running
+# when following their contents.
+FOLLOW_POLL_SECS = 1
+
+# Number of seconds after which the state of bundles is sent again when nothing else has been sent
+# when following their contents, so that the connection doesn't time out.
+FOLLOW_KEEPALIVE_SECS = 60
+
+# Number of seconds after which the stream is ended when following the contents of bundles, so
+# that followers don't hold the threads of the server forever. Clients then follow again.
+FOLLOW_MAX_SECS = 10 * 60
+
+# Requests following the contents of bundles that are streaming for up to FOLLOW_MAX_SECS (see
+# _follow_bundle_contents()).
+_followers = RequestSlots()
+
 
 @get('/bundles/<uuid:re:%s>' % spec_util.UUID_STR, apply=ProtectedPlugin())
 def _fetch_bundle(uuid):
@@ -92,9 +118,16 @@ def _fetch_bundles():
         - `.floating              ` : Match bundles that aren't on any worksheet.
         - `.count                 ` : Count the number of bundles.
         - `.limit=10              ` : Limit the number of results to the top 10.
+        - `.cursor                ` : Return the first page of `.limit` results and the
+                                      cursor of the next page (see below).
+        - `.cursor=<cursor>       ` : Return the page of results after the cursor.
      - `include_display_metadata`: `1` to include additional metadata helpful
        for displaying the bundle info, `0` to omit them. Default is `0`.
      - `include`: comma-separated list of related resources to include, such as "owner"
+     - `stream`: `1` to stream the bundles matching the search keywords as newline-delimited
+       JSON (`application/x-ndjson`), one document per bundle in the format of
+       `GET /bundles/<uuid>`. `.limit` is then the total number of bundles, all of them by
+       default. Default is `0`.
 
     When aggregation keywords such as `.count` are used, the resulting value
     is returned as:
@@ -105,6 +138,18 @@ def _fetch_bundles():
         }
     }
     ```
+    With `.cursor`, the cursor of the next page is returned in `meta`, or `null` on the last
+    page:
+    ```
+    {
+        "data": [...],
+        "meta": {
+            "next_cursor": <cursor>
+        }
+    }
+    ```
+    Unlike `.offset`, which makes the database skip all the results of the previous pages,
+    cursors start right after the last result of the previous page.
     2. By bundle `command` and/or `dependencies` (for `--memoized` option in cl [run/mimic] command).
     When `dependencies` is not defined, the searching result will include bundles that match with command only.
 
@@ -124,15 +169,20 @@ def _fetch_bundles():
     command = query_get_type(str, 'command', '')
     dependencies = query_get_type(str, 'dependencies', '[]')
 
+    meta = {}
     if keywords:
         # Handle search keywords
         keywords = resolve_owner_in_keywords(keywords)
+        if query_get_bool('stream', default=False):
+            return stream_bundles(keywords)
         search_result = local.model.search_bundles(request.user.user_id, keywords)
         # Return simple dict if scalar result (e.g. .sum or .count queries)
         if search_result['is_aggregate']:
             return json_api_meta({}, {'result': search_result['result']})
         # If not aggregate this is a list
         bundle_uuids = search_result['result']
+        if 'next_cursor' in search_result:
+            meta['next_cursor'] = search_result['next_cursor']
     elif specs:
         # Resolve bundle specs
         bundle_uuids = canonicalize.get_bundle_uuids(
@@ -150,7 +200,77 @@ def _fetch_bundles():
     if descendant_depth is not None:
         bundle_uuids = local.model.get_self_and_descendants(bundle_uuids, depth=descendant_depth)
 
-    return build_bundles_document(bundle_uuids)
+    document = build_bundles_document(bundle_uuids)
+    if meta:
+        json_api_meta(document, meta)
+    return document
+
+
+def stream_bundles(keywords):
+    """
+    Returns the bundles matching the search keywords as newline-delimited JSON documents (see
+    _fetch_bundles). Bundles are fetched STREAM_PAGE_SIZE at a time with keyset pagination, so
+    that memory use doesn't grow with the number of results.
+    """
+    user_id = request.user.user_id
+    limit = None
+    cursor = ''
+    search_keywords = []
+    for keyword in keywords:
+        key, _, value = keyword.partition('=')
+        if key == '.limit':
+            limit = int(value)
+        elif key == '.cursor':
+            cursor = value
+        else:
+            search_keywords.append(keyword)
+
+    def search(cursor, limit):
+        page_size = STREAM_PAGE_SIZE if limit is None else min(limit, STREAM_PAGE_SIZE)
+        return local.model.search_bundles(
+            user_id, search_keywords + ['.cursor=' + cursor, '.limit=%d' % page_size]
+        )
+
+    search_result = search(cursor, limit)
+    if search_result['is_aggregate']:
+        return json_api_meta({}, {'result': search_result['result']})
+
+    def generate(search_result, limit):
+        while True:
+            if search_result['result']:
+                for document in split_bundles_document(
+                    build_bundles_document(search_result['result'])
+                ):
+                    yield json.dumps(document) + '\n'
+            if limit is not None:
+                limit -= len(search_result['result'])
+            if not search_result['next_cursor'] or limit == 0:
+                break
+            search_result = search(search_result['next_cursor'], limit)
+
+    response.content_type = 'application/x-ndjson'
+    return generate(search_result, limit)
+
+
+def split_bundles_document(document):
+    """
+    Splits a document of several bundles into one document per bundle, each with the included
+    resources that the bundle refers to.
+    """
+    included = {
+        (resource['type'], resource['id']): resource for resource in document.get('included', [])
+    }
+    for data in document['data']:
+        keys = []
+        for relationship in data.get('relationships', {}).values():
+            linkage = relationship.get('data')
+            for ref in linkage if isinstance(linkage, list) else [linkage]:
+                if ref is not None and (ref['type'], ref['id']) in included:
+                    keys.append((ref['type'], ref['id']))
+        bundle_document = {'data': data}
+        if keys:
+            bundle_document['included'] = [included[key] for key in dict.fromkeys(keys)]
+        yield bundle_document
 
 
 def build_bundles_document(bundle_uuids):
@@ -426,6 +546,36 @@ def _fetch_locations():
     return dict(data=uuids_to_locations)
 
 
+@get('/bundles/lineage', apply=ProtectedPlugin())
+def _fetch_bundles_lineage():
+    """
+    Fetch bundles together with their lineage in one request: the bundles that depend on them,
+    directly or not (descendants), and the bundles that any of those depend on (ancestors).
+
+    Query parameters:
+
+     - `uuids`: UUIDs of the bundles. May be provided multiple times.
+     - `descendant_depth`: number of dependencies to follow down from the bundles. Default is 0.
+     - `ancestor_depth`: number of dependencies to follow up from the bundles and their
+       descendants. Default is 0.
+     - `include_display_metadata` and `include`: as for `GET /bundles`.
+
+    Bundles are returned in the same format as `GET /bundles`, ancestors first (farthest first),
+    then the given bundles, then their descendants (closest first). The dependencies of each
+    bundle are the edges of the graph.
+    """
+    bundle_uuids = query_get_list('uuids')
+    descendant_depth = query_get_type(int, 'descendant_depth', 0)
+    ancestor_depth = query_get_type(int, 'ancestor_depth', 0)
+    bundle_uuids = local.model.get_self_and_descendants(bundle_uuids, depth=descendant_depth)
+    ancestors = local.model.get_ancestor_depths(bundle_uuids, depth=ancestor_depth)
+    for uuid in bundle_uuids:
+        ancestors.pop(uuid, None)
+    return build_bundles_document(
+        sorted(ancestors, key=lambda uuid: -ancestors[uuid]) + bundle_uuids
+    )
+
+
 @get('/bundles/<uuid:re:%s>/contents/info/' % spec_util.UUID_STR, name='fetch_bundle_contents_info')
 @get(
     '/bundles/<uuid:re:%s>/contents/info/<path:path>' % spec_util.UUID_STR,
@@ -454,7 +604,8 @@ def _fetch_bundle_contents_info(uuid, path=''):
                 <each file of directory represented recursively with the same schema>
               },
               ...
-          ]
+          ],
+          "data_hash": "<data hash of the bundle, once its contents are final>"
       }
     }
     ```
@@ -470,6 +621,8 @@ def _fetch_bundle_contents_info(uuid, path=''):
         # Object is not JSON serializable so submit its dict in API response
         # The client is responsible for deserializing it
         info['resolved_target'] = info['resolved_target'].__dict__
+        # Workers share the contents of dependencies with the same data hash.
+        info['data_hash'] = local.model.get_bundle_data_hashes([uuid]).get(uuid)
     except NotFoundError as e:
         abort(http.client.NOT_FOUND, str(e))
     except Exception as e:
@@ -769,6 +922,98 @@ def _fetch_bundle_contents_blob(uuid, path=''):
     return fileobj
 
 
+@get(
+    '/bundles/<uuid:re:%s>/contents/follow/' % spec_util.UUID_STR,
+    name='follow_bundle_contents',
+    apply=ProtectedPlugin(),
+)
+def _follow_bundle_contents(uuid):
+    """
+    API to follow files of a bundle as they are appended to, and the state of the bundle as it
+    changes, until the bundle is in a final state and the files have been read to the end.
+
+    Query parameters:
+    - `subpath`: path of a file in the bundle to follow. Can be repeated to follow several files.
+    - `offset`: offset in bytes to start following each file from, in the same order as the
+      subpaths. Negative offsets are relative to the end of the file. Default is 0.
+
+    The response is streamed as newline-delimited JSON (`application/x-ndjson`), with one event
+    per line. The first event is the state of the bundle, and the last one is its final state.
+    The state is sent again whenever it changes, or when nothing has been sent for a minute.
+    ```
+    {"type": "state", "state": "<state of the bundle>"}
+    {"type": "data", "subpath": "<subpath>", "offset": <offset>, "data": "<base64 encoded bytes>"}
+    ```
+
+    Since each stream takes up a thread of the server, each process only streams to
+    "max_followers" (in the server config) clients at a time, for up to 10 minutes each.
+    Other requests read the files to their current end once and end the stream. Clients
+    should follow the bundle again from the offsets they have read to whenever the stream
+    ends before the bundle is in a final state.
+    """
+    subpaths = query_get_list('subpath')
+    offsets = [int(offset) for offset in query_get_list('offset')] or [0] * len(subpaths)
+    if len(offsets) != len(subpaths):
+        abort(http.client.BAD_REQUEST, 'There must be one offset per subpath.')
+    check_bundles_have_read_permission(local.model, request.user, [uuid])
+
+    # Negative offsets are resolved now, so that the files are followed from where they end now.
+    offsets = dict(zip(subpaths, offsets))
+    for subpath, offset in offsets.items():
+        if offset < 0:
+            try:
+                size = local.download_manager.get_target_info(BundleTarget(uuid, subpath), 0)[
+                    'size'
+                ]
+            except NotFoundError:
+                size = 0
+            offsets[subpath] = max(size + offset, 0)
+
+    max_followers = local.config.get('server', {}).get('max_followers', 10)
+    is_follower = _followers.acquire(max_followers)
+    deadline = time.time() + (FOLLOW_MAX_SECS if is_follower else 0)
+
+    def generate():
+        # Bottle starts the generator as soon as it is returned, so the slot is always released.
+        try:
+            state = None
+            last_sent = 0
+            while True:
+                new_state = local.model.get_bundle_state(uuid)
+                if new_state != state or time.time() - last_sent > FOLLOW_KEEPALIVE_SECS:
+                    state = new_state
+                    last_sent = time.time()
+                    yield json.dumps({'type': 'state', 'state': state}) + '\n'
+                if state == State.RUNNING or state in State.FINAL_STATES:
+                    # Once the bundle is in a final state, or the stream is about to end, the
+                    # files are read to the end one last time.
+                    timeout_secs = min(max(deadline - time.time(), 0), FOLLOW_TIMEOUT_SECS)
+                    if state in State.FINAL_STATES:
+                        timeout_secs = 0
+                    for subpath, offset, data in local.download_manager.follow_files(
+                        uuid, offsets, timeout_secs
+                    ):
+                        offsets[subpath] = offset + len(data)
+                        event = {
+                            'type': 'data',
+                            'subpath': subpath,
+                            'offset': offset,
+                            'data': base64.b64encode(data).decode(),
+                        }
+                        last_sent = time.time()
+                        yield json.dumps(event) + '\n'
+                if state in State.FINAL_STATES or time.time() >= deadline:
+                    break
+                if state != State.RUNNING:
+                    time.sleep(FOLLOW_POLL_SECS)
+        finally:
+            if is_follower:
+                _followers.release()
+
+    response.content_type = 'application/x-ndjson'
+    return generate()
+
+
 @put(
     '/bundles/<uuid:re:%s>/contents/blob/' % spec_util.UUID_STR,
     name='update_bundle_contents_blob',
@@ -800,40 +1045,230 @@ def _update_bundle_contents_blob(uuid):
       Default is False. If CODALAB_ALWAYS_USE_AZURE_BLOB_BETA is set, this parameter
       is disregarded, as Azure Blob Storage will always be used.
     """
+    bundle = _get_bundle_to_upload(uuid)
+    params = _get_upload_params()
+
+    def get_source():
+        source = None
+        if request.query.urls:
+            sources = query_get_list('urls')
+            if len(sources) != 1:
+                abort(http.client.BAD_REQUEST, "Exactly one url must be provided.")
+            source = sources[0]
+        # request without "filename" doesn't need to upload to bundle store
+        if request.query.filename:
+            filename = request.query.get('filename', default='contents')
+            source = (filename, request['wsgi.input'])
+        return source
+
+    _store_bundle_contents(bundle, get_source, params)
+
+
+@post(
+    '/bundles/<uuid:re:%s>/contents/uploads/' % spec_util.UUID_STR,
+    name='create_bundle_contents_upload',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _create_bundle_contents_upload(uuid):
+    """
+    Start a resumable upload of the contents of the given uploading bundle. The contents are
+    sent in numbered parts (see below), which can be sent in parallel and sent again if they
+    fail, and are stored once the upload is committed.
+
+    Query parameters: `filename`, `unpack`, `finalize_on_failure`, `finalize_on_success`,
+    `state_on_success` and `use_azure_blob_beta`, as for `PUT /bundles/<uuid>/contents/blob/`.
+
+    Response format:
+    ```
+    {
+      "data": {
+          "upload_id": "<id of the upload session>",
+          "bundle_uuid": "<uuid of the bundle>",
+          "parts": [{"number": <part number>, "size": <size>, "sha1": "<SHA-1 of part>"}, ...]
+      }
+    }
+    ```
+    """
+    _get_bundle_to_upload(uuid)
+    params = _get_upload_params()
+    params['filename'] = request.query.get('filename', default='contents')
+    params['unpack'] = query_get_bool('unpack', default=True)
+    session = local.upload_part_store.create_session(uuid, request.user.user_id, params)
+    return {'data': local.upload_part_store.get_session(session['upload_id'])}
+
+
+@get(
+    '/bundles/<uuid:re:%s>/contents/uploads/' % spec_util.UUID_STR,
+    name='fetch_bundle_contents_uploads',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _fetch_bundle_contents_uploads(uuid):
+    """
+    Fetch the resumable uploads of the contents of the given bundle that haven't been
+    committed, oldest first, with the parts received so far (same format as above).
+    """
+    check_bundles_have_all_permission(local.model, request.user, [uuid])
+    return {'data': local.upload_part_store.get_sessions(uuid)}
+
+
+@get(
+    '/bundles/<uuid:re:%s>/contents/uploads/<upload_id>' % spec_util.UUID_STR,
+    name='fetch_bundle_contents_upload',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _fetch_bundle_contents_upload(uuid, upload_id):
+    """
+    Fetch a resumable upload and the parts received so far (same format as above).
+    """
+    return {'data': _get_upload_session(uuid, upload_id)}
+
+
+@put(
+    '/bundles/<uuid:re:%s>/contents/uploads/<upload_id>/parts/<number:int>' % spec_util.UUID_STR,
+    name='update_bundle_contents_upload_part',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _update_bundle_contents_upload_part(uuid, upload_id, number):
+    """
+    Upload a part of a resumable upload, replacing the part with the same number if it was
+    already sent. Parts are numbered from 0, and the contents of the bundle are the
+    concatenation of the parts in order.
+
+    Query parameters:
+    - `sha1`: (optional) SHA-1 of the part, checked by the server.
+
+    Response format:
+    ```
+    {
+      "data": {"number": <part number>, "size": <size>, "sha1": "<SHA-1 of part>"}
+    }
+    ```
+    """
+    _get_upload_session(uuid, upload_id)
+    try:
+        part = local.upload_part_store.write_part(
+            upload_id, number, request['wsgi.input'], sha1=request.query.get('sha1') or None
+        )
+    except UsageError as e:
+        abort(http.client.BAD_REQUEST, str(e))
+    return {'data': part}
+
+
+@post(
+    '/bundles/<uuid:re:%s>/contents/uploads/<upload_id>/commit' % spec_util.UUID_STR,
+    name='commit_bundle_contents_upload',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _commit_bundle_contents_upload(uuid, upload_id):
+    """
+    Store the concatenation of the parts of a resumable upload as the contents of the bundle,
+    like `PUT /bundles/<uuid>/contents/blob/` would, and end the upload. The parts are deleted
+    even if storing the contents fails; if the bundle isn't finalized then, its contents can be
+    sent again with a new upload.
+
+    Query parameters:
+    - `num_parts`: number of parts of the upload, which must all have been received.
+    """
+    session = _get_upload_session(uuid, upload_id)
+    bundle = _get_bundle_to_upload(uuid)
+    num_parts = query_get_type(int, 'num_parts')
+    if num_parts is None or num_parts < 0:
+        abort(http.client.BAD_REQUEST, 'num_parts must be specified.')
+    try:
+        fileobj = local.upload_part_store.open_parts(upload_id, num_parts)
+    except UsageError as e:
+        abort(http.client.BAD_REQUEST, str(e))
+    params = session['params']
+    try:
+        _store_bundle_contents(bundle, lambda: (params['filename'], fileobj), params)
+    finally:
+        fileobj.close()
+        # Don't keep the parts of a failed commit until they expire.
+        local.upload_part_store.delete_session(upload_id)
+
+
+@delete(
+    '/bundles/<uuid:re:%s>/contents/uploads/<upload_id>' % spec_util.UUID_STR,
+    name='delete_bundle_contents_upload',
+    apply=AuthenticatedProtectedPlugin(),
+)
+def _delete_bundle_contents_upload(uuid, upload_id):
+    """
+    Abort a resumable upload and delete the parts received so far.
+    """
+    _get_upload_session(uuid, upload_id)
+    local.upload_part_store.delete_session(upload_id)
+
+
+#############################################################
+#  BUNDLE HELPER FUNCTIONS
+#############################################################
+
+
+def _get_bundle_to_upload(uuid):
+    """
+    Returns the bundle with the given uuid, checking that its contents can be uploaded by the
+    current user.
+    """
     check_bundles_have_all_permission(local.model, request.user, [uuid])
     bundle = local.model.get_bundle(uuid)
     if bundle.state in State.FINAL_STATES:
         abort(http.client.FORBIDDEN, 'Contents cannot be modified, bundle already finalized.')
+    return bundle
 
-    # Get and validate query parameters
-    finalize_on_failure = query_get_bool('finalize_on_failure', default=False)
-    finalize_on_success = query_get_bool('finalize_on_success', default=True)
-    use_azure_blob_beta = os.getenv("CODALAB_ALWAYS_USE_AZURE_BLOB_BETA") or query_get_bool(
-        'use_azure_blob_beta', default=False
-    )
-    final_state = request.query.get('state_on_success', default=State.READY)
-    if finalize_on_success and final_state not in State.FINAL_STATES:
+
+def _get_upload_params():
+    """
+    Returns the parameters of how to store uploaded contents from the query parameters (see
+    _update_bundle_contents_blob).
+    """
+    params = {
+        'git': query_get_bool('git', default=False),
+        'unpack': query_get_bool('unpack', default=True),
+        'finalize_on_failure': query_get_bool('finalize_on_failure', default=False),
+        'finalize_on_success': query_get_bool('finalize_on_success', default=True),
+        'state_on_success': request.query.get('state_on_success', default=State.READY),
+        'use_azure_blob_beta': bool(
+            os.getenv("CODALAB_ALWAYS_USE_AZURE_BLOB_BETA")
+            or query_get_bool('use_azure_blob_beta', default=False)
+        ),
+    }
+    if params['finalize_on_success'] and params['state_on_success'] not in State.FINAL_STATES:
         abort(
             http.client.BAD_REQUEST,
             'state_on_success must be one of %s' % '|'.join(State.FINAL_STATES),
         )
+    return params
+
+
+def _get_upload_session(uuid, upload_id):
+    """
+    Returns the resumable upload with the given id of the contents of the bundle with the given
+    uuid, checking that the current user can upload them.
+    """
+    check_bundles_have_all_permission(local.model, request.user, [uuid])
+    try:
+        session = local.upload_part_store.get_session(upload_id)
+    except NotFoundError as e:
+        abort(http.client.NOT_FOUND, str(e))
+    if session['bundle_uuid'] != uuid:
+        abort(http.client.NOT_FOUND, 'Upload %s not found' % upload_id)
+    return session
 
+
+def _store_bundle_contents(bundle, get_source, params):
+    """
+    Stores the contents of the bundle from the source returned by get_source() (see
+    UploadManager.upload_to_bundle_store), and updates the state of the bundle as params (see
+    _get_upload_params) say.
+    """
     # If this bundle already has data, remove it.
     if local.upload_manager.has_contents(bundle):
         local.upload_manager.cleanup_existing_contents(bundle)
 
     # Store the data.
     try:
-        source = None
-        if request.query.urls:
-            sources = query_get_list('urls')
-            if len(sources) != 1:
-                abort(http.client.BAD_REQUEST, "Exactly one url must be provided.")
-            source = sources[0]
-        # request without "filename" doesn't need to upload to bundle store
-        if request.query.filename:
-            filename = request.query.get('filename', default='contents')
-            source = (filename, request['wsgi.input'])
+        source = get_source()
         bundle_link_url = getattr(bundle.metadata, "link_url", None)
         if bundle_link_url:
             # Don't upload to bundle store if using --link, as the path
@@ -843,9 +1278,9 @@ def _update_bundle_contents_blob(uuid):
             local.upload_manager.upload_to_bundle_store(
                 bundle,
                 source=source,
-                git=query_get_bool('git', default=False),
-                unpack=query_get_bool('unpack', default=True),
-                use_azure_blob_beta=use_azure_blob_beta,
+                git=params['git'],
+                unpack=params['unpack'],
+                use_azure_blob_beta=params['use_azure_blob_beta'],
             )
             bundle_link_url = getattr(bundle.metadata, "link_url", None)
             bundle_location = bundle_link_url or local.bundle_store.get_bundle_location(bundle.uuid)
@@ -878,7 +1313,7 @@ def _update_bundle_contents_blob(uuid):
         # Workers also use this API endpoint to upload partial contents of
         # running bundles, and they should use finalize_on_failure=0 to avoid
         # letting transient errors during upload fail the bundles prematurely.
-        if finalize_on_failure:
+        if params['finalize_on_failure']:
             local.model.update_bundle(
                 bundle,
                 {
@@ -895,14 +1330,9 @@ def _update_bundle_contents_blob(uuid):
         abort(http.client.INTERNAL_SERVER_ERROR, msg)
 
     else:
-        if finalize_on_success:
+        if params['finalize_on_success']:
             # Upload succeeded: update state
-            local.model.update_bundle(bundle, {'state': final_state})
-
-
-#############################################################
-#  BUNDLE HELPER FUNCTIONS
-#############################################################
+            local.model.update_bundle(bundle, {'state': params['state_on_success']})
 
 
 def get_request_range():
@@ -1003,9 +1433,6 @@ def delete_bundles(uuids, force, recursive, data_only, dry_run):
             # Actually delete the bundle
             local.model.delete_bundles(relevant_uuids)
 
-        # Update user statistics
-        local.model.update_user_disk_used(request.user.user_id)
-
     # Delete the data.
     bundle_link_urls = local.model.get_bundle_metadata(relevant_uuids, "link_url")
     for uuid in relevant_uuids:
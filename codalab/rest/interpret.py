@@ -10,9 +10,12 @@ worksheet_util does not make any calls to the model, they are kind of just like
 static helper functions.
 """
 import base64
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from contextlib import closing
 from itertools import chain
 import json
+import threading
 import yaml
 from bottle import get, post, local, request, abort, httplib
 
@@ -32,7 +35,7 @@ from codalab.lib.worksheet_util import (
     get_command,
 )
 from codalab.model.tables import GROUP_OBJECT_PERMISSION_ALL
-from codalab.objects.permission import permission_str
+from codalab.objects.permission import check_bundles_have_read_permission, permission_str
 from codalab.rest import util as rest_util
 from codalab.server.authenticated_plugin import ProtectedPlugin
 from codalab.rest.worksheets import get_worksheet_info, search_worksheets
@@ -43,6 +46,7 @@ from codalab.rest.worksheet_block_schemas import (
     FetchStatusCodes,
     FetchStatusSchema,
 )
+from codalab.worker.bundle_state import State
 from codalab.worker.download_util import BundleTarget
 
 
@@ -62,6 +66,17 @@ def _interpret_search():
         "display": [ display args ]
     }
     ```
+
+    Response body:
+    ```
+    {
+        "response": {
+            "result": [ list of bundle UUIDs, or the value of an aggregate search ],
+            "is_aggregate": true if the search is an aggregate (e.g., .count),
+            "next_cursor": cursor of the next page, only with the .cursor keyword (see GET /bundles)
+        }
+    }
+    ```
     """
     query = request.json
     if 'keywords' not in query:
@@ -149,6 +164,10 @@ def _interpret_genpath_table_contents():
     """
     Takes a table and fills in unresolved genpath specifications.
 
+    If "allow_partial" is true, the genpaths that haven't been resolved by the
+    server's genpath deadline are returned as they are, and the status is
+    "partial" instead of "ready".
+
     JSON request body:
     ```
     {
@@ -159,7 +178,8 @@ def _interpret_genpath_table_contents():
                 ...
             },
             ...
-        ]
+        ],
+        "allow_partial": false
     }
     ```
 
@@ -173,13 +193,20 @@ def _interpret_genpath_table_contents():
                 ...
             },
             ...
-        ]
+        ],
+        "status": {"code": "ready", "error_message": ""}
     }
     ```
     """
     contents = request.json['contents']
-    new_contents = interpret_genpath_table_contents(contents)
-    return {'contents': new_contents}
+    deadline = get_genpath_deadline() if request.json.get('allow_partial') else None
+    new_contents = interpret_genpath_table_contents(contents, deadline)
+    status = (
+        FetchStatusSchema.get_partial_status()
+        if get_genpaths_table_contents_requests(new_contents)
+        else FetchStatusSchema.get_ready_status()
+    )
+    return {'contents': new_contents, 'status': status}
 
 
 @get('/interpret/worksheet/<uuid:re:%s>' % spec_util.UUID_STR, apply=ProtectedPlugin())
@@ -314,7 +341,9 @@ def fetch_interpreted_worksheet(uuid):
                 if not is_relevant_block:
                     interpreted_blocks['blocks'][i] = None
     # Grouped individual items into blocks
-    worksheet_info['blocks'] = resolve_interpreted_blocks(interpreted_blocks['blocks'], brief=brief)
+    worksheet_info['blocks'] = resolve_interpreted_blocks(
+        interpreted_blocks['blocks'], brief=brief, worksheet_info=worksheet_info
+    )
     worksheet_info['raw_to_block'] = interpreted_blocks['raw_to_block']
     worksheet_info['block_to_raw'] = interpreted_blocks['block_to_raw']
 
@@ -396,12 +425,88 @@ def head_target(target, max_num_lines):
 DEFAULT_GRAPH_MAX_LINES = 100
 
 
-def resolve_interpreted_blocks(interpreted_blocks, brief):
+# Fields of each mode of block that resolve_interpreted_blocks fills in by reading bundle
+# contents, which are what the interpret cache stores.
+RESOLVED_BLOCK_FIELDS = {
+    BlockModes.record_block: ('rows', 'status'),
+    BlockModes.table_block: ('rows', 'status'),
+    BlockModes.contents_block: ('status', 'lines'),
+    BlockModes.image_block: ('status', 'image_data'),
+    BlockModes.graph_block: ('trajectories',),
+}
+
+
+def get_block_bundle_uuids(block):
+    """
+    Returns the set of uuids of the bundles that an interpreted block shows.
+    """
+    uuids = set()
+    bundle_infos = block.get('bundles_spec', {}).get('bundle_infos') or []
+    if isinstance(bundle_infos, dict):
+        bundle_infos = [bundle_infos]
+    for bundle_info in bundle_infos:
+        if bundle_info and 'uuid' in bundle_info:
+            uuids.add(bundle_info['uuid'])
+    for info in block.get('trajectories', []):
+        uuids.add(info['bundle_uuid'])
+    return uuids
+
+
+def get_cached_blocks(interpreted_blocks, worksheet_info):
+    """
+    Looks up the resolved contents of the blocks of the worksheet |worksheet_info| in the
+    interpret cache. Returns ({block index: cache key}, {block index: cached contents}); blocks
+    that can't be cached have no key.
+    """
+    cache = local.interpret_cache
+    block_uuids = {
+        block_index: get_block_bundle_uuids(block)
+        for block_index, block in enumerate(interpreted_blocks)
+        if block is not None and block['mode'] in RESOLVED_BLOCK_FIELDS
+    }
+    all_uuids = list(set(chain.from_iterable(block_uuids.values())))
+    if not all_uuids:
+        return {}, {}
+    bundles = {bundle.uuid: bundle for bundle in local.model.batch_get_bundles(uuid=all_uuids)}
+
+    keys = {}
+    hits = {}
+    for block_index, uuids in block_uuids.items():
+        if not uuids or not uuids.issubset(bundles):
+            continue
+        key = cache.make_key(
+            worksheet_info['uuid'],
+            worksheet_info['date_last_modified'],
+            interpreted_blocks[block_index],
+            [bundles[uuid] for uuid in uuids],
+        )
+        if key is None:
+            continue
+        keys[block_index] = key
+        contents = cache.get(key)
+        if contents is not None:
+            hits[block_index] = contents
+
+    if hits:
+        # The cached contents may have been read by another user, so check that this one can
+        # read all the bundles they come from. Otherwise, resolve the blocks as usual, which
+        # reports the errors.
+        read_uuids = set(chain.from_iterable(hit['bundle_uuids'] for hit in hits.values()))
+        try:
+            check_bundles_have_read_permission(local.model, request.user, list(read_uuids))
+        except PermissionError:
+            hits = {}
+    return keys, hits
+
+
+def resolve_interpreted_blocks(interpreted_blocks, brief, worksheet_info=None):
     """
     Called by the web interface.  Takes a list of interpreted worksheet
     items (returned by worksheet_util.interpret_items) and fetches the
     appropriate information, replacing the 'interpreted' field in each item.
     The result can be serialized via JSON.
+    If the interpret cache is enabled and |worksheet_info| (the worksheet the blocks belong
+    to) is given, blocks are served from and added to the cache.
     """
 
     def set_error_data(block_index, message):
@@ -409,11 +514,24 @@ def resolve_interpreted_blocks(interpreted_blocks, brief):
             MarkupBlockSchema().load({'id': block_index, 'text': 'ERROR: ' + message}).data
         )
 
+    cache_keys = {}
+    cache_hits = {}
+    if local.interpret_cache is not None and worksheet_info is not None and not brief:
+        cache_keys, cache_hits = get_cached_blocks(interpreted_blocks, worksheet_info)
+
     for block_index, block in enumerate(interpreted_blocks):
         if block is None:
             continue
         mode = block['mode']
 
+        if block_index in cache_hits:
+            block.update(cache_hits[block_index]['fields'])
+            block['is_refined'] = True
+            continue
+        # Bundles that the block reads from other than the ones it shows (e.g., bundles that
+        # symlinks point into).
+        read_uuids = set()
+
         try:
             # Replace data with a resolved version.
             if mode in (BlockModes.markup_block, BlockModes.placeholder_block):
@@ -433,14 +551,21 @@ def resolve_interpreted_blocks(interpreted_blocks, brief):
                         else FetchStatusSchema.get_ready_status()
                     )
                 else:
-                    block['rows'] = interpret_genpath_table_contents(block['rows'])
-                    block['status'] = FetchStatusSchema.get_ready_status()
+                    block['rows'] = interpret_genpath_table_contents(
+                        block['rows'], get_genpath_deadline()
+                    )
+                    block['status'] = (
+                        FetchStatusSchema.get_partial_status()
+                        if get_genpaths_table_contents_requests(block['rows'])
+                        else FetchStatusSchema.get_ready_status()
+                    )
             elif mode == BlockModes.contents_block or mode == BlockModes.image_block:
                 bundle_uuid = block['bundles_spec']['bundle_infos'][0]['uuid']
                 target_path = block['target_genpath']
                 target = BundleTarget(bundle_uuid, target_path)
                 try:
                     target_info = rest_util.get_target_info(target, 0)
+                    read_uuids.add(target_info['resolved_target'].bundle_uuid)
                     if target_info['type'] == 'directory' and mode == BlockModes.contents_block:
                         block['status']['code'] = FetchStatusCodes.ready
                         block['lines'] = ['<directory>']
@@ -477,6 +602,7 @@ def resolve_interpreted_blocks(interpreted_blocks, brief):
                         target_info = rest_util.get_target_info(target, 0)
                     except NotFoundError:
                         continue
+                    read_uuids.add(target_info['resolved_target'].bundle_uuid)
                     if target_info['type'] == 'file':
                         contents = head_target(target_info['resolved_target'], block['max_lines'])
                         # Assume TSV file without header for now, just return each line as a row
@@ -503,6 +629,23 @@ def resolve_interpreted_blocks(interpreted_blocks, brief):
 
         block['is_refined'] = True
 
+        if (
+            block_index in cache_keys
+            and interpreted_blocks[block_index] is block
+            and block.get('status', {}).get('code') != FetchStatusCodes.partial
+        ):
+            local.interpret_cache.set(
+                cache_keys[block_index],
+                {
+                    'fields': {
+                        field: block[field]
+                        for field in RESOLVED_BLOCK_FIELDS[mode]
+                        if field in block
+                    },
+                    'bundle_uuids': sorted(get_block_bundle_uuids(block) | read_uuids),
+                },
+            )
+
     return interpreted_blocks
 
 
@@ -515,6 +658,7 @@ def interpret_search(keywords):
     - .floating: return bundles not in any worksheet
     - .offset=<int>: return bundles starting at this offset
     - .limit=<int>: maximum number of bundles to return
+    - .cursor, .cursor=<cursor>: return bundles a page at a time (see BundleModel.search_bundles)
     - .count: just return the number of bundles
     - .shared: shared with me through a group
     - .mine: sugar for owner_id=user_id
@@ -590,15 +734,51 @@ def get_genpaths_table_contents_requests(contents):
     return requests
 
 
-def interpret_genpath_table_contents(contents):
+# Marks targets that the user can't read in the results of read_genpath_targets.
+GENPATH_FORBIDDEN = object()
+
+# Marks the requests that interpret_file_genpaths didn't resolve before the deadline.
+GENPATH_UNRESOLVED = object()
+
+_genpath_executor = None
+_genpath_executor_lock = threading.Lock()
+
+
+def get_genpath_executor():
+    """
+    Returns the thread pool that genpaths are read with, shared by all the requests handled by
+    this process. Its size is set by "genpath_threads" in the server config.
+    """
+    global _genpath_executor
+    with _genpath_executor_lock:
+        if _genpath_executor is None:
+            _genpath_executor = ThreadPoolExecutor(
+                local.config.get('server', {}).get('genpath_threads', 16),
+                thread_name_prefix='genpath',
+            )
+        return _genpath_executor
+
+
+def get_genpath_deadline():
+    """
+    Returns how long, in seconds, worksheet requests wait for genpaths to be read before
+    returning the tables that show them partially resolved. Set by "genpath_deadline" in the
+    server config.
+    """
+    return formatting.parse_duration(local.config.get('server', {}).get('genpath_deadline', '20s'))
+
+
+def interpret_genpath_table_contents(contents, deadline=None):
     """
     contents represents a table, but some of the elements might not be
     interpreted yet, so fill them in.
+    Cells that haven't been resolved after |deadline| seconds are left as they
+    are; use get_genpaths_table_contents_requests to check for them.
     """
 
     # Request information
     requests = get_genpaths_table_contents_requests(contents)
-    responses = interpret_file_genpaths(requests)
+    responses = interpret_file_genpaths(requests, deadline)
 
     # Put it in a table
     new_contents = []
@@ -607,40 +787,42 @@ def interpret_genpath_table_contents(contents):
         new_row = {}
         for key, value in row.items():
             if is_bundle_genpath_triple(value):
-                value = responses[ri]
+                if responses[ri] is not GENPATH_UNRESOLVED:
+                    value = responses[ri]
                 ri += 1
             new_row[key] = value
         new_contents.append(new_row)
     return new_contents
 
 
-def interpret_file_genpaths(requests):
+def interpret_file_genpaths(requests, deadline=None):
     """
     Helper function.
     requests: list of (bundle_uuid, genpath, post-processing-func)
-    Return responses: corresponding list of strings
+    Return responses: corresponding list of strings, with GENPATH_UNRESOLVED
+    for the requests that haven't been resolved after |deadline| seconds.
+    Each file is read only once, however many requests refer to it.
     """
-    target_cache = {}
-    responses = []
+    parsed_requests = []
     for (bundle_uuid, genpath, post_in_request) in requests:
-        value = interpret_file_genpath(target_cache, bundle_uuid, genpath, post_in_request)
-        responses.append(value)
+        subpath, key = parse_file_genpath(genpath)
+        parsed_requests.append((BundleTarget(bundle_uuid, subpath), key, post_in_request))
+    infos = read_genpath_targets([target for target, _, _ in parsed_requests], deadline)
+    responses = []
+    for target, key, post_in_request in parsed_requests:
+        if target in infos:
+            responses.append(get_genpath_value(infos[target], key, post_in_request))
+        else:
+            responses.append(GENPATH_UNRESOLVED)
     return responses
 
 
-def interpret_file_genpath(target_cache, bundle_uuid, genpath, post):
+def parse_file_genpath(genpath):
     """
-    |cache| is a mapping from target (bundle_uuid, subpath) to the info map,
-    which is to be read/written to avoid reading/parsing the same file many
-    times.
     |genpath| specifies the subpath and various fields (e.g., for
     /stats:train/errorRate, subpath = 'stats', key = 'train/errorRate').
-    |post| function to apply to the resulting value.
-    Return the string value.
+    Return (subpath, key).
     """
-    MAX_LINES = 10000  # Maximum number of lines we need to read from a file.
-
-    # Load the file
     if not is_file_genpath(genpath):
         raise UsageError('Not file genpath: %s' % genpath)
     genpath = genpath[1:]
@@ -648,49 +830,107 @@ def interpret_file_genpath(target_cache, bundle_uuid, genpath, post):
         subpath, key = genpath.split(':')
     else:
         subpath, key = genpath, None
+    return subpath, key
 
-    target = BundleTarget(bundle_uuid, subpath)
-    if target not in target_cache:
-        info = None
-        try:
-            target_info = rest_util.get_target_info(target, 0)
-            if target_info['type'] == 'file':
-                contents = head_target(target_info['resolved_target'], MAX_LINES)
-
-                if len(contents) == 0:
-                    info = ''
-                elif all('\t' in x for x in contents):
-                    # Tab-separated file (key\tvalue\nkey\tvalue...)
-                    info = {}
-                    for x in contents:
-                        kv = x.strip().split("\t", 1)
-                        if len(kv) == 2:
-                            info[kv[0]] = kv[1]
-                else:
-                    try:
-                        # JSON file
-                        info = json.loads(''.join(contents))
-                    except (TypeError, ValueError):
-                        try:
-                            # YAML file
-                            # Use safe_load because yaml.load() could execute
-                            # arbitrary Python code
-                            info = yaml.safe_load(''.join(contents))
-                        except yaml.YAMLError:
-                            # Plain text file
-                            info = ''.join(contents)
-        except NotFoundError:
-            pass
-        except PermissionError:
-            # Use an array of length 1 to pass the PermissionError to the frontend
-            info = ["Forbidden"]
-            return info
 
-        # Try to interpret the structure of the file by looking inside it.
-        target_cache[target] = info
+def read_genpath_targets(targets, deadline=None):
+    """
+    Reads the files at |targets| in parallel on the genpath thread pool, each
+    file once. Targets in bundles running on the same worker are submitted
+    together, so that the download manager sends their reads to the worker in
+    batches.
+    Return {target: info} (see read_genpath_target) for the targets that have
+    been read after |deadline| seconds (all of them if |deadline| is None).
+    """
+    targets = list(OrderedDict.fromkeys(targets))
+    uuids = set(target.bundle_uuid for target in targets)
+    states = local.model.get_bundle_states(uuids)
+    workers = {}
+    for uuid in uuids:
+        if states.get(uuid) == State.RUNNING:
+            worker = local.model.get_bundle_worker(uuid)
+            if worker is not None:
+                workers[uuid] = (worker['user_id'], worker['worker_id'])
+    targets_by_worker = OrderedDict()
+    for target in targets:
+        targets_by_worker.setdefault(workers.get(target.bundle_uuid), []).append(target)
+
+    infos = {}
+    lock = threading.Lock()
+
+    def read_target(target):
+        info = read_genpath_target(target)
+        with lock:
+            infos[target] = info
+
+    executor = get_genpath_executor()
+    futures = [
+        executor.submit(rest_util.with_request_context(read_target), target)
+        for worker_targets in targets_by_worker.values()
+        for target in worker_targets
+    ]
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    for future in done:
+        # Raise any unexpected error.
+        future.result()
+    with lock:
+        return dict(infos)
+
+
+def read_genpath_target(target):
+    """
+    Reads the file at |target| and tries to interpret its structure by looking
+    inside it. Return the info object, None if the file doesn't exist or
+    GENPATH_FORBIDDEN if the user can't read it.
+    """
+    MAX_LINES = 10000  # Maximum number of lines we need to read from a file.
 
-    # Traverse the info object.
-    info = target_cache.get(target, None)
+    info = None
+    try:
+        target_info = rest_util.get_target_info(target, 0)
+        if target_info['type'] == 'file':
+            contents = head_target(target_info['resolved_target'], MAX_LINES)
+
+            if len(contents) == 0:
+                info = ''
+            elif all('\t' in x for x in contents):
+                # Tab-separated file (key\tvalue\nkey\tvalue...)
+                info = {}
+                for x in contents:
+                    kv = x.strip().split("\t", 1)
+                    if len(kv) == 2:
+                        info[kv[0]] = kv[1]
+            else:
+                try:
+                    # JSON file
+                    info = json.loads(''.join(contents))
+                except (TypeError, ValueError):
+                    try:
+                        # YAML file
+                        # Use safe_load because yaml.load() could execute
+                        # arbitrary Python code
+                        info = yaml.safe_load(''.join(contents))
+                    except yaml.YAMLError:
+                        # Plain text file
+                        info = ''.join(contents)
+    except NotFoundError:
+        pass
+    except PermissionError:
+        return GENPATH_FORBIDDEN
+    return info
+
+
+def get_genpath_value(info, key, post):
+    """
+    Traverses the |info| object read from a file to the field |key| (e.g.,
+    'train/errorRate') and applies the |post| function to it.
+    Return the string value.
+    """
+    if info is GENPATH_FORBIDDEN:
+        # Use an array of length 1 to pass the PermissionError to the frontend
+        return ["Forbidden"]
     if key is not None and info is not None:
         for k in key.split('/'):
             if isinstance(info, dict):
@@ -0,0 +1,30 @@
+"""
+Metrics about the REST server's in-memory caches, used to size them.
+"""
+import http.client
+
+from bottle import abort, get, local, request
+
+from codalab.server.authenticated_plugin import AuthenticatedProtectedPlugin
+
+
+@get('/metrics', apply=AuthenticatedProtectedPlugin())
+def fetch_metrics():
+    """
+    Return the hit and miss counts and other statistics of the caches of this REST server
+    process (null for caches that are disabled). Only the root user can see metrics.
+    """
+    if request.user.user_id != local.model.root_user_id:
+        abort(http.client.UNAUTHORIZED, 'Only the root user can see metrics.')
+    bundle_cache = local.model.bundle_cache
+    interpret_cache = local.interpret_cache
+    permission_cache = local.model.permission_cache
+    return {
+        'data': {
+            'bundle_cache': bundle_cache.stats() if bundle_cache is not None else None,
+            'interpret_cache': interpret_cache.stats() if interpret_cache is not None else None,
+            'permission_cache': (
+                permission_cache.stats() if permission_cache is not None else None
+            ),
+        }
+    }
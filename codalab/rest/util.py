@@ -253,3 +253,23 @@ def get_group_info(group_spec, need_admin, access_all_groups=False):
         abort(http.client.FORBIDDEN, 'Cannot modify the public group %s.' % group_spec)
 
     return group_info
+
+
+def with_request_context(func):
+    """
+    Returns a version of |func| that runs with the current request's environment objects
+    (local.model, request.user, etc.), so it can be called from another thread. Bottle keeps
+    these per thread.
+    """
+    local_vars = dict(local.__dict__)
+    environ = request.environ
+
+    def wrapper(*args, **kwargs):
+        local.__dict__.update(local_vars)
+        request.bind(environ)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.__dict__.clear()
+
+    return wrapper
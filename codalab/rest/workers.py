@@ -9,11 +9,15 @@ from datetime import datetime
 from bottle import abort, get, local, post, request, response
 
 from codalab.lib import spec_util
+from codalab.lib.server_util import RequestSlots
 from codalab.objects.permission import check_bundle_have_run_permission
 from codalab.server.authenticated_plugin import AuthenticatedProtectedPlugin
 from codalab.worker.bundle_state import BundleCheckinState
 from codalab.worker.main import DEFAULT_EXIT_AFTER_NUM_RUNS
 
+# Requests to /messages that are waiting the full LISTEN_TIME_SECS (see messages()).
+_message_listeners = RequestSlots()
+
 
 @post("/workers/<worker_id>/checkin", name="worker_checkin", apply=AuthenticatedProtectedPlugin())
 def checkin(worker_id):
@@ -24,8 +28,72 @@ def checkin(worker_id):
     """
     WAIT_TIME_SECS = 3.0
 
+    socket_id = _full_worker_checkin(worker_id)
+    _checkin_runs(worker_id, request.json["runs"])
+
+    with closing(local.worker_model.start_listening(socket_id)) as sock:
+        return local.worker_model.get_json_message(sock, WAIT_TIME_SECS)
+
+
+@post(
+    "/workers/<worker_id>/heartbeat", name="worker_heartbeat", apply=AuthenticatedProtectedPlugin()
+)
+def heartbeat(worker_id):
+    """
+    Checks in with the bundle service without waiting for messages (version 2 of the
+    check-in protocol; messages are received from /workers/<worker_id>/messages instead).
+
+    If the "full" field is true, the body has the same fields as a /checkin request.
+    Otherwise, it only has the fields that changed since the worker's last successful
+    heartbeat, and "runs" only has the runs whose state the worker wants to report.
+
+    Returns {"resync": true} if the worker isn't known to the bundle service, in which case
+    the worker should send a full heartbeat.
+    """
+    if request.json.get("full"):
+        _full_worker_checkin(worker_id)
+    elif local.worker_model.worker_heartbeat(request.user.user_id, worker_id, request.json) is None:
+        return {"resync": True}
+    _checkin_runs(worker_id, request.json.get("runs", []))
+    return {"resync": False}
+
+
+@get("/workers/<worker_id>/messages", name="worker_messages", apply=AuthenticatedProtectedPlugin())
+def messages(worker_id):
+    """
+    Waits for a message for the worker for up to LISTEN_TIME_SECS seconds and returns
+    it as soon as it is sent, or returns None if there isn't one. Workers using
+    /heartbeat keep a request to this endpoint open at all times.
+
+    Since each of these requests takes up a thread of the REST server, each process only
+    waits that long for "max_message_listeners" (in the server config) workers at a time.
+    The requests of other workers only wait SHORT_LISTEN_TIME_SECS seconds, like /checkin.
+    """
+    LISTEN_TIME_SECS = 30.0
+    SHORT_LISTEN_TIME_SECS = 3.0
+
+    socket_id = local.worker_model.get_socket_id(request.user.user_id, worker_id)
+    if socket_id is None:
+        abort(http.client.NOT_FOUND, "Worker %s hasn't checked in." % worker_id)
+
+    max_listeners = local.config.get('server', {}).get('max_message_listeners', 10)
+    if not _message_listeners.acquire(max_listeners):
+        with closing(local.worker_model.start_listening(socket_id)) as sock:
+            return local.worker_model.get_json_message(sock, SHORT_LISTEN_TIME_SECS)
+    try:
+        with closing(local.worker_model.start_listening(socket_id)) as sock:
+            return local.worker_model.get_json_message(sock, LISTEN_TIME_SECS)
+    finally:
+        _message_listeners.release()
+
+
+def _full_worker_checkin(worker_id):
+    """
+    Stores all the information about the worker in the request. Returns the worker's
+    socket ID.
+    """
     # Old workers might not have all the fields, so allow subsets to be missing.
-    socket_id = local.worker_model.worker_checkin(
+    return local.worker_model.worker_checkin(
         request.user.user_id,
         worker_id,
         request.json.get("tag"),
@@ -39,18 +107,30 @@ def checkin(worker_id):
         request.json.get("tag_exclusive", False),
         request.json.get("exit_after_num_runs", DEFAULT_EXIT_AFTER_NUM_RUNS),
         request.json.get("is_terminating", False),
+        request.json.get("capabilities"),
     )
 
-    for run in request.json["runs"]:
+
+def _checkin_runs(worker_id, runs):
+    """
+    Updates the bundles with the run states the worker reported.
+    """
+    worker_runs = []
+    for run in runs:
         try:
-            worker_run = BundleCheckinState.from_dict(run)
-            bundle = local.model.get_bundle(worker_run.uuid)
-            local.model.bundle_checkin(bundle, worker_run, request.user.user_id, worker_id)
+            worker_runs.append(BundleCheckinState.from_dict(run))
         except Exception:
             pass
-
-    with closing(local.worker_model.start_listening(socket_id)) as sock:
-        return local.worker_model.get_json_message(sock, WAIT_TIME_SECS)
+    try:
+        local.model.batch_bundle_checkin(worker_runs, request.user.user_id, worker_id)
+    except Exception:
+        # Check the runs in one by one, so that a bad run doesn't hold up the others.
+        for worker_run in worker_runs:
+            try:
+                bundle = local.model.get_bundle(worker_run.uuid)
+                local.model.bundle_checkin(bundle, worker_run, request.user.user_id, worker_id)
+            except Exception:
+                pass
 
 
 def check_reply_permission(worker_id, socket_id):
@@ -41,10 +41,12 @@ class FetchStatusCodes:
     pending = 'pending'
     briefly_loaded = 'briefly_loaded'
     ready = 'ready'
+    # Some of the contents haven't been fetched yet, fetch again to get the rest.
+    partial = 'partial'
     not_found = 'not_found'
     no_permission = 'no_permission'
 
-    values = (unknown, pending, briefly_loaded, ready, not_found, no_permission)
+    values = (unknown, pending, briefly_loaded, ready, partial, not_found, no_permission)
 
 
 class FetchStatusSchema(PlainSchema):
@@ -71,6 +73,10 @@ class FetchStatusSchema(PlainSchema):
     def get_ready_status():
         return {'code': FetchStatusCodes.ready, 'error_message': ''}
 
+    @staticmethod
+    def get_partial_status():
+        return {'code': FetchStatusCodes.partial, 'error_message': ''}
+
 
 class BundlesSpecSchema(PlainSchema):
     uuid_spec_type = 'uuid_spec'
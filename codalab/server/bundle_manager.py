@@ -1,9 +1,8 @@
 import copy
 import datetime
+import heapq
 import logging
 import os
-import random
-import re
 import shutil
 import sys
 import tempfile
@@ -21,6 +20,10 @@ from codalab.objects.permission import (
 )
 from codalab.common import NotFoundError, PermissionError, parse_linked_bundle_url
 from codalab.lib import bundle_util, formatting, path_util
+from codalab.model.change_log import ChangeKind
+from codalab.server import placement
+from codalab.server.scheduler_state import SchedulerState
+from codalab.server.worker_index import WorkerIndex, get_requested_tag
 from codalab.server.worker_info_accessor import WorkerInfoAccessor
 from codalab.worker.file_util import remove_path
 from codalab.worker.un_tar_directory import un_tar_directory
@@ -40,6 +43,16 @@ MINIMUM_REQUEST_MEMORY_BYTES = 4 * 1024 * 1024
 # Deduct DISK_QUOTA_SLACK_BYTES from the max user disk quota bytes when computing the default amount of disk space to
 # request. Then the default max disk quota that can be requested becomes disk quota left - DISK_QUOTA_SLACK_BYTES.
 DISK_QUOTA_SLACK_BYTES = 0.5 * 1024 * 1024 * 1024
+# A change to a bundle entering one of these states can start or free up a run, so
+# it triggers a scheduling pass when the bundle manager is event-driven.
+SCHEDULING_TRIGGER_STATES = {
+    State.STAGED,
+    State.FINALIZING,
+    State.READY,
+    State.FAILED,
+    State.KILLED,
+    State.WORKER_OFFLINE,
+}
 
 
 def normpath(path):
@@ -90,17 +103,68 @@ class BundleManager(object):
         self._default_cpu_image = config.get('default_cpu_image')
         self._default_gpu_image = config.get('default_gpu_image')
 
+        self._placement_policy = config.get('placement_policy', placement.PlacementPolicy.GREEDY)
+        if self._placement_policy not in placement.PlacementPolicy.OPTIONS:
+            print(
+                'Invalid placement_policy in the workers section of config.json: %s'
+                % self._placement_policy,
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+        # How often to correct any drift in the disk used by users.
+        self._disk_used_reconciliation_interval = (
+            parse(formatting.parse_duration, 'disk_used_reconciliation_interval') or 60 * 60
+        )
+        self._last_disk_used_reconciliation_time = time.time()
+
+        self._scheduler_state = SchedulerState(
+            self._model,
+            self._compute_bundle_resources,
+            parse(formatting.parse_duration, 'scheduler_resync_interval') or 60,
+        )
+
         logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO)
 
-    def run(self, sleep_time):
-        logger.info('Bundle manager running!')
+    def run(self, sleep_time, event_driven=False, full_iteration_seconds=60):
+        """
+        Runs the bundle manager until it is signaled to exit.
+
+        By default, a full iteration runs every |sleep_time| seconds. If |event_driven|
+        is set, the bundle manager instead waits for changes to be recorded in the change
+        log (for up to |sleep_time| seconds at a time) and only looks at the bundles and
+        workers that changed, falling back to a full iteration every
+        |full_iteration_seconds| seconds to catch anything the change log misses (e.g.
+        timeouts and unresponsive workers).
+        """
+        logger.info('Bundle manager running%s!', ' (event-driven)' if event_driven else '')
+        change_log = self._model.change_log
+        last_change_id = 0
+        last_full_iteration_time = None
         while not self._is_exiting():
             try:
-                self._run_iteration()
+                if (
+                    not event_driven
+                    or last_full_iteration_time is None
+                    or time.time() - last_full_iteration_time >= full_iteration_seconds
+                ):
+                    # Changes recorded during the full iteration are handled after it.
+                    full_iteration_change_id = change_log.last_id()
+                    self._run_iteration()
+                    last_change_id = max(last_change_id, full_iteration_change_id)
+                    # Only drop the changes that every reader has seen.
+                    change_log.prune(min(last_change_id, self._scheduler_state.last_change_id))
+                    last_full_iteration_time = time.time()
+                else:
+                    last_change_id, changes = change_log.fetch(last_change_id)
+                    self._run_incremental_iteration(changes)
             except Exception:
                 traceback.print_exc()
 
-            time.sleep(sleep_time)
+            if event_driven:
+                change_log.wait(last_change_id, sleep_time)
+            else:
+                time.sleep(sleep_time)
 
         while self._is_making_bundles():
             time.sleep(sleep_time)
@@ -118,14 +182,66 @@ class BundleManager(object):
         self._make_bundles()
         self._schedule_run_bundles()
         self._fail_unresponsive_bundles()
+        self._reconcile_disk_used()
 
-    def _stage_bundles(self):
+    def _reconcile_disk_used(self):
+        """
+        Every |disk_used_reconciliation_interval|, recomputes the disk used by each user from
+        scratch to correct any drift in the incrementally maintained values.
+        """
+        if (
+            time.time() - self._last_disk_used_reconciliation_time
+            < self._disk_used_reconciliation_interval
+        ):
+            return
+        self._last_disk_used_reconciliation_time = time.time()
+        for (
+            user_id,
+            (disk_used, actual_disk_used),
+        ) in self._model.reconcile_user_disk_used().items():
+            logger.warning(
+                'Corrected disk used by user %s from %s to %s',
+                user_id,
+                formatting.size_str(disk_used),
+                formatting.size_str(actual_disk_used),
+            )
+
+    def _run_incremental_iteration(self, changes):
+        """
+        Runs the parts of an iteration affected by |changes|, as returned by
+        ChangeLog.fetch().
+        """
+        changed_uuids = changes[ChangeKind.BUNDLE]
+        if not changed_uuids and not changes[ChangeKind.WORKER]:
+            return
+        states = self._model.get_bundle_states(changed_uuids) if changed_uuids else {}
+
+        # Created bundles, and created children of bundles that changed state, might
+        # now be ready to stage (or fail).
+        stage_uuids = set(uuid for uuid, state in states.items() if state == State.CREATED)
+        finished_uuids = [uuid for uuid, state in states.items() if state in State.FINAL_STATES]
+        if finished_uuids:
+            for child_uuids in self._model.get_children_uuids(finished_uuids).values():
+                stage_uuids.update(child_uuids)
+        if stage_uuids:
+            self._stage_bundles(stage_uuids)
+
+        if State.STAGED in states.values():
+            self._make_bundles()
+        if changes[ChangeKind.WORKER] or SCHEDULING_TRIGGER_STATES & set(states.values()):
+            self._schedule_run_bundles(changed_uuids)
+
+    def _stage_bundles(self, uuids=None):
         """
         Stages bundles by:
             1) Failing any bundles that have any missing or failed dependencies.
             2) Staging any bundles that have all ready dependencies.
+        If |uuids| is given, only looks at the created bundles among them.
         """
-        bundles = self._model.batch_get_bundles(state=State.CREATED)
+        if uuids is None:
+            bundles = self._model.batch_get_bundles(state=State.CREATED)
+        else:
+            bundles = self._model.batch_get_bundles(state=State.CREATED, uuid=list(uuids))
         parent_uuids = set(dep.parent_uuid for bundle in bundles for dep in bundle.dependencies)
         parents = self._model.batch_get_bundles(uuid=parent_uuids)
 
@@ -318,12 +434,22 @@ class BundleManager(object):
                 self._worker_model.worker_cleanup(worker['user_id'], worker['worker_id'])
                 workers.remove(worker['worker_id'])
 
-    def _restage_stuck_starting_bundles(self, workers):
+    def _get_run_bundles(self, states, uuids=None):
+        """
+        Returns the run bundles in one of |states|, limited to |uuids| if given.
+        """
+        if uuids is None:
+            return self._model.batch_get_bundles(state=states, bundle_type='run')
+        if not uuids:
+            return []
+        return self._model.batch_get_bundles(state=states, bundle_type='run', uuid=list(uuids))
+
+    def _restage_stuck_starting_bundles(self, workers, uuids=None):
         """
         Moves bundles that got stuck in the STARTING state back to the STAGED
         state so that they can be scheduled to run again.
         """
-        for bundle in self._model.batch_get_bundles(state=State.STARTING, bundle_type='run'):
+        for bundle in self._get_run_bundles([State.STARTING], uuids):
             if (
                 not workers.is_running(bundle.uuid)
                 or time.time() - bundle.metadata.last_updated > 5 * 60
@@ -332,11 +458,11 @@ class BundleManager(object):
                 if self._model.transition_bundle_staged(bundle):
                     workers.restage(bundle.uuid)
 
-    def _acknowledge_recently_finished_bundles(self, workers):
+    def _acknowledge_recently_finished_bundles(self, workers, uuids=None):
         """
         Acknowledge recently finished bundles to workers so they can discard run information.
         """
-        for bundle in self._model.batch_get_bundles(state=State.FINALIZING, bundle_type='run'):
+        for bundle in self._get_run_bundles([State.FINALIZING], uuids):
             worker = self._model.get_bundle_worker(bundle.uuid)
             if worker is None:
                 logger.info(
@@ -355,15 +481,13 @@ class BundleManager(object):
                 # TODO(Ashwin): fix this -- bundle location could be linked.
                 self._model.transition_bundle_finished(bundle, bundle_location)
 
-    def _bring_offline_stuck_running_bundles(self, workers):
+    def _bring_offline_stuck_running_bundles(self, workers, uuids=None):
         """
         Make bundles that got stuck in the RUNNING or PREPARING state into WORKER_OFFLINE state.
         Bundles in WORKER_OFFLINE state can be moved back to the RUNNING or PREPARING state if a
         worker resumes the bundle indicating that it's still in one of those states.
         """
-        active_bundles = self._model.batch_get_bundles(
-            state=State.RUNNING, bundle_type='run'
-        ) + self._model.batch_get_bundles(state=State.PREPARING, bundle_type='run')
+        active_bundles = self._get_run_bundles([State.RUNNING, State.PREPARING], uuids)
         now = time.time()
         for bundle in active_bundles:
             failure_message = None
@@ -435,98 +559,105 @@ class BundleManager(object):
         # are attempting to run each staged bundle will respect the ordering of
         # staged_bundles_to_run (i.e., they won't be used immediately, and will be instead
         # assigned bundles on the next run of _run_iteration).
-        resource_deducted_user_workers = defaultdict(list)
+        user_worker_indexes = {}
+        user_parallel_runs = self._scheduler_state.get_user_parallel_runs(workers.workers())
         user_parallel_run_quota_left = {}
         for user in user_queue_positions.keys():
             # Skip for the root user as the user-owned workers will be the public CodaLab workers,
             # which are accounted for after this loop.
             if user != self._model.root_user_id:
-                resource_deducted_user_workers[user] = self._deduct_worker_resources(
-                    workers.get_user_workers(user), running_bundles_info
+                user_worker_indexes[user] = WorkerIndex(
+                    self._deduct_worker_resources(
+                        workers.get_user_workers(user), running_bundles_info
+                    )
                 )
-            user_parallel_run_quota_left[user] = self._model.get_user_parallel_run_quota_left(
-                user, user_info_cache[user]
+            else:
+                user_worker_indexes[user] = WorkerIndex([])
+            user_parallel_run_quota_left[user] = (
+                user_info_cache[user]['parallel_run_quota'] - user_parallel_runs[user]
+            )
+        codalab_owned_worker_index = WorkerIndex(
+            self._deduct_worker_resources(
+                workers.get_user_workers(self._model.root_user_id), running_bundles_info
             )
-        resource_deducted_codalab_owned_workers = self._deduct_worker_resources(
-            workers.get_user_workers(self._model.root_user_id), running_bundles_info
+        )
+        all_worker_indexes = list(user_worker_indexes.values()) + [codalab_owned_worker_index]
+        indexed_worker_ids = set(
+            worker['worker_id'] for index in all_worker_indexes for worker in index.workers()
         )
 
-        workers_list = []
         # We store a running record of the workers that go offline while we're dispatching
         # bundles, so if they come back online, we continue to ignore them in order in order to
         # respect bundle prioritization. Such workers will be assigned bundles in the BundleManager's
         # next iteration.
         offline_workers = set()
-        # Dispatch bundles
-        for bundle, bundle_resources in staged_bundles_to_run:
+        last_cleanup_time = None
+
+        def find_workers(bundle, bundle_resources):
+            nonlocal last_cleanup_time
+            worker_indexes = [user_worker_indexes[bundle.owner_id]]
             if user_parallel_run_quota_left[bundle.owner_id] > 0:
-                workers_list = (
-                    resource_deducted_user_workers[bundle.owner_id]
-                    + resource_deducted_codalab_owned_workers
-                )
-            else:
-                workers_list = resource_deducted_user_workers[bundle.owner_id]
+                worker_indexes.append(codalab_owned_worker_index)
             # Although we pre-compute the available workers, workers might go offline.
             # As a result, we refresh the currently-online workers (by cleaning up the
             # dead workers), and filter out the precomputed workers that are no longer online.
             # If we don't do this, the workers might appear otherwise-eligible for runs, and we'll
             # attempt to start every bundle on every such worker. This can take a long time (if there
             # are many staged bundles, over an hour), and new bundles cannot be assigned to workers
-            # in the meantime.
-            self._cleanup_dead_workers(workers)
-            online_worker_ids = set(
-                worker["worker_id"]
-                for worker in (
-                    workers.get_user_workers(bundle.owner_id)
-                    + workers.get_user_workers(self._model.root_user_id)
-                )
-            )
-            # Store the worker IDs for workers that have gone offline.
-            offline_workers.update(
-                [
-                    worker["worker_id"]
-                    for worker in workers_list
-                    if worker["worker_id"] not in online_worker_ids
-                ]
+            # in the meantime. Checking at most once a second is enough, since workers are only
+            # considered dead after not checking in for self._worker_timeout_seconds.
+            if last_cleanup_time is None or time.time() - last_cleanup_time >= 1:
+                self._cleanup_dead_workers(workers)
+                online_worker_ids = set(worker['worker_id'] for worker in workers.workers())
+                # Store the worker IDs for workers that have gone offline. Note that we can't
+                # just use online_worker_ids to filter workers, since we want to also exclude
+                # workers that go offline, and then later come back online while we're still
+                # dispatching bundles.
+                offline_workers.update(indexed_worker_ids - online_worker_ids)
+                last_cleanup_time = time.time()
+
+            return heapq.merge(
+                *[
+                    index.find(bundle, bundle_resources, offline_workers)
+                    for index in worker_indexes
+                ],
+                key=lambda pair: pair[0],
             )
-            # Filter worker that have gone offline. Note that we can't just use
-            # online_worker_ids here, since we want to also exclude workers that go
-            # offline, and then later come back online while we're still dispatching bundles.
-            workers_list = [
-                worker for worker in workers_list if worker["worker_id"] not in offline_workers
-            ]
 
-            workers_list = self._filter_and_sort_workers(workers_list, bundle, bundle_resources)
+        def try_place(bundle, bundle_resources, worker):
             # Try starting bundles on the workers that have enough computing resources
-            for worker in workers_list:
-                if self._try_start_bundle(workers, worker, bundle, bundle_resources):
-                    # If we successfully started a bundle on a codalab-owned worker,
-                    # decrement the parallel run quota left.
-                    if worker["user_id"] == self._model.root_user_id:
-                        user_parallel_run_quota_left[bundle.owner_id] -= 1
-                    # Update available worker resources. This is a lower-bound,
-                    # since resources released by jobs that finish are not used until
-                    # the next call to _schedule_run_bundles_on_workers.
-                    worker['cpus'] -= bundle_resources.cpus
-                    worker['gpus'] -= bundle_resources.gpus
-                    worker['memory_bytes'] -= bundle_resources.memory
-                    worker['exit_after_num_runs'] -= 1
+            if not self._try_start_bundle(workers, worker, bundle, bundle_resources):
+                return False
+            # If we successfully started a bundle on a codalab-owned worker,
+            # decrement the parallel run quota left.
+            if worker["user_id"] == self._model.root_user_id:
+                user_parallel_run_quota_left[bundle.owner_id] -= 1
+            # Update available worker resources.
+            for index in all_worker_indexes:
+                if index.contains(worker):
+                    index.allocate(worker, bundle_resources)
                     break
+            return True
+
+        # Dispatch bundles
+        placement.place(self._placement_policy, staged_bundles_to_run, find_workers, try_place)
 
         # To avoid the potential race condition between bundle manager's dispatch frequency and
         # worker's checkin frequency, update the column "exit_after_num_runs" in worker table
         # before bundle manager's next scheduling loop
-        for worker in workers_list:
-            # Update workers that have "exit_after_num_runs" manually set from CLI.
-            if (
-                worker['exit_after_num_runs']
-                < workers._workers[worker['worker_id']]['exit_after_num_runs']
-            ):
-                self._worker_model.update_workers(
-                    worker["user_id"],
-                    worker['worker_id'],
-                    {'exit_after_num_runs': worker['exit_after_num_runs']},
-                )
+        for index in all_worker_indexes:
+            for worker in index.workers():
+                # Update workers that have "exit_after_num_runs" manually set from CLI.
+                if (
+                    worker['worker_id'] in workers._workers
+                    and worker['exit_after_num_runs']
+                    < workers._workers[worker['worker_id']]['exit_after_num_runs']
+                ):
+                    self._worker_model.update_workers(
+                        worker["user_id"],
+                        worker['worker_id'],
+                        {'exit_after_num_runs': worker['exit_after_num_runs']},
+                    )
 
     def _deduct_worker_resources(self, workers_list, running_bundles_info):
         """
@@ -557,85 +688,9 @@ class BundleManager(object):
         """
         Filters the workers to those that can run the given bundle and returns
         the list sorted in order of preference for running the bundle.
+        See WorkerIndex.find for the order.
         """
-        # Filter by tag.
-        if bundle.metadata.request_queue:
-            workers_list = self._get_matched_workers(bundle.metadata.request_queue, workers_list)
-        else:
-            # The bundle is untagged, so we want to keep workers that are not
-            # tag-exclusive or don't have a tag defined.
-            # (removing workers that are tag_exclusive and have tags defined).
-            workers_list = [
-                worker
-                for worker in workers_list
-                if not worker['tag_exclusive'] or not worker['tag']
-            ]
-
-        # Filter by CPUs.
-        workers_list = [
-            worker for worker in workers_list if worker['cpus'] >= bundle_resources.cpus
-        ]
-
-        # Filter by GPUs.
-        if bundle_resources.gpus:
-            workers_list = [
-                worker for worker in workers_list if worker['gpus'] >= bundle_resources.gpus
-            ]
-
-        # Filter by memory.
-        workers_list = [
-            worker for worker in workers_list if worker['memory_bytes'] >= bundle_resources.memory
-        ]
-
-        # Filter by the number of jobs allowed to run on this worker.
-        workers_list = [worker for worker in workers_list if worker['exit_after_num_runs'] > 0]
-
-        # Filter by worker's available disk space.
-        workers_list = [
-            worker for worker in workers_list if worker['free_disk_bytes'] >= bundle_resources.disk
-        ]
-
-        # Sort workers list according to these keys in the following succession:
-        #  - whether the worker is a CPU-only worker, if the bundle doesn't request GPUs
-        #  - number of dependencies available, descending
-        #  - number of free cpus, descending
-        #  - random key
-        #
-        # Breaking ties randomly is important, since multiple workers frequently
-        # have the same number of dependencies and free CPUs for a given bundle
-        # (in particular, bundles with no dependencies) and we may end up
-        # selecting the same worker over and over again for new jobs. While this
-        # is not a problem for the performance of the jobs themselves, this can
-        # cause one worker to collect a disproportionate number of dependencies
-        # in its cache.
-        needed_deps = set([(dep.parent_uuid, dep.parent_path) for dep in bundle.dependencies])
-
-        def get_sort_key(worker):
-            if worker['shared_file_system']:
-                num_available_deps = len(needed_deps)
-            else:
-                deps = set(worker['dependencies'])
-                num_available_deps = len(needed_deps & deps)
-
-            # Subject to the worker meeting the resource requirements of the bundle, we also want to:
-            # 1. prioritize workers that are tag-exclusive.
-            # 2. prioritize workers with fewer GPUs (including zero).
-            # 3. prioritize workers that have more bundle dependencies.
-            # 4. prioritize workers with fewer CPUs.
-            # 5. prioritize workers with fewer running jobs.
-            # 6. break ties randomly by a random seed.
-            return (
-                not worker['tag_exclusive'],
-                worker['gpus'] or worker['has_gpus'],
-                -num_available_deps,
-                worker['cpus'],
-                len(worker['run_uuids']),
-                random.random(),
-            )
-
-        workers_list.sort(key=get_sort_key)
-
-        return workers_list
+        return [worker for _, worker in WorkerIndex(workers_list).find(bundle, bundle_resources)]
 
     def _try_start_bundle(self, workers, worker, bundle, bundle_resources):
         """
@@ -812,7 +867,7 @@ class BundleManager(object):
                     {'state': State.FAILED, 'metadata': {'failure_message': failure_message}},
                 )
 
-    def _schedule_run_bundles(self):
+    def _schedule_run_bundles(self, uuids=None):
         """
         This method implements a state machine. The states are:
 
@@ -824,6 +879,10 @@ class BundleManager(object):
             Worker reported that the run has started.
         READY / FAILED, no worker_run DB entry:
             Finished.
+
+        If |uuids| is given, only those bundles are checked for the exceptional
+        cases below, and bundles that got stuck without changing are left to the
+        next full iteration.
         """
         workers = WorkerInfoAccessor(
             self._model, self._worker_model, self._worker_timeout_seconds - 5
@@ -831,11 +890,13 @@ class BundleManager(object):
 
         # Handle some exceptional cases.
         self._cleanup_dead_workers(workers)
-        self._restage_stuck_starting_bundles(workers)
-        self._bring_offline_stuck_running_bundles(workers)
-        self._acknowledge_recently_finished_bundles(workers)
+        self._restage_stuck_starting_bundles(workers, uuids)
+        self._bring_offline_stuck_running_bundles(workers, uuids)
+        self._acknowledge_recently_finished_bundles(workers, uuids)
         # A dictionary structured as {user id : user information} to track those visited user information
         user_info_cache = {}
+        # Pick up the bundles that changed since the last pass, including the ones above.
+        self._scheduler_state.refresh()
         staged_bundles_to_run = self._get_staged_bundles_to_run(workers, user_info_cache)
 
         # Schedule, preferring user-owned workers.
@@ -888,9 +949,9 @@ class BundleManager(object):
         :param workers: a list of workers
         :return: a list of matched workers
         """
-        tag_match = re.match('(?:tag=)?(.+)', request_queue)
-        if tag_match is not None:
-            return [worker for worker in workers if worker['tag'] == tag_match.group(1)]
+        tag = get_requested_tag(request_queue)
+        if tag is not None:
+            return [worker for worker in workers if worker['tag'] == tag]
         return []
 
     def _get_staged_bundles_to_run(self, workers, user_info_cache):
@@ -905,7 +966,7 @@ class BundleManager(object):
         # Keep track of staged bundles that have valid resources requested
         staged_bundles_to_run = []
 
-        for bundle in self._model.batch_get_bundles(state=State.STAGED, bundle_type='run'):
+        for bundle in self._scheduler_state.staged_bundles():
             # Cache those visited user information
             if bundle.owner_id in user_info_cache:
                 user_info = user_info_cache[bundle.owner_id]
@@ -1005,20 +1066,19 @@ class BundleManager(object):
 
     def _get_running_bundles_info(self, workers, staged_bundles_to_run):
         """
-        Build a nested dictionary to store information (bundle and bundle_resources) including
-        the current running bundles and staged bundles.
-        Note that the primary usage of this function is to improve efficiency when calling
-        self._compute_bundle_resources(), e.g. reusing constants (gpus, cpus, memory) from
-        the returning values of self._compute_bundle_resources() as they don't change over time.
-        However, be careful when using this function to improve efficiency for returning values
-        like disk and time from self._compute_bundle_resources() as they do depend on the number
-        of jobs that are running during the time of computation. Accuracy might be affected
-        without considering this factor.
+        Build a nested dictionary to store the bundle_resources of the bundles running on workers.
+        Resources of running bundles come from self._scheduler_state, which only computes them
+        once per run since the requested gpus, cpus and memory don't change over time. Bundles that
+        a worker claims but are also staged (and so about to be dispatched) use the resources
+        computed for them in this pass, to avoid overestimating worker resources in
+        self._deduct_worker_resources(). We could potentially be conservative on dispatching jobs
+        to workers, but this is still better than over assigning jobs.
         :param workers: a WorkerInfoAccessor object containing worker related information e.g. running uuid.
+        :param staged_bundles_to_run: a list of tuples each contains a valid bundle and its bundle resources.
         :return: a nested dictionary structured as follows:
                 {
                     uuid: {
-                        "bundle": bundle,
+                        "owner_id": owner_id,
                         "bundle_resources": bundle_resources
                     }
                 }
@@ -1028,23 +1088,14 @@ class BundleManager(object):
         staged_bundles_to_run_dict = {
             bundle.uuid: bundle_resources for (bundle, bundle_resources) in staged_bundles_to_run
         }
-        # Get uuid of all the staged bundles that will be dispatched on workers
-        staged_uuids = list(staged_bundles_to_run_dict.keys())
-
-        # Get the running bundles (including the potential running bundles: staged bundles) that exist
-        # in the bundle table as well. Including staged bundles here is to avoid overestimating worker resources in
-        # the function self._deduct_worker_resources(). We could potentially be conservative on dispatching jobs to
-        # workers, but this is still better than over assigning jobs.
-        running_bundles = self._model.batch_get_bundles(uuid=run_uuids + staged_uuids)
-        # Build a dictionary which maps from uuid to running bundle and bundle_resources
         running_bundles_info = {
-            bundle.uuid: {
-                "bundle": bundle,
-                "bundle_resources": self._compute_bundle_resources(bundle)
-                if bundle.uuid in run_uuids
-                else staged_bundles_to_run_dict[bundle.uuid],
+            uuid: {
+                "owner_id": owner_id,
+                "bundle_resources": staged_bundles_to_run_dict.get(uuid, bundle_resources),
             }
-            for bundle in running_bundles
+            for uuid, (owner_id, bundle_resources) in (
+                self._scheduler_state.get_running_bundles_info(run_uuids).items()
+            )
         }
 
         return running_bundles_info
@@ -0,0 +1,102 @@
+"""
+Policies for placing staged run bundles on workers.
+
+A policy is given the staged bundles (in queue order, as (bundle, bundle_resources)
+tuples) and two callbacks:
+- find_workers(bundle, bundle_resources) returns the workers that can currently run the
+  bundle as (sort key, worker) pairs in order of preference (see WorkerIndex.find);
+- try_place(bundle, bundle_resources, worker) tries to start the bundle on the worker,
+  updating the worker's available resources, and returns whether it succeeded.
+Keeping policies independent of the bundle manager lets the placement simulator replay
+queues against them.
+"""
+import itertools
+from collections import OrderedDict
+
+from codalab.server.worker_index import WorkerIndex
+
+
+class PlacementPolicy(object):
+    # Place bundles one by one in queue order, each on its most preferred worker.
+    GREEDY = 'greedy'
+    # Place the whole queue at once, interleaving users and packing workers tightly.
+    BATCH = 'batch'
+
+    OPTIONS = {GREEDY, BATCH}
+
+
+# Number of preferred workers the batch policy looks at to pick the tightest fit.
+BATCH_CANDIDATES = 16
+
+
+def place(policy, staged_bundles_to_run, find_workers, try_place):
+    if policy == PlacementPolicy.BATCH:
+        place_batch(staged_bundles_to_run, find_workers, try_place)
+    else:
+        place_greedy(staged_bundles_to_run, find_workers, try_place)
+
+
+def place_greedy(staged_bundles_to_run, find_workers, try_place):
+    for bundle, bundle_resources in staged_bundles_to_run:
+        for _, worker in find_workers(bundle, bundle_resources):
+            if try_place(bundle, bundle_resources, worker):
+                break
+
+
+def get_bundle_size(bundle_resources):
+    """
+    Sort key that orders bundles from the largest to the smallest request.
+    """
+    return (-bundle_resources.gpus, -bundle_resources.cpus, -bundle_resources.memory)
+
+
+def get_fit(worker, bundle_resources):
+    """
+    Returns how much of the worker's free CPUs and memory the bundle would leave unused,
+    as a fraction of what is free (lower is a tighter fit).
+    """
+    return sum(
+        (free - requested) / free if free > 0 else 0
+        for free, requested in (
+            (worker['cpus'], bundle_resources.cpus),
+            (worker['memory_bytes'], bundle_resources.memory),
+        )
+    )
+
+
+def place_batch(staged_bundles_to_run, find_workers, try_place):
+    """
+    Places the staged bundles as a batch:
+    1. Fairness: bundles are placed in rounds, where each user with bundles left gets their
+       next bundle (in the user's queue order) placed. One user's long queue therefore
+       can't hold back other users' bundles.
+    2. Packing: within a round, larger bundles are placed first (as in first-fit
+       decreasing bin packing), and each bundle goes to the worker that it fits most
+       tightly among its BATCH_CANDIDATES most preferred workers with the most dependencies
+       cached, leaving whole workers free for larger bundles.
+    Parallel run quotas are enforced by find_workers and try_place as in the greedy policy.
+    """
+    user_bundles = OrderedDict()
+    for bundle, bundle_resources in staged_bundles_to_run:
+        user_bundles.setdefault(bundle.owner_id, []).append((bundle, bundle_resources))
+
+    for round_bundles in itertools.zip_longest(*user_bundles.values()):
+        round_bundles = sorted(
+            (staged for staged in round_bundles if staged is not None),
+            key=lambda staged: get_bundle_size(staged[1]),
+        )
+        for bundle, bundle_resources in round_bundles:
+            workers = iter(find_workers(bundle, bundle_resources))
+            candidates = list(itertools.islice(workers, BATCH_CANDIDATES))
+            # The sort key starts with the worker's group (whether it is tag-exclusive and its
+            # GPUs) and the number of dependencies it has cached, which come before the fit.
+            num_leading = WorkerIndex.GROUP_KEY_LENGTH + 1
+            candidates.sort(
+                key=lambda pair: pair[0][:num_leading]
+                + (get_fit(pair[1], bundle_resources),)
+                + pair[0][num_leading:]
+            )
+            # If none of the candidates work out, fall back to the rest in order of preference.
+            for _, worker in itertools.chain(candidates, workers):
+                if try_place(bundle, bundle_resources, worker):
+                    break
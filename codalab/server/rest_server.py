@@ -42,6 +42,7 @@ import codalab.rest.cli
 import codalab.rest.groups
 import codalab.rest.help
 import codalab.rest.interpret
+import codalab.rest.metrics
 import codalab.rest.oauth2
 import codalab.rest.users
 import codalab.rest.workers
@@ -73,8 +74,10 @@ class SaveEnvironmentPlugin(object):
             local.model = self.manager.model()
             local.worker_model = self.manager.worker_model()
             local.upload_manager = self.manager.upload_manager()
+            local.upload_part_store = self.manager.upload_part_store()
             local.download_manager = self.manager.download_manager()
             local.bundle_store = self.manager.bundle_store()
+            local.interpret_cache = self.manager.interpret_cache()
             local.config = self.manager.config
             local.emailer = self.manager.emailer
             return callback(*args, **kwargs)
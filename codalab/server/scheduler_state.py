@@ -0,0 +1,112 @@
+"""
+SchedulerState is the in-memory state that the bundle manager keeps across scheduling
+passes, so that a pass only loads the bundles that changed since the previous one
+instead of reloading every staged and running bundle.
+"""
+from collections import defaultdict
+import time
+
+from codalab.model.change_log import ChangeKind
+from codalab.worker.bundle_state import State
+
+
+class SchedulerState(object):
+    """
+    Keeps track of:
+    - the staged run bundles, reconciled from the change log on each refresh();
+    - the owner and resource request of each bundle running on a worker, which do not
+      change once a bundle is started.
+
+    Since the change log can miss changes (e.g. transactions that commit out of id
+    order), everything is reloaded from scratch every |resync_seconds| seconds.
+    """
+
+    def __init__(self, model, compute_bundle_resources, resync_seconds=60):
+        self._model = model
+        self._compute_bundle_resources = compute_bundle_resources
+        self._resync_seconds = resync_seconds
+        self._last_resync_time = None
+        # Id of the last change log record that has been applied.
+        self.last_change_id = 0
+        # {uuid: bundle} for all staged run bundles.
+        self._staged_bundles = {}
+        # {uuid: (owner_id, bundle_resources)} for bundles running on workers.
+        self._running_bundles = {}
+
+    def refresh(self):
+        """
+        Brings the state up to date with the changes recorded since the last refresh.
+        """
+        if (
+            self._last_resync_time is None
+            or time.time() - self._last_resync_time >= self._resync_seconds
+        ):
+            self.resync()
+            return
+
+        self.last_change_id, changes = self._model.change_log.fetch(self.last_change_id)
+        changed_uuids = changes[ChangeKind.BUNDLE]
+        if not changed_uuids:
+            return
+        for uuid in changed_uuids:
+            self._staged_bundles.pop(uuid, None)
+        for bundle in self._model.batch_get_bundles(
+            uuid=list(changed_uuids), state=State.STAGED, bundle_type='run'
+        ):
+            self._staged_bundles[bundle.uuid] = bundle
+
+    def resync(self):
+        """
+        Reloads the state from scratch.
+        """
+        # Changes recorded while reloading are applied again on the next refresh.
+        self.last_change_id = self._model.change_log.last_id()
+        self._staged_bundles = {
+            bundle.uuid: bundle
+            for bundle in self._model.batch_get_bundles(state=State.STAGED, bundle_type='run')
+        }
+        self._running_bundles = {}
+        self._last_resync_time = time.time()
+
+    def staged_bundles(self):
+        """
+        Returns the staged run bundles in the order they were created.
+        """
+        return sorted(self._staged_bundles.values(), key=lambda bundle: bundle.id)
+
+    def get_running_bundles_info(self, run_uuids):
+        """
+        Returns {uuid: (owner_id, bundle_resources)} for those of |run_uuids| that exist in
+        the bundle table. Only bundles that were not running on the previous call are loaded
+        from the database; bundles that are no longer running are forgotten.
+        """
+        run_uuids = set(run_uuids)
+        for uuid in list(self._running_bundles):
+            if uuid not in run_uuids:
+                del self._running_bundles[uuid]
+        new_uuids = run_uuids - set(self._running_bundles)
+        if new_uuids:
+            for bundle in self._model.batch_get_bundles(uuid=list(new_uuids)):
+                self._running_bundles[bundle.uuid] = (
+                    bundle.owner_id,
+                    self._compute_bundle_resources(bundle),
+                )
+        return {uuid: info for uuid, info in self._running_bundles.items() if uuid in run_uuids}
+
+    def get_user_parallel_runs(self, workers):
+        """
+        Returns {user_id: number of the user's bundles running on workers the user does not
+        own}, which is what counts towards the user's parallel run quota.
+        """
+        running_bundles_info = self.get_running_bundles_info(
+            uuid for worker in workers for uuid in worker['run_uuids']
+        )
+        user_parallel_runs = defaultdict(int)
+        for worker in workers:
+            for uuid in worker['run_uuids']:
+                if uuid not in running_bundles_info:
+                    continue
+                owner_id = running_bundles_info[uuid][0]
+                if owner_id != worker['user_id']:
+                    user_parallel_runs[owner_id] += 1
+        return user_parallel_runs
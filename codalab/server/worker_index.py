@@ -0,0 +1,246 @@
+"""
+WorkerIndex indexes the workers available to the bundle manager, so that finding the
+workers that can run a bundle is a lookup instead of a scan over every worker (and every
+worker's cached dependencies) for every staged bundle.
+"""
+import bisect
+import itertools
+import random
+import re
+from collections import defaultdict
+
+# Index key of the workers that can run bundles without a request_queue.
+UNTAGGED = None
+
+
+def get_requested_tag(request_queue):
+    """
+    Returns the worker tag requested by |request_queue|, which has the format
+    "tag=worker_X" or "worker_X", or None if it doesn't name a tag.
+    """
+    tag_match = re.match('(?:tag=)?(.+)', request_queue)
+    if tag_match is not None:
+        return tag_match.group(1)
+    return None
+
+
+class SortedWorkers(object):
+    """
+    Workers sorted by the number of CPUs they have free.
+    """
+
+    def __init__(self):
+        # Sorted list of (free cpus, id(worker)), parallel to self._workers.
+        self._keys = []
+        self._workers = []
+
+    def __len__(self):
+        return len(self._workers)
+
+    def add(self, worker):
+        key = (worker['cpus'], id(worker))
+        i = bisect.bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._workers.insert(i, worker)
+
+    def remove(self, worker, cpus):
+        """
+        Removes |worker|, which was added when it had |cpus| free.
+        """
+        i = bisect.bisect_left(self._keys, (cpus, id(worker)))
+        del self._keys[i]
+        del self._workers[i]
+
+    def at_least(self, cpus):
+        """
+        Generates the workers with at least |cpus| free, with the fewest free CPUs first.
+        """
+        for i in range(bisect.bisect_left(self._keys, (cpus,)), len(self._workers)):
+            yield self._workers[i]
+
+
+class WorkerIndex(object):
+    """
+    Indexes a list of worker dicts (as returned by WorkerInfoAccessor, with resources
+    already deducted) by:
+    - the queue they serve: their tag, and UNTAGGED if they run untagged bundles;
+    - within each queue, the leading components of the sort key used to pick a worker
+      (whether they are tag-exclusive and how many GPUs they have), and then free CPUs;
+    - the dependencies they have cached, as an inverted index from
+      (parent_uuid, parent_path) to workers.
+    The worker dicts are shared with the caller; use allocate() to update a worker's
+    resources so that the index stays consistent.
+    """
+
+    # Number of leading components of the sort key of find() that make up a worker's group
+    # (see _get_group). The next component is minus the number of dependencies it has cached.
+    GROUP_KEY_LENGTH = 3
+
+    def __init__(self, workers_list):
+        self._workers = {}
+        # {queue: {group: SortedWorkers}}, see _get_group.
+        self._groups = defaultdict(lambda: defaultdict(SortedWorkers))
+        # {id(worker): (group, cpus)} as of when the worker was indexed.
+        self._indexed = {}
+        # {(parent_uuid, parent_path): set of id(worker)}
+        self._dependency_workers = defaultdict(set)
+        # Workers on a shared file system have all dependencies available.
+        self._shared_file_system_workers = set()
+        for worker in workers_list:
+            self._workers[id(worker)] = worker
+            self._add(worker)
+            if worker['shared_file_system']:
+                self._shared_file_system_workers.add(id(worker))
+            else:
+                for dep in worker['dependencies']:
+                    self._dependency_workers[tuple(dep)].add(id(worker))
+
+    @staticmethod
+    def _get_queues(worker):
+        queues = []
+        if worker['tag']:
+            queues.append(worker['tag'])
+        # Untagged bundles can run on workers that are not tag-exclusive or don't have a tag.
+        if not worker['tag_exclusive'] or not worker['tag']:
+            queues.append(UNTAGGED)
+        return queues
+
+    @staticmethod
+    def _get_group(worker):
+        """
+        Returns the first GROUP_KEY_LENGTH components of the worker's sort key (see find()).
+        Whether the worker has GPUs is kept apart from its number of free GPUs, so that
+        workers whose GPUs are all in use don't end up in the same group as workers with one
+        free GPU.
+        """
+        return (not worker['tag_exclusive'], bool(worker['has_gpus']), worker['gpus'])
+
+    def _add(self, worker):
+        # Workers that are not allowed to run more jobs are not indexed.
+        if worker['exit_after_num_runs'] <= 0:
+            return
+        group = self._get_group(worker)
+        for queue in self._get_queues(worker):
+            self._groups[queue][group].add(worker)
+        self._indexed[id(worker)] = (group, worker['cpus'])
+
+    def _remove(self, worker):
+        if id(worker) not in self._indexed:
+            return
+        group, cpus = self._indexed.pop(id(worker))
+        for queue in self._get_queues(worker):
+            self._groups[queue][group].remove(worker, cpus)
+            if not self._groups[queue][group]:
+                del self._groups[queue][group]
+
+    def workers(self):
+        return list(self._workers.values())
+
+    def contains(self, worker):
+        return id(worker) in self._workers
+
+    def allocate(self, worker, bundle_resources):
+        """
+        Deducts the resources of a bundle that was started on |worker|. This is a
+        lower-bound, since resources released by jobs that finish are not used until the
+        index is rebuilt.
+        """
+        self._remove(worker)
+        worker['cpus'] -= bundle_resources.cpus
+        worker['gpus'] -= bundle_resources.gpus
+        worker['memory_bytes'] -= bundle_resources.memory
+        worker['exit_after_num_runs'] -= 1
+        self._add(worker)
+
+    def find(self, bundle, bundle_resources, excluded_worker_ids=()):
+        """
+        Generates the workers that can run the given bundle as (sort key, worker) pairs,
+        in order of preference for running the bundle. Workers are looked at lazily, so
+        taking the first few doesn't cost time proportional to the number of workers.
+        Pairs generated by different indexes can be merged by sort key (e.g. with
+        heapq.merge). The index must not be modified while generating.
+        """
+        # Filter by tag.
+        if bundle.metadata.request_queue:
+            queue = get_requested_tag(bundle.metadata.request_queue)
+            if queue is None:
+                return
+        else:
+            queue = UNTAGGED
+        if queue not in self._groups:
+            return
+        groups = self._groups[queue]
+
+        def can_run(worker):
+            return (
+                worker['cpus'] >= bundle_resources.cpus
+                and (not bundle_resources.gpus or worker['gpus'] >= bundle_resources.gpus)
+                and worker['memory_bytes'] >= bundle_resources.memory
+                and worker['free_disk_bytes'] >= bundle_resources.disk
+                and worker['worker_id'] not in excluded_worker_ids
+            )
+
+        # Count the dependencies each worker has cached using the inverted index.
+        needed_deps = set([(dep.parent_uuid, dep.parent_path) for dep in bundle.dependencies])
+        num_available_deps = defaultdict(int)
+        for dep in needed_deps:
+            for worker_key in self._dependency_workers.get(dep, ()):
+                num_available_deps[worker_key] += 1
+        if needed_deps:
+            for worker_key in self._shared_file_system_workers:
+                num_available_deps[worker_key] = len(needed_deps)
+
+        def get_sort_key(worker):
+            # Subject to the worker meeting the resource requirements of the bundle, we also want to:
+            # 1. prioritize workers that are tag-exclusive.
+            # 2. prioritize workers without GPUs, then workers with fewer free GPUs.
+            # 3. prioritize workers that have more bundle dependencies.
+            # 4. prioritize workers with fewer CPUs.
+            # 5. prioritize workers with fewer running jobs.
+            # 6. break ties randomly by a random seed.
+            #
+            # Breaking ties randomly is important, since multiple workers frequently have the
+            # same number of dependencies and free CPUs for a given bundle (in particular,
+            # bundles with no dependencies) and we may end up selecting the same worker over
+            # and over again for new jobs. While this is not a problem for the performance of
+            # the jobs themselves, this can cause one worker to collect a disproportionate
+            # number of dependencies in its cache.
+            return self._get_group(worker) + (
+                -num_available_deps.get(id(worker), 0),
+                worker['cpus'],
+                len(worker['run_uuids']),
+                random.random(),
+            )
+
+        # Workers with some of the dependencies come first within their group.
+        dependency_workers = defaultdict(list)
+        for worker_key in num_available_deps:
+            worker = self._workers[worker_key]
+            if (
+                worker_key in self._indexed
+                and queue in self._get_queues(worker)
+                and can_run(worker)
+            ):
+                dependency_workers[self._get_group(worker)].append(worker)
+
+        for group in sorted(groups):
+            if group[2] < bundle_resources.gpus:
+                continue
+            for pair in sorted(
+                ((get_sort_key(worker), worker) for worker in dependency_workers[group]),
+                key=lambda pair: pair[0],
+            ):
+                yield pair
+            # Then come the other workers in order of free CPUs, with ties sorted by the rest
+            # of the sort key.
+            workers = (
+                worker
+                for worker in groups[group].at_least(bundle_resources.cpus)
+                if id(worker) not in num_available_deps and can_run(worker)
+            )
+            for _, same_cpus_workers in itertools.groupby(workers, key=lambda w: w['cpus']):
+                for pair in sorted(
+                    ((get_sort_key(worker), worker) for worker in same_cpus_workers),
+                    key=lambda pair: pair[0],
+                ):
+                    yield pair
@@ -0,0 +1,180 @@
+"""
+Local cache of the index.sqlite files of archives stored on Blob Storage, and of the
+SQLiteIndexedTar objects opened with them.
+
+Without the cache, every read from an archive on Blob Storage downloads its whole index,
+which is tens of MB for bundles with many files. Indexes are cached on disk, keyed by the
+archive's path and the etag of its index, so that a re-uploaded bundle never reads a stale
+index. The cache directory can be shared by several processes; the least recently used
+indexes are evicted once it grows past its maximum size.
+"""
+from collections import namedtuple, OrderedDict
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from apache_beam.io.filesystem import CompressionTypes
+from apache_beam.io.filesystems import FileSystems
+
+from codalab.common import parse_linked_bundle_url
+from codalab.lib.beam.ratarmount import SQLiteIndexedTar
+from codalab.lib.formatting import parse_size
+
+logger = logging.getLogger(__name__)
+
+# An open archive: the SQLiteIndexedTar object to read it with, the file object of the archive
+# on Blob Storage that it reads from, and the (archive path, index etag) key it's cached under.
+ArchiveHandle = namedtuple('ArchiveHandle', ['key', 'tf', 'fileobj'])
+
+
+class ArchiveIndexCache(object):
+    """
+    Downloads the indexes of archives on Blob Storage to |cache_dir|, keeping at most
+    |max_size_bytes| bytes of them, and keeps up to |max_idle_handles| SQLiteIndexedTar
+    objects that aren't in use open so that later reads of the same archive can reuse them.
+
+    A SQLiteIndexedTar object can only be used by one reader at a time, so acquire() hands
+    out a handle that no one else is using and release() makes it available again.
+    """
+
+    INDEX_SUFFIX = '.sqlite'
+
+    def __init__(self, cache_dir: str, max_size_bytes: int, max_idle_handles: int = 32):
+        self._cache_dir = cache_dir
+        self._max_size_bytes = max_size_bytes
+        self._max_idle_handles = max_idle_handles
+        self._lock = threading.Lock()
+        # (archive path, index etag) -> list of idle ArchiveHandles, from least to most
+        # recently released.
+        self._idle_handles = OrderedDict()  # type: OrderedDict
+        self._num_idle_handles = 0
+
+    def acquire(self, archive_path: str) -> ArchiveHandle:
+        """
+        Returns an ArchiveHandle for the archive at |archive_path|, which must be given back
+        with release() once the caller is done with it.
+        """
+        index_path = parse_linked_bundle_url(archive_path).index_path
+        key = (archive_path, FileSystems.checksum(index_path))
+        with self._lock:
+            handles = self._idle_handles.get(key)
+            if handles:
+                handle = handles.pop()
+                self._num_idle_handles -= 1
+                if not handles:
+                    del self._idle_handles[key]
+                return handle
+
+        local_index_path = self.get_index(index_path, key[1])
+        fileobj = FileSystems.open(archive_path, compression_type=CompressionTypes.UNCOMPRESSED)
+        try:
+            tf = SQLiteIndexedTar(
+                fileObject=fileobj,
+                tarFileName="contents",
+                writeIndex=False,
+                clearIndexCache=False,
+                indexFileName=local_index_path,
+            )
+        except Exception:
+            fileobj.close()
+            raise
+        return ArchiveHandle(key, tf, fileobj)
+
+    def release(self, handle: ArchiveHandle, reuse: bool = True):
+        """
+        Makes |handle| available to later calls to acquire(), or closes it if |reuse| is
+        False.
+        """
+        if not reuse or self._max_idle_handles <= 0:
+            self._close(handle)
+            return
+        to_close = []
+        with self._lock:
+            self._idle_handles.setdefault(handle.key, []).append(handle)
+            self._idle_handles.move_to_end(handle.key)
+            self._num_idle_handles += 1
+            while self._num_idle_handles > self._max_idle_handles:
+                oldest_key = next(iter(self._idle_handles))
+                handles = self._idle_handles[oldest_key]
+                to_close.append(handles.pop(0))
+                self._num_idle_handles -= 1
+                if not handles:
+                    del self._idle_handles[oldest_key]
+        for old_handle in to_close:
+            self._close(old_handle)
+
+    def get_index(self, index_path: str, etag: str) -> str:
+        """
+        Returns the path of a local copy of the index at |index_path| with the given etag,
+        downloading it if it isn't cached yet.
+        """
+        name = hashlib.sha256((index_path + '\0' + etag).encode()).hexdigest()
+        local_index_path = os.path.join(self._cache_dir, name + self.INDEX_SUFFIX)
+        try:
+            # Mark the index as recently used.
+            os.utime(local_index_path)
+            return local_index_path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self._cache_dir, suffix='.tmp', delete=False
+        ) as index_fileobj:
+            try:
+                with FileSystems.open(
+                    index_path, compression_type=CompressionTypes.UNCOMPRESSED
+                ) as source:
+                    shutil.copyfileobj(source, index_fileobj)
+            except Exception:
+                os.remove(index_fileobj.name)
+                raise
+        os.replace(index_fileobj.name, local_index_path)
+        self._evict(keep=local_index_path)
+        return local_index_path
+
+    def _evict(self, keep: str):
+        """
+        Removes the least recently used indexes, other than |keep|, until the cache fits in
+        its maximum size. Indexes removed while in use stay readable by the SQLiteIndexedTar
+        objects that have them open.
+        """
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if not entry.name.endswith(self.INDEX_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self._max_size_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    @staticmethod
+    def _close(handle: ArchiveHandle):
+        try:
+            if handle.tf.sqlConnection:
+                handle.tf.sqlConnection.close()
+            handle.fileobj.close()
+        except Exception:
+            logger.warning('Failed to close archive index', exc_info=True)
+
+
+archive_index_cache = ArchiveIndexCache(
+    os.environ.get('CODALAB_ARCHIVE_INDEX_CACHE_DIR')
+    or os.path.join(tempfile.gettempdir(), 'codalab-archive-index-cache'),
+    parse_size(os.environ.get('CODALAB_ARCHIVE_INDEX_CACHE_SIZE') or '1g'),
+)
@@ -36,6 +36,7 @@ def wrap_exception(message):
                         raise BundleServiceException(
                             message + ': ' + http.client.responses[e.code] + ' - ' + client_error,
                             400 <= e.code < 500,
+                            e.code,
                         )
                 except json.decoder.JSONDecodeError as e:
                     raise BundleServiceException(message + ': ' + str(e), False)
@@ -57,9 +58,13 @@ class BundleServiceException(RestClientException):
     """
     Exception raised by the BundleServiceClient methods on error. If
     client_error is False, the failure is caused by a server-side error and
-    can be retried.
+    can be retried. status_code is the HTTP status of the response, if any.
     """
 
+    def __init__(self, message, client_error, status_code=None):
+        super(BundleServiceException, self).__init__(message, client_error)
+        self.status_code = status_code
+
 
 class BundleServiceClient(RestClient):
     """
@@ -127,6 +132,22 @@ class BundleServiceClient(RestClient):
             'POST', self._worker_url_prefix(worker_id) + '/checkin', data=request_data
         )
 
+    @wrap_exception('Unable to check in with bundle service')
+    def heartbeat(self, worker_id, request_data):
+        return self._make_request(
+            'POST', self._worker_url_prefix(worker_id) + '/heartbeat', data=request_data
+        )
+
+    @wrap_exception('Unable to get messages from bundle service')
+    def get_message(self, worker_id):
+        """
+        Waits for the next message for the worker. The server holds the request open for up
+        to 30 seconds and returns None if no message arrives in that time.
+        """
+        return self._make_request(
+            'GET', self._worker_url_prefix(worker_id) + '/messages', timeout_seconds=60
+        )
+
     @wrap_exception('Unable to reply to message from bundle service')
     def reply(self, worker_id, socket_id, message):
         self._make_request(
@@ -195,3 +216,17 @@ class BundleServiceClient(RestClient):
             timeout_seconds=URLOPEN_TIMEOUT_SECONDS * 2,
         )
         return response
+
+    @wrap_exception('Unable to get bundle contents from bundle service')
+    def get_bundle_contents_range(self, uuid, path, start, end):
+        """
+        Returns a file-like object with the bytes [start, end) of the file at the given
+        path, uncompressed.
+        """
+        return self._make_request(
+            'GET',
+            '/bundles/' + uuid + '/contents/blob/' + path,
+            headers={'Range': 'bytes=%d-%d' % (start, end - 1)},
+            return_response=True,
+            timeout_seconds=URLOPEN_TIMEOUT_SECONDS * 2,
+        )
@@ -0,0 +1,169 @@
+"""
+Gzip compression of the streams that bundle contents are transferred in (directory downloads,
+worker result uploads and CLI uploads).
+
+ParallelGzipStream compresses a stream the way pigz does: the input is split into blocks that
+are deflated independently on a thread pool (zlib releases the GIL while it compresses), each
+primed with the last 32KiB of the block before it, so the ratio stays close to that of a
+single stream. The blocks are joined into a single gzip member, so the output is a regular
+.gz file that any gzip reader (including un_gzip_stream and un_tar_directory) accepts.
+
+file_util.GzipStream and file_util.tar_gzip_directory use the level and number of threads set
+with configure(). Level 0 is the "uncompressed" mode for transfers over fast networks: the data
+is sent as stored deflate blocks, which costs no CPU besides the CRC but is still a valid .gz.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import struct
+import threading
+import zlib
+from typing import IO
+
+from codalab.worker.un_gzip_stream import BytesBuffer
+
+DEFAULT_LEVEL = 6
+DEFAULT_THREADS = min(4, os.cpu_count() or 1)
+
+# Size of the blocks that are compressed independently, and of the window that each block is
+# primed with (the maximum distance of a deflate back-reference).
+BLOCK_SIZE = 128 * 1024
+DICT_SIZE = 32 * 1024
+
+# Header of a gzip member with no file name and no modification time, like `gzip -n` writes.
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+_level = DEFAULT_LEVEL
+_threads = DEFAULT_THREADS
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configure(level=None, threads=None):
+    """
+    Sets the compression level (0-9, where 0 means uncompressed) and the number of threads
+    used to compress streams. Arguments that are None keep their current value.
+    """
+    global _level, _threads, _executor
+    if level is not None:
+        if not 0 <= level <= 9:
+            raise ValueError('Compression level must be between 0 and 9, got %s' % level)
+        _level = level
+    if threads is not None:
+        if threads < 1:
+            raise ValueError('Number of compression threads must be at least 1, got %s' % threads)
+        with _executor_lock:
+            if threads != _threads and _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+            _threads = threads
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(_threads, thread_name_prefix='gzip')
+        return _executor
+
+
+def get_stream_options():
+    """
+    Returns the keyword arguments to create a ParallelGzipStream with the configured level and
+    number of threads.
+    """
+    executor = _get_executor() if _threads > 1 else None
+    return {'level': _level, 'executor': executor, 'max_pending': 2 * _threads}
+
+
+def _compress_block(block, zdict, level, last):
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # A sync flush ends the block on a byte boundary without marking it as the last one, so
+    # that the next block can simply be appended.
+    return compressor.compress(block) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+
+
+class ParallelGzipStream(object):
+    """
+    File-like object that reads |fileobj| gzipped at the given level. Blocks are compressed
+    on |executor| (or in the reading thread if it's None), with at most |max_pending| of them
+    in flight at once, and the output is the same whatever the executor.
+    """
+
+    def __init__(
+        self, fileobj: IO[bytes], level=DEFAULT_LEVEL, executor=None, max_pending=1,
+    ):
+        self.__input = fileobj
+        self.__level = level
+        self.__executor = executor
+        self.__max_pending = max(1, max_pending)
+        self.__pending = deque()  # type: deque
+        self.__buffer = BytesBuffer()
+        self.__buffer.write(GZIP_HEADER)
+        self.__crc = 0
+        self.__size = 0
+        self.__zdict = b''
+        self.__input_done = False
+        self.__done = False
+
+    def __submit(self, block, last):
+        # Level 0 stores blocks as they are, so there is nothing for a dictionary to help with.
+        zdict = self.__zdict if self.__level > 0 else b''
+        if self.__executor is None:
+            self.__pending.append(_compress_block(block, zdict, self.__level, last))
+        else:
+            self.__pending.append(
+                self.__executor.submit(_compress_block, block, zdict, self.__level, last)
+            )
+        self.__zdict = block[-DICT_SIZE:]
+
+    def __fill(self):
+        """
+        Reads blocks of the input until |max_pending| are being compressed or the input ends.
+        """
+        while not self.__input_done and len(self.__pending) < self.__max_pending:
+            block = self.__input.read(BLOCK_SIZE)
+            if block:
+                self.__crc = zlib.crc32(block, self.__crc)
+                self.__size += len(block)
+                self.__submit(block, last=False)
+            else:
+                # Ends the deflate stream with an empty last block.
+                self.__submit(b'', last=True)
+                self.__input_done = True
+
+    def __write_next(self):
+        """
+        Writes the next compressed block to the buffer, or the trailer once all blocks are
+        written. Returns False when there is nothing left to write.
+        """
+        self.__fill()
+        if self.__pending:
+            block = self.__pending.popleft()
+            self.__buffer.write(block if isinstance(block, bytes) else block.result())
+            return True
+        if not self.__done:
+            self.__buffer.write(struct.pack('<II', self.__crc, self.__size & 0xFFFFFFFF))
+            self.__done = True
+            return True
+        return False
+
+    def read(self, num_bytes=None) -> bytes:
+        while num_bytes is None or num_bytes < 0 or len(self.__buffer) < num_bytes:
+            if not self.__write_next():
+                break
+        if num_bytes is None or num_bytes < 0:
+            num_bytes = len(self.__buffer)
+        return self.__buffer.read(num_bytes)
+
+    def close(self):
+        for block in self.__pending:
+            if not isinstance(block, bytes):
+                block.cancel()
+        self.__pending.clear()
+        self.__input.close()
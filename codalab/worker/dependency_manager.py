@@ -6,12 +6,14 @@ import time
 import shutil
 from contextlib import closing
 from collections import namedtuple
-from typing import Dict, Set
+from typing import Dict, Optional, Set
 
 import codalab.worker.pyjson
 from .bundle_service_client import BundleServiceClient
 from codalab.lib.formatting import size_str
+from codalab.worker.dependency_store import DependencyStore
 from codalab.worker.file_util import remove_path
+from codalab.worker.range_download import RangeDownload, TransferLimiter
 from codalab.worker.un_tar_directory import un_tar_directory
 from codalab.worker.fsm import BaseDependencyManager, DependencyStage, StateTransitioner
 from codalab.worker.worker_thread import ThreadDict
@@ -45,7 +47,15 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
     """
 
     DEPENDENCIES_DIR_NAME = 'dependencies'
+    # Partial downloads live outside of DEPENDENCIES_DIR_NAME, since _sync_state only keeps
+    # the paths of known dependencies there.
+    PARTIAL_DEPENDENCIES_DIR_NAME = 'dependencies-partial'
+    # References to the contents in the DependencyStore that dependencies are linked to.
+    STORE_REFS_DIR_NAME = 'dependencies-store-refs'
     DEPENDENCY_FAILURE_COOLDOWN = 10
+    # File dependencies at least this large are downloaded in parallel byte ranges, which
+    # resume where they left off after a failure or a worker restart.
+    RANGE_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
     # TODO(bkgoksel): The server writes these to the worker_dependencies table, which stores the dependencies
     # json as a SqlAlchemy LargeBinary, which defaults to MySQL BLOB, which has a size limit of
     # 65K. For now we limit this value to about 58K to avoid any issues but we probably want to do
@@ -60,6 +70,10 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
         worker_dir: str,
         max_cache_size_bytes: int,
         download_dependencies_max_retries: int,
+        download_dependencies_parallelism: int = 4,
+        download_dependencies_max_connections: int = 8,
+        download_dependencies_max_rate: Optional[int] = None,
+        dependency_store_dir: Optional[str] = None,
     ):
         super(DependencyManager, self).__init__()
         self.add_transition(DependencyStage.DOWNLOADING, self._transition_from_DOWNLOADING)
@@ -74,6 +88,25 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
         if not os.path.exists(self.dependencies_dir):
             logger.info('{} doesn\'t exist, creating.'.format(self.dependencies_dir))
             os.makedirs(self.dependencies_dir, 0o770)
+        self.partial_dependencies_dir = os.path.join(
+            worker_dir, DependencyManager.PARTIAL_DEPENDENCIES_DIR_NAME
+        )
+        if not os.path.exists(self.partial_dependencies_dir):
+            os.makedirs(self.partial_dependencies_dir, 0o770)
+
+        # Dependencies are downloaded to the store shared by the workers on this host, if any,
+        # and linked from there.
+        self._store = DependencyStore(dependency_store_dir) if dependency_store_dir else None
+        self.store_refs_dir = os.path.join(worker_dir, DependencyManager.STORE_REFS_DIR_NAME)
+        if self._store is not None:
+            self._store.check_can_link(self.store_refs_dir)
+
+        # Number of ranges of a single file to download at once, and limits on the
+        # connections and bytes per second that all downloads use together.
+        self._download_parallelism = download_dependencies_parallelism
+        self._download_limiter = TransferLimiter(
+            download_dependencies_max_connections, download_dependencies_max_rate
+        )
 
         # Locks for concurrency
         self._dependency_locks = dict()  # type: Dict[DependencyKey, threading.RLock]
@@ -133,6 +166,13 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
         # Get the paths that exist in dependency state, loaded path and
         # the local file system (the dependency directories under self.dependencies_dir)
         local_directories = set(os.listdir(self.dependencies_dir))
+        # Dependencies that were being downloaded in ranges are resumed.
+        local_directories.update(
+            dep_state.path
+            for dep_state in self._dependencies.values()
+            if dep_state.stage == DependencyStage.DOWNLOADING
+            and os.path.exists(self._partial_path(dep_state.path))
+        )
         paths_in_loaded_state = [dep_state.path for dep_state in self._dependencies.values()]
         self._paths = self._paths.intersection(paths_in_loaded_state).intersection(
             local_directories
@@ -165,6 +205,23 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
             )
             remove_path(full_path)
 
+        # Release the contents in the store that orphaned dependencies were linked to
+        if os.path.exists(self.store_refs_dir):
+            for path in set(os.listdir(self.store_refs_dir)) - self._paths:
+                self._release_from_store(path)
+
+        # Remove the partial downloads of dependencies that are no longer being downloaded
+        partial_file_names = set()
+        for dep_state in self._dependencies.values():
+            if dep_state.stage == DependencyStage.DOWNLOADING:
+                partial_path = self._partial_path(dep_state.path)
+                partial_file_names.update(
+                    os.path.basename(path) for path in RangeDownload.get_paths(partial_path)
+                )
+        for file_name in os.listdir(self.partial_dependencies_dir):
+            if file_name not in partial_file_names:
+                remove_path(os.path.join(self.partial_dependencies_dir, file_name))
+
         # Save the current synced state back to the state file: dependency-state.json as
         # the current state might have been changed during the state syncing phase
         self._save_state()
@@ -283,7 +340,8 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
             try:
                 path_to_remove = self._dependencies[dependency_key].path
                 self._paths.remove(path_to_remove)
-                remove_path(path_to_remove)
+                remove_path(os.path.join(self.dependencies_dir, path_to_remove))
+                self._release_from_store(path_to_remove)
             except Exception:
                 pass
             finally:
@@ -412,11 +470,105 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
         except Exception:
             raise
 
+    def _partial_path(self, path):
+        """
+        Returns the path to download the dependency with the given path to in ranges.
+        """
+        return os.path.join(self.partial_dependencies_dir, path + '.partial')
+
+    def _store_ref_path(self, path, key):
+        """
+        Returns the path of the reference of the dependency with the given path to the contents
+        of key in the store.
+        """
+        return os.path.join(self.store_refs_dir, path, key)
+
+    def _release_from_store(self, path):
+        """
+        Releases the contents in the store that the dependency with the given path is linked to.
+        """
+        refs_path = os.path.join(self.store_refs_dir, path)
+        if not os.path.exists(refs_path):
+            return
+        if self._store is not None:
+            for key in os.listdir(refs_path):
+                self._store.release(key, self._store_ref_path(path, key))
+        remove_path(refs_path)
+
     @property
     def all_dependencies(self):
         with self._global_lock:
             return list(self._dependencies.keys())
 
+    def _download_stream(self, dependency_state, dependency_path, target_type, progress_callback):
+        """
+        Downloads the dependency in a single request, passing the number of bytes downloaded
+        so far to progress_callback.
+        """
+        with self._download_limiter.connection():
+            fileobj = self._bundle_service.get_bundle_contents(
+                dependency_state.dependency_key.parent_uuid,
+                dependency_state.dependency_key.parent_path,
+            )
+            with closing(fileobj):
+                # "Bug" the fileobj's read function so that we can keep
+                # track of the number of bytes downloaded so far.
+                old_read_method = fileobj.read
+                bytes_downloaded = [0]
+
+                def interruptable_read(*args, **kwargs):
+                    data = old_read_method(*args, **kwargs)
+                    bytes_downloaded[0] += len(data)
+                    self._download_limiter.throttle(len(data))
+                    progress_callback(bytes_downloaded[0])
+                    return data
+
+                fileobj.read = interruptable_read
+
+                # Start copying the fileobj to filesystem dependency path
+                self._store_dependency(dependency_path, fileobj, target_type)
+
+    def _store_downloaded_file(self, dependency_path, downloaded_path):
+        """
+        Moves a file dependency that has been downloaded to downloaded_path to its path, which
+        can be in the store on another file system.
+        """
+        if os.path.exists(dependency_path):
+            logger.info('Path %s already exists, overwriting', dependency_path)
+            remove_path(dependency_path)
+        shutil.move(downloaded_path, dependency_path)
+
+    def _download(self, dependency_state, download_path, target_info, progress_callback):
+        """
+        Downloads the dependency, whose target info is target_info, to download_path, passing
+        the number of bytes downloaded so far to progress_callback.
+        """
+        if (
+            target_info['type'] == 'file'
+            and target_info.get('size', 0) >= self.RANGE_DOWNLOAD_MIN_SIZE
+        ):
+            range_download = RangeDownload(
+                lambda start, end: self._bundle_service.get_bundle_contents_range(
+                    dependency_state.dependency_key.parent_uuid,
+                    dependency_state.dependency_key.parent_path,
+                    start,
+                    end,
+                ),
+                target_info['size'],
+                self._partial_path(dependency_state.path),
+                self._download_parallelism,
+                self._download_limiter,
+                progress_callback,
+            )
+            # Resumes from the ranges downloaded by earlier attempts, if any.
+            range_download.run()
+            self._store_downloaded_file(download_path, self._partial_path(dependency_state.path))
+            range_download.remove()
+        else:
+            self._download_stream(
+                dependency_state, download_path, target_info['type'], progress_callback
+            )
+
     def _transition_from_DOWNLOADING(self, dependency_state):
         def download():
             def update_state_and_check_killed(bytes_downloaded):
@@ -442,30 +594,47 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
             while attempt < self._download_dependencies_max_retries:
                 try:
                     # Start async download to the fileobj
-                    target_type = self._bundle_service.get_bundle_info(
-                        dependency_state.dependency_key.parent_uuid,
-                        dependency_state.dependency_key.parent_path,
-                    )["type"]
-                    fileobj = self._bundle_service.get_bundle_contents(
+                    target_info = self._bundle_service.get_bundle_info(
                         dependency_state.dependency_key.parent_uuid,
                         dependency_state.dependency_key.parent_path,
                     )
-                    with closing(fileobj):
-                        # "Bug" the fileobj's read function so that we can keep
-                        # track of the number of bytes downloaded so far.
-                        old_read_method = fileobj.read
-                        bytes_downloaded = [0]
-
-                        def interruptable_read(*args, **kwargs):
-                            data = old_read_method(*args, **kwargs)
-                            bytes_downloaded[0] += len(data)
-                            update_state_and_check_killed(bytes_downloaded[0])
-                            return data
-
-                        fileobj.read = interruptable_read
-
-                        # Start copying the fileobj to filesystem dependency path
-                        self._store_dependency(dependency_path, fileobj, target_type)
+                    target_type = target_info["type"]
+                    # Servers that don't report data hashes, or bundles without one, bypass
+                    # the store.
+                    data_hash = target_info.get('data_hash')
+                    if self._store is not None and data_hash:
+                        key = DependencyStore.get_key(
+                            data_hash, dependency_state.dependency_key.parent_path
+                        )
+                        with self._store.lock(
+                            key, wait_callback=lambda: update_state_and_check_killed(0)
+                        ):
+                            if self._store.has(key):
+                                logger.debug(
+                                    'Dependency %s found in store', dependency_state.dependency_key,
+                                )
+                                update_state_and_check_killed(target_info.get('size', 0))
+                            else:
+                                temp_path = self._store.get_temp_path(key)
+                                self._download(
+                                    dependency_state,
+                                    temp_path,
+                                    target_info,
+                                    update_state_and_check_killed,
+                                )
+                                self._store.add(key, temp_path)
+                            self._store.link(
+                                key,
+                                dependency_path,
+                                self._store_ref_path(dependency_state.path, key),
+                            )
+                    else:
+                        self._download(
+                            dependency_state,
+                            dependency_path,
+                            target_info,
+                            update_state_and_check_killed,
+                        )
 
                     logger.debug(
                         'Finished downloading %s dependency %s to %s',
@@ -478,7 +647,13 @@ class DependencyManager(StateTransitioner, BaseDependencyManager):
 
                 except Exception as e:
                     attempt += 1
+                    if isinstance(e, DownloadAbortedException):
+                        attempt = self._download_dependencies_max_retries
                     if attempt >= self._download_dependencies_max_retries:
+                        for path in RangeDownload.get_paths(
+                            self._partial_path(dependency_state.path)
+                        ):
+                            remove_path(path)
                         with self._dependency_locks[dependency_state.dependency_key]:
                             self._downloading[dependency_state.dependency_key]['success'] = False
                             self._downloading[dependency_state.dependency_key][
@@ -0,0 +1,175 @@
+"""
+DependencyStore is a content-addressed store of dependency contents that the workers running on
+the same host share, so that the same data (e.g., copies of a bundle, or a dataset that several
+workers depend on) is downloaded and stored once.
+
+Contents are keyed by the data hash of the parent bundle and the path within it, and each
+worker hard-links them into its own dependencies directory, which runs mount read-only. Workers
+coordinate through a lock file per key, which is held while the contents are downloaded, linked
+or removed.
+
+Each worker that links the contents of a key also links the key's anchor file into a directory
+of its own, so the link count of the anchor is the number of workers using the key (plus one).
+When it drops back to one, the contents are removed. Since the references are links, they go
+away with the worker's directory, and a worker that is removed for good doesn't leak contents.
+This needs the store to be on the same file system as the directories of the workers, which
+check_can_link() checks when a worker starts.
+"""
+from contextlib import contextmanager
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from codalab.worker.file_util import remove_path
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyStoreException(Exception):
+    pass
+
+
+class DependencyStore(object):
+    OBJECTS_DIR_NAME = 'objects'
+    LOCKS_DIR_NAME = 'locks'
+    ANCHOR_SUFFIX = '.anchor'
+    TEMP_SUFFIX = '.tmp'
+    # Seconds between attempts to take the lock of a key that another worker holds.
+    LOCK_POLL_INTERVAL = 1
+
+    def __init__(self, store_dir):
+        self.objects_dir = os.path.join(store_dir, DependencyStore.OBJECTS_DIR_NAME)
+        self.locks_dir = os.path.join(store_dir, DependencyStore.LOCKS_DIR_NAME)
+        for path in [self.objects_dir, self.locks_dir]:
+            os.makedirs(path, 0o770, exist_ok=True)
+
+    def check_can_link(self, dir_path):
+        """
+        Raises a DependencyStoreException if files in the store can't be hard-linked into
+        |dir_path|, which happens when it's on another file system.
+        """
+        os.makedirs(dir_path, 0o770, exist_ok=True)
+        fd, probe_path = tempfile.mkstemp(dir=self.locks_dir, suffix=DependencyStore.TEMP_SUFFIX)
+        os.close(fd)
+        link_path = os.path.join(dir_path, os.path.basename(probe_path))
+        try:
+            os.link(probe_path, link_path)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                message = 'it must be on the same file system'
+            else:
+                message = str(e)
+            raise DependencyStoreException(
+                'Dependency store %s can\'t link files into %s: %s'
+                % (os.path.dirname(self.objects_dir), dir_path, message)
+            )
+        else:
+            os.remove(link_path)
+        finally:
+            os.remove(probe_path)
+
+    @staticmethod
+    def get_key(data_hash, parent_path):
+        """
+        Returns the key of the contents at |parent_path| within a bundle with |data_hash|.
+        """
+        return hashlib.sha1(('%s/%s' % (data_hash, parent_path or '')).encode()).hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.objects_dir, key)
+
+    def _get_anchor_path(self, key):
+        return os.path.join(self.objects_dir, key + DependencyStore.ANCHOR_SUFFIX)
+
+    @contextmanager
+    def lock(self, key, wait_callback=None):
+        """
+        Holds the lock of |key|, which can be held by one thread of one worker at a time.
+        While another worker holds it, |wait_callback| is called every LOCK_POLL_INTERVAL
+        seconds (and can raise to stop waiting).
+        """
+        with open(os.path.join(self.locks_dir, key), 'a') as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if wait_callback:
+                        wait_callback()
+                    time.sleep(DependencyStore.LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def has(self, key):
+        """
+        Returns whether the store has the contents of |key|. Call with the lock of |key| held.
+        """
+        return os.path.exists(self._get_anchor_path(key))
+
+    def get_temp_path(self, key):
+        """
+        Returns the path to download the contents of |key| to before adding them with add().
+        Call with the lock of |key| held.
+        """
+        path = self._get_path(key) + DependencyStore.TEMP_SUFFIX
+        # Left over by a worker that failed while downloading.
+        remove_path(path)
+        return path
+
+    def add(self, key, temp_path):
+        """
+        Adds the contents downloaded to |temp_path| as the contents of |key|. Call with the lock
+        of |key| held.
+        """
+        path = self._get_path(key)
+        remove_path(path)
+        os.rename(temp_path, path)
+        open(self._get_anchor_path(key), 'w').close()
+
+    def link(self, key, dest_path, ref_path):
+        """
+        Hard-links the contents of |key| to |dest_path|, and the anchor of |key| to |ref_path|,
+        which the caller passes to release() once it no longer uses the contents. Call with the
+        lock of |key| held.
+        """
+        path = self._get_path(key)
+        remove_path(dest_path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.copytree(path, dest_path, symlinks=True, copy_function=_link_or_copy)
+        else:
+            _link_or_copy(path, dest_path)
+        if not os.path.exists(ref_path):
+            os.makedirs(os.path.dirname(ref_path), 0o770, exist_ok=True)
+            os.link(self._get_anchor_path(key), ref_path)
+
+    def release(self, key, ref_path):
+        """
+        Removes the reference |ref_path| to the contents of |key|, and the contents if no
+        worker uses them anymore.
+        """
+        with self.lock(key):
+            remove_path(ref_path)
+            anchor_path = self._get_anchor_path(key)
+            if os.path.exists(anchor_path) and os.stat(anchor_path).st_nlink <= 1:
+                logger.info('Removing dependency contents %s, which no worker uses', key)
+                os.remove(anchor_path)
+                remove_path(self._get_path(key))
+
+
+def _link_or_copy(src, dst):
+    """
+    Hard-links |src| to |dst|, or copies it if they are on different file systems.
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copy2(src, dst)
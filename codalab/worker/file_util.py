@@ -1,16 +1,17 @@
-from contextlib import closing
+from contextlib import closing, ExitStack
 from io import BytesIO, TextIOWrapper
 import gzip
 import logging
 import os
 import shutil
 import subprocess
+import time
 import bz2
 import hashlib
 
 from codalab.common import BINARY_PLACEHOLDER, UsageError
 from codalab.common import parse_linked_bundle_url
-from codalab.worker.un_gzip_stream import BytesBuffer
+from codalab.worker.compression import get_stream_options, ParallelGzipStream
 from codalab.worker.tar_subdir_stream import TarSubdirStream
 from codalab.worker.tar_file_stream import TarFileStream
 from apache_beam.io.filesystem import CompressionTypes
@@ -18,6 +19,7 @@ from apache_beam.io.filesystems import FileSystems
 import tempfile
 import tarfile
 from codalab.lib.beam.ratarmount import SQLiteIndexedTar, FileInfo
+from codalab.worker.archive_index_cache import archive_index_cache
 from typing import IO, cast
 
 NONE_PLACEHOLDER = '<none>'
@@ -62,7 +64,8 @@ def tar_gzip_directory(
                       the directory structure are excluded.
     ignore_file: Name of the file where exclusion patterns are read from.
     """
-    args = ['tar', 'czf', '-', '-C', directory_path]
+    # The archive is gzipped by GzipStream rather than by tar, which only uses one core.
+    args = ['tar', 'cf', '-', '-C', directory_path]
 
     # If the BSD tar library is being used, append --disable-copy to prevent creating ._* files
     if 'bsdtar' in get_tar_version_output():
@@ -88,7 +91,7 @@ def tar_gzip_directory(
     args.append('.')
     try:
         proc = subprocess.Popen(args, stdout=subprocess.PIPE)
-        return proc.stdout
+        return GzipStream(proc.stdout)
     except subprocess.CalledProcessError as e:
         raise IOError(e.output)
 
@@ -197,35 +200,24 @@ class OpenIndexedArchiveFile(object):
     SQLiteIndexedTar object.
 
     This way, the archive file can be read and specific files can be extracted without
-    needing to download the entire archive file.
+    needing to download the entire archive file. The index is cached locally and the
+    SQLiteIndexedTar object is reused by later reads of the same archive once this context
+    manager exits (see archive_index_cache).
 
     Returns the SQLiteIndexedTar object.
     """
 
     def __init__(self, path: str):
-        self.f = FileSystems.open(path, compression_type=CompressionTypes.UNCOMPRESSED)
         self.path = path
-        with tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False) as index_fileobj:
-            self.index_file_name = index_fileobj.name
-            shutil.copyfileobj(
-                FileSystems.open(
-                    parse_linked_bundle_url(self.path).index_path,
-                    compression_type=CompressionTypes.UNCOMPRESSED,
-                ),
-                index_fileobj,
-            )
+        self.handle = None
 
     def __enter__(self) -> SQLiteIndexedTar:
-        return SQLiteIndexedTar(
-            fileObject=self.f,
-            tarFileName="contents",
-            writeIndex=False,
-            clearIndexCache=False,
-            indexFileName=self.index_file_name,
-        )
+        self.handle = archive_index_cache.acquire(self.path)
+        return self.handle.tf
 
     def __exit__(self, type, value, traceback):
-        os.remove(self.index_file_name)
+        # Don't reuse the SQLiteIndexedTar object if reading from it failed.
+        archive_index_cache.release(self.handle, reuse=type is None)
 
 
 class OpenFile(object):
@@ -267,7 +259,10 @@ class OpenFile(object):
                     raise IOError("Directories must be gzipped.")
                 return FileSystems.open(self.path, compression_type=CompressionTypes.UNCOMPRESSED)
             # If a file path is specified within an archive file on Blob Storage, open the specified path within the archive.
-            with OpenIndexedArchiveFile(linked_bundle_path.bundle_path) as tf:
+            # The archive is kept open until the returned stream is closed, so the stack is handed over to
+            # TarFileStream when streaming a single file.
+            with ExitStack() as stack:
+                tf = stack.enter_context(OpenIndexedArchiveFile(linked_bundle_path.bundle_path))
                 isdir = lambda finfo: finfo.type == tarfile.DIRTYPE
                 # If the archive file is a .tar.gz file, open the specified archive subpath within the archive.
                 # If it is a .gz file, open the "/contents" entry, which represents the actual gzipped file.
@@ -286,7 +281,7 @@ class OpenFile(object):
                     return GzipStream(TarSubdirStream(self.path))
                 else:
                     # Stream a single file from within the archive
-                    fs = TarFileStream(tf, finfo)
+                    fs = TarFileStream(tf, finfo, stack.pop_all())
                     return GzipStream(fs) if self.gzipped else fs
         else:
             # Stream a directory or file from disk storage.
@@ -304,26 +299,13 @@ class OpenFile(object):
         pass
 
 
-class GzipStream(BytesIO):
-    """A stream that gzips a file in chunks.
+class GzipStream(ParallelGzipStream):
+    """A stream that gzips a file in chunks, with the level and number of threads set with
+    compression.configure().
     """
 
     def __init__(self, fileobj: IO[bytes]):
-        self.__input = fileobj
-        self.__buffer = BytesBuffer()
-        self.__gzip = gzip.GzipFile(None, mode='wb', fileobj=self.__buffer)
-
-    def read(self, num_bytes=None) -> bytes:
-        while num_bytes is None or len(self.__buffer) < num_bytes:
-            s = self.__input.read(num_bytes)
-            if not s:
-                self.__gzip.close()
-                break
-            self.__gzip.write(s)
-        return self.__buffer.read(num_bytes)
-
-    def close(self):
-        self.__input.close()
+        super().__init__(fileobj, **get_stream_options())
 
 
 def gzip_file(file_path: str) -> IO[bytes]:
@@ -430,6 +412,33 @@ def read_file_section(file_path, offset, length):
         return fileobj.read(length)
 
 
+def follow_files(file_paths, offsets, timeout_secs, poll_interval_secs=0.5, chunk_size=1024 * 1024):
+    """
+    Follows files as they are appended to, like `tail -f`. |file_paths| maps keys to the paths
+    of the files, and |offsets| maps the same keys to the offset to start reading each file from.
+    Yields (key, offset, bytes) for each section read, until the files have been read to the end
+    after |timeout_secs| seconds (so once, if it's 0). Files that don't exist (yet) and
+    directories are skipped.
+    """
+    offsets = dict(offsets)
+    deadline = time.time() + timeout_secs
+    while True:
+        for key, file_path in file_paths.items():
+            while True:
+                try:
+                    data = read_file_section(file_path, offsets[key], chunk_size)
+                except IOError:
+                    break
+                if not data:
+                    break
+                yield key, offsets[key], data
+                offsets[key] += len(data)
+        remaining_secs = deadline - time.time()
+        if remaining_secs <= 0:
+            return
+        time.sleep(min(poll_interval_secs, remaining_secs))
+
+
 def summarize_file(file_path, num_head_lines, num_tail_lines, max_line_length, truncation_text):
     """
     Summarizes the file at the given path, returning a string containing the
@@ -18,9 +18,10 @@ from codalab.common import SingularityError
 from codalab.lib.formatting import parse_size
 from codalab.lib.telemetry_util import initialize_sentry, load_sentry_data, using_sentry
 from .bundle_service_client import BundleServiceClient, BundleAuthException
-from . import docker_utils
+from . import compression, docker_utils
 from .worker import Worker
 from codalab.worker.dependency_manager import DependencyManager
+from codalab.worker.dependency_store import DependencyStoreException
 from codalab.worker.docker_image_manager import DockerImageManager
 from codalab.worker.singularity_image_manager import SingularityImageManager
 
@@ -184,6 +185,49 @@ def parse_args():
         default=3,
         help='The number of times to retry downloading dependencies after a failure (defaults to 3).',
     )
+    parser.add_argument(
+        '--download-dependencies-parallelism',
+        type=int,
+        default=4,
+        help='The number of byte ranges of a large file dependency to download at once (defaults to 4).',
+    )
+    parser.add_argument(
+        '--download-dependencies-max-connections',
+        type=int,
+        default=8,
+        help='The maximum number of connections that all dependency downloads use together '
+        '(defaults to 8).',
+    )
+    parser.add_argument(
+        '--download-dependencies-max-rate',
+        type=parse_size,
+        metavar='SIZE',
+        default=None,
+        help='Limit the total bandwidth of dependency downloads to the specified amount of bytes '
+        'per second (e.g. 3, 3k, 3m, 3g, 3t). Unlimited if not specified.',
+    )
+    parser.add_argument(
+        '--dependency-store-dir',
+        default=None,
+        help='Directory of a store of dependency contents shared by the workers on this host, '
+        'which link dependencies from it instead of each downloading and storing them. Must be '
+        'on the same file system as the work directory. Not used if not specified.',
+    )
+    parser.add_argument(
+        '--compression-level',
+        type=int,
+        default=compression.DEFAULT_LEVEL,
+        help='The gzip level (0-9) of bundle contents uploaded to the server. 0 sends them '
+        'uncompressed, which can be faster on a fast network (defaults to %d).'
+        % compression.DEFAULT_LEVEL,
+    )
+    parser.add_argument(
+        '--compression-threads',
+        type=int,
+        default=compression.DEFAULT_THREADS,
+        help='The number of threads that compress bundle contents uploaded to the server '
+        '(defaults to %d on this machine).' % compression.DEFAULT_THREADS,
+    )
     parser.add_argument(
         '--shared-memory-size-gb',
         type=int,
@@ -244,6 +288,7 @@ def main():
     )
 
     logging.getLogger('urllib3').setLevel(logging.INFO)
+    compression.configure(level=args.compression_level, threads=args.compression_threads)
     # Initialize sentry logging
     if using_sentry():
         initialize_sentry()
@@ -262,13 +307,21 @@ def main():
         dependency_manager = None
     else:
         local_bundles_dir = os.path.join(args.work_dir, 'runs')
-        dependency_manager = DependencyManager(
-            os.path.join(args.work_dir, 'dependencies-state.json'),
-            bundle_service,
-            args.work_dir,
-            args.max_work_dir_size,
-            args.download_dependencies_max_retries,
-        )
+        try:
+            dependency_manager = DependencyManager(
+                os.path.join(args.work_dir, 'dependencies-state.json'),
+                bundle_service,
+                args.work_dir,
+                args.max_work_dir_size,
+                args.download_dependencies_max_retries,
+                args.download_dependencies_parallelism,
+                args.download_dependencies_max_connections,
+                args.download_dependencies_max_rate,
+                args.dependency_store_dir,
+            )
+        except DependencyStoreException as e:
+            logger.error('%s (see --dependency-store-dir)', e)
+            sys.exit(1)
 
     if args.container_runtime == "singularity":
         singularity_folder = os.path.join(args.work_dir, 'codalab_singularity_images')
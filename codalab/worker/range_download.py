@@ -0,0 +1,204 @@
+"""
+Downloads of large files from the bundle service in parallel byte ranges, which resume from
+the ranges already downloaded after a failure or a worker restart, and a limiter for the
+connections and bandwidth that all of a worker's downloads share.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TransferLimiter(object):
+    """
+    Limits the number of concurrent connections and, optionally, the total bandwidth used by
+    all the transfers that share it.
+    """
+
+    def __init__(self, max_connections, max_bytes_per_second=None):
+        self._connections = threading.BoundedSemaphore(max_connections)
+        self._max_bytes_per_second = max_bytes_per_second
+        self._lock = threading.Lock()
+        # Time at which the bytes transferred so far have been paid for at the maximum rate.
+        self._paid_until = 0.0
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that holds one of the connections while a transfer is in progress.
+        """
+        with self._connections:
+            yield
+
+    def throttle(self, num_bytes):
+        """
+        Called after transferring |num_bytes| bytes. Sleeps as long as needed to keep the
+        total rate under the limit, allowing bursts of up to a second's worth of data.
+        """
+        if not self._max_bytes_per_second:
+            return
+        with self._lock:
+            now = time.time()
+            self._paid_until = (
+                max(self._paid_until, now - 1) + float(num_bytes) / self._max_bytes_per_second
+            )
+            delay = self._paid_until - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RangeDownload(object):
+    """
+    Downloads a file of |size| bytes to |partial_path| in ranges of |chunk_size| bytes, up to
+    |parallelism| of them at a time. fetch_range(start, end) should return a file-like object
+    with the bytes [start, end) of the file.
+
+    The chunks that have been completely written (and synced to disk) are recorded in
+    |partial_path| + '.json', so a download that fails or is interrupted resumes from the
+    chunks that are missing when it's run again.
+    """
+
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(
+        self,
+        fetch_range,
+        size,
+        partial_path,
+        parallelism,
+        limiter,
+        progress_callback=None,
+        chunk_size=16 * 1024 * 1024,
+    ):
+        self._fetch_range = fetch_range
+        self._size = size
+        self._partial_path = partial_path
+        self._progress_path = partial_path + '.json'
+        self._parallelism = parallelism
+        self._limiter = limiter
+        self._progress_callback = progress_callback
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self._done_chunks = set()
+        self._bytes_downloaded = 0
+
+    @staticmethod
+    def get_paths(partial_path):
+        """
+        Returns the paths of all the files that a download to |partial_path| may create.
+        """
+        return [partial_path, partial_path + '.json', partial_path + '.json.tmp']
+
+    @property
+    def num_chunks(self):
+        return (self._size + self._chunk_size - 1) // self._chunk_size
+
+    def _chunk_range(self, chunk):
+        start = chunk * self._chunk_size
+        return start, min(start + self._chunk_size, self._size)
+
+    def run(self):
+        """
+        Downloads the chunks that are missing from |partial_path|. Raises the first error
+        that any of the chunks fails with, keeping the chunks that completed.
+        """
+        self._done_chunks = self._load_progress()
+        self._bytes_downloaded = sum(
+            end - start for start, end in map(self._chunk_range, self._done_chunks)
+        )
+        if self._done_chunks:
+            logger.info(
+                'Resuming download to %s from %d of %d bytes',
+                self._partial_path,
+                self._bytes_downloaded,
+                self._size,
+            )
+        with open(self._partial_path, 'ab') as f:
+            f.truncate(self._size)
+
+        self._failed.clear()
+        missing_chunks = [i for i in range(self.num_chunks) if i not in self._done_chunks]
+        with ThreadPoolExecutor(self._parallelism) as executor:
+            futures = [executor.submit(self._download_chunk, i) for i in missing_chunks]
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                self._failed.set()
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def remove(self):
+        """
+        Removes the partial download.
+        """
+        for path in self.get_paths(self._partial_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _download_chunk(self, chunk):
+        start, end = self._chunk_range(chunk)
+        with self._limiter.connection():
+            if self._failed.is_set():
+                return
+            with closing(self._fetch_range(start, end)) as fileobj, open(
+                self._partial_path, 'r+b'
+            ) as f:
+                f.seek(start)
+                offset = start
+                while offset < end:
+                    if self._failed.is_set():
+                        return
+                    data = fileobj.read(min(self.BLOCK_SIZE, end - offset))
+                    if not data:
+                        raise IOError(
+                            'Range %d-%d ended after %d bytes' % (start, end, offset - start)
+                        )
+                    f.write(data)
+                    offset += len(data)
+                    self._limiter.throttle(len(data))
+                    self._add_bytes_downloaded(len(data))
+                if fileobj.read(1):
+                    raise IOError('Range %d-%d has more than %d bytes' % (start, end, end - start))
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            self._done_chunks.add(chunk)
+            self._save_progress()
+
+    def _add_bytes_downloaded(self, num_bytes):
+        with self._lock:
+            self._bytes_downloaded += num_bytes
+            bytes_downloaded = self._bytes_downloaded
+        if self._progress_callback:
+            self._progress_callback(bytes_downloaded)
+
+    def _load_progress(self):
+        if not os.path.exists(self._partial_path) or not os.path.exists(self._progress_path):
+            return set()
+        try:
+            with open(self._progress_path) as f:
+                progress = json.load(f)
+        except ValueError:
+            return set()
+        if progress.get('size') != self._size or progress.get('chunk_size') != self._chunk_size:
+            return set()
+        return set(progress['chunks'])
+
+    def _save_progress(self):
+        progress = {
+            'size': self._size,
+            'chunk_size': self._chunk_size,
+            'chunks': sorted(self._done_chunks),
+        }
+        temp_path = self._progress_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(progress, f)
+        os.replace(temp_path, self._progress_path)
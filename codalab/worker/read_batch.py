@@ -0,0 +1,120 @@
+"""
+Framing of the reply to a batch_read message, which asks a worker for many reads (of possibly
+different bundles running on it) at once.
+
+The worker answers with a single streamed reply. Its header message is {'num_reads': n}, and
+its data is one frame per read, in the order of the reads:
+
+    <4-byte length><JSON header>
+    <4-byte length><data chunk>
+    ...
+    <4-byte length = 0>
+
+The JSON header is the message a single read would have replied with, i.e.,
+{'error_code': ..., 'error_message': ...} if the read failed. The data is what a single read
+would have streamed (gzipped, for the read types that return data), split into chunks.
+
+The reply to a follow_files read uses the same framing, with a frame for each section of a file
+read (see Reader.follow_files).
+"""
+import json
+import queue
+import struct
+
+LENGTH = struct.Struct('>I')
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_frame(stream, message, data):
+    """
+    Writes the frame of a read that replied with |message| and |data| (None, bytes or a
+    file-like object) to |stream|.
+    """
+    header = json.dumps(message).encode()
+    stream.write(LENGTH.pack(len(header)) + header)
+    if isinstance(data, bytes):
+        for i in range(0, len(data), CHUNK_SIZE):
+            chunk = data[i : i + CHUNK_SIZE]
+            stream.write(LENGTH.pack(len(chunk)) + chunk)
+    elif data is not None:
+        while True:
+            chunk = data.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            stream.write(LENGTH.pack(len(chunk)) + chunk)
+    stream.write(LENGTH.pack(0))
+
+
+def read_frames(fileobj):
+    """
+    Yields (message, data) for each frame in the reply |fileobj|, where data is the bytes the
+    read streamed (possibly empty).
+    """
+    while True:
+        length = _read_length(fileobj, allow_eof=True)
+        if length is None:
+            return
+        message = json.loads(_read_exactly(fileobj, length).decode())
+        chunks = []
+        while True:
+            length = _read_length(fileobj)
+            if length == 0:
+                break
+            chunks.append(_read_exactly(fileobj, length))
+        yield message, b''.join(chunks)
+
+
+def _read_length(fileobj, allow_eof=False):
+    data = fileobj.read(LENGTH.size)
+    if not data and allow_eof:
+        return None
+    if len(data) < LENGTH.size:
+        data += _read_exactly(fileobj, LENGTH.size - len(data))
+    return LENGTH.unpack(data)[0]
+
+
+def _read_exactly(fileobj, length):
+    chunks = []
+    while length > 0:
+        chunk = fileobj.read(length)
+        if not chunk:
+            raise IOError('Batch read reply ended in the middle of a frame')
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+class ReplyStream(object):
+    """
+    File-like object that one thread writes frames to while another streams them to the
+    server by reading from it. Writes block while |max_pending_chunks| chunks are waiting to
+    be read.
+    """
+
+    def __init__(self, max_pending_chunks=16, timeout_secs=60):
+        self._chunks = queue.Queue(max_pending_chunks)
+        self._timeout_secs = timeout_secs
+        self._buffer = b''
+        self._closed = False
+
+    def write(self, data):
+        self._chunks.put(data, timeout=self._timeout_secs)
+
+    def close(self):
+        """
+        Called by the writer when it's done.
+        """
+        self._chunks.put(None, timeout=self._timeout_secs)
+
+    def read(self, num_bytes=-1):
+        # Return as soon as some data is available, except when asked for everything.
+        while not self._closed and (num_bytes < 0 or not self._buffer):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._closed = True
+            else:
+                self._buffer += chunk
+        if num_bytes < 0:
+            num_bytes = len(self._buffer)
+        data, self._buffer = self._buffer[:num_bytes], self._buffer[num_bytes:]
+        return data
@@ -4,14 +4,21 @@ import os
 import threading
 
 import codalab.worker.download_util as download_util
-from codalab.worker.download_util import get_target_path, PathException, BundleTarget
+from codalab.worker.download_util import (
+    BUNDLE_NO_LONGER_RUNNING_MESSAGE,
+    get_target_path,
+    PathException,
+    BundleTarget,
+)
 from codalab.worker.file_util import (
+    follow_files,
     gzip_file,
     gzip_bytestring,
     read_file_section,
     summarize_file,
     tar_gzip_directory,
 )
+from codalab.worker.read_batch import ReplyStream, write_frame
 
 
 class Reader(object):
@@ -22,6 +29,7 @@ class Reader(object):
             'stream_file': self.stream_file,
             'read_file_section': self.read_file_section,
             'summarize_file': self.summarize_file,
+            'follow_files': self.follow_files,
         }
         self.read_threads = []  # Threads
 
@@ -34,6 +42,38 @@ class Reader(object):
             err = (http.client.BAD_REQUEST, "Unsupported read_type for read: %s" % read_type)
             reply(err)
 
+    def batch_read(self, runs, reads, stream, timeout_secs=60):
+        """
+        Handles the reads of a batch_read message one after the other, writing a frame with
+        the reply of each to |stream| (see read_batch.py). |runs| maps bundle uuids to their
+        run states, and each read is a dict with the 'uuid', 'path' and 'read_args' of a
+        read message.
+        """
+        for read in reads:
+            lock = threading.Lock()
+            done = threading.Event()
+
+            def reply_fn(err, message={}, data=None):
+                with lock:
+                    if done.is_set():
+                        return
+                    if err:
+                        message = {'error_code': err[0], 'error_message': err[1]}
+                    write_frame(stream, message, data)
+                    done.set()
+
+            run_state = runs.get(read['uuid'])
+            if run_state is None:
+                reply_fn((http.client.INTERNAL_SERVER_ERROR, BUNDLE_NO_LONGER_RUNNING_MESSAGE))
+                continue
+            try:
+                self.read(run_state, read['path'], read['read_args'], reply_fn)
+            except Exception as e:
+                reply_fn((http.client.INTERNAL_SERVER_ERROR, str(e)))
+            # Some reads reply from another thread.
+            if not done.wait(timeout_secs):
+                reply_fn((http.client.INTERNAL_SERVER_ERROR, 'Timed out reading %s' % read['path']))
+
     def stop(self):
         for thread in self.read_threads:
             thread.join()
@@ -147,3 +187,40 @@ class Reader(object):
             reply_fn(None, {}, bytestring)
 
         self._threaded_read(run_state, path, summarize_file_thread, reply_fn)
+
+    def follow_files(self, run_state, path, args, reply_fn):
+        """
+        Stream the sections appended to the files at the paths in args['offsets'], starting at
+        the offset of each, for args['timeout'] seconds using a separate thread. The reply is
+        framed like that of a batch_read (see read_batch.py), with one frame per section read,
+        whose header is its {'subpath': ..., 'offset': ...} and whose data isn't gzipped.
+        """
+        try:
+            file_paths = {
+                subpath: get_target_path(
+                    run_state.bundle_path, BundleTarget(run_state.bundle.uuid, subpath)
+                )
+                for subpath in args['offsets']
+            }
+        except PathException as e:
+            reply_fn((http.client.NOT_FOUND, str(e)), None, None)
+            return
+
+        def follow_files_thread():
+            stream = ReplyStream()
+
+            def write_frames():
+                try:
+                    for subpath, offset, data in follow_files(
+                        file_paths, args['offsets'], args['timeout']
+                    ):
+                        write_frame(stream, {'subpath': subpath, 'offset': offset}, data)
+                finally:
+                    stream.close()
+
+            threading.Thread(target=write_frames).start()
+            reply_fn(None, {}, stream)
+
+        read_thread = threading.Thread(target=follow_files_thread)
+        read_thread.start()
+        self.read_threads.append(read_thread)
@@ -1,4 +1,6 @@
+from contextlib import ExitStack
 from io import SEEK_SET, SEEK_CUR, SEEK_END, BytesIO
+from typing import Optional
 
 from codalab.worker.un_gzip_stream import BytesBuffer
 from codalab.lib.beam.ratarmount import FileInfo, SQLiteIndexedTar
@@ -15,15 +17,17 @@ class TarFileStream(BytesIO):
     (right now it only supports tf.read()), we may not have a need for this class anymore.
     """
 
-    def __init__(self, tf: SQLiteIndexedTar, finfo: FileInfo):
+    def __init__(self, tf: SQLiteIndexedTar, finfo: FileInfo, stack: Optional[ExitStack] = None):
         """Initialize TarFileStream.
 
         Args:
             tf (SQLiteIndexedTar): Tar archive indexed by ratarmount.
             finfo (FileInfo): FileInfo object describing the file that is to be read from the aforementioned tar archive.
+            stack (ExitStack): Context managers that keep tf open, which are exited when this stream is closed.
         """
         self.tf = tf
         self.finfo = finfo
+        self._stack = stack
         self._buffer = BytesBuffer()
         self.pos = 0
 
@@ -62,6 +66,12 @@ class TarFileStream(BytesIO):
     def tell(self):
         return self.pos
 
+    def close(self):
+        if self._stack is not None:
+            self._stack.close()
+            self._stack = None
+        super().close()
+
     def __getattr__(self, name):
         """
         Proxy any methods/attributes besides read() and close() to the
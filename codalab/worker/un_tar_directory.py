@@ -2,7 +2,9 @@ import os
 import tarfile
 
 
-def un_tar_directory(fileobj, directory_path, compression='', force=False):
+def un_tar_directory(
+    fileobj, directory_path, compression='', force=False, tarfile_cls=tarfile.TarFile
+):
     """
     Extracts the given file-like object containing a tar archive into the given
     directory, which will be created and should not already exist. If it already exists,
@@ -10,7 +12,7 @@ def un_tar_directory(fileobj, directory_path, compression='', force=False):
     the directory is removed and recreated.
 
     compression specifies the compression scheme and can be one of '', 'gz' or
-    'bz2'.
+    'bz2'. tarfile_cls is the TarFile subclass that extracts the archive.
 
     Raises tarfile.TarError if the archive is not valid.
     """
@@ -20,7 +22,7 @@ def un_tar_directory(fileobj, directory_path, compression='', force=False):
 
         remove_path(directory_path)
     os.mkdir(directory_path)
-    with tarfile.open(fileobj=fileobj, mode='r|' + compression) as tar:
+    with tarfile_cls.open(fileobj=fileobj, mode='r|' + compression) as tar:
         for member in tar:
             # Make sure that there is no trickery going on (see note in
             # TarFile.extractall() documentation).
@@ -1,5 +1,6 @@
 import logging
 import os
+import queue
 import shutil
 from subprocess import PIPE, Popen
 import threading
@@ -26,6 +27,7 @@ from .state_committer import JsonStateCommitter
 from .bundle_state import BundleInfo, RunResources, BundleCheckinState
 from .worker_run_state import RunStateMachine, RunStage, RunState
 from .reader import Reader
+from .read_batch import ReplyStream
 
 logger = logging.getLogger(__name__)
 """
@@ -49,6 +51,19 @@ class Worker:
     BUNDLE_DIR_WAIT_NUM_TRIES = 120
     # Number of seconds to sleep if checking in with server fails two times in a row
     CHECKIN_COOLDOWN = 5
+    # Maximum number of seconds between heartbeats. Every such heartbeat reports all runs,
+    # which keeps their last_updated time recent, so this must stay well below the
+    # server's worker timeout (60 seconds by default).
+    HEARTBEAT_INTERVAL_SECONDS = 20
+    # Check-in fields whose changes are only reported with the next heartbeat, rather than
+    # triggering one.
+    LAZY_HEARTBEAT_FIELDS = ('free_disk_bytes', 'dependencies')
+    # Run fields whose changes trigger a heartbeat. Other fields, like the container times,
+    # change all the time and are reported every HEARTBEAT_INTERVAL_SECONDS.
+    HEARTBEAT_RUN_FIELDS = ('state', 'run_status', 'docker_image', 'exitcode', 'failure_message')
+    # Optional messages this worker handles, reported at check-in so that the server only sends
+    # them to workers that understand them.
+    CAPABILITIES = ('batch_read', 'follow_files')
 
     def __init__(
         self,
@@ -117,6 +132,16 @@ class Worker:
 
         self.checkin_frequency_seconds = checkin_frequency_seconds
         self.last_checkin_successful = False
+        # The check-in fields and the HEARTBEAT_RUN_FIELDS of each run that the server last
+        # acknowledged, or None if the next heartbeat must send all fields.
+        self.last_heartbeat_fields = None  # type: Optional[dict]
+        self.last_heartbeat_runs = {}  # type: Dict[str, tuple]
+        self.last_heartbeat_time = 0.0
+        # Messages received from the server by the listener thread, processed by the main loop.
+        self.messages = queue.Queue()  # type: queue.Queue
+        self.listener_thread = None  # type: Optional[threading.Thread]
+        # Whether the server supports heartbeats, or has to be checked in with instead.
+        self.heartbeat_supported = True
         self.last_time_ran = None  # type: Optional[bool]
 
         self.runs = {}  # type: Dict[str, RunState]
@@ -277,7 +302,7 @@ class Worker:
                 if self.check_idle_stop() or self.check_num_runs_stop():
                     self.terminate = True
                 else:
-                    time.sleep(self.checkin_frequency_seconds)
+                    self.wait_for_message(self.checkin_frequency_seconds)
             except Exception:
                 self.last_checkin_successful = False
                 if using_sentry():
@@ -404,11 +429,27 @@ class Worker:
 
     def checkin(self):
         """
-        Checkin with the server and get a response. React to this response.
-        This function must return fast to keep checkins frequent. Time consuming
+        Checkin with the server and react to the messages received from it since the last
+        checkin. This function must return fast to keep checkins frequent. Time consuming
         processes must be handled asynchronously.
         """
-        request = {
+        self.heartbeat()
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            self.process_message(message)
+
+    def heartbeat(self):
+        """
+        Reports the worker's resources and the state of its runs to the server. Only the
+        fields and runs that changed since the last heartbeat the server acknowledged are
+        sent, and nothing is sent at all if nothing important changed in the last
+        HEARTBEAT_INTERVAL_SECONDS. Servers that don't support heartbeats are checked in with
+        instead (see full_checkin).
+        """
+        fields = {
             'tag': self.tag,
             'group_name': self.group_name,
             'cpus': len(self.cpuset),
@@ -417,33 +458,132 @@ class Worker:
             'free_disk_bytes': self.free_disk_bytes,
             'dependencies': self.cached_dependencies,
             'hostname': socket.gethostname(),
-            'runs': [run.as_dict for run in self.all_runs],
             'shared_file_system': self.shared_file_system,
             'tag_exclusive': self.tag_exclusive,
             'exit_after_num_runs': self.exit_after_num_runs - self.num_runs,
             'is_terminating': self.terminate or self.terminate_and_restage,
+            'capabilities': list(self.CAPABILITIES),
+        }
+        if not self.heartbeat_supported:
+            self.full_checkin(fields)
+            return
+        runs = [run.as_dict for run in self.all_runs]
+        run_keys = {
+            run['uuid']: tuple(run[field] for field in self.HEARTBEAT_RUN_FIELDS) for run in runs
         }
+        now = time.time()
+        if self.last_heartbeat_fields is None:
+            request = dict(fields, full=True)
+        else:
+            request = {
+                key: value
+                for key, value in fields.items()
+                if self.last_heartbeat_fields.get(key) != value
+            }
+        urgent = 'full' in request or any(key not in self.LAZY_HEARTBEAT_FIELDS for key in request)
+        if now - self.last_heartbeat_time < self.HEARTBEAT_INTERVAL_SECONDS:
+            runs = [
+                run
+                for run in runs
+                if self.last_heartbeat_runs.get(run['uuid']) != run_keys[run['uuid']]
+            ]
+            if not urgent and not runs:
+                return
+        request['runs'] = runs
+
+        try:
+            response = self.bundle_service.heartbeat(self.id, request)
+            self._checkin_succeeded()
+        except BundleServiceException as ex:
+            if ex.status_code == http.client.NOT_FOUND:
+                logger.info("Server doesn't support heartbeats, checking in with /checkin instead")
+                self.heartbeat_supported = False
+                self.full_checkin(fields)
+            else:
+                self._checkin_failed(ex)
+            return
+
+        if response and response.get('resync'):
+            logger.info('Server lost track of this worker, sending a full heartbeat')
+            self.last_heartbeat_fields = None
+            return
+        self.last_heartbeat_fields = fields
+        self.last_heartbeat_time = now
+        self.last_heartbeat_runs = {uuid: self.last_heartbeat_runs.get(uuid) for uuid in run_keys}
+        self.last_heartbeat_runs.update((run['uuid'], run_keys[run['uuid']]) for run in runs)
+
+        if self.listener_thread is None:
+            self.listener_thread = threading.Thread(target=self.listen_for_messages, daemon=True)
+            self.listener_thread.start()
+
+    def full_checkin(self, fields):
+        """
+        Checks in with servers that don't support heartbeats, reporting all the fields and runs
+        every time. The server replies with the next message for the worker, if any, which is
+        queued for the main loop to process.
+        """
+        request = dict(fields, runs=[run.as_dict for run in self.all_runs])
         try:
             response = self.bundle_service.checkin(self.id, request)
-            if not self.last_checkin_successful:
-                logger.info('Connected! Successful check in!')
-            self.last_checkin_successful = True
+            self._checkin_succeeded()
         except BundleServiceException as ex:
-            logger.warning("Disconnected from server! Failed check in: %s", ex)
-            if not self.last_checkin_successful:
-                logger.info(
-                    "Checkin failed twice in a row, sleeping %d seconds", self.CHECKIN_COOLDOWN
-                )
+            self._checkin_failed(ex)
+            return
+        if response:
+            self.messages.put(response)
+
+    def _checkin_succeeded(self):
+        if not self.last_checkin_successful:
+            logger.info('Connected! Successful check in!')
+        self.last_checkin_successful = True
+
+    def _checkin_failed(self, ex):
+        logger.warning("Disconnected from server! Failed check in: %s", ex)
+        if not self.last_checkin_successful:
+            logger.info("Checkin failed twice in a row, sleeping %d seconds", self.CHECKIN_COOLDOWN)
+            time.sleep(self.CHECKIN_COOLDOWN)
+        self.last_checkin_successful = False
+
+    def listen_for_messages(self):
+        """
+        Runs in a separate thread, keeping a request for messages open with the server at all
+        times so that messages arrive as soon as the server sends them. The messages are
+        queued for the main loop to process.
+        """
+        while not self.terminate:
+            try:
+                message = self.bundle_service.get_message(self.id)
+            except Exception as ex:
+                logger.warning("Failed to get messages from server: %s", ex)
                 time.sleep(self.CHECKIN_COOLDOWN)
-            self.last_checkin_successful = False
-            response = None
+                continue
+            if message:
+                self.messages.put(message)
+
+    def wait_for_message(self, timeout):
+        """
+        Sleeps for up to timeout seconds, processing the first message that arrives from the
+        server in the meantime, if any.
+        """
+        try:
+            message = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return
+        self.process_message(message)
+
+    def process_message(self, response):
+        """
+        Reacts to a message from the server.
+        """
         # Stop processing any new runs received from server
-        if not response or self.terminate_and_restage or self.terminate:
+        if self.terminate_and_restage or self.terminate:
             return
         action_type = response['type']
         logger.debug('Received %s message: %s', action_type, response)
         if action_type == 'run':
             self.initialize_run(response['bundle'], response['resources'])
+        elif action_type == 'batch_read':
+            self.batch_read(response['socket_id'], response['reads'])
         else:
             uuid = response['uuid']
             socket_id = response.get('socket_id', None)
@@ -705,6 +845,31 @@ class Worker:
             err = (http.client.INTERNAL_SERVER_ERROR, str(e))
             reply(err)
 
+    def batch_read(self, socket_id, reads):
+        """
+        Handles the reads of a batch_read message on a separate thread, streaming the replies
+        of all of them on `socket_id` (see read_batch.py).
+        """
+
+        def batch_read_fn():
+            stream = ReplyStream()
+
+            def write_frames():
+                try:
+                    self.reader.batch_read(self.runs, reads, stream)
+                finally:
+                    stream.close()
+
+            threading.Thread(target=write_frames).start()
+            try:
+                self.bundle_service_reply(socket_id, None, {'num_reads': len(reads)}, stream)
+            except Exception:
+                traceback.print_exc()
+
+        read_thread = threading.Thread(target=batch_read_fn)
+        read_thread.start()
+        self.reader.read_threads.append(read_thread)
+
     def netcat(self, socket_id, uuid, port, message):
         """
         Sends `message` to `port` of the Docker container of the run with `uuid` and
@@ -202,8 +202,12 @@ class WorkerManager(object):
         if self.args.worker_tag_exclusive and self.args.worker_tag:
             keywords += ["request_queue=%s,tag=%s" % (self.args.worker_tag, self.args.worker_tag)]
 
-        bundles: BundlesPayload = self.codalab_client.fetch(
-            'bundles', params={'worksheet': None, 'keywords': keywords, 'include': ['owner']}
+        # Stream all the staged bundles, rather than the first page of search results, so that
+        # bundles this WorkerManager can run aren't hidden behind ones it can't.
+        bundles: BundlesPayload = list(
+            self.codalab_client.stream_bundles(
+                keywords, params={'worksheet': None, 'include': ['owner']}
+            )
         )
         # Unless no_prefilter is set, filter out otherwise-eligible run bundles that request more
         # resources than this WorkerManager's workers have.
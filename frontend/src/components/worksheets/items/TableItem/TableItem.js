@@ -383,15 +383,18 @@ const TableWrapper = (props) => {
     const { item, onAsyncItemLoad } = props;
     useEffect(() => {
         (async function() {
-            if (item.status.code === FETCH_STATUS_SCHEMA.BRIEFLY_LOADED) {
+            if (
+                item.status.code === FETCH_STATUS_SCHEMA.BRIEFLY_LOADED ||
+                item.status.code === FETCH_STATUS_SCHEMA.PARTIAL
+            ) {
                 try {
-                    const { contents } = await fetchAsyncBundleContents({
+                    const { contents, status } = await fetchAsyncBundleContents({
                         contents: item.rows,
                     });
                     onAsyncItemLoad({
                         ...item,
                         rows: contents,
-                        status: {
+                        status: status || {
                             code: FETCH_STATUS_SCHEMA.READY,
                             error_message: '',
                         },
@@ -31,6 +31,7 @@ export const FETCH_STATUS_SCHEMA = {
     PENDING: 'pending',
     BRIEFLY_LOADED: 'briefly_loaded',
     READY: 'ready',
+    PARTIAL: 'partial',
     NOT_FOUND: 'not_found',
     NO_PERMISSION: 'no_permission',
 };
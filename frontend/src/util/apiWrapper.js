@@ -89,7 +89,7 @@ export const fetchAsyncBundleContents = async ({ contents }) => {
     // used in table and record items
     return semaphore.use(async () => {
         const url = '/rest/interpret/genpath-table-contents';
-        return await post(url, { contents });
+        return await post(url, { contents, allow_partial: true });
     });
 };
 
@@ -337,15 +337,12 @@ class Competition(object):
 
     def _fetch_submission_history(self):
         # Fetch latest evaluation bundles
-        last_tests = self.client.fetch(
-            'bundles',
-            params={
-                'keywords': [
-                    '.mine',  # don't allow others to forge evaluations
-                    'tags={evaluate[tag]}'.format(**self.config),
-                    '.limit={max_leaderboard_size}'.format(**self.config),
-                ]
-            },
+        last_tests = self.client.stream_bundles(
+            [
+                '.mine',  # don't allow others to forge evaluations
+                'tags={evaluate[tag]}'.format(**self.config),
+                '.limit={max_leaderboard_size}'.format(**self.config),
+            ]
         )
 
         # Collect data in preparation for computing submission counts
@@ -564,15 +561,12 @@ class Competition(object):
         """
         logger.debug('Fetching the leaderboard')
         # Fetch bundles on current leaderboard
-        eval_bundles = self.client.fetch(
-            'bundles',
-            params={
-                'keywords': [
-                    '.mine',  # don't allow others to forge evaluations
-                    'tags={evaluate[tag]}'.format(**self.config),
-                    '.limit={max_leaderboard_size}'.format(**self.config),
-                ]
-            },
+        eval_bundles = self.client.stream_bundles(
+            [
+                '.mine',  # don't allow others to forge evaluations
+                'tags={evaluate[tag]}'.format(**self.config),
+                '.limit={max_leaderboard_size}'.format(**self.config),
+            ]
         )
         eval_bundles = {b['id']: b for b in eval_bundles}
 
@@ -0,0 +1,136 @@
+"""
+Micro-benchmark for applying a worker's run updates on check-in: one bundle_checkin per
+run (preceded by get_bundle, as the checkin endpoint used to do) versus a single
+batch_bundle_checkin. Reports the database time and number of statements per check-in
+for workers running different numbers of bundles.
+
+Usage:
+    python -m tests.benchmark.bundle_checkin_benchmark --num-runs 1 8 32 128
+    python -m tests.benchmark.bundle_checkin_benchmark --engine-url mysql://codalab@localhost/codalab
+"""
+import argparse
+import time
+
+from sqlalchemy import event
+
+from codalab.bundles.run_bundle import RunBundle
+from codalab.lib.codalab_manager import CodaLabManager
+from codalab.lib.spec_util import generate_uuid
+from codalab.worker.bundle_state import BundleCheckinState, State
+from codalab.worker.worker_run_state import RunStage
+
+METADATA = {
+    'name': 'run',
+    'description': '',
+    'tags': [],
+    'request_docker_image': 'codalab/default-cpu',
+    'request_cpus': 1,
+    'request_gpus': 0,
+    'request_memory': '2g',
+    'request_time': '',
+    'request_disk': '',
+    'request_network': False,
+    'request_priority': 0,
+    'request_queue': '',
+    'allow_failed_dependencies': False,
+    'exclude_patterns': [],
+    'created': int(time.time()),
+}
+
+
+def create_runs(model, user_id, num_runs):
+    worker_runs = []
+    for _ in range(num_runs):
+        bundle = RunBundle.construct(
+            targets=[],
+            command='sleep 100',
+            metadata=METADATA,
+            owner_id=user_id,
+            uuid=generate_uuid(),
+            state=State.RUNNING,
+        )
+        bundle.is_frozen = None
+        bundle.is_anonymous = False
+        model.save_bundle(bundle)
+        stats = {'start': 0, 'end': 0, 'elapsed': 0}
+        worker_runs.append(
+            BundleCheckinState(
+                uuid=bundle.uuid,
+                run_status='Running',
+                bundle_start_time=0,
+                container_time_total=0,
+                container_time_user=0,
+                container_time_system=0,
+                docker_image='codalab/default-cpu',
+                state=State.RUNNING,
+                remote='worker',
+                exitcode=None,
+                failure_message=None,
+                cpu_usage=0.0,
+                memory_usage=0,
+                bundle_profile_stats={
+                    stage: stats for stage in RunStage.WORKER_STATE_TO_SERVER_STATE
+                },
+            )
+        )
+    return worker_runs
+
+
+def checkin_one_by_one(model, worker_runs, user_id, worker_id):
+    for worker_run in worker_runs:
+        bundle = model.get_bundle(worker_run.uuid)
+        model.bundle_checkin(bundle, worker_run, user_id, worker_id)
+
+
+def checkin_batch(model, worker_runs, user_id, worker_id):
+    model.batch_bundle_checkin(worker_runs, user_id, worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-runs', type=int, nargs='+', default=[1, 4, 16, 32, 64, 128])
+    parser.add_argument('--repeat', type=int, default=10, help='Check-ins to time per case.')
+    parser.add_argument('--engine-url', help='MySQL database (default: in-memory SQLite).')
+    args = parser.parse_args()
+
+    manager = CodaLabManager()
+    if args.engine_url:
+        manager.config['server']['class'] = 'MySQLModel'
+        manager.config['server']['engine_url'] = args.engine_url
+    else:
+        manager.config['server']['class'] = 'SQLiteModel'
+    model = manager.model()
+    user_id = model.root_user_id
+    worker_id = 'benchmark-worker'
+
+    num_statements = 0
+
+    def count_statement(*args):
+        nonlocal num_statements
+        num_statements += 1
+
+    event.listen(model.engine, 'before_cursor_execute', count_statement)
+
+    print('%8s  %-11s  %12s  %12s' % ('runs', 'method', 'ms/checkin', 'statements'))
+    for num_runs in args.num_runs:
+        for name, checkin in (('one-by-one', checkin_one_by_one), ('batch', checkin_batch)):
+            worker_runs = create_runs(model, user_id, num_runs)
+            checkin(model, worker_runs, user_id, worker_id)  # Warm up.
+            num_statements = 0
+            start = time.time()
+            for _ in range(args.repeat):
+                checkin(model, worker_runs, user_id, worker_id)
+            elapsed = time.time() - start
+            print(
+                '%8d  %-11s  %12.1f  %12.1f'
+                % (
+                    num_runs,
+                    name,
+                    elapsed / args.repeat * 1000,
+                    float(num_statements) / args.repeat,
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()
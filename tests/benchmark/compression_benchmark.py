@@ -0,0 +1,91 @@
+"""
+Benchmark for gzipping bundle contents. Compares the throughput and output size of
+ParallelGzipStream with different numbers of threads and levels against gzip.GzipFile at level
+9 (which is how GzipStream used to compress) and against `gzip -6`, which `tar czf` used, on
+synthetic data that compresses about as well as text.
+
+Usage:
+    python -m tests.benchmark.compression_benchmark --size-mb 256 --threads 1 4 16
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import random
+import subprocess
+import time
+from io import BytesIO
+
+from codalab.worker.compression import ParallelGzipStream
+
+
+def make_data(size, rng):
+    words = [
+        bytes(rng.choice(b'abcdefghijklmnopqrstuvwxyz') for _ in range(8)) for _ in range(5000)
+    ]
+    chunk = b' '.join(rng.choice(words) for _ in range(1024 * 1024 // 9))
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+
+def read_all(stream):
+    size = 0
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        size += len(chunk)
+    return size
+
+
+def run(name, data, compress):
+    start = time.time()
+    compressed_size = compress(data)
+    elapsed = time.time() - start
+    print(
+        '%-28s %8.1f MB/s %6.1f%% of input'
+        % (name, len(data) / elapsed / 1024 ** 2, 100.0 * compressed_size / len(data))
+    )
+
+
+def gzip_file(data, level):
+    output = BytesIO()
+    with gzip.GzipFile(None, 'wb', level, output) as f:
+        f.write(data)
+    return len(output.getvalue())
+
+
+def gzip_process(data, level):
+    return len(
+        subprocess.run(['gzip', '-%d' % level, '-c'], input=data, stdout=subprocess.PIPE).stdout
+    )
+
+
+def parallel_gzip(data, level, threads):
+    with ThreadPoolExecutor(threads) as executor:
+        stream = ParallelGzipStream(
+            BytesIO(data),
+            level=level,
+            executor=executor if threads > 1 else None,
+            max_pending=2 * threads,
+        )
+        return read_all(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--levels', type=int, nargs='+', default=[0, 1, 6])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data = make_data(args.size_mb * 1024 ** 2, random.Random(args.seed))
+    run('GzipFile level 9', data, lambda data: gzip_file(data, 9))
+    run('gzip -6 process', data, lambda data: gzip_process(data, 6))
+    for level in args.levels:
+        for threads in args.threads:
+            run(
+                'parallel level %d, %d threads' % (level, threads),
+                data,
+                lambda data: parallel_gzip(data, level, threads),
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark for the worker message buses (see codalab/model/message_bus.py). Simulates
+workers checking in: each of --num-sockets threads repeatedly listens on its own socket
+for a few seconds, while sender threads send each socket --num-messages JSON messages.
+Reports the latency from sending a message to receiving it, and the CPU time used.
+
+By default, senders and listeners use separate DatabaseMessageBus objects, as if they ran
+on different hosts, so listeners only notice messages by polling the database.
+
+Usage:
+    python -m tests.benchmark.message_bus_benchmark --num-sockets 1000
+    python -m tests.benchmark.message_bus_benchmark --engine-url mysql://codalab@localhost/codalab
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from codalab.model.message_bus import DatabaseMessageBus, UnixSocketMessageBus
+from codalab.model.tables import db_metadata
+
+CHECKIN_SECS = 3
+
+
+def run(send_bus, listen_bus, num_sockets, num_messages, num_senders):
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def listen(socket_id):
+        received = 0
+        while received < num_messages and not stop.is_set():
+            with closing(listen_bus.start_listening(socket_id)) as listener:
+                message = listen_bus.get_json_message(listener, CHECKIN_SECS)
+            if message is not None:
+                with lock:
+                    latencies.append(time.time() - message['sent'])
+                received += 1
+
+    def send(socket_id):
+        return send_bus.send_json_message(socket_id, {'sent': time.time()}, 60)
+
+    listeners = [threading.Thread(target=listen, args=(i,)) for i in range(num_sockets)]
+    start_time, start_cpu = time.time(), time.process_time()
+    for listener in listeners:
+        listener.start()
+    with ThreadPoolExecutor(num_senders) as executor:
+        sent = list(
+            executor.map(send, [i for _ in range(num_messages) for i in range(num_sockets)])
+        )
+    stop.set()
+    for listener in listeners:
+        listener.join()
+    elapsed, cpu = time.time() - start_time, time.process_time() - start_cpu
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+    print(
+        '  delivered %d/%d in %.1fs (%.1fs CPU); latency ms: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f'
+        % (
+            sum(sent),
+            len(sent),
+            elapsed,
+            cpu,
+            percentile(0.5),
+            percentile(0.95),
+            percentile(0.99),
+            latencies[-1] * 1000,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-sockets', type=int, default=1000)
+    parser.add_argument('--num-messages', type=int, default=3, help='Messages per socket.')
+    parser.add_argument('--num-senders', type=int, default=32)
+    parser.add_argument(
+        '--engine-url', help='Database for DatabaseMessageBus (default: a temporary SQLite file).'
+    )
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        print('UnixSocketMessageBus')
+        socket_bus = UnixSocketMessageBus(temp_dir)
+        run(socket_bus, socket_bus, args.num_sockets, args.num_messages, args.num_senders)
+
+        if args.engine_url:
+            engine = create_engine(args.engine_url, pool_size=100, max_overflow=args.num_sockets)
+        else:
+            # Limit the number of connections to stay under the open files limit.
+            engine = create_engine(
+                'sqlite:///' + os.path.join(temp_dir, 'codalab.db'),
+                connect_args={'timeout': 60, 'check_same_thread': False},
+                poolclass=QueuePool,
+                pool_size=32,
+                max_overflow=0,
+                pool_timeout=60,
+            )
+        db_metadata.create_all(engine)
+        print('DatabaseMessageBus (separate bus objects, as on different hosts)')
+        run(
+            DatabaseMessageBus(engine, args.poll_interval),
+            DatabaseMessageBus(engine, args.poll_interval),
+            args.num_sockets,
+            args.num_messages,
+            args.num_senders,
+        )
+        print('DatabaseMessageBus (shared bus object)')
+        bus = DatabaseMessageBus(engine, args.poll_interval)
+        run(bus, bus, args.num_sockets, args.num_messages, args.num_senders)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
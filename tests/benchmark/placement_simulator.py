@@ -0,0 +1,257 @@
+"""
+Simulator that replays a queue of run bundles against a set of workers under each
+placement policy (see codalab/server/placement.py), to compare throughput, makespan and
+waiting times.
+
+The queue is either synthetic or a JSON lines file with one run per line, e.g.:
+    {"uuid": "0x...", "owner_id": "0", "submitted": 1495784349, "duration": 1830,
+     "cpus": 1, "gpus": 0, "memory": 2147483648, "dependencies": ["0x..."]}
+A file like this can be exported from the runs in a CodaLab instance's database with
+--export (which uses the server's config.json).
+
+Usage:
+    python -m tests.benchmark.placement_simulator --num-bundles 5000 --num-workers 100
+    python -m tests.benchmark.placement_simulator --export queue.jsonl
+    python -m tests.benchmark.placement_simulator --queue queue.jsonl --workers workers.json
+"""
+import argparse
+import json
+import random
+from collections import defaultdict, namedtuple
+
+from codalab.server import placement
+from codalab.server.worker_index import WorkerIndex
+from codalab.worker.bundle_state import RunResources
+
+Dependency = namedtuple('Dependency', ['parent_uuid', 'parent_path'])
+Metadata = namedtuple('Metadata', ['request_queue'])
+Bundle = namedtuple('Bundle', ['uuid', 'owner_id', 'metadata', 'dependencies'])
+
+GB = 1024 ** 3
+
+
+def synthetic_queue(num_bundles, num_users, seed):
+    rng = random.Random(seed)
+    parents = ['0x%032x' % i for i in range(num_bundles // 10 + 1)]
+    runs = []
+    submitted = 0
+    for i in range(num_bundles):
+        # Users submit in bursts, and a few heavy users submit most of the runs.
+        owner_id = str(min(int(rng.expovariate(1.0) * num_users / 4), num_users - 1))
+        submitted += rng.expovariate(1 / 5.0)
+        runs.append(
+            {
+                'uuid': '0x%032x' % (num_bundles + i),
+                'owner_id': owner_id,
+                'submitted': submitted,
+                'duration': rng.lognormvariate(6, 1.2),
+                'cpus': rng.choice([1, 1, 1, 2, 4, 8]),
+                'gpus': rng.choice([0, 0, 0, 0, 1, 2]),
+                'memory': rng.choice([1, 2, 4, 8, 16]) * GB,
+                'dependencies': rng.sample(parents, rng.randint(0, 3)),
+            }
+        )
+    return runs
+
+
+def synthetic_workers(num_workers, seed):
+    rng = random.Random(seed)
+    workers = []
+    for i in range(num_workers):
+        gpus = rng.choice([0, 0, 2, 4])
+        workers.append({'cpus': rng.choice([8, 16, 32]), 'gpus': gpus, 'memory_bytes': 64 * GB})
+    return workers
+
+
+def export_queue(path):
+    """Writes the finished runs in the CodaLab database to |path|."""
+    from codalab.lib import formatting
+    from codalab.lib.codalab_manager import CodaLabManager
+    from codalab.worker.bundle_state import State
+
+    model = CodaLabManager().model()
+    bundles = model.batch_get_bundles(bundle_type='run', state=[State.READY, State.FAILED])
+    with open(path, 'w') as f:
+        for bundle in bundles:
+            metadata = bundle.metadata
+            if not getattr(metadata, 'time', None):
+                continue
+            run = {
+                'uuid': bundle.uuid,
+                'owner_id': bundle.owner_id,
+                'submitted': metadata.created,
+                'duration': metadata.time,
+                'cpus': metadata.request_cpus or 1,
+                'gpus': metadata.request_gpus or 0,
+                'memory': formatting.parse_size(metadata.request_memory or '2g'),
+                'dependencies': sorted(set(dep.parent_uuid for dep in bundle.dependencies)),
+            }
+            f.write(json.dumps(run) + '\n')
+    print('Exported %d runs to %s' % (len(bundles), path))
+
+
+def simulate(policy, runs, worker_specs, parallel_run_quota, tick, dependency_seconds):
+    """
+    Replays |runs| on workers with |worker_specs| under |policy|. Every |tick| seconds the
+    staged runs are placed on the workers' free resources. A run whose dependencies are not
+    cached on its worker waits |dependency_seconds| per missing dependency before starting.
+    """
+    runs = sorted(runs, key=lambda run: run['submitted'])
+    start_time = runs[0]['submitted']
+    workers = [
+        dict(
+            spec,
+            worker_id=str(i),
+            user_id='codalab',
+            free_disk_bytes=float('inf'),
+            exit_after_num_runs=float('inf'),
+            tag=None,
+            tag_exclusive=False,
+            has_gpus=spec['gpus'] > 0,
+            shared_file_system=False,
+            cached=set(),
+        )
+        for i, spec in enumerate(worker_specs)
+    ]
+    running = defaultdict(list)  # worker_id -> [(end time, run)]
+    user_running = defaultdict(int)
+    staged = []
+    waits = []
+    dependency_hits = dependency_misses = 0
+    busy_cpu_seconds = 0
+    end_time = start_time
+    next_run = 0
+    now = start_time
+
+    while next_run < len(runs) or staged or any(running.values()):
+        while next_run < len(runs) and runs[next_run]['submitted'] <= now:
+            run = runs[next_run]
+            bundle = Bundle(
+                uuid=run['uuid'],
+                owner_id=run['owner_id'],
+                metadata=Metadata(request_queue=None),
+                dependencies=[Dependency(uuid, '') for uuid in run['dependencies']],
+            )
+            resources = RunResources(
+                cpus=run['cpus'],
+                gpus=run['gpus'],
+                docker_image='',
+                time=0,
+                memory=run['memory'],
+                disk=0,
+                network=False,
+            )
+            staged.append((bundle, resources, run))
+            next_run += 1
+
+        # Build the workers' free resources as the bundle manager would.
+        free_workers = []
+        for worker, spec in zip(workers, worker_specs):
+            still_running = [(end, run) for end, run in running[worker['worker_id']] if end > now]
+            for end, run in running[worker['worker_id']]:
+                if end <= now:
+                    user_running[run['owner_id']] -= 1
+            running[worker['worker_id']] = still_running
+            free = dict(worker)
+            free['cpus'] = spec['cpus'] - sum(run['cpus'] for _, run in still_running)
+            free['gpus'] = spec['gpus'] - sum(run['gpus'] for _, run in still_running)
+            free['memory_bytes'] = spec['memory_bytes'] - sum(
+                run['memory'] for _, run in still_running
+            )
+            free['run_uuids'] = [run['uuid'] for _, run in still_running]
+            free['dependencies'] = [(uuid, '') for uuid in worker['cached']]
+            free_workers.append(free)
+        index = WorkerIndex(free_workers)
+        runs_by_uuid = {bundle.uuid: run for bundle, _, run in staged}
+        placed = set()
+
+        def find_workers(bundle, bundle_resources):
+            if user_running[bundle.owner_id] >= parallel_run_quota:
+                return iter(())
+            return index.find(bundle, bundle_resources)
+
+        def try_place(bundle, bundle_resources, free_worker):
+            nonlocal dependency_hits, dependency_misses, busy_cpu_seconds, end_time
+            run = runs_by_uuid[bundle.uuid]
+            worker = workers[int(free_worker['worker_id'])]
+            missing = [uuid for uuid in run['dependencies'] if uuid not in worker['cached']]
+            dependency_misses += len(missing)
+            dependency_hits += len(run['dependencies']) - len(missing)
+            worker['cached'].update(run['dependencies'])
+            end = now + len(missing) * dependency_seconds + run['duration']
+            running[worker['worker_id']].append((end, run))
+            user_running[bundle.owner_id] += 1
+            waits.append(now - run['submitted'])
+            busy_cpu_seconds += run['cpus'] * run['duration']
+            end_time = max(end_time, end)
+            index.allocate(free_worker, bundle_resources)
+            placed.add(bundle.uuid)
+            return True
+
+        placement.place(
+            policy,
+            [(bundle, resources) for bundle, resources, _ in staged],
+            find_workers,
+            try_place,
+        )
+        staged = [staged_run for staged_run in staged if staged_run[0].uuid not in placed]
+        now += tick
+
+    makespan = end_time - start_time
+    waits.sort()
+    total_cpus = sum(spec['cpus'] for spec in worker_specs)
+    return {
+        'makespan_hours': makespan / 3600,
+        'throughput_per_hour': len(runs) / makespan * 3600 if makespan else 0,
+        'mean_wait_minutes': sum(waits) / len(waits) / 60,
+        'p95_wait_minutes': waits[int(len(waits) * 0.95)] / 60,
+        'cpu_utilization': busy_cpu_seconds / (total_cpus * makespan) if makespan else 0,
+        'dependency_hit_rate': dependency_hits / max(dependency_hits + dependency_misses, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--queue', help='JSON lines file with the runs to replay.')
+    parser.add_argument('--workers', help='JSON file with a list of worker resources.')
+    parser.add_argument('--export', help='Export the finished runs in the database to this file.')
+    parser.add_argument('--num-bundles', type=int, default=5000)
+    parser.add_argument('--num-users', type=int, default=20)
+    parser.add_argument('--num-workers', type=int, default=100)
+    parser.add_argument('--parallel-run-quota', type=int, default=100)
+    parser.add_argument('--tick', type=float, default=5, help='Seconds between passes.')
+    parser.add_argument(
+        '--dependency-seconds',
+        type=float,
+        default=60,
+        help='Seconds to fetch a dependency that is not cached on the worker.',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.export:
+        export_queue(args.export)
+        return
+
+    if args.queue:
+        with open(args.queue) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    else:
+        runs = synthetic_queue(args.num_bundles, args.num_users, args.seed)
+    if args.workers:
+        with open(args.workers) as f:
+            worker_specs = json.load(f)
+    else:
+        worker_specs = synthetic_workers(args.num_workers, args.seed)
+    print('%d runs, %d workers' % (len(runs), len(worker_specs)))
+
+    for policy in (placement.PlacementPolicy.GREEDY, placement.PlacementPolicy.BATCH):
+        random.seed(args.seed)
+        stats = simulate(
+            policy, runs, worker_specs, args.parallel_run_quota, args.tick, args.dependency_seconds
+        )
+        print(policy.ljust(8) + '  '.join('%s=%.3f' % item for item in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark for bundle searches with .* (such as the bare keywords typed into the web search box),
+with and without the search index (see codalab/model/search_index.py), on a synthetic database of
+bundles with random names, descriptions, tags and commands.
+
+Usage:
+    python -m tests.benchmark.search_benchmark --num-bundles 100000
+    python -m tests.benchmark.search_benchmark --num-bundles 5000000 \
+        --engine-url mysql://codalab@localhost/codalab
+"""
+import argparse
+import random
+import time
+
+from codalab.lib.codalab_manager import CodaLabManager
+from codalab.lib.spec_util import generate_uuid
+from codalab.model.search_index import get_ngrams
+from codalab.model.tables import (
+    bundle as cl_bundle,
+    bundle_metadata as cl_bundle_metadata,
+    bundle_search_ngram as cl_bundle_search_ngram,
+)
+from codalab.worker.bundle_state import State
+
+WORDS = [
+    'train',
+    'eval',
+    'predict',
+    'resnet',
+    'bert',
+    'lstm',
+    'squad',
+    'imagenet',
+    'cifar',
+    'baseline',
+    'ablation',
+    'dev',
+    'test',
+    'large',
+    'small',
+    'v2',
+]
+
+# Searches typed one character at a time, as in the web search box.
+QUERIES = ['r', 're', 'res', 'resn', 'resnet', 'resnet-squad', 'resnet-squad-0001', 'zzz']
+
+# Number of bundles inserted per batch.
+BATCH_SIZE = 10000
+
+
+def make_name(rng, i):
+    return '%s-%s-%04d' % (rng.choice(WORDS), rng.choice(WORDS), i % 10000)
+
+
+def populate(model, user_id, num_bundles, rng):
+    """
+    Creates |num_bundles| bundles and returns the uuid of the last one.
+    """
+    for start in range(0, num_bundles, BATCH_SIZE):
+        bundles, metadata, ngrams = [], [], []
+        for i in range(start, min(start + BATCH_SIZE, num_bundles)):
+            uuid = generate_uuid()
+            command = 'python %s.py --data %s' % (rng.choice(WORDS), rng.choice(WORDS))
+            bundles.append(
+                {
+                    'uuid': uuid,
+                    'bundle_type': 'run',
+                    'command': command,
+                    'data_hash': None,
+                    'state': State.READY,
+                    'owner_id': user_id,
+                    'is_anonymous': False,
+                }
+            )
+            texts = [uuid, command, make_name(rng, i), ' '.join(rng.sample(WORDS, 4))]
+            texts += rng.sample(WORDS, 2)
+            for key, value in zip(['name', 'description', 'tags', 'tags'], texts[2:]):
+                metadata.append({'bundle_uuid': uuid, 'metadata_key': key, 'metadata_value': value})
+            bundle_ngrams = set()
+            for text in texts:
+                bundle_ngrams |= get_ngrams(text)
+            ngrams.extend({'bundle_uuid': uuid, 'ngram': ngram} for ngram in bundle_ngrams)
+        with model.engine.begin() as connection:
+            connection.execute(cl_bundle.insert(), bundles)
+            connection.execute(cl_bundle_metadata.insert(), metadata)
+            connection.execute(cl_bundle_search_ngram.insert(), ngrams)
+    return uuid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-bundles', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='Searches to time per query.')
+    parser.add_argument('--engine-url', help='MySQL database (default: SQLite).')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    manager = CodaLabManager()
+    if args.engine_url:
+        manager.config['server']['class'] = 'MySQLModel'
+        manager.config['server']['engine_url'] = args.engine_url
+    else:
+        manager.config['server']['class'] = 'SQLiteModel'
+    model = manager.model()
+    user_id = model.root_user_id
+
+    start = time.time()
+    uuid = populate(model, user_id, args.num_bundles, random.Random(args.seed))
+    print('Created %d bundles in %.1fs' % (args.num_bundles, time.time() - start))
+
+    print('%-20s  %8s  %12s  %12s' % ('query', 'results', 'ms (index)', 'ms (scan)'))
+    # Also search for part of a uuid, as when pasting it.
+    for query in QUERIES + [uuid[2:10]]:
+        times = []
+        for enabled in [True, False]:
+            model.search_index.enabled = enabled
+            start = time.time()
+            for _ in range(args.repeat):
+                result = model.search_bundles(user_id, [query, '.count'])['result']
+            times.append((time.time() - start) / args.repeat * 1000)
+        print('%-20s  %8d  %12.1f  %12.1f' % (query, result, times[0], times[1]))
+
+
+if __name__ == '__main__':
+    main()
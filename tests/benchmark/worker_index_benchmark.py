@@ -0,0 +1,154 @@
+"""
+Benchmark for matching staged bundles to workers in the bundle manager. Compares
+WorkerIndex against scanning through every worker for every bundle (which is how
+BundleManager._filter_and_sort_workers used to work), on synthetic workers and bundles.
+
+Usage:
+    python -m tests.benchmark.worker_index_benchmark --num-bundles 10000 --num-workers 1000
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+
+from codalab.server.worker_index import WorkerIndex
+from codalab.worker.bundle_state import RunResources
+
+Dependency = namedtuple('Dependency', ['parent_uuid', 'parent_path'])
+Metadata = namedtuple('Metadata', ['request_queue'])
+Bundle = namedtuple('Bundle', ['uuid', 'metadata', 'dependencies'])
+
+TAGS = ['gpu-cluster', 'nlp', 'vision']
+
+
+def make_workers(num_workers, deps, rng):
+    workers = []
+    for i in range(num_workers):
+        gpus = rng.choice([0, 0, 0, 1, 2, 4])
+        tag = rng.choice([None] * 7 + TAGS)
+        workers.append(
+            {
+                'worker_id': 'worker-%d' % i,
+                'user_id': 'codalab',
+                'cpus': rng.choice([4, 8, 16, 32]),
+                'gpus': gpus,
+                'has_gpus': gpus > 0,
+                'memory_bytes': rng.choice([16, 32, 64]) * 1024 ** 3,
+                'free_disk_bytes': rng.choice([100, 500]) * 1024 ** 3,
+                'exit_after_num_runs': 1000,
+                'tag': tag,
+                'tag_exclusive': tag is not None and rng.random() < 0.5,
+                'run_uuids': [],
+                'dependencies': rng.sample(deps, 50),
+                'shared_file_system': False,
+            }
+        )
+    return workers
+
+
+def make_bundles(num_bundles, deps, rng):
+    bundles = []
+    for i in range(num_bundles):
+        request_queue = rng.choice([None] * 9 + TAGS)
+        bundle = Bundle(
+            uuid='bundle-%d' % i,
+            metadata=Metadata(request_queue=request_queue),
+            dependencies=[Dependency(*dep) for dep in rng.sample(deps, rng.randint(0, 5))],
+        )
+        resources = RunResources(
+            cpus=rng.choice([1, 1, 2, 4]),
+            gpus=rng.choice([0, 0, 0, 1]),
+            docker_image='',
+            time=0,
+            memory=rng.choice([1, 2, 4, 8]) * 1024 ** 3,
+            disk=rng.choice([1, 10]) * 1024 ** 3,
+            network=False,
+        )
+        bundles.append((bundle, resources))
+    return bundles
+
+
+def scan(workers_list, bundle, bundle_resources):
+    """Filters and sorts workers by scanning all of them."""
+    if bundle.metadata.request_queue:
+        workers_list = [w for w in workers_list if w['tag'] == bundle.metadata.request_queue]
+    else:
+        workers_list = [w for w in workers_list if not w['tag_exclusive'] or not w['tag']]
+    workers_list = [w for w in workers_list if w['cpus'] >= bundle_resources.cpus]
+    if bundle_resources.gpus:
+        workers_list = [w for w in workers_list if w['gpus'] >= bundle_resources.gpus]
+    workers_list = [w for w in workers_list if w['memory_bytes'] >= bundle_resources.memory]
+    workers_list = [w for w in workers_list if w['exit_after_num_runs'] > 0]
+    workers_list = [w for w in workers_list if w['free_disk_bytes'] >= bundle_resources.disk]
+    needed_deps = set([(dep.parent_uuid, dep.parent_path) for dep in bundle.dependencies])
+
+    def get_sort_key(worker):
+        num_available_deps = len(needed_deps & set(worker['dependencies']))
+        return (
+            not worker['tag_exclusive'],
+            worker['gpus'] or worker['has_gpus'],
+            -num_available_deps,
+            worker['cpus'],
+            len(worker['run_uuids']),
+            random.random(),
+        )
+
+    workers_list.sort(key=get_sort_key)
+    return workers_list
+
+
+def allocate(worker, bundle_resources):
+    worker['cpus'] -= bundle_resources.cpus
+    worker['gpus'] -= bundle_resources.gpus
+    worker['memory_bytes'] -= bundle_resources.memory
+    worker['exit_after_num_runs'] -= 1
+
+
+def run_scan(workers, bundles):
+    placed = 0
+    for bundle, bundle_resources in bundles:
+        candidates = scan(workers, bundle, bundle_resources)
+        if candidates:
+            allocate(candidates[0], bundle_resources)
+            placed += 1
+    return placed
+
+
+def run_index(workers, bundles):
+    index = WorkerIndex(workers)
+    placed = 0
+    for bundle, bundle_resources in bundles:
+        for _, worker in index.find(bundle, bundle_resources):
+            index.allocate(worker, bundle_resources)
+            placed += 1
+            break
+    return placed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--num-bundles', type=int, default=10000)
+    parser.add_argument('--num-workers', type=int, default=1000)
+    parser.add_argument('--num-deps', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    deps = [('0x%032x' % i, '') for i in range(args.num_deps)]
+    workers = make_workers(args.num_workers, deps, rng)
+    bundles = make_bundles(args.num_bundles, deps, rng)
+    print('%d staged bundles, %d workers' % (args.num_bundles, args.num_workers))
+
+    for name, run in (('scan', run_scan), ('index', run_index)):
+        workers_copy = [dict(worker) for worker in workers]
+        start = time.time()
+        placed = run(workers_copy, bundles)
+        elapsed = time.time() - start
+        print(
+            '%-6s %8.2fs  %8.3fms/bundle  %d placed'
+            % (name, elapsed, elapsed * 1000 / len(bundles), placed)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
 """
 Unit tests for the static methods of the JsonApiClient
 """
+import hashlib
+import threading
 import unittest
+from io import BytesIO
+from unittest import mock
 
 from codalab.client.json_api_client import (
     EmptyJsonApiRelationship,
     JsonApiClient,
+    JsonApiException,
     JsonApiRelationship,
 )
 from codalab.common import PreconditionViolation
@@ -131,3 +136,81 @@ class JsonApiClientTest(unittest.TestCase):
             client.fetch_one(2)
         with self.assertRaises(PreconditionViolation):
             client.fetch_one(10)
+
+
+class UploadContentsInPartsTest(unittest.TestCase):
+    def setUp(self):
+        self.client = JsonApiClient('', {}, lambda: None)
+        self.parts = {}
+        self.commits = []
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.client._make_request = self.make_request
+
+    def make_request(self, method, path, query_params=None, data=None, **kwargs):
+        if path.endswith('/uploads/'):
+            return {'data': {'upload_id': 'u1', 'parts': []}}
+        if '/parts/' in path:
+            number = int(path.rsplit('/', 1)[1])
+            with self.lock:
+                if self.failures.get(number):
+                    self.failures[number] -= 1
+                    raise JsonApiException('Server error', False)
+            self.assertEqual(query_params['sha1'], hashlib.sha1(data).hexdigest())
+            self.parts[number] = data
+            return {'data': {}}
+        if path.endswith('/commit'):
+            self.commits.append(query_params['num_parts'])
+            return {}
+        self.fail('Unexpected request %s %s' % (method, path))
+
+    def upload(self, data, **kwargs):
+        progress = []
+        self.client.upload_contents_in_parts(
+            '0x1',
+            BytesIO(data),
+            progress_callback=lambda size: progress.append(size) or True,
+            part_size=3,
+            parallelism=2,
+            **kwargs
+        )
+        return progress
+
+    def test_upload(self):
+        progress = self.upload(b'abcdefghij')
+        self.assertEqual(self.parts, {0: b'abc', 1: b'def', 2: b'ghi', 3: b'j'})
+        self.assertEqual(self.commits, [4])
+        self.assertEqual(progress, [3, 6, 9, 10])
+
+    @mock.patch('codalab.client.json_api_client.time.sleep')
+    def test_retry(self, sleep):
+        self.failures = {1: 2}
+        self.upload(b'abcdefghij')
+        self.assertEqual(self.parts[1], b'def')
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(self.commits, [4])
+
+    def test_resume(self):
+        upload = {
+            'upload_id': 'u1',
+            'parts': [
+                {'number': 0, 'sha1': hashlib.sha1(b'abc').hexdigest()},
+                # Sent for different contents, so it's sent again.
+                {'number': 1, 'sha1': hashlib.sha1(b'xyz').hexdigest()},
+            ],
+        }
+        progress = self.upload(b'abcdefghij', upload=upload)
+        self.assertEqual(self.parts, {1: b'def', 2: b'ghi', 3: b'j'})
+        self.assertEqual(self.commits, [4])
+        self.assertEqual(progress[-1], 10)
+
+    def test_client_errors_are_not_retried(self):
+        def make_request(method, path, **kwargs):
+            if '/parts/' in path:
+                raise JsonApiException('Bad part', True)
+            return self.make_request(method, path, **kwargs)
+
+        self.client._make_request = make_request
+        with self.assertRaises(JsonApiException):
+            self.upload(b'abcdefghij')
+        self.assertEqual(self.commits, [])
@@ -1,5 +1,15 @@
+import base64
+import http.client
+import io
+import os
+import tarfile
+import tempfile
 import unittest
+from unittest.mock import Mock, patch
+
+from codalab.common import NotFoundError
 from codalab.lib.bundle_cli import BundleCLI
+from codalab.worker.bundle_state import State
 
 
 class BundleCliTest(unittest.TestCase):
@@ -26,3 +36,137 @@ class BundleCliTest(unittest.TestCase):
         expected_result = ['cl', 'run', "echo 'hello world!'"]
         actual_result = self.bundle_cli.collapse_bare_command(argv)
         self.assertEqual(actual_result, expected_result)
+
+
+class FollowTargetsTest(unittest.TestCase):
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.cli = BundleCLI(Mock(), stdout=self.stdout)
+        self.client = Mock()
+
+    @staticmethod
+    def data_event(subpath, offset, data):
+        return {
+            'type': 'data',
+            'subpath': subpath,
+            'offset': offset,
+            'data': base64.b64encode(data).decode(),
+        }
+
+    def follow(self, streams):
+        def follow_contents(bundle_uuid, offsets):
+            for event in streams.pop(0):
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+
+        self.client.follow_contents.side_effect = follow_contents
+        with patch('codalab.lib.bundle_cli.time.sleep'):
+            return self.cli.follow_targets(self.client, '0x1', ['stdout'], from_start=True)
+
+    def followed_offsets(self):
+        return [args[1] for args, _ in self.client.follow_contents.call_args_list]
+
+    def test_follow(self):
+        state = self.follow(
+            [
+                [
+                    {'type': 'state', 'state': State.RUNNING},
+                    self.data_event('stdout', 0, b'line 1\n'),
+                    {'type': 'state', 'state': State.READY},
+                    self.data_event('stdout', 7, b'line 2\n'),
+                ]
+            ]
+        )
+        self.assertEqual(state, State.READY)
+        self.assertEqual(self.stdout.getvalue(), 'line 1\nline 2\n')
+        self.assertEqual(self.followed_offsets(), [[('stdout', 0)]])
+
+    def test_resume(self):
+        """Streams that end early or are cut off are followed again from where they were."""
+        state = self.follow(
+            [
+                [{'type': 'state', 'state': State.RUNNING}, self.data_event('stdout', 0, b'a')],
+                [self.data_event('stdout', 1, b'b'), http.client.IncompleteRead(b'')],
+                # The rest of the files may follow the final state.
+                [{'type': 'state', 'state': State.READY}, ConnectionResetError()],
+                [{'type': 'state', 'state': State.READY}, self.data_event('stdout', 2, b'c')],
+            ]
+        )
+        self.assertEqual(state, State.READY)
+        self.assertEqual(self.stdout.getvalue(), 'abc')
+        self.assertEqual(
+            self.followed_offsets(),
+            [[('stdout', 0)], [('stdout', 1)], [('stdout', 2)], [('stdout', 2)]],
+        )
+
+    def test_old_server(self):
+        self.client.follow_contents.side_effect = NotFoundError('Not found')
+        with patch.object(self.cli, '_poll_targets', return_value=State.READY) as poll_targets:
+            state = self.cli.follow_targets(self.client, '0x1', ['stdout'])
+        self.assertEqual(state, State.READY)
+        poll_targets.assert_called_once_with(self.client, '0x1', ['stdout'], False)
+
+
+class UploadTest(unittest.TestCase):
+    def setUp(self):
+        self.client = Mock()
+        self.client.fetch.side_effect = lambda kind, *args: {
+            'user': {'disk_quota': 1e9, 'disk_used': 0},
+            'bundles': {'id': '0x1', 'state': State.UPLOADING},
+        }[kind]
+        self.client.create.return_value = {'id': '0x1'}
+        manager = Mock(cli_verbose=0)
+        manager.get_current_worksheet_uuid.return_value = (self.client, '0x2')
+        self.stderr = io.StringIO()
+        self.cli = BundleCLI(manager, stdout=io.StringIO(), stderr=self.stderr)
+        self.cli.resolve_bundle_uuid = Mock(return_value='0x1')
+        self.sent = []
+        self.client.upload_contents_blob.side_effect = self.send
+        self.client.upload_contents_in_parts.side_effect = self.send
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.paths = []
+        for name in ('a', 'b'):
+            self.paths.append(os.path.join(self.temp_dir.name, name))
+            with open(self.paths[-1], 'w') as f:
+                f.write(name)
+
+    def send(self, bundle_id, fileobj, progress_callback, **kwargs):
+        data = fileobj.read()
+        progress_callback(len(data))
+        self.sent.append(data)
+
+    def assert_sent_archive(self):
+        self.assertEqual(len(self.sent), 1)
+        with tarfile.open(fileobj=io.BytesIO(self.sent[0]), mode='r:gz') as archive:
+            self.assertEqual(sorted(archive.getnames()), ['a', 'b'])
+        self.assertIn(
+            'Sent %.2fMiB' % (len(self.sent[0]) / 1024.0 / 1024.0), self.stderr.getvalue()
+        )
+
+    def test_several_sources(self):
+        """Several sources are packed as they're sent, without knowing the size up front."""
+        self.client.create_contents_upload.return_value = {'upload_id': '1', 'parts': []}
+        self.cli.do_command(['upload'] + self.paths)
+        self.client.upload_contents_blob.assert_not_called()
+        self.assert_sent_archive()
+
+    def test_several_sources_old_server(self):
+        self.client.create_contents_upload.side_effect = NotFoundError('Not found')
+        self.cli.do_command(['upload'] + self.paths)
+        self.client.upload_contents_in_parts.assert_not_called()
+        self.assert_sent_archive()
+
+    def test_resume_without_upload(self):
+        """Resuming a bundle whose upload failed to be stored starts a new upload."""
+        self.client.fetch_contents_uploads.return_value = []
+        self.client.create_contents_upload.return_value = {'upload_id': '1', 'parts': []}
+        self.cli.do_command(['upload', '--resume', '0x1'] + self.paths)
+        self.client.create.assert_not_called()
+        self.assertEqual(
+            self.client.upload_contents_in_parts.call_args[1]['upload'],
+            {'upload_id': '1', 'parts': []},
+        )
+        self.assert_sent_archive()
@@ -0,0 +1,59 @@
+from collections import namedtuple
+import unittest
+
+from codalab.lib.interpret_cache import InterpretCache
+from codalab.model.bundle_cache import LRUCacheBackend
+from codalab.worker.bundle_state import State
+
+Bundle = namedtuple('Bundle', ['uuid', 'state', 'data_hash'])
+
+
+class InterpretCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = InterpretCache(LRUCacheBackend(max_size=10, ttl_seconds=60))
+        self.block = {
+            'mode': 'contents',
+            'target_genpath': 'stdout',
+            'max_lines': 10,
+            'bundles_spec': {'bundle_infos': [{'uuid': '0x1', 'permission': 1}]},
+        }
+        self.bundle = Bundle('0x1', State.READY, '0xabc')
+
+    def make_key(self, date_last_modified='2020-01-01', block=None, bundle=None):
+        return self.cache.make_key(
+            '0xw', date_last_modified, block or self.block, [bundle or self.bundle]
+        )
+
+    def test_key_depends_on_versions(self):
+        key = self.make_key()
+        self.assertEqual(self.make_key(), key)
+        self.assertNotEqual(self.make_key(date_last_modified='2020-01-02'), key)
+        self.assertNotEqual(self.make_key(bundle=Bundle('0x1', State.READY, '0xdef')), key)
+        self.assertNotEqual(self.make_key(block=dict(self.block, max_lines=20)), key)
+        # The permissions of the current user in the bundle infos don't matter.
+        block = dict(self.block, bundles_spec={'bundle_infos': [{'uuid': '0x1', 'permission': 2}]})
+        self.assertEqual(self.make_key(block=block), key)
+
+    def test_unfinished_bundles_are_not_cached(self):
+        self.assertIsNone(self.make_key(bundle=Bundle('0x1', State.RUNNING, None)))
+        self.assertEqual(self.cache.stats()['uncacheable'], 1)
+
+    def test_stats(self):
+        key = self.make_key()
+        self.assertIsNone(self.cache.get(key))
+        contents = {'fields': {'lines': ['hello']}, 'bundle_uuids': ['0x1']}
+        self.cache.set(key, contents)
+        cached = self.cache.get(key)
+        self.assertEqual(cached, contents)
+        # Callers can change what they get without changing the cache.
+        cached['fields']['lines'].append('world')
+        self.assertEqual(self.cache.get(key), contents)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2.0 / 3)
+        self.assertEqual(
+            stats['bytes_saved'],
+            2 * len('{"fields": {"lines": ["hello"]}, "bundle_uuids": ["0x1"]}'),
+        )
+        self.assertEqual(stats['size'], 1)
@@ -3,6 +3,8 @@ import os
 import shutil
 import tempfile
 import unittest
+from io import BytesIO
+from unittest import mock
 
 from codalab.lib import path_util
 
@@ -77,3 +79,62 @@ class PathUtilFSTest(unittest.TestCase):
         os.symlink(link_target, symlink_path)
         link_hash = path_util.hash_file_contents(symlink_path)
         self.assertEqual(link_hash, expected_hash)
+
+    def test_hash_directory_in_parallel(self):
+        '''
+    Test that hashing files in parallel doesn't change the hash of a directory.
+    '''
+        with mock.patch.object(path_util, 'file_hash_cache', path_util.FileHashCache(0)):
+            with mock.patch.object(path_util, 'HASH_THREADS', 1):
+                expected_hash = path_util.hash_directory(self.bundle_path)
+            with mock.patch.object(path_util, 'HASH_THREADS', 4), mock.patch.object(
+                path_util, 'HASH_BATCH_SIZE', 1
+            ):
+                self.assertEqual(path_util.hash_directory(self.bundle_path), expected_hash)
+
+    def test_hash_directory_uses_cached_hashes(self):
+        '''
+    Test that only files that changed since they were last hashed are read again.
+    '''
+        for path in self.bundle_files:
+            os.utime(path, (0, 0))
+        with mock.patch.object(path_util, 'file_hash_cache', path_util.FileHashCache()):
+            expected_hash = path_util.hash_directory(self.bundle_path)
+            with mock.patch('codalab.lib.path_util.open', create=True, wraps=open) as mock_open:
+                self.assertEqual(path_util.hash_directory(self.bundle_path), expected_hash)
+                mock_open.assert_not_called()
+
+                with open(self.bundle_files[0], 'w') as fd:
+                    fd.write('new contents')
+                os.utime(self.bundle_files[0], (0, 0))
+                self.assertNotEqual(path_util.hash_directory(self.bundle_path), expected_hash)
+                mock_open.assert_called_once_with(self.bundle_files[0], 'rb')
+
+    def test_hash_replaced_file(self):
+        '''
+    Test that files replaced by others of the same size and mtime are hashed again.
+    '''
+        path = self.bundle_files[0]
+        os.utime(path, (0, 0))
+        with mock.patch.object(path_util, 'file_hash_cache', path_util.FileHashCache()):
+            old_hash = path_util.hash_file_contents(path)
+            new_path = path + '.new'
+            with open(new_path, 'w') as fd:
+                fd.write('x' * os.path.getsize(path))
+            os.utime(new_path, (0, 0))
+            expected_hash = path_util.hash_file_contents(new_path)
+            os.rename(new_path, path)
+            self.assertNotEqual(expected_hash, old_hash)
+            self.assertEqual(path_util.hash_file_contents(path), expected_hash)
+
+    def test_write_and_hash_file(self):
+        '''
+    Test that write_and_hash_file caches the same hash that hash_file_contents computes.
+    '''
+        path = os.path.join(self.bundle_path, 'uploaded')
+        with mock.patch.object(path_util, 'file_hash_cache', path_util.FileHashCache()):
+            path_util.write_and_hash_file(BytesIO(self.contents.encode()), path)
+            expected_hash = hashlib.sha1(
+                (path_util.FILE_PREFIX + self.contents).encode()
+            ).hexdigest()
+            self.assertEqual(path_util.file_hash_cache.get(path, os.lstat(path)), expected_hash)
@@ -60,3 +60,15 @@ class ServerUtilTest(unittest.TestCase):
             foo()
         except NotImplementedError:
             self.assertEqual(server_util.exc_frame_locals(), {'a': 1, 'b': 2})
+
+
+class RequestSlotsTest(unittest.TestCase):
+    def test_acquire_and_release(self):
+        slots = server_util.RequestSlots()
+        self.assertTrue(slots.acquire(2))
+        self.assertTrue(slots.acquire(2))
+        self.assertFalse(slots.acquire(2))
+        self.assertTrue(slots.acquire(3))
+        slots.release()
+        self.assertTrue(slots.acquire(3))
+        self.assertFalse(slots.acquire(3))
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from io import BytesIO
+
+from codalab.common import NotFoundError, UsageError
+from codalab.lib.upload_part_store import UploadPartStore
+
+
+class UploadPartStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = UploadPartStore(self.root, ttl_seconds=60)
+        self.session = self.store.create_session('0x1', 'user', {'filename': 'contents'})
+        self.upload_id = self.session['upload_id']
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_sessions(self):
+        other = self.store.create_session('0x2', 'user', {})
+        session = self.store.get_session(self.upload_id)
+        self.assertEqual(session['params'], {'filename': 'contents'})
+        self.assertEqual(session['parts'], [])
+        self.assertEqual(
+            [session['upload_id'] for session in self.store.get_sessions('0x1')], [self.upload_id]
+        )
+        self.store.delete_session(other['upload_id'])
+        self.assertEqual(self.store.get_sessions('0x2'), [])
+        for upload_id in [other['upload_id'], '../0x1']:
+            with self.assertRaises(NotFoundError):
+                self.store.get_session(upload_id)
+
+    def test_write_and_read_parts(self):
+        self.store.write_part(self.upload_id, 1, BytesIO(b'def'))
+        part = self.store.write_part(
+            self.upload_id, 0, BytesIO(b'abc'), sha1=hashlib.sha1(b'abc').hexdigest()
+        )
+        self.assertEqual(part, {'number': 0, 'size': 3, 'sha1': hashlib.sha1(b'abc').hexdigest()})
+        self.assertEqual(
+            [part['number'] for part in self.store.get_session(self.upload_id)['parts']], [0, 1]
+        )
+        # Parts can be sent again.
+        self.store.write_part(self.upload_id, 1, BytesIO(b'ghi'))
+        reader = self.store.open_parts(self.upload_id, 2)
+        self.assertEqual(reader.read(2), b'ab')
+        self.assertEqual(reader.read(), b'cghi')
+        self.assertEqual(reader.read(), b'')
+        reader.close()
+
+    def test_corrupted_part(self):
+        with self.assertRaises(UsageError):
+            self.store.write_part(self.upload_id, 0, BytesIO(b'abc'), sha1='0' * 40)
+        self.assertEqual(self.store.get_session(self.upload_id)['parts'], [])
+        self.assertEqual(os.listdir(os.path.join(self.root, self.upload_id)), ['session.json'])
+
+    def test_missing_parts(self):
+        self.store.write_part(self.upload_id, 1, BytesIO(b'def'))
+        with self.assertRaises(UsageError):
+            self.store.open_parts(self.upload_id, 2)
+
+    def test_cleanup(self):
+        old = time.time() - 120
+        os.utime(os.path.join(self.root, self.upload_id), (old, old))
+        self.store.create_session('0x2', 'user', {})
+        with self.assertRaises(NotFoundError):
+            self.store.get_session(self.upload_id)
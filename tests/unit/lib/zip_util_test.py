@@ -5,10 +5,12 @@ import tarfile
 import tempfile
 import unittest
 import zipfile
+from unittest import mock
 
 from io import BytesIO
 
 from codalab.common import UsageError
+from codalab.lib import path_util
 from codalab.lib.zip_util import (
     get_archive_ext,
     strip_archive_ext,
@@ -187,7 +189,8 @@ class ZipUtilTest(unittest.TestCase):
             packed = pack_files_for_upload(
                 sources=[f1.name, tmpdir], should_unpack=False, follow_symlinks=False
             )
-            fileobj = packed.pop("fileobj")
+            # The archive is packed as it's read.
+            fileobj = BytesIO(packed.pop("fileobj").read())
             tf = tarfile.open(fileobj=fileobj, mode="r:gz")
             expected_names = [
                 os.path.basename(f1.name),
@@ -197,12 +200,25 @@ class ZipUtilTest(unittest.TestCase):
             self.assertEqual(tf.getnames(), expected_names)
             self.assertEqual(tf.extractfile(expected_names[0]).read(), SAMPLE_CONTENTS)
             self.assertEqual(tf.extractfile(expected_names[2]).read(), SAMPLE_CONTENTS)
-            fileobj.seek(0, os.SEEK_END)
             self.assertEqual(
-                packed,
-                {"filename": 'contents.tar.gz', "filesize": fileobj.tell(), "should_unpack": True,},
+                packed, {"filename": 'contents.tar.gz', "filesize": None, "should_unpack": True,},
             )
 
+    def test_pack_files_fails(self):
+        """Packing fails if a source can't be read, instead of sending a partial archive."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ["a.txt", "b.txt"]:
+                with open(os.path.join(tmpdir, name), "wb") as f:
+                    f.write(SAMPLE_CONTENTS)
+            with mock.patch.object(tarfile.TarFile, "add", side_effect=OSError("unreadable")):
+                packed = pack_files_for_upload(
+                    sources=[os.path.join(tmpdir, "a.txt"), os.path.join(tmpdir, "b.txt")],
+                    should_unpack=False,
+                    follow_symlinks=False,
+                )
+                with self.assertRaises(IOError):
+                    packed["fileobj"].read()
+
     def test_unpack_single_archive(self):
         """Unpack a single archive."""
         for (compress_fn, extension) in [
@@ -240,6 +256,24 @@ class ZipUtilTest(unittest.TestCase):
                 )
                 self.assertEqual(SAMPLE_CONTENTS, open(os.path.join(dest_path, "out"), "rb").read())
 
+    def test_unpack_hashes_files(self):
+        """Unpacking caches the hashes of the unpacked files."""
+        for (compress_fn, extension) in [
+            (tar_gzip_directory, ".tar.gz"),
+            (tar_bz2_directory, ".tar.bz2"),
+        ]:
+            with self.subTest(extension=extension), tempfile.TemporaryDirectory() as tmpdir, open(
+                os.path.join(tmpdir, "file.txt"), "wb"
+            ) as f, tempfile.TemporaryDirectory() as dest_path:
+                f.write(SAMPLE_CONTENTS)
+                f.flush()
+                unpack(extension, compress_fn(tmpdir), os.path.join(dest_path, "out"))
+                path = os.path.join(dest_path, "out", "file.txt")
+                self.assertEqual(
+                    path_util.file_hash_cache.get(path, os.lstat(path)),
+                    path_util.copy_and_hash(BytesIO(SAMPLE_CONTENTS), BytesIO()),
+                )
+
     def test_unpack_to_archive_single_archive(self):
         """Unpack a single archive to a .tar.gz file."""
         for (compress_fn, extension) in [
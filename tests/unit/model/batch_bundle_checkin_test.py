@@ -0,0 +1,121 @@
+import unittest
+
+from codalab.model.change_log import ChangeKind
+from codalab.worker.bundle_state import BundleCheckinState, State
+from codalab.worker.worker_run_state import RunStage
+from tests.unit.server.bundle_manager import TestBase
+
+
+class BatchBundleCheckinTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = self.bundle_manager._model
+        self.worker_id = self.mock_worker_checkin(cpus=4, user_id=self.user_id)
+
+    def create_bundle(self, state):
+        bundle = self.create_run_bundle(state)
+        self.save_bundle(bundle)
+        return self.model.get_bundle(bundle.uuid)
+
+    def make_worker_run(self, bundle, state, **kwargs):
+        stats = {'start': 15, 'end': 20, 'elapsed': 5}
+        fields = dict(
+            uuid=bundle.uuid,
+            run_status='Running',
+            bundle_start_time=0,
+            container_time_total=10,
+            container_time_user=6,
+            container_time_system=4,
+            docker_image='codalab/default-cpu',
+            state=state,
+            remote='worker',
+            exitcode=None,
+            failure_message=None,
+            cpu_usage=0.5,
+            memory_usage=100,
+            bundle_profile_stats={stage: stats for stage in RunStage.WORKER_STATE_TO_SERVER_STATE},
+        )
+        fields.update(kwargs)
+        return BundleCheckinState(**fields)
+
+    def checkin_one_by_one(self, worker_runs):
+        for worker_run in worker_runs:
+            bundle = self.model.get_bundle(worker_run.uuid)
+            self.model.bundle_checkin(bundle, worker_run, self.user_id, self.worker_id)
+
+    def get_metadata(self, uuid):
+        metadata = self.model.get_bundle(uuid).metadata.to_dict()
+        del metadata['created']
+        del metadata['last_updated']
+        return metadata
+
+    def test_same_as_bundle_checkin(self):
+        """Batch check-ins leave bundles in the same state as one-by-one check-ins."""
+
+        def create_bundles_and_runs():
+            running = self.create_bundle(State.PREPARING)
+            offline = self.create_bundle(State.WORKER_OFFLINE)
+            finalizing = self.create_bundle(State.RUNNING)
+            return [
+                self.make_worker_run(running, State.RUNNING),
+                self.make_worker_run(offline, State.RUNNING, docker_image=None),
+                self.make_worker_run(
+                    finalizing, State.FINALIZING, exitcode=1, run_status='Finished'
+                ),
+            ]
+
+        expected_runs = create_bundles_and_runs()
+        self.checkin_one_by_one(expected_runs)
+        actual_runs = create_bundles_and_runs()
+        result = self.model.batch_bundle_checkin(actual_runs, self.user_id, self.worker_id)
+
+        self.assertEqual(result, {worker_run.uuid: True for worker_run in actual_runs})
+        for expected, actual in zip(expected_runs, actual_runs):
+            self.assertEqual(
+                self.model.get_bundle(actual.uuid).state, self.model.get_bundle(expected.uuid).state
+            )
+            self.assertEqual(self.get_metadata(actual.uuid), self.get_metadata(expected.uuid))
+            self.assertEqual(
+                self.model.get_bundle_metadata([actual.uuid], 'run_status'),
+                {actual.uuid: actual.run_status},
+            )
+        self.assertEqual(self.model.get_bundle(actual_runs[2].uuid).state, State.FINALIZING)
+        self.assertEqual(
+            self.model.get_bundle(actual_runs[2].uuid).metadata.failure_message, 'Exit code 1'
+        )
+        # The resumed bundle is assigned to the worker again.
+        self.assertEqual(
+            self.model.get_bundle_worker(actual_runs[1].uuid)['worker_id'], self.worker_id
+        )
+
+    def test_records_state_changes(self):
+        preparing = self.create_bundle(State.PREPARING)
+        running = self.create_bundle(State.RUNNING)
+        last_id = self.model.change_log.last_id()
+        self.model.batch_bundle_checkin(
+            [
+                self.make_worker_run(preparing, State.RUNNING),
+                self.make_worker_run(running, State.RUNNING),
+            ],
+            self.user_id,
+            self.worker_id,
+        )
+        _, changes = self.model.change_log.fetch(last_id)
+        self.assertEqual(changes[ChangeKind.BUNDLE], {preparing.uuid})
+
+    def test_skips_missing_and_staged_bundles(self):
+        running = self.create_bundle(State.RUNNING)
+        missing = self.create_run_bundle(State.RUNNING)
+        staged = self.create_bundle(State.STARTING)
+        result = self.model.batch_bundle_checkin(
+            [
+                self.make_worker_run(running, State.RUNNING),
+                self.make_worker_run(missing, State.RUNNING),
+                self.make_worker_run(staged, State.STAGED),
+            ],
+            self.user_id,
+            self.worker_id,
+        )
+        self.assertEqual(result, {running.uuid: True, missing.uuid: False, staged.uuid: True})
+        self.assertEqual(self.model.get_bundle(staged.uuid).state, State.STAGED)
+        self.assertEqual(self.model.batch_bundle_checkin([], self.user_id, self.worker_id), {})
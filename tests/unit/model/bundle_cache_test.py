@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch
+
+from codalab.model.bundle_cache import BundleCache, LRUCacheBackend
+from codalab.worker.bundle_state import State
+from tests.unit.server.bundle_manager import TestBase
+
+
+class LRUCacheBackendTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        backend = LRUCacheBackend(max_size=2, ttl_seconds=10)
+        backend.set_many({'a': 1, 'b': 2})
+        self.assertEqual(backend.get_many(['a']), {'a': 1})
+        backend.set_many({'c': 3})
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        self.assertEqual(len(backend), 2)
+
+    def test_expires(self):
+        backend = LRUCacheBackend(max_size=2, ttl_seconds=10)
+        with patch('time.time', return_value=100):
+            backend.set_many({'a': 1})
+        with patch('time.time', return_value=109):
+            self.assertEqual(backend.get_many(['a']), {'a': 1})
+        with patch('time.time', return_value=110):
+            self.assertEqual(backend.get_many(['a']), {})
+        self.assertEqual(len(backend), 0)
+
+
+class BundleModelCacheTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = self.bundle_manager._model
+        self.model.bundle_cache = BundleCache(LRUCacheBackend(max_size=100, ttl_seconds=100))
+        self.bundle, self.parent = self.create_bundle_single_dep(bundle_state=State.STAGED)
+
+    def test_read_through(self):
+        """Bundles should be loaded from the database once, and then from the cache."""
+        self.assertEqual(self.model.get_bundle(self.bundle.uuid).metadata.name, 'run-python')
+        with patch.object(self.model, '_get_bundle_values') as mock:
+            bundle = self.model.get_bundle(self.bundle.uuid)
+            self.assertEqual(self.model.get_bundle_state(self.bundle.uuid), State.STAGED)
+            mock.assert_not_called()
+        self.assertEqual(bundle.metadata.name, 'run-python')
+        self.assertEqual(bundle.dependencies[0].parent_uuid, self.parent.uuid)
+        stats = self.model.bundle_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_invalidated_by_updates(self):
+        bundle = self.model.get_bundle(self.bundle.uuid)
+        self.model.update_bundle(bundle, {'state': State.STARTING, 'metadata': {'name': 'new'}})
+        bundle = self.model.get_bundle(self.bundle.uuid)
+        self.assertEqual((bundle.state, bundle.metadata.name), (State.STARTING, 'new'))
+        self.assertEqual(self.model.get_bundle_state(self.bundle.uuid), State.STARTING)
+
+        self.model.delete_bundles([self.bundle.uuid])
+        self.assertEqual(self.model.batch_get_bundles(uuid=[self.bundle.uuid]), [])
@@ -0,0 +1,98 @@
+import unittest
+
+from codalab.objects.dependency import Dependency
+from tests.unit.server.bundle_manager import TestBase
+
+
+class BundleLineageTest(TestBase, unittest.TestCase):
+    def create_bundle(self, *parents, save=True):
+        bundle = self.create_run_bundle()
+        bundle.dependencies = [
+            Dependency(
+                {
+                    "parent_uuid": parent.uuid,
+                    "parent_path": "",
+                    "child_uuid": bundle.uuid,
+                    "child_path": "src%d" % i,
+                }
+            )
+            for i, parent in enumerate(parents)
+        ]
+        if save:
+            self.save_bundle(bundle)
+        return bundle
+
+    def test_lineage(self):
+        """Depths are the smallest number of dependencies between bundles."""
+        model = self.bundle_manager._model
+        a = self.create_bundle()
+        b = self.create_bundle(a)
+        c = self.create_bundle(a, b)
+        d = self.create_bundle(b, c)
+
+        self.assertEqual(
+            model.get_descendant_depths([a.uuid], 10), {b.uuid: 1, c.uuid: 1, d.uuid: 2}
+        )
+        self.assertEqual(model.get_descendant_depths([a.uuid], 1), {b.uuid: 1, c.uuid: 1})
+        self.assertEqual(model.get_descendant_depths([a.uuid], 0), {})
+        self.assertEqual(model.get_ancestor_depths([d.uuid], 10), {a.uuid: 2, b.uuid: 1, c.uuid: 1})
+        self.assertEqual(
+            model.get_ancestor_depths([c.uuid, d.uuid], 1), {a.uuid: 1, b.uuid: 1, c.uuid: 1}
+        )
+        # Closest first.
+        uuids = model.get_self_and_descendants([a.uuid], 10)
+        self.assertEqual(uuids[0], a.uuid)
+        self.assertEqual(set(uuids[1:3]), {b.uuid, c.uuid})
+        self.assertEqual(uuids[3:], [d.uuid])
+
+    def test_children_saved_first(self):
+        """Bundles saved before their parents get the ancestors of their parents."""
+        model = self.bundle_manager._model
+        a = self.create_bundle()
+        b = self.create_bundle(a, save=False)
+        c = self.create_bundle(b)
+        d = self.create_bundle(a, c)
+        self.save_bundle(b)
+
+        self.assertEqual(
+            model.get_descendant_depths([a.uuid], 10), {b.uuid: 1, c.uuid: 2, d.uuid: 1}
+        )
+        self.assertEqual(model.get_ancestor_depths([d.uuid], 10), {a.uuid: 1, b.uuid: 2, c.uuid: 1})
+
+    def test_delete(self):
+        model = self.bundle_manager._model
+        a = self.create_bundle()
+        b = self.create_bundle(a)
+        c = self.create_bundle(b)
+
+        model.delete_bundles([c.uuid])
+        self.assertEqual(model.get_descendant_depths([a.uuid], 10), {b.uuid: 1})
+
+        # Bundles are no longer related through a deleted bundle.
+        c = self.create_bundle(b)
+        model.delete_bundles([b.uuid])
+        self.assertEqual(model.get_ancestor_depths([c.uuid], 10), {})
+        self.assertEqual(model.get_descendant_depths([a.uuid], 10), {})
+        self.assertEqual(model.get_self_and_descendants([a.uuid], 10), [a.uuid])
+
+        # Saving the deleted bundle again restores the lineage through it.
+        self.save_bundle(b)
+        self.assertEqual(model.get_ancestor_depths([c.uuid], 10), {a.uuid: 2, b.uuid: 1})
+
+    def test_delete_middle(self):
+        """Deleting a bundle keeps the lineage through its siblings."""
+        model = self.bundle_manager._model
+        a = self.create_bundle()
+        x = self.create_bundle(a)
+        y = self.create_bundle(a)
+        z = self.create_bundle(y)
+        c = self.create_bundle(x, z)
+        d = self.create_bundle(c)
+
+        model.delete_bundles([x.uuid])
+        self.assertEqual(
+            model.get_descendant_depths([a.uuid], 10), {y.uuid: 1, z.uuid: 2, c.uuid: 3, d.uuid: 4}
+        )
+        self.assertEqual(
+            model.get_ancestor_depths([d.uuid], 10), {a.uuid: 4, y.uuid: 3, z.uuid: 2, c.uuid: 1}
+        )
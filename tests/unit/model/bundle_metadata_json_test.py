@@ -0,0 +1,62 @@
+import unittest
+
+from sqlalchemy import select
+
+from codalab.model.tables import bundle as cl_bundle
+from codalab.worker.bundle_state import State
+from tests.unit.server.bundle_manager import TestBase
+
+
+class BundleMetadataJsonTest(TestBase, unittest.TestCase):
+    def get_metadata_json(self, uuid):
+        with self.bundle_manager._model.engine.begin() as connection:
+            return connection.execute(
+                select([cl_bundle.c.metadata_json]).where(cl_bundle.c.uuid == uuid)
+            ).scalar()
+
+    def set_metadata_json(self, uuid, metadata_json):
+        with self.bundle_manager._model.engine.begin() as connection:
+            connection.execute(
+                cl_bundle.update()
+                .where(cl_bundle.c.uuid == uuid)
+                .values(metadata_json=metadata_json)
+            )
+
+    def test_kept_in_sync(self):
+        """Metadata loaded from metadata_json should match what was saved and updated."""
+        model = self.bundle_manager._model
+        bundle = self.create_run_bundle(State.STAGED, metadata=dict(tags=['a', 'b']))
+        self.save_bundle(bundle)
+        self.assertIsNotNone(self.get_metadata_json(bundle.uuid))
+        expected = model.get_bundle(bundle.uuid).metadata.to_dict()
+
+        bundle = model.get_bundle(bundle.uuid)
+        model.update_bundle(bundle, {'metadata': {'name': 'renamed', 'time': 5.5}})
+        model.update_bundle(bundle, {'metadata': {'failure_message': None}}, delete=True)
+        expected.update(name='renamed', time=5.5)
+        del expected['failure_message']
+
+        self.assertEqual(model.get_bundle(bundle.uuid).metadata.to_dict(), expected)
+        self.assertEqual(model.get_bundle_metadata([bundle.uuid], 'name'), {bundle.uuid: 'renamed'})
+
+        # Loading from bundle_metadata, as for bundles that haven't been backfilled, gives the
+        # same result.
+        self.set_metadata_json(bundle.uuid, None)
+        self.assertEqual(model.get_bundle(bundle.uuid).metadata.to_dict(), expected)
+        self.assertEqual(model.get_bundle_metadata([bundle.uuid], 'name'), {bundle.uuid: 'renamed'})
+
+    def test_mixed_backfill(self):
+        """Bundles with and without metadata_json can be loaded together."""
+        model = self.bundle_manager._model
+        bundle1 = self.create_run_bundle(State.STAGED, metadata=dict(name='bundle1'))
+        self.save_bundle(bundle1)
+        bundle2 = self.create_run_bundle(State.STAGED, metadata=dict(name='bundle2'))
+        self.save_bundle(bundle2)
+        self.set_metadata_json(bundle2.uuid, None)
+
+        bundles = model.batch_get_bundles(uuid=[bundle1.uuid, bundle2.uuid])
+        self.assertEqual([bundle.metadata.name for bundle in bundles], ['bundle1', 'bundle2'])
+        self.assertEqual(
+            model.get_bundle_names([bundle1.uuid, bundle2.uuid]),
+            {bundle1.uuid: 'bundle1', bundle2.uuid: 'bundle2'},
+        )
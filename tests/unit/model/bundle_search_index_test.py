@@ -0,0 +1,65 @@
+import unittest
+
+from codalab.model.search_index import get_pattern_ngrams
+from tests.unit.server.bundle_manager import TestBase
+
+
+class BundleSearchIndexTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = self.bundle_manager._model
+        self.bundles = {}
+        for name, description in [
+            ('train-resnet', 'ImageNet baseline'),
+            ('eval-resnet', 'evaluation'),
+            ('train-bert', 'SQuAD fine-tuning'),
+        ]:
+            bundle = self.create_run_bundle(metadata=dict(name=name, description=description))
+            self.save_bundle(bundle)
+            self.bundles[name] = bundle
+
+    def search(self, *keywords):
+        """Returns the names of the bundles found with and without the search index."""
+        names = {bundle.uuid: name for name, bundle in self.bundles.items()}
+        results = []
+        for enabled in [False, True]:
+            self.model.search_index.enabled = enabled
+            uuids = self.model.search_bundles(self.user_id, list(keywords))['result']
+            results.append(sorted(names[uuid] for uuid in uuids))
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_pattern_ngrams(self):
+        self.assertEqual(get_pattern_ngrams('%ResNet%'), {'res', 'esn', 'sne', 'net'})
+        self.assertEqual(get_pattern_ngrams('%ab_cde%'), {'cde'})
+        self.assertIsNone(get_pattern_ngrams('%ab%'))
+        self.assertIsNone(get_pattern_ngrams('%a\\%bcd%'))
+
+    def test_search(self):
+        self.assertEqual(self.search('resnet'), ['eval-resnet', 'train-resnet'])
+        self.assertEqual(self.search('TRAIN'), ['train-bert', 'train-resnet'])
+        self.assertEqual(self.search('train.*bert'), ['train-bert'])
+        self.assertEqual(self.search('tr'), ['train-bert', 'train-resnet'])
+        self.assertEqual(self.search('gpt'), [])
+        self.assertEqual(self.search('description=.*fine.*'), ['train-bert'])
+        self.assertEqual(self.search('name=.*resnet', '.mine'), ['eval-resnet', 'train-resnet'])
+        uuid = self.bundles['eval-resnet'].uuid
+        self.assertEqual(self.search(uuid[2:10]), ['eval-resnet'])
+        self.assertEqual(self.search('uuid=%s.*' % uuid[:10]), ['eval-resnet'])
+        candidates = self.model.search_index.get_candidates('%resnet%')
+        self.assertEqual(
+            candidates, {self.bundles['eval-resnet'].uuid, self.bundles['train-resnet'].uuid}
+        )
+
+    def test_update_and_delete(self):
+        bundle = self.model.get_bundle(self.bundles['train-bert'].uuid)
+        self.model.update_bundle(bundle, {'metadata': {'name': 'train-gpt'}})
+        self.bundles['train-gpt'] = self.bundles.pop('train-bert')
+        self.assertEqual(self.search('gpt'), ['train-gpt'])
+        self.assertEqual(self.search('bert'), [])
+        # The description is still indexed.
+        self.assertEqual(self.search('description=.*squad.*'), ['train-gpt'])
+
+        self.model.delete_bundles([bundle.uuid])
+        del self.bundles['train-gpt']
+        self.assertEqual(self.model.search_index.get_candidates('%squad%'), set())
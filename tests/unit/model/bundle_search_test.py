@@ -0,0 +1,59 @@
+import unittest
+
+from codalab.common import UsageError
+from tests.unit.server.bundle_manager import TestBase
+
+
+class BundleSearchCursorTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.uuids = []
+        for name in ['b', 'a', 'c', 'a', 'b']:
+            bundle = self.create_run_bundle(metadata=dict(name=name))
+            self.save_bundle(bundle)
+            self.uuids.append(bundle.uuid)
+
+    def search_pages(self, keywords):
+        model = self.bundle_manager._model
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            result = model.search_bundles(self.user_id, keywords + ['.cursor=' + cursor])
+            self.assertFalse(result['is_aggregate'])
+            pages.append(result['result'])
+            cursor = result['next_cursor']
+        return pages
+
+    def test_pages(self):
+        pages = self.search_pages(['.limit=2'])
+        self.assertEqual(pages, [self.uuids[0:2], self.uuids[2:4], self.uuids[4:]])
+        # The last page is full, so its cursor leads to an empty page.
+        self.assertEqual(self.search_pages(['.limit=5']), [self.uuids, []])
+
+    def test_pages_with_sort_key(self):
+        names = dict(zip(self.uuids, ['b', 'a', 'c', 'a', 'b']))
+        for keyword, expected_names in [
+            ('name=.sort', ['a', 'a', 'b', 'b', 'c']),
+            ('name=.sort-', ['c', 'b', 'b', 'a', 'a']),
+        ]:
+            with self.subTest(keyword=keyword):
+                pages = self.search_pages([keyword, '.limit=2'])
+                self.assertEqual([len(page) for page in pages], [2, 2, 1])
+                uuids = [uuid for page in pages for uuid in page]
+                self.assertEqual(sorted(uuids), sorted(self.uuids))
+                self.assertEqual([names[uuid] for uuid in uuids], expected_names)
+
+    def test_sugar(self):
+        model = self.bundle_manager._model
+        result = model.search_bundles(self.user_id, ['.cursor', '.limit=3'])
+        self.assertEqual(result['result'], self.uuids[:3])
+        self.assertIsNotNone(result['next_cursor'])
+        # Without .cursor, there's no cursor.
+        self.assertNotIn('next_cursor', model.search_bundles(self.user_id, ['.limit=3']))
+
+    def test_invalid(self):
+        model = self.bundle_manager._model
+        for keywords in [['.cursor', '.offset=2'], ['.cursor=abc'], ['.cursor=WzFd']]:
+            with self.subTest(keywords=keywords):
+                with self.assertRaises(UsageError):
+                    model.search_bundles(self.user_id, keywords)
@@ -0,0 +1,78 @@
+import unittest
+
+from codalab.lib.spec_util import generate_uuid
+from codalab.worker.bundle_state import State
+from tests.unit.server.bundle_manager import TestBase
+
+
+class DiskUsedTest(TestBase, unittest.TestCase):
+    """
+    Checks that the disk used by users, which is kept up to date incrementally, agrees with
+    recomputing it from scratch.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.model = self.bundle_manager._model
+        self.other_user_id = generate_uuid()
+        self.model.add_user(
+            "other",
+            "other@codalab.org",
+            "Other",
+            "User",
+            "password",
+            "Stanford",
+            user_id=self.other_user_id,
+        )
+
+    def create_bundle(self, data_size, data_hash='0x123'):
+        bundle = self.create_run_bundle(State.READY, metadata={'data_size': data_size})
+        bundle.data_hash = data_hash
+        self.save_bundle(bundle)
+        return self.model.get_bundle(bundle.uuid)
+
+    def assertDiskUsedIsAccurate(self, expected):
+        for user_id, disk_used in expected.items():
+            self.assertEqual(self.model.get_user_info(user_id)['disk_used'], disk_used)
+            self.assertEqual(self.model._get_disk_used(user_id), disk_used)
+
+    def test_disk_used_agrees_with_recompute(self):
+        bundle1 = self.create_bundle(100)
+        bundle2 = self.create_bundle(20)
+        self.create_bundle(5, data_hash=None)
+        self.assertDiskUsedIsAccurate({self.user_id: 120, self.other_user_id: 0})
+
+        self.model.update_bundle(bundle1, {'metadata': {'data_size': 300}})
+        self.assertDiskUsedIsAccurate({self.user_id: 320})
+
+        self.model.update_bundle(bundle2, {'owner_id': self.other_user_id})
+        self.assertDiskUsedIsAccurate({self.user_id: 300, self.other_user_id: 20})
+
+        self.model.remove_data_hash_references([bundle1.uuid])
+        self.assertDiskUsedIsAccurate({self.user_id: 0, self.other_user_id: 20})
+
+        self.model.update_bundle(
+            self.model.get_bundle(bundle1.uuid), {'data_hash': '0x456', 'metadata': {}}
+        )
+        self.assertDiskUsedIsAccurate({self.user_id: 300})
+
+        self.model.delete_bundles([bundle1.uuid, bundle2.uuid])
+        self.assertDiskUsedIsAccurate({self.user_id: 0, self.other_user_id: 0})
+
+    def test_unrelated_updates_do_not_change_disk_used(self):
+        bundle = self.create_bundle(100)
+        self.model.update_bundle(bundle, {'state': State.FAILED, 'metadata': {'name': 'b'}})
+        self.model.increment_user_time_used(self.user_id, 10)
+        self.assertDiskUsedIsAccurate({self.user_id: 100})
+        self.assertEqual(self.model.get_user_info(self.user_id)['time_used'], 10)
+
+    def test_reconcile_user_disk_used(self):
+        self.create_bundle(100)
+        self.model.update_user_info({'user_id': self.user_id, 'disk_used': 7})
+        self.model.update_user_info({'user_id': self.other_user_id, 'disk_used': 3})
+        self.assertEqual(
+            self.model.reconcile_user_disk_used(),
+            {self.user_id: (7, 100), self.other_user_id: (3, 0)},
+        )
+        self.assertDiskUsedIsAccurate({self.user_id: 100, self.other_user_id: 0})
+        self.assertEqual(self.model.reconcile_user_disk_used(), {})
@@ -0,0 +1,119 @@
+from contextlib import closing
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from codalab.model.message_bus import DatabaseMessageBus, UnixSocketMessageBus
+from codalab.model.tables import db_metadata
+
+
+class MessageBusTestMixin(object):
+    """Tests that apply to every message bus implementation."""
+
+    def receive(self, socket_id, receive_fn):
+        """Runs receive_fn(listener) in a thread and returns a function that joins it."""
+        result = {}
+
+        def listen():
+            with closing(self.bus.start_listening(socket_id)) as listener:
+                result['value'] = receive_fn(listener)
+
+        thread = threading.Thread(target=listen)
+        thread.start()
+
+        def join():
+            thread.join()
+            return result['value']
+
+        return join
+
+    def test_json_message(self):
+        join = self.receive(1, lambda listener: self.bus.get_json_message(listener, 10))
+        self.assertTrue(self.bus.send_json_message(1, {'type': 'run', 'uuid': '0x1'}, 10))
+        self.assertEqual(join(), {'type': 'run', 'uuid': '0x1'})
+
+    def test_header_and_stream(self):
+        data = os.urandom(DatabaseMessageBus.CHUNK_SIZE * 10 + 123)
+
+        def receive(listener):
+            header = self.bus.get_json_message(listener, 10)
+            with closing(self.bus.get_stream(listener, 10)) as fileobj:
+                return header, fileobj.read()
+
+        join = self.receive(2, receive)
+        self.assertTrue(self.bus.send_json_message(2, {'size': len(data)}, 10))
+        self.assertTrue(self.bus.send_stream(2, io.BytesIO(data), 10))
+        self.assertEqual(join(), ({'size': len(data)}, data))
+
+    def test_nobody_listening(self):
+        self.assertFalse(self.bus.send_json_message(3, {}, 0.1))
+        with closing(self.bus.start_listening(3)) as listener:
+            self.assertIsNone(self.bus.get_json_message(listener, 0.1))
+
+
+class UnixSocketMessageBusTest(MessageBusTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.socket_dir = tempfile.mkdtemp()
+        self.bus = UnixSocketMessageBus(self.socket_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.socket_dir)
+
+
+class DatabaseMessageBusTest(MessageBusTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        engine = create_engine('sqlite:///' + os.path.join(self.db_dir, 'codalab.db'))
+        db_metadata.create_all(engine)
+        self.bus = DatabaseMessageBus(engine)
+
+    def tearDown(self):
+        # The bus's poller thread may still be finishing a query, leaving a journal file.
+        shutil.rmtree(self.db_dir, ignore_errors=True)
+
+    def test_message_waits_for_listener(self):
+        """Messages sent before anyone listens should be received once someone does."""
+        thread = threading.Thread(target=self.bus.send_json_message, args=(4, {'a': 1}, 10))
+        thread.start()
+        with closing(self.bus.start_listening(4)) as listener:
+            self.assertEqual(self.bus.get_json_message(listener, 10), {'a': 1})
+        thread.join()
+
+    def test_poll_failure(self):
+        """Messages sent by other processes are still received after a poll fails."""
+        engine = self.bus._engine
+        other_bus = DatabaseMessageBus(engine)
+        polls = []
+
+        def begin():
+            if threading.current_thread() is self.bus._poller:
+                polls.append(None)
+                if len(polls) == 1:
+                    raise OperationalError('SELECT', {}, Exception('Lost connection'))
+            return engine.begin()
+
+        self.bus._engine = Mock(begin=begin)
+        self.bus.POLL_ERROR_BACKOFF_SECS = 0.1
+        wait_for_message = self.receive(6, lambda listener: self.bus.get_json_message(listener, 10))
+        # The poller keeps polling for the waiting thread after the failed poll.
+        for _ in range(50):
+            if len(polls) > 1:
+                break
+            time.sleep(0.1)
+        self.assertGreater(len(polls), 1)
+        self.assertTrue(other_bus.send_json_message(6, {'a': 1}, 10))
+        self.assertEqual(wait_for_message(), {'a': 1})
+
+    def test_withdrawn_after_timeout(self):
+        """A message that timed out shouldn't be received later."""
+        self.assertFalse(self.bus.send_json_message(5, {'a': 1}, 0.1))
+        with closing(self.bus.start_listening(5)) as listener:
+            self.assertIsNone(self.bus.get_json_message(listener, 0.1))
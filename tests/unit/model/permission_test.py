@@ -0,0 +1,109 @@
+import unittest
+
+from codalab.common import PermissionError
+from codalab.lib.spec_util import generate_uuid
+from codalab.model.bundle_cache import LRUCacheBackend
+from codalab.model.permission_cache import PermissionCache
+from codalab.model.tables import (
+    GROUP_OBJECT_PERMISSION_ALL as ALL,
+    GROUP_OBJECT_PERMISSION_NONE as NONE,
+    GROUP_OBJECT_PERMISSION_READ as READ,
+)
+from codalab.objects.permission import check_bundles_have_read_permission
+from tests.unit.server.bundle_manager import TestBase
+
+
+class PermissionTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.model = self.bundle_manager._model
+        self.reader_id = generate_uuid()
+        self.model.add_user(
+            "reader",
+            "reader@codalab.org",
+            "Test",
+            "Reader",
+            "password",
+            "Stanford",
+            user_id=self.reader_id,
+        )
+        self.uuids = []
+        for _ in range(3):
+            bundle = self.create_run_bundle()
+            self.save_bundle(bundle)
+            self.uuids.append(bundle.uuid)
+        self.groups = [
+            self.model.create_group({'name': name, 'user_defined': True, 'owner_id': self.user_id})[
+                'uuid'
+            ]
+            for name in ['group1', 'group2']
+        ]
+
+    def check(self, expected):
+        """Checks the reader's permissions on the bundles, however they are resolved."""
+        owner_ids = {uuid: self.user_id for uuid in self.uuids}
+        readable = set(uuid for uuid, permission in zip(self.uuids, expected) if permission)
+        for use_permission_view in [False, True]:
+            self.model.use_permission_view = use_permission_view
+            with self.subTest(use_permission_view=use_permission_view):
+                permissions = self.model.get_user_bundle_permissions(
+                    self.reader_id, self.uuids, owner_ids
+                )
+                self.assertEqual([permissions[uuid] for uuid in self.uuids], expected)
+                result = self.model.search_bundles(self.reader_id, ['.limit=100'])['result']
+                self.assertEqual(set(result), readable)
+                reader = self.model.get_user(user_id=self.reader_id)
+                for uuid, permission in zip(self.uuids, expected):
+                    if permission:
+                        check_bundles_have_read_permission(self.model, reader, [uuid])
+                    else:
+                        with self.assertRaises(PermissionError):
+                            check_bundles_have_read_permission(self.model, reader, [uuid])
+
+    def run_changes(self):
+        model = self.model
+        group1, group2 = self.groups
+        self.check([NONE, NONE, NONE])
+
+        model.set_group_bundle_permission(group1, self.uuids[0], READ)
+        model.set_group_bundle_permission(model.public_group_uuid, self.uuids[1], READ)
+        self.check([NONE, READ, NONE])
+        model.add_user_in_group(self.reader_id, group1, False)
+        self.check([READ, READ, NONE])
+
+        model.add_user_in_group(self.reader_id, group2, False)
+        model.set_group_bundle_permission(group2, self.uuids[0], ALL)
+        model.set_group_bundle_permission(group2, self.uuids[2], READ)
+        self.check([ALL, READ, READ])
+        model.set_group_bundle_permission(group2, self.uuids[0], NONE)
+        self.check([READ, READ, READ])
+
+        model.delete_user_in_group(self.reader_id, group1)
+        self.check([NONE, READ, READ])
+        model.delete_group(group2)
+        self.check([NONE, READ, NONE])
+        model.add_user_in_group(self.reader_id, group1, False)
+        model.delete_bundles([self.uuids[0]])
+        del self.uuids[0]
+        self.check([READ, NONE])
+
+    def test_permissions(self):
+        self.run_changes()
+
+    def test_permissions_with_cache(self):
+        self.model.permission_cache = PermissionCache(LRUCacheBackend(100, 60))
+        self.run_changes()
+        self.assertGreater(self.model.permission_cache.stats()['hits'], 0)
+
+    def test_worksheet_permissions(self):
+        model = self.model
+        worksheet_uuid = generate_uuid()
+        owner_ids = {worksheet_uuid: self.user_id}
+        model.add_user_in_group(self.reader_id, self.groups[0], False)
+        model.set_group_worksheet_permission(self.groups[0], worksheet_uuid, ALL)
+        for use_permission_view in [False, True]:
+            model.use_permission_view = use_permission_view
+            self.assertEqual(
+                model.get_user_worksheet_permissions(self.reader_id, [worksheet_uuid], owner_ids),
+                {worksheet_uuid: ALL},
+            )
@@ -0,0 +1,87 @@
+import unittest
+
+from codalab.model.change_log import ChangeKind
+from tests.unit.server.bundle_manager import TestBase
+
+
+class WorkerHeartbeatTest(TestBase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker_model = self.bundle_manager._worker_model
+        self.change_log = self.bundle_manager._model.change_log
+        self.user_id = self.bundle_manager._model.root_user_id
+        self.worker_id = self.mock_worker_checkin(cpus=4, memory_bytes=1000, free_disk_bytes=10)
+
+    def get_worker(self):
+        (worker,) = [
+            worker
+            for worker in self.worker_model.get_workers()
+            if worker['worker_id'] == self.worker_id
+        ]
+        return worker
+
+    def worker_changed_since(self, last_id):
+        _, changes = self.change_log.fetch(last_id)
+        return self.worker_id in changes[ChangeKind.WORKER]
+
+    def test_unknown_worker(self):
+        self.assertIsNone(self.worker_model.worker_heartbeat(self.user_id, 'unknown', {}))
+
+    def test_updates_only_changed_columns(self):
+        before = self.get_worker()
+        last_id = self.change_log.last_id()
+        socket_id = self.worker_model.worker_heartbeat(
+            self.user_id, self.worker_id, {'free_disk_bytes': 5, 'dependencies': [['0x1', '']]}
+        )
+        self.assertEqual(socket_id, before['socket_id'])
+        after = self.get_worker()
+        self.assertEqual(after['free_disk_bytes'], 5)
+        self.assertEqual(after['dependencies'], [('0x1', '')])
+        self.assertEqual(after['cpus'], 4)
+        self.assertEqual(after['memory_bytes'], 1000)
+        self.assertGreaterEqual(after['checkin_time'], before['checkin_time'])
+        self.assertTrue(self.worker_changed_since(last_id))
+
+    def test_empty_heartbeat_keeps_dependencies(self):
+        self.worker_model.worker_heartbeat(
+            self.user_id, self.worker_id, {'dependencies': [['0x1', '']]}
+        )
+        self.worker_model.worker_heartbeat(self.user_id, self.worker_id, {})
+        self.assertEqual(self.get_worker()['dependencies'], [('0x1', '')])
+
+    def test_scheduling_change_is_logged(self):
+        last_id = self.change_log.last_id()
+        self.worker_model.worker_heartbeat(self.user_id, self.worker_id, {'cpus': 4})
+        self.assertFalse(self.worker_changed_since(last_id))
+        self.worker_model.worker_heartbeat(self.user_id, self.worker_id, {'cpus': 8})
+        self.assertTrue(self.worker_changed_since(last_id))
+        self.assertEqual(self.get_worker()['cpus'], 8)
+
+    def test_scheduling_change_is_logged_for_disk_and_dependencies(self):
+        """Free disk space and cached dependencies affect where bundles are placed."""
+        for changes in [{'free_disk_bytes': 5}, {'dependencies': [['0x1', '']]}]:
+            last_id = self.change_log.last_id()
+            self.worker_model.worker_heartbeat(self.user_id, self.worker_id, changes)
+            self.assertTrue(self.worker_changed_since(last_id))
+        last_id = self.change_log.last_id()
+        self.worker_model.worker_heartbeat(
+            self.user_id, self.worker_id, {'capabilities': ['batch_read']}
+        )
+        self.assertFalse(self.worker_changed_since(last_id))
+
+    def test_get_socket_id(self):
+        self.assertEqual(
+            self.worker_model.get_socket_id(self.user_id, self.worker_id),
+            self.get_worker()['socket_id'],
+        )
+        self.assertIsNone(self.worker_model.get_socket_id(self.user_id, 'unknown'))
+
+    def test_capabilities(self):
+        # Workers that don't report capabilities don't have any.
+        self.assertEqual(self.get_worker()['capabilities'], [])
+        self.worker_model.worker_heartbeat(
+            self.user_id, self.worker_id, {'capabilities': ['batch_read']}
+        )
+        self.assertEqual(self.get_worker()['capabilities'], ['batch_read'])
+        self.worker_model.worker_heartbeat(self.user_id, self.worker_id, {})
+        self.assertEqual(self.get_worker()['capabilities'], ['batch_read'])
@@ -22,7 +22,8 @@ class MockBundle(Bundle):
 
 
 class BundleTest(unittest.TestCase):
-    COLUMNS = tuple(col.name for col in cl_bundle.c if col.name != 'id')
+    # metadata_json is a copy of the metadata that is only used by BundleModel.
+    COLUMNS = tuple(col.name for col in cl_bundle.c if col.name not in ('id', 'metadata_json'))
 
     str_metadata = 'my_str'
     int_metadata = 17
@@ -69,8 +70,8 @@ class BundleTest(unittest.TestCase):
 
     def test_columns(self):
         '''
-    Test that Bundle.COLUMNS includes precisely the non-id columns of cl_bundle,
-    in the same order.
+    Test that Bundle.COLUMNS includes precisely the non-id, non-metadata_json columns of
+    cl_bundle, in the same order.
     '''
         self.assertEqual(Bundle.COLUMNS, self.COLUMNS)
 
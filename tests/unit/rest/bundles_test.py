@@ -1,4 +1,16 @@
+import base64
+import io
+import json
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
 from .base import BaseTestCase
+from bottle import HTTPError
+from codalab.common import NotFoundError
+from codalab.lib.upload_part_store import UploadPartStore
+from codalab.rest import bundles
+from codalab.worker.bundle_state import State
 from freezegun import freeze_time
 
 
@@ -82,3 +94,115 @@ class BundlesTest(BaseTestCase):
                 }
             ],
         )
+
+
+class FollowBundleContentsTest(unittest.TestCase):
+    def setUp(self):
+        bundles.request.bind({})
+        bundles.request.user = Mock(user_id='test_user')
+        bundles.response.bind()
+        bundles.local.config = {'server': {}}
+        bundles.local.model = Mock()
+        bundles.local.download_manager = Mock()
+        self.sizes = {'stdout': 10}
+        bundles.local.download_manager.get_target_info.side_effect = self.get_target_info
+        self.states = [State.RUNNING, State.READY]
+        bundles.local.model.get_bundle_state.side_effect = lambda uuid: (
+            self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        )
+        self.follows = []
+        bundles.local.download_manager.follow_files.side_effect = self.follow_files
+
+    def get_target_info(self, target, depth):
+        if target.subpath not in self.sizes:
+            raise NotFoundError('Not found')
+        return {'size': self.sizes[target.subpath]}
+
+    def follow_files(self, uuid, offsets, timeout_secs):
+        self.follows.append((dict(offsets), timeout_secs))
+        if 'stdout' in offsets and offsets['stdout'] < self.sizes['stdout']:
+            yield 'stdout', offsets['stdout'], b'x' * (self.sizes['stdout'] - offsets['stdout'])
+
+    def follow(self, subpaths, offsets):
+        query = {'subpath': subpaths, 'offset': [str(offset) for offset in offsets]}
+        with patch.object(bundles, 'check_bundles_have_read_permission'), patch.object(
+            bundles, 'query_get_list', side_effect=lambda name: query[name]
+        ):
+            return [json.loads(event) for event in bundles._follow_bundle_contents('0x1')]
+
+    def test_follow(self):
+        events = self.follow(['stdout'], [0])
+        self.assertEqual(
+            events,
+            [
+                {'type': 'state', 'state': State.RUNNING},
+                {
+                    'type': 'data',
+                    'subpath': 'stdout',
+                    'offset': 0,
+                    'data': base64.b64encode(b'x' * 10).decode(),
+                },
+                {'type': 'state', 'state': State.READY},
+            ],
+        )
+        # Files are read to the end one last time once the bundle is ready.
+        self.assertEqual(
+            self.follows, [({'stdout': 0}, bundles.FOLLOW_TIMEOUT_SECS), ({'stdout': 10}, 0)]
+        )
+
+    def test_negative_offsets(self):
+        """Negative offsets are relative to the end of the files when the request is made."""
+        self.follow(['stdout', 'stderr', 'log'], [-4, -4, 3])
+        self.sizes['stderr'] = 2
+        self.follow(['stderr'], [-1])
+        self.assertEqual(
+            [offsets for offsets, _ in self.follows],
+            [
+                {'stdout': 6, 'stderr': 0, 'log': 3},
+                {'stdout': 10, 'stderr': 0, 'log': 3},
+                {'stderr': 1},
+            ],
+        )
+
+    def test_max_followers(self):
+        """Requests beyond the limit of the process end after reading the files once."""
+        bundles.local.config = {'server': {'max_followers': 0}}
+        self.states = [State.RUNNING]
+        events = self.follow(['stdout'], [0])
+        self.assertEqual([event['type'] for event in events], ['state', 'data'])
+        self.assertEqual(self.follows, [({'stdout': 0}, 0)])
+
+
+class CommitBundleContentsUploadTest(unittest.TestCase):
+    def setUp(self):
+        bundles.request.bind({'QUERY_STRING': 'num_parts=1'})
+        bundles.request.user = Mock(user_id='test_user')
+        bundles.response.bind()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        bundles.local.upload_part_store = UploadPartStore(temp_dir.name, ttl_seconds=60)
+        bundles.local.model = Mock()
+        bundles.local.model.get_bundle.return_value = Mock(
+            uuid='0x1', state=State.UPLOADING, metadata=Mock(spec=[])
+        )
+        bundles.local.upload_manager = Mock()
+        bundles.local.upload_manager.has_contents.return_value = False
+        params = {'filename': 'contents', 'git': False, 'unpack': False}
+        params.update(finalize_on_failure=False, use_azure_blob_beta=False)
+        self.upload_id = bundles.local.upload_part_store.create_session('0x1', 'test_user', params)[
+            'upload_id'
+        ]
+        bundles.local.upload_part_store.write_part(self.upload_id, 0, io.BytesIO(b'data'))
+
+    def commit(self):
+        with patch.object(bundles, 'check_bundles_have_all_permission'):
+            bundles._commit_bundle_contents_upload('0x1', self.upload_id)
+
+    def test_failure(self):
+        """The parts of a failed commit are deleted, even if the bundle is still uploading."""
+        bundles.local.upload_manager.upload_to_bundle_store.side_effect = IOError('Disk error')
+        with self.assertRaises(HTTPError):
+            self.commit()
+        bundles.local.model.update_bundle.assert_called_once()
+        self.assertNotIn('state', bundles.local.model.update_bundle.call_args[0][1])
+        self.assertEqual(bundles.local.upload_part_store.get_sessions('0x1'), [])
@@ -0,0 +1,72 @@
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from codalab.rest import interpret
+from codalab.worker.bundle_state import State
+from codalab.worker.download_util import BundleTarget
+
+
+class ReadGenpathTargetsTest(unittest.TestCase):
+    def setUp(self):
+        interpret.request.bind({})
+        interpret.request.user = Mock(user_id='test_user')
+        interpret.local.config = {'server': {'genpath_threads': 4}}
+        interpret.local.model = Mock()
+        interpret.local.model.get_bundle_states.side_effect = lambda uuids: {
+            uuid: State.RUNNING if uuid.startswith('running') else State.READY for uuid in uuids
+        }
+        interpret.local.model.get_bundle_worker.return_value = {
+            'user_id': 'user',
+            'worker_id': 'worker',
+        }
+        self.reads = []
+        self.lock = threading.Lock()
+
+    def read_genpath_target(self, target):
+        # Reads run in other threads, with the environment of the request.
+        self.assertEqual(interpret.request.user.user_id, 'test_user')
+        with self.lock:
+            self.reads.append(target)
+        return target.subpath
+
+    def test_reads_each_target_once(self):
+        targets = [BundleTarget('0x1', 'stdout'), BundleTarget('0x2', 'stdout')]
+        with patch.object(interpret, 'read_genpath_target', self.read_genpath_target):
+            infos = interpret.read_genpath_targets(targets * 3)
+        self.assertEqual(infos, {target: 'stdout' for target in targets})
+        self.assertCountEqual(self.reads, targets)
+
+    def test_submits_targets_by_worker(self):
+        interpret.local.model.get_bundle_worker.side_effect = lambda uuid: {
+            'user_id': 'user',
+            'worker_id': uuid[-1],
+        }
+        targets = [BundleTarget('running%d' % (i % 2), 'file%d' % i) for i in range(4)]
+        with patch.object(interpret, 'get_genpath_executor') as get_executor:
+            get_executor.return_value.submit.return_value.result.return_value = None
+            with patch.object(
+                interpret, 'wait', side_effect=lambda futures, timeout: (futures, [])
+            ):
+                interpret.read_genpath_targets(targets)
+        submitted = [call[0][1] for call in get_executor.return_value.submit.call_args_list]
+        self.assertEqual(submitted, [targets[0], targets[2], targets[1], targets[3]])
+
+    def test_deadline(self):
+        release = threading.Event()
+
+        def read_genpath_target(target):
+            if target.bundle_uuid == 'slow':
+                release.wait(5)
+            return 'info'
+
+        targets = [BundleTarget('fast', 'stdout'), BundleTarget('slow', 'stdout')]
+        with patch.object(interpret, 'read_genpath_target', read_genpath_target):
+            infos = interpret.read_genpath_targets(targets, deadline=0.5)
+            release.set()
+        self.assertEqual(infos, {targets[0]: 'info'})
+        with patch.object(interpret, 'read_genpath_targets', return_value=infos):
+            responses = interpret.interpret_file_genpaths(
+                [('fast', '/stdout', None), ('slow', '/stdout', None)]
+            )
+        self.assertEqual(responses, ['info', interpret.GENPATH_UNRESOLVED])
@@ -0,0 +1,134 @@
+from codalab.model.change_log import ChangeKind
+from codalab.worker.bundle_state import State
+from tests.unit.server.bundle_manager import BaseBundleManagerTest
+
+
+class BundleManagerRunIncrementalIterationTest(BaseBundleManagerTest):
+    def fetch_changes(self):
+        """Returns the changes recorded since the last call."""
+        last_id, changes = self.bundle_manager._model.change_log.fetch(
+            getattr(self, 'last_change_id', 0)
+        )
+        self.last_change_id = last_id
+        return changes
+
+    def test_state_changes_are_recorded(self):
+        """Creating a bundle and changing its state should be recorded, but updating
+        only its metadata should not."""
+        bundle = self.create_run_bundle()
+        self.save_bundle(bundle)
+        self.assertEqual(self.fetch_changes()[ChangeKind.BUNDLE], {bundle.uuid})
+
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.update_bundle(bundle, {'metadata': {'description': 'updated'}})
+        self.assertEqual(self.fetch_changes()[ChangeKind.BUNDLE], set())
+
+        self.update_bundle(bundle, {'state': State.STAGED})
+        self.assertEqual(self.fetch_changes()[ChangeKind.BUNDLE], {bundle.uuid})
+
+    def test_worker_changes_are_recorded(self):
+        """A new worker and a change in its capacity or cached dependencies should be
+        recorded, but a check-in with the same capacity and dependencies should not."""
+
+        def checkin(cpus, free_disk_bytes, dependencies=()):
+            self.bundle_manager._worker_model.worker_checkin(
+                user_id=self.user_id,
+                worker_id='worker',
+                tag=None,
+                group_name=None,
+                cpus=cpus,
+                gpus=0,
+                memory_bytes=0,
+                free_disk_bytes=free_disk_bytes,
+                dependencies=list(dependencies),
+                shared_file_system=False,
+                tag_exclusive=False,
+                exit_after_num_runs=999999999,
+                is_terminating=False,
+            )
+
+        checkin(cpus=1, free_disk_bytes=100)
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], {'worker'})
+
+        checkin(cpus=1, free_disk_bytes=100)
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], set())
+
+        checkin(cpus=2, free_disk_bytes=100)
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], {'worker'})
+
+        checkin(cpus=2, free_disk_bytes=50)
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], {'worker'})
+
+        checkin(cpus=2, free_disk_bytes=50, dependencies=[('0x1', '')])
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], {'worker'})
+
+        checkin(cpus=2, free_disk_bytes=50, dependencies=[('0x1', '')])
+        self.assertEqual(self.fetch_changes()[ChangeKind.WORKER], set())
+
+    def test_no_changes(self):
+        """With no changes, nothing should happen."""
+        bundle = self.create_run_bundle()
+        self.save_bundle(bundle)
+        self.fetch_changes()
+
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.assertEqual(bundle.state, State.CREATED)
+
+    def test_stage_created_bundle(self):
+        """A newly created bundle should be staged."""
+        bundle = self.create_run_bundle()
+        self.save_bundle(bundle)
+
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.assertEqual(bundle.state, State.STAGED)
+
+    def test_stage_child_of_finished_bundle(self):
+        """A created bundle should be staged once its parent becomes ready."""
+        bundle, parent = self.create_bundle_single_dep(parent_state=State.RUNNING)
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.assertEqual(bundle.state, State.CREATED)
+
+        self.update_bundle(parent, {'state': State.READY})
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.assertEqual(bundle.state, State.STAGED)
+
+    def test_schedule_staged_bundle(self):
+        """A staged bundle should be started once a worker checks in."""
+        bundle = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle)
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        self.mock_worker_checkin(cpus=1, user_id=self.user_id)
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        bundle = self.bundle_manager._model.get_bundle(bundle.uuid)
+        self.assertEqual(bundle.state, State.STARTING)
+
+    def test_only_changed_bundles_are_checked(self):
+        """Only changed bundles should be checked for being stuck; the rest are left
+        to the full iteration."""
+        stuck = self.create_run_bundle(State.RUNNING)
+        self.save_bundle(stuck)
+        self.fetch_changes()
+        changed = self.create_run_bundle(State.RUNNING)
+        self.save_bundle(changed)
+        self.mock_worker_checkin(cpus=1, user_id=self.user_id)
+
+        self.bundle_manager._run_incremental_iteration(self.fetch_changes())
+
+        stuck = self.bundle_manager._model.get_bundle(stuck.uuid)
+        self.assertEqual(stuck.state, State.RUNNING)
+        changed = self.bundle_manager._model.get_bundle(changed.uuid)
+        self.assertEqual(changed.state, State.WORKER_OFFLINE)
+
+        self.bundle_manager._schedule_run_bundles()
+
+        stuck = self.bundle_manager._model.get_bundle(stuck.uuid)
+        self.assertEqual(stuck.state, State.WORKER_OFFLINE)
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+from codalab.worker.bundle_state import State
+from tests.unit.server.bundle_manager import BaseBundleManagerTest
+
+
+class SchedulerStateTest(BaseBundleManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.scheduler_state = self.bundle_manager._scheduler_state
+
+    def staged_uuids(self):
+        self.scheduler_state.refresh()
+        return [bundle.uuid for bundle in self.scheduler_state.staged_bundles()]
+
+    def test_staged_bundles(self):
+        """Staged bundles should be tracked as they are created, edited and started."""
+        self.assertEqual(self.staged_uuids(), [])
+
+        bundle1 = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle1)
+        bundle2 = self.create_run_bundle(State.CREATED)
+        self.save_bundle(bundle2)
+        self.assertEqual(self.staged_uuids(), [bundle1.uuid])
+
+        self.update_bundle(bundle2, {'state': State.STAGED})
+        self.assertEqual(self.staged_uuids(), [bundle1.uuid, bundle2.uuid])
+
+        bundle1 = self.bundle_manager._model.get_bundle(bundle1.uuid)
+        self.update_bundle(bundle1, {'metadata': {'request_priority': 5}})
+        self.scheduler_state.refresh()
+        self.assertEqual(
+            self.scheduler_state._staged_bundles[bundle1.uuid].metadata.request_priority, 5
+        )
+
+        self.update_bundle(bundle1, {'state': State.STARTING})
+        self.assertEqual(self.staged_uuids(), [bundle2.uuid])
+
+    def test_deleted_bundles(self):
+        """Deleted bundles should stop being tracked without waiting for a resync."""
+        bundle = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle)
+        self.assertEqual(self.staged_uuids(), [bundle.uuid])
+
+        self.bundle_manager._model.delete_bundles([bundle.uuid])
+        self.assertEqual(self.staged_uuids(), [])
+
+    def test_resync(self):
+        """Bundles changed without going through the change log are picked up on resync."""
+        bundle = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle)
+        self.assertEqual(self.staged_uuids(), [bundle.uuid])
+
+        self.scheduler_state._staged_bundles = {}
+        self.assertEqual(self.staged_uuids(), [])
+
+        self.scheduler_state.resync()
+        self.assertEqual(self.staged_uuids(), [bundle.uuid])
+
+    def test_running_bundles_info_is_cached(self):
+        """Running bundles should only be loaded the first time they are seen."""
+        bundle = self.create_run_bundle(State.RUNNING, metadata=dict(request_cpus=3))
+        self.save_bundle(bundle)
+        model = self.bundle_manager._model
+
+        with patch.object(model, 'batch_get_bundles', wraps=model.batch_get_bundles) as mock:
+            info = self.scheduler_state.get_running_bundles_info([bundle.uuid])
+            self.assertEqual(info[bundle.uuid][0], self.user_id)
+            self.assertEqual(info[bundle.uuid][1].cpus, 3)
+            self.scheduler_state.get_running_bundles_info([bundle.uuid])
+            self.assertEqual(mock.call_count, 1)
+
+        self.assertEqual(self.scheduler_state.get_running_bundles_info([]), {})
+        self.assertEqual(self.scheduler_state._running_bundles, {})
+
+    def test_user_parallel_runs(self):
+        """Only runs on workers the owner doesn't own should count towards the quota."""
+        bundle1 = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle1)
+        bundle2 = self.create_run_bundle(State.STAGED)
+        self.save_bundle(bundle2)
+        user_worker_id = self.mock_worker_checkin(cpus=1, user_id=self.user_id)
+        root_worker_id = self.mock_worker_checkin(cpus=1)
+        model = self.bundle_manager._model
+        bundle1, bundle2 = model.batch_get_bundles(uuid=[bundle1.uuid, bundle2.uuid])
+        model.transition_bundle_starting(bundle1, self.user_id, user_worker_id)
+        model.transition_bundle_starting(bundle2, model.root_user_id, root_worker_id)
+
+        user_parallel_runs = self.scheduler_state.get_user_parallel_runs(
+            self.bundle_manager._worker_model.get_workers()
+        )
+
+        self.assertEqual(user_parallel_runs[self.user_id], 1)
+        user_info = model.get_user_info(self.user_id)
+        self.assertEqual(
+            model.get_user_parallel_run_quota_left(self.user_id, user_info),
+            user_info['parallel_run_quota'] - user_parallel_runs[self.user_id],
+        )
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import Mock
+
+from codalab.bundles.run_bundle import RunBundle
+from codalab.objects.metadata_spec import MetadataSpec
+from codalab.server.placement import PlacementPolicy, place
+from codalab.server.worker_index import WorkerIndex
+from codalab.worker.bundle_state import RunResources
+from tests.unit.server.worker_index_test import make_worker
+
+
+def make_bundle(uuid, owner_id, cpus=1, memory=1000):
+    bundle = Mock(spec=RunBundle, uuid=uuid, owner_id=owner_id, metadata=Mock(spec=MetadataSpec))
+    bundle.metadata.request_queue = None
+    bundle.dependencies = []
+    resources = RunResources(
+        cpus=cpus, gpus=0, docker_image='', time=100, memory=memory, disk=1000, network=False
+    )
+    return bundle, resources
+
+
+class PlacementTest(unittest.TestCase):
+    def place(self, policy, staged_bundles_to_run, workers, failing_worker_ids=()):
+        """Places the bundles on the workers and returns [(bundle uuid, worker id)]."""
+        index = WorkerIndex(workers)
+        placements = []
+
+        def try_place(bundle, bundle_resources, worker):
+            if worker['worker_id'] in failing_worker_ids:
+                return False
+            index.allocate(worker, bundle_resources)
+            placements.append((bundle.uuid, worker['worker_id']))
+            return True
+
+        place(policy, staged_bundles_to_run, index.find, try_place)
+        return placements
+
+    def test_greedy_follows_queue_order(self):
+        staged = [make_bundle('a1', 'a'), make_bundle('a2', 'a'), make_bundle('b1', 'b')]
+        placements = self.place(PlacementPolicy.GREEDY, staged, [make_worker(0, cpus=2)])
+        self.assertEqual(placements, [('a1', 0), ('a2', 0)])
+
+    def test_batch_interleaves_users(self):
+        """Each user should get a bundle placed before any user gets a second one."""
+        staged = [make_bundle('a1', 'a'), make_bundle('a2', 'a'), make_bundle('b1', 'b')]
+        placements = self.place(PlacementPolicy.BATCH, staged, [make_worker(0, cpus=2)])
+        self.assertEqual(placements, [('a1', 0), ('b1', 0)])
+
+    def test_batch_packs_larger_bundles_first(self):
+        """Small bundles shouldn't take the room that a larger bundle in the batch needs."""
+        staged = [make_bundle('small', 'a', memory=1000), make_bundle('large', 'b', memory=4000)]
+
+        def make_workers():
+            return [
+                make_worker(0, cpus=1, memory_bytes=4000),
+                make_worker(1, cpus=2, memory_bytes=1000),
+            ]
+
+        self.assertEqual(self.place(PlacementPolicy.GREEDY, staged, make_workers()), [('small', 0)])
+        self.assertEqual(
+            sorted(self.place(PlacementPolicy.BATCH, staged, make_workers())),
+            [('large', 0), ('small', 1)],
+        )
+
+    def test_batch_picks_tightest_fit(self):
+        """A bundle should go to the worker it leaves the least resources unused on."""
+        staged = [make_bundle('bundle', 'a', cpus=2)]
+        workers = [
+            make_worker(0, cpus=4, memory_bytes=1000),
+            make_worker(1, cpus=2, memory_bytes=8000),
+            make_worker(2, cpus=3, memory_bytes=1000),
+        ]
+        self.assertEqual(self.place(PlacementPolicy.BATCH, staged, workers), [('bundle', 2)])
+
+    def test_batch_prefers_cached_dependencies_to_fit(self):
+        """A worker with more of the dependencies cached wins over a tighter fit."""
+        bundle, resources = make_bundle('bundle', 'a', cpus=2)
+        bundle.dependencies = [Mock(parent_uuid='0x1', parent_path='')]
+        workers = [
+            make_worker(0, cpus=2, memory_bytes=1000),
+            make_worker(1, cpus=4, memory_bytes=8000, dependencies=[('0x1', '')]),
+        ]
+        self.assertEqual(
+            self.place(PlacementPolicy.BATCH, [(bundle, resources)], workers), [('bundle', 1)]
+        )
+
+    def test_batch_falls_back_when_placement_fails(self):
+        staged = [make_bundle('bundle', 'a')]
+        workers = [make_worker(i, cpus=1) for i in range(20)]
+        placements = self.place(
+            PlacementPolicy.BATCH, staged, workers, failing_worker_ids=set(range(19))
+        )
+        self.assertEqual(placements, [('bundle', 19)])
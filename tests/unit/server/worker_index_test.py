@@ -0,0 +1,164 @@
+import random
+import unittest
+from collections import namedtuple
+from unittest.mock import Mock
+
+from codalab.bundles.run_bundle import RunBundle
+from codalab.objects.metadata_spec import MetadataSpec
+from codalab.server.worker_index import WorkerIndex
+from codalab.worker.bundle_state import RunResources
+
+Dependency = namedtuple('Dependency', ['parent_uuid', 'parent_path'])
+
+
+def make_worker(worker_id, **kwargs):
+    worker = {
+        'worker_id': worker_id,
+        'user_id': 'codalab',
+        'cpus': 4,
+        'gpus': 0,
+        'memory_bytes': 4 * 1000,
+        'free_disk_bytes': 4 * 1000,
+        'exit_after_num_runs': 1000,
+        'tag': None,
+        'run_uuids': [],
+        'dependencies': [],
+        'shared_file_system': False,
+        'tag_exclusive': False,
+        'has_gpus': False,
+    }
+    worker.update(kwargs)
+    return worker
+
+
+class WorkerIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.bundle = Mock(spec=RunBundle, metadata=Mock(spec=MetadataSpec))
+        self.bundle.metadata.request_queue = None
+        self.bundle.dependencies = []
+        self.bundle_resources = RunResources(
+            cpus=1, gpus=0, docker_image='', time=100, memory=1000, disk=1000, network=False
+        )
+
+    def find(self, index, excluded_worker_ids=()):
+        return [
+            worker['worker_id']
+            for _, worker in index.find(self.bundle, self.bundle_resources, excluded_worker_ids)
+        ]
+
+    def test_filter_by_resources(self):
+        index = WorkerIndex(
+            [
+                make_worker(0, cpus=0),
+                make_worker(1, memory_bytes=10),
+                make_worker(2, free_disk_bytes=10),
+                make_worker(3, exit_after_num_runs=0),
+                make_worker(4),
+                make_worker(5, gpus=1, has_gpus=True),
+            ]
+        )
+        self.assertEqual(self.find(index), [4, 5])
+        self.assertEqual(self.find(index, excluded_worker_ids={4}), [5])
+
+        self.bundle_resources.gpus = 1
+        self.assertEqual(self.find(index), [5])
+
+    def test_filter_by_gpus(self):
+        busy = make_worker('busy', gpus=0, has_gpus=True)
+        free = make_worker('free', gpus=1, has_gpus=True)
+        self.bundle_resources.gpus = 1
+        # Workers whose GPUs are all in use must not hide workers with free GPUs, whatever
+        # order they are indexed in.
+        for workers in ([busy, free], [free, busy]):
+            self.assertEqual(self.find(WorkerIndex(workers)), ['free'])
+
+    def test_allocate_gpus(self):
+        worker = make_worker(0, gpus=1, has_gpus=True)
+        other = make_worker(1, gpus=1, has_gpus=True)
+        index = WorkerIndex([worker, other])
+        self.bundle_resources.gpus = 1
+        index.allocate(worker, self.bundle_resources)
+        self.assertEqual(worker['gpus'], 0)
+        self.assertEqual(self.find(index), [1])
+
+    def test_filter_by_tag(self):
+        index = WorkerIndex(
+            [
+                make_worker(0, tag='worker_X'),
+                make_worker(1, tag='worker_X', tag_exclusive=True),
+                make_worker(2),
+            ]
+        )
+        self.assertEqual(set(self.find(index)), {0, 2})
+
+        self.bundle.metadata.request_queue = 'tag=worker_X'
+        self.assertEqual(self.find(index), [1, 0])
+
+        self.bundle.metadata.request_queue = 'worker_Y'
+        self.assertEqual(self.find(index), [])
+
+    def test_sort_by_dependencies(self):
+        self.bundle.dependencies = [Dependency('a', ''), Dependency('b', '')]
+        index = WorkerIndex(
+            [
+                make_worker(0, dependencies=[('a', '')]),
+                make_worker(1, dependencies=[('a', ''), ('b', '')]),
+                make_worker(2),
+                make_worker(3, shared_file_system=True, cpus=8),
+            ]
+        )
+        self.assertEqual(self.find(index), [1, 3, 0, 2])
+
+    def test_allocate(self):
+        worker = make_worker(0, cpus=2, exit_after_num_runs=2)
+        index = WorkerIndex([worker, make_worker(1, cpus=1)])
+        self.assertEqual(self.find(index), [1, 0])
+
+        index.allocate(worker, self.bundle_resources)
+        self.assertEqual(worker['cpus'], 1)
+        self.assertEqual(worker['memory_bytes'], 3000)
+        self.assertEqual(set(self.find(index)), {0, 1})
+
+        self.bundle_resources.memory = 3500
+        self.assertEqual(self.find(index), [1])
+
+        self.bundle_resources.memory = 1000
+        index.allocate(worker, self.bundle_resources)
+        self.assertEqual(worker['exit_after_num_runs'], 0)
+        self.assertEqual(self.find(index), [1])
+
+    def test_same_as_scan(self):
+        """The index should find the same workers as scanning through all of them."""
+        rng = random.Random(0)
+        deps = [(str(i), '') for i in range(10)]
+        workers = [
+            make_worker(
+                i,
+                cpus=rng.randint(0, 8),
+                gpus=rng.randint(0, 2),
+                memory_bytes=rng.randint(0, 4) * 1000,
+                tag=rng.choice([None, 'worker_X']),
+                tag_exclusive=rng.random() < 0.5,
+                dependencies=rng.sample(deps, 3),
+            )
+            for i in range(100)
+        ]
+        index = WorkerIndex(workers)
+        for request_queue in (None, 'worker_X'):
+            for cpus, gpus in ((1, 0), (4, 0), (2, 1), (1, 2)):
+                self.bundle.metadata.request_queue = request_queue
+                self.bundle_resources.cpus = cpus
+                self.bundle_resources.gpus = gpus
+                expected = set(
+                    worker['worker_id']
+                    for worker in workers
+                    if (
+                        worker['tag'] == request_queue
+                        if request_queue
+                        else not worker['tag_exclusive'] or not worker['tag']
+                    )
+                    and worker['cpus'] >= cpus
+                    and worker['gpus'] >= gpus
+                    and worker['memory_bytes'] >= self.bundle_resources.memory
+                )
+                self.assertEqual(set(self.find(index)), expected)
@@ -0,0 +1,87 @@
+import tests.unit.azure_blob_mock  # noqa: F401
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from apache_beam.io.filesystems import FileSystems
+
+from codalab.common import parse_linked_bundle_url
+from codalab.worker.archive_index_cache import ArchiveIndexCache
+from tests.unit.worker.download_util_test import AzureBlobTestBase
+
+
+class ArchiveIndexCacheTest(AzureBlobTestBase, unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ArchiveIndexCache(self.cache_dir, max_size_bytes=1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def read_readme(self, handle):
+        return handle.tf.read(path="", fileInfo=handle.tf.getFileInfo("/README.md"), size=11)
+
+    def test_reuses_index_and_handle(self):
+        _, dirname = self.create_directory()
+        with patch.object(FileSystems, 'open', wraps=FileSystems.open) as mock_open:
+            handle = self.cache.acquire(dirname)
+            self.assertEqual(self.read_readme(handle), b"hello world")
+            self.cache.release(handle)
+            # The released handle is reused without opening anything.
+            handle2 = self.cache.acquire(dirname)
+            self.assertIs(handle2, handle)
+            # A second concurrent reader gets its own handle, using the cached index.
+            handle3 = self.cache.acquire(dirname)
+            self.assertIsNot(handle3, handle)
+            self.assertEqual(self.read_readme(handle3), b"hello world")
+            self.cache.release(handle2)
+            self.cache.release(handle3)
+        # The index was downloaded once, and the archive opened once per handle.
+        self.assertEqual(mock_open.call_count, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_new_etag_downloads_index(self):
+        _, dirname = self.create_directory()
+        handle = self.cache.acquire(dirname)
+        self.cache.release(handle)
+        with patch.object(FileSystems, 'checksum', return_value='new-etag'):
+            handle2 = self.cache.acquire(dirname)
+        self.assertIsNot(handle2, handle)
+        self.assertEqual(self.read_readme(handle2), b"hello world")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_release_without_reuse(self):
+        _, dirname = self.create_directory()
+        handle = self.cache.acquire(dirname)
+        self.cache.release(handle, reuse=False)
+        self.assertIsNot(self.cache.acquire(dirname), handle)
+
+    def test_max_idle_handles(self):
+        cache = ArchiveIndexCache(self.cache_dir, max_size_bytes=1024 * 1024, max_idle_handles=1)
+        _, dirname1 = self.create_directory()
+        _, dirname2 = self.create_directory()
+        handle1 = cache.acquire(dirname1)
+        handle2 = cache.acquire(dirname2)
+        cache.release(handle1)
+        cache.release(handle2)
+        self.assertIs(cache.acquire(dirname2), handle2)
+        self.assertIsNot(cache.acquire(dirname1), handle1)
+
+    def test_evicts_least_recently_used(self):
+        index_paths = [
+            parse_linked_bundle_url(self.create_directory()[1]).index_path for _ in range(4)
+        ]
+        index_size = os.path.getsize(self.cache.get_index(index_paths[0], 'etag'))
+        cache = ArchiveIndexCache(self.cache_dir, max_size_bytes=3 * index_size)
+        local_paths = []
+        for i, index_path in enumerate(index_paths[:3]):
+            local_paths.append(cache.get_index(index_path, 'etag'))
+            os.utime(local_paths[-1], (i, i))
+        # Use the first index again, so that the second one is the least recently used.
+        cache.get_index(index_paths[0], 'etag')
+        cache.get_index(index_paths[3], 'etag')
+        self.assertTrue(os.path.exists(local_paths[0]))
+        self.assertFalse(os.path.exists(local_paths[1]))
+        self.assertTrue(os.path.exists(local_paths[2]))
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import os
+import random
+import tempfile
+import unittest
+from io import BytesIO
+
+from codalab.worker import compression
+from codalab.worker.compression import ParallelGzipStream
+from codalab.worker.file_util import tar_gzip_directory
+from codalab.worker.un_gzip_stream import un_gzip_stream
+from codalab.worker.un_tar_directory import un_tar_directory
+
+
+class ParallelGzipStreamTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        # Spans several blocks, with repetitions across block boundaries.
+        words = [bytes(rng.choice(b'abcdefgh') for _ in range(8)) for _ in range(1000)]
+        self.data = b' '.join(rng.choice(words) for _ in range(100000))
+        self.executor = ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def compress(self, data, **kwargs):
+        return ParallelGzipStream(BytesIO(data), **kwargs).read()
+
+    def test_output_is_gzip(self):
+        for level in [0, 1, 6, 9]:
+            with self.subTest(level=level):
+                compressed = self.compress(
+                    self.data, level=level, executor=self.executor, max_pending=8
+                )
+                self.assertEqual(gzip.decompress(compressed), self.data)
+                self.assertEqual(un_gzip_stream(BytesIO(compressed)).read(), self.data)
+                if level > 0:
+                    self.assertLess(len(compressed), len(self.data) / 2)
+        self.assertEqual(gzip.decompress(self.compress(b'')), b'')
+
+    def test_same_output_with_any_number_of_threads(self):
+        self.assertEqual(
+            self.compress(self.data, executor=self.executor, max_pending=8),
+            self.compress(self.data),
+        )
+
+    def test_read_in_pieces(self):
+        stream = ParallelGzipStream(BytesIO(self.data), executor=self.executor, max_pending=8)
+        chunks = iter(lambda: stream.read(1000), b'')
+        self.assertEqual(gzip.decompress(b''.join(chunks)), self.data)
+
+    def test_configure(self):
+        with self.assertRaises(ValueError):
+            compression.configure(level=10)
+        try:
+            compression.configure(level=0, threads=2)
+            options = compression.get_stream_options()
+            self.assertEqual(options['level'], 0)
+            self.assertEqual(options['max_pending'], 4)
+        finally:
+            compression.configure(
+                level=compression.DEFAULT_LEVEL, threads=compression.DEFAULT_THREADS
+            )
+
+    def test_tar_gzip_directory(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as dest:
+            os.mkdir(os.path.join(source, 'dir'))
+            with open(os.path.join(source, 'dir', 'data'), 'wb') as f:
+                f.write(self.data)
+            un_tar_directory(tar_gzip_directory(source), os.path.join(dest, 'out'), 'gz')
+            with open(os.path.join(dest, 'out', 'dir', 'data'), 'rb') as f:
+                self.assertEqual(f.read(), self.data)
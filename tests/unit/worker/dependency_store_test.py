@@ -0,0 +1,172 @@
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from io import BytesIO
+from unittest.mock import Mock, patch
+
+from codalab.worker.bundle_state import DependencyKey
+from codalab.worker.dependency_manager import DependencyManager
+from codalab.worker.dependency_store import DependencyStore, DependencyStoreException
+from codalab.worker.fsm import DependencyStage
+
+
+class DependencyStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = DependencyStore(os.path.join(self.dir, 'store'))
+        self.key = DependencyStore.get_key('0xabc', 'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, *parts):
+        return os.path.join(self.dir, *parts)
+
+    def add_directory(self):
+        with self.store.lock(self.key):
+            temp_path = self.store.get_temp_path(self.key)
+            os.makedirs(os.path.join(temp_path, 'subdir'))
+            with open(os.path.join(temp_path, 'subdir', 'file'), 'w') as f:
+                f.write('contents')
+            os.symlink('subdir/file', os.path.join(temp_path, 'link'))
+            self.store.add(self.key, temp_path)
+
+    def test_key(self):
+        self.assertEqual(DependencyStore.get_key('0xabc', 'data'), self.key)
+        self.assertNotEqual(DependencyStore.get_key('0xabc', 'other'), self.key)
+        self.assertNotEqual(DependencyStore.get_key('0xdef', 'data'), self.key)
+        self.assertEqual(
+            DependencyStore.get_key('0xabc', None), DependencyStore.get_key('0xabc', '')
+        )
+
+    def test_link_and_release(self):
+        self.add_directory()
+        with self.store.lock(self.key):
+            self.assertTrue(self.store.has(self.key))
+            self.store.link(self.key, self.path('worker1', 'dep'), self.path('refs1', 'dep'))
+            self.store.link(self.key, self.path('worker2', 'dep'), self.path('refs2', 'dep'))
+        for worker in ['worker1', 'worker2']:
+            file_path = self.path(worker, 'dep', 'subdir', 'file')
+            with open(file_path) as f:
+                self.assertEqual(f.read(), 'contents')
+            self.assertEqual(os.readlink(self.path(worker, 'dep', 'link')), 'subdir/file')
+        # Both workers share the contents in the store.
+        self.assertEqual(os.stat(self.path('worker1', 'dep', 'subdir', 'file')).st_nlink, 3)
+
+        shutil.rmtree(self.path('worker1', 'dep'))
+        self.store.release(self.key, self.path('refs1', 'dep'))
+        with self.store.lock(self.key):
+            self.assertTrue(self.store.has(self.key))
+        self.store.release(self.key, self.path('refs2', 'dep'))
+        with self.store.lock(self.key):
+            self.assertFalse(self.store.has(self.key))
+        # Workers that still link the contents keep them.
+        with open(self.path('worker2', 'dep', 'subdir', 'file')) as f:
+            self.assertEqual(f.read(), 'contents')
+
+    def test_link_across_file_systems(self):
+        """Contents are copied when they can't be linked, but references have to be links."""
+        self.add_directory()
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')):
+            with self.store.lock(self.key):
+                with self.assertRaises(OSError):
+                    self.store.link(self.key, self.path('worker', 'dep'), self.path('refs', 'dep'))
+            with open(self.path('worker', 'dep', 'subdir', 'file')) as f:
+                self.assertEqual(f.read(), 'contents')
+            self.assertEqual(os.stat(self.path('worker', 'dep', 'subdir', 'file')).st_nlink, 1)
+
+            with self.assertRaisesRegex(DependencyStoreException, 'same file system'):
+                self.store.check_can_link(self.path('refs'))
+        self.assertEqual(os.listdir(self.path('refs')), [])
+        self.store.check_can_link(self.path('refs'))
+        self.assertEqual(os.listdir(self.path('refs')), [])
+
+    def test_lock_is_exclusive(self):
+        events = []
+
+        def hold_lock():
+            with self.store.lock(self.key):
+                events.append('locked')
+                time.sleep(0.5)
+                events.append('unlocked')
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        while not events:
+            time.sleep(0.01)
+        wait_callback = Mock()
+        with self.store.lock(self.key, wait_callback=wait_callback):
+            events.append('locked')
+        thread.join()
+        self.assertEqual(events, ['locked', 'unlocked', 'locked'])
+        self.assertTrue(wait_callback.called)
+
+
+class DependencyManagerStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.bundle_service = Mock()
+        self.bundle_service.get_bundle_info.return_value = {
+            'type': 'file',
+            'size': 8,
+            'data_hash': '0xabc',
+        }
+        self.bundle_service.get_bundle_contents.side_effect = lambda uuid, path: BytesIO(
+            b'contents'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def create_dependency_manager(self, name):
+        worker_dir = os.path.join(self.dir, name)
+        os.makedirs(worker_dir)
+        return DependencyManager(
+            os.path.join(worker_dir, 'dependencies-state.json'),
+            self.bundle_service,
+            worker_dir,
+            max_cache_size_bytes=1024,
+            download_dependencies_max_retries=1,
+            dependency_store_dir=os.path.join(self.dir, 'store'),
+        )
+
+    def wait_until_ready(self, dependency_manager, dependency_key):
+        for _ in range(100):
+            dependency_manager._process_dependencies()
+            state = dependency_manager.get('0xrun', dependency_key)
+            if state.stage != DependencyStage.DOWNLOADING:
+                return state
+            time.sleep(0.05)
+        self.fail('Dependency was not downloaded')
+
+    def test_store_on_other_file_system(self):
+        """Workers fail to start if they can't link from the store."""
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')):
+            with self.assertRaises(DependencyStoreException):
+                self.create_dependency_manager('worker')
+
+    def test_dependencies_are_downloaded_once(self):
+        # The same contents under two different bundles, on two workers.
+        keys = [DependencyKey('0x1', 'data'), DependencyKey('0x2', 'data')]
+        dependency_managers = [self.create_dependency_manager(name) for name in ['w1', 'w2']]
+        paths = []
+        for dependency_manager, dependency_key in zip(dependency_managers, keys):
+            state = self.wait_until_ready(dependency_manager, dependency_key)
+            self.assertEqual(state.stage, DependencyStage.READY)
+            paths.append(os.path.join(dependency_manager.dependencies_dir, state.path))
+        self.assertEqual(self.bundle_service.get_bundle_contents.call_count, 1)
+        for path in paths:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'contents')
+        self.assertEqual(os.stat(paths[0]).st_ino, os.stat(paths[1]).st_ino)
+
+        # The contents stay in the store until no worker uses them.
+        dependency_managers[0]._delete_dependency(keys[0])
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertEqual(os.stat(paths[1]).st_nlink, 2)
+        dependency_managers[1]._delete_dependency(keys[1])
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'store', 'objects')), [])
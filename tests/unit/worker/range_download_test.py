@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from codalab.worker.range_download import RangeDownload, TransferLimiter
+
+
+class RangeDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.partial_path = os.path.join(self.temp_dir, 'file.partial')
+        self.contents = bytes(random.getrandbits(8) for _ in range(10000))
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def fetch_range(self, start, end):
+        with self.lock:
+            self.fetched.append((start, end))
+        return io.BytesIO(self.contents[start:end])
+
+    def make_download(self, fetch_range=None, **kwargs):
+        return RangeDownload(
+            fetch_range or self.fetch_range,
+            len(self.contents),
+            self.partial_path,
+            parallelism=4,
+            limiter=TransferLimiter(2),
+            chunk_size=1024,
+            **kwargs
+        )
+
+    def read_partial(self):
+        with open(self.partial_path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        progress = []
+        self.make_download(progress_callback=progress.append).run()
+        self.assertEqual(self.read_partial(), self.contents)
+        self.assertEqual(len(self.fetched), 10)
+        self.assertEqual(sorted(self.fetched)[-1], (9216, 10000))
+        self.assertEqual(max(progress), len(self.contents))
+
+    def test_resume_after_failure(self):
+        def fetch_range(start, end):
+            if start == 5 * 1024:
+                raise IOError('Connection reset')
+            return self.fetch_range(start, end)
+
+        with self.assertRaises(IOError):
+            self.make_download(fetch_range).run()
+        with open(self.partial_path + '.json') as f:
+            done_chunks = set(json.load(f)['chunks'])
+        self.assertNotIn(5, done_chunks)
+
+        # A new download (e.g. after a worker restart) only fetches the missing chunks.
+        self.fetched = []
+        self.make_download().run()
+        self.assertEqual(self.read_partial(), self.contents)
+        self.assertEqual(
+            sorted(start // 1024 for start, _ in self.fetched),
+            [i for i in range(10) if i not in done_chunks],
+        )
+
+    def test_short_range_fails(self):
+        def fetch_range(start, end):
+            return io.BytesIO(self.contents[start : end - 1])
+
+        with self.assertRaises(IOError):
+            self.make_download(fetch_range).run()
+
+    def test_ignored_range_fails(self):
+        def fetch_range(start, end):
+            return io.BytesIO(self.contents)
+
+        with self.assertRaises(IOError):
+            self.make_download(fetch_range).run()
+
+    def test_remove(self):
+        download = self.make_download()
+        download.run()
+        download.remove()
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+class TransferLimiterTest(unittest.TestCase):
+    def test_limits_connections(self):
+        limiter = TransferLimiter(2)
+        active = []
+        max_active = [0]
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def transfer():
+            with limiter.connection():
+                with lock:
+                    active.append(1)
+                    max_active[0] = max(max_active[0], len(active))
+                release.wait(1)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=transfer) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max_active[0], 2)
+
+    def test_throttle(self):
+        limiter = TransferLimiter(1, max_bytes_per_second=100)
+        with patch('time.time', return_value=1000.0), patch('time.sleep') as sleep:
+            # Up to a second's worth of bytes goes through right away.
+            limiter.throttle(100)
+            sleep.assert_not_called()
+            limiter.throttle(50)
+            sleep.assert_called_once_with(0.5)
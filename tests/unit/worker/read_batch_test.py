@@ -0,0 +1,250 @@
+import http.client
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from codalab.common import NotFoundError
+from codalab.lib.download_manager import DownloadManager, ReadCoalescer
+from codalab.worker.download_util import BundleTarget
+from codalab.worker.file_util import un_gzip_bytestring
+from codalab.worker.read_batch import read_frames, ReplyStream, write_frame
+from codalab.worker.reader import Reader
+
+
+class ReadBatchTest(unittest.TestCase):
+    def test_frames(self):
+        stream = ReplyStream(max_pending_chunks=2)
+
+        def write():
+            write_frame(stream, {'a': 1}, None)
+            write_frame(stream, {}, b'hello')
+            write_frame(stream, {'error_code': 404}, None)
+            write_frame(stream, {}, io.BytesIO(b'x' * 3000000))
+            stream.close()
+
+        # Writes block until the frames are read.
+        thread = threading.Thread(target=write)
+        thread.start()
+        frames = list(read_frames(stream))
+        thread.join()
+        self.assertEqual(
+            frames,
+            [({'a': 1}, b''), ({}, b'hello'), ({'error_code': 404}, b''), ({}, b'x' * 3000000)],
+        )
+
+    def test_truncated_frame(self):
+        fileobj = io.BytesIO()
+        write_frame(fileobj, {}, b'hello')
+        fileobj = io.BytesIO(fileobj.getvalue()[:-6])
+        with self.assertRaises(IOError):
+            list(read_frames(fileobj))
+
+
+class ReaderBatchReadTest(unittest.TestCase):
+    def setUp(self):
+        self.bundle_path = tempfile.mkdtemp()
+        with open(os.path.join(self.bundle_path, 'stdout'), 'w') as f:
+            f.write('line 1\nline 2\n')
+        self.run_state = Mock(bundle_path=self.bundle_path)
+        self.run_state.bundle.uuid = '0x1'
+        self.run_state.bundle.dependencies = []
+
+    def tearDown(self):
+        shutil.rmtree(self.bundle_path)
+
+    def test_batch_read(self):
+        reader = Reader()
+        stream = io.BytesIO()
+        reads = [
+            {'uuid': '0x1', 'path': 'stdout', 'read_args': {'type': 'get_target_info', 'depth': 0}},
+            {
+                'uuid': '0x1',
+                'path': 'stdout',
+                'read_args': {'type': 'read_file_section', 'offset': 7, 'length': 6},
+            },
+            {
+                'uuid': '0x1',
+                'path': 'missing',
+                'read_args': {'type': 'get_target_info', 'depth': 0},
+            },
+            {'uuid': '0x2', 'path': 'stdout', 'read_args': {'type': 'stream_file'}},
+        ]
+        reader.batch_read({'0x1': self.run_state}, reads, stream)
+        reader.stop()
+        stream.seek(0)
+        frames = list(read_frames(stream))
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[0][0]['target_info']['size'], 14)
+        self.assertEqual(un_gzip_bytestring(frames[1][1]), b'line 2')
+        self.assertEqual(frames[2][0]['error_code'], http.client.NOT_FOUND)
+        self.assertEqual(frames[3][0]['error_code'], http.client.INTERNAL_SERVER_ERROR)
+
+
+class ReaderFollowFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.bundle_path = tempfile.mkdtemp()
+        with open(os.path.join(self.bundle_path, 'stdout'), 'w') as f:
+            f.write('line 1\nline 2\n')
+        self.run_state = Mock(bundle_path=self.bundle_path)
+        self.run_state.bundle.uuid = '0x1'
+        self.reader = Reader()
+        self.replies = queue.Queue()
+
+    def tearDown(self):
+        self.reader.stop()
+        shutil.rmtree(self.bundle_path)
+
+    def reply_fn(self, err, message={}, data=None):
+        self.replies.put((err, data))
+
+    def test_follow_files(self):
+        read_args = {'type': 'follow_files', 'offsets': {'stdout': 7, 'stderr': 0}, 'timeout': 2}
+        self.reader.read(self.run_state, '', read_args, self.reply_fn)
+        err, stream = self.replies.get(timeout=5)
+        self.assertIsNone(err)
+        frames = read_frames(stream)
+        self.assertEqual(next(frames), ({'subpath': 'stdout', 'offset': 7}, b'line 2\n'))
+
+        # The sections appended to the files afterwards are streamed as they are appended.
+        with open(os.path.join(self.bundle_path, 'stdout'), 'a') as f:
+            f.write('line 3\n')
+        with open(os.path.join(self.bundle_path, 'stderr'), 'w') as f:
+            f.write('error\n')
+        self.assertCountEqual(
+            list(frames),
+            [
+                ({'subpath': 'stdout', 'offset': 14}, b'line 3\n'),
+                ({'subpath': 'stderr', 'offset': 0}, b'error\n'),
+            ],
+        )
+
+    def test_follow_files_outside_bundle(self):
+        read_args = {'type': 'follow_files', 'offsets': {'../x': 0}, 'timeout': 0}
+        self.reader.read(self.run_state, '', read_args, self.reply_fn)
+        err, _ = self.replies.get(timeout=5)
+        self.assertEqual(err[0], http.client.NOT_FOUND)
+
+
+class ReadCoalescerTest(unittest.TestCase):
+    def test_coalesces_concurrent_reads(self):
+        batches = []
+
+        def batch_read(worker, reads):
+            batches.append(reads)
+            return [
+                (read_args, target.encode()) if target != 'bad' else IOError(target)
+                for target, read_args in reads
+            ]
+
+        coalescer = ReadCoalescer(batch_read, window_seconds=0.5, max_batch_size=3)
+        worker = {'user_id': 'user', 'worker_id': 'worker'}
+        results = {}
+        errors = {}
+
+        def read(target):
+            try:
+                results[target] = coalescer.read(worker, target, {'type': 'stream_file'})
+            except IOError as e:
+                errors[target] = e
+
+        threads = [threading.Thread(target=read, args=(t,)) for t in ['a', 'b', 'bad', 'c']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The first three reads fill a batch; the last one is sent on its own.
+        self.assertEqual(sorted(len(reads) for reads in batches), [1, 3])
+        self.assertEqual(results['a'], ({'type': 'stream_file'}, b'a'))
+        self.assertEqual(set(results), {'a', 'b', 'c'})
+        self.assertEqual(str(errors['bad']), 'bad')
+
+
+class DownloadManagerReadTest(unittest.TestCase):
+    def setUp(self):
+        self.bundle_model = Mock()
+        self.worker_model = Mock()
+        self.worker_model.get_json_message.return_value = {'a': 1}
+        self.worker_model.get_stream.return_value = io.BytesIO(b'data')
+        self.download_manager = DownloadManager(self.bundle_model, self.worker_model, Mock())
+        self.target = BundleTarget('0x1', 'stdout')
+        self.read_args = {'type': 'read_file_section', 'offset': 0, 'length': 4}
+
+    def set_capabilities(self, capabilities):
+        self.bundle_model.get_bundle_worker.return_value = {
+            'user_id': 'user',
+            'worker_id': 'worker',
+            'socket_id': 1,
+            'capabilities': capabilities,
+        }
+
+    def read(self):
+        return self.download_manager._read_from_worker(self.target, self.read_args)
+
+    def sent_message_types(self):
+        return [args[1]['type'] for args, _ in self.worker_model.send_json_message.call_args_list]
+
+    def test_single_reads_for_old_workers(self):
+        self.set_capabilities([])
+        self.assertEqual(self.read(), ({'a': 1}, b'data'))
+        self.assertEqual(self.sent_message_types(), ['read'])
+        self.worker_model.deallocate_socket.assert_called_once()
+
+    def test_batch_reads(self):
+        self.set_capabilities(['batch_read'])
+        batch_read = Mock(return_value=[({'a': 1}, b'data')])
+        self.download_manager._read_coalescer._batch_read_fn = batch_read
+        self.assertEqual(self.read(), ({'a': 1}, b'data'))
+        batch_read.assert_called_once()
+
+    def test_unreachable_worker(self):
+        self.worker_model.send_json_message.return_value = False
+        for capabilities in ([], ['batch_read']):
+            self.set_capabilities(capabilities)
+            with self.assertRaises(NotFoundError):
+                self.read()
+        # Nobody waits for replies that won't come.
+        self.worker_model.get_json_message.assert_not_called()
+        self.worker_model.get_stream.assert_not_called()
+
+    def test_follow_files(self):
+        self.set_capabilities(['batch_read', 'follow_files'])
+        stream = io.BytesIO()
+        write_frame(stream, {'subpath': 'stdout', 'offset': 0}, b'data')
+        stream.seek(0)
+        self.worker_model.get_stream.return_value = stream
+        with patch.object(self.download_manager, '_is_available_locally', return_value=False):
+            sections = list(self.download_manager.follow_files('0x1', {'stdout': 0}, 5))
+        self.assertEqual(sections, [('stdout', 0, b'data')])
+        self.assertEqual(self.sent_message_types(), ['read'])
+        self.assertEqual(
+            self.worker_model.send_json_message.call_args[0][1]['read_args']['type'],
+            'follow_files',
+        )
+
+    def test_follow_files_on_old_workers(self):
+        """Workers that don't handle follow_files have their files polled instead."""
+        self.set_capabilities(['batch_read'])
+        contents = {'stdout': b'line 1\n'}
+
+        def read_file_section(target, offset, length, gzipped):
+            if target.subpath not in contents:
+                raise NotFoundError('Not found')
+            data = contents[target.subpath][offset : offset + length]
+            # The file is appended to while it is followed.
+            contents['stdout'] = b'line 1\nline 2\n'
+            return data
+
+        self.download_manager.FOLLOW_POLL_INTERVAL_SECS = 0.01
+        with patch.object(
+            self.download_manager, '_is_available_locally', return_value=False
+        ), patch.object(self.download_manager, 'read_file_section', read_file_section):
+            sections = list(
+                self.download_manager.follow_files('0x1', {'stdout': 0, 'stderr': 0}, 0.1)
+            )
+        self.assertEqual(sections, [('stdout', 0, b'line 1\n'), ('stdout', 7, b'line 2\n')])
+        self.worker_model.send_json_message.assert_not_called()
@@ -0,0 +1,79 @@
+import http.client
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from codalab.worker.bundle_service_client import BundleServiceException
+from codalab.worker.worker import Worker
+
+
+def init_docker_networks(worker, docker_network_prefix):
+    worker.worker_docker_network = None
+    worker.docker_network_internal = None
+    worker.docker_network_external = None
+
+
+class WorkerHeartbeatTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.bundle_service = Mock()
+        with patch('codalab.worker.worker.docker'), patch.object(
+            Worker, 'init_docker_networks', init_docker_networks
+        ):
+            self.worker = Worker(
+                image_manager=Mock(),
+                dependency_manager=None,
+                commit_file=self.work_dir + '/state.json',
+                cpuset={'0'},
+                gpuset=set(),
+                max_memory=None,
+                worker_id='worker',
+                tag=None,
+                work_dir=self.work_dir,
+                local_bundles_dir=None,
+                exit_when_idle=False,
+                exit_after_num_runs=100,
+                idle_seconds=0,
+                checkin_frequency_seconds=5,
+                bundle_service=self.bundle_service,
+                shared_file_system=True,
+                tag_exclusive=False,
+                group_name=None,
+            )
+        self.worker.listener_thread = Mock()
+
+    def test_heartbeat(self):
+        self.bundle_service.heartbeat.return_value = {}
+        self.worker.heartbeat()
+        request = self.bundle_service.heartbeat.call_args[0][1]
+        self.assertTrue(request['full'])
+        self.assertIn('batch_read', request['capabilities'])
+        self.bundle_service.checkin.assert_not_called()
+
+    def test_heartbeat_not_supported(self):
+        """Servers without /heartbeat are checked in with from then on."""
+        self.bundle_service.heartbeat.side_effect = BundleServiceException(
+            'Not found', True, http.client.NOT_FOUND
+        )
+        self.bundle_service.checkin.return_value = {'type': 'kill', 'uuid': '0x1'}
+        self.worker.heartbeat()
+        self.assertFalse(self.worker.heartbeat_supported)
+        self.assertEqual(self.worker.messages.get_nowait(), {'type': 'kill', 'uuid': '0x1'})
+
+        self.bundle_service.checkin.return_value = None
+        self.worker.heartbeat()
+        self.assertEqual(self.bundle_service.heartbeat.call_count, 1)
+        self.assertEqual(self.bundle_service.checkin.call_count, 2)
+        self.assertEqual(self.bundle_service.checkin.call_args[0][1]['runs'], [])
+        self.assertTrue(self.worker.messages.empty())
+
+    def test_heartbeat_failed(self):
+        """Other errors don't make the worker give up on heartbeats."""
+        self.worker.last_checkin_successful = True
+        self.bundle_service.heartbeat.side_effect = BundleServiceException(
+            'Unavailable', False, http.client.SERVICE_UNAVAILABLE
+        )
+        self.worker.heartbeat()
+        self.assertTrue(self.worker.heartbeat_supported)
+        self.assertFalse(self.worker.last_checkin_successful)
+        self.bundle_service.checkin.assert_not_called()